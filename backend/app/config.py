@@ -23,6 +23,21 @@ class Settings(BaseSettings):
     # File upload settings
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB default
+    UPLOAD_CHUNK_SIZE: int = 1048576  # uploads are streamed to storage in 1MB chunks
+    # "local" (files under app/uploads) or "s3" (any S3-compatible endpoint, e.g. MinIO)
+    UPLOAD_STORAGE_BACKEND: str = "local"
+    UPLOAD_S3_BUCKET: Optional[str] = None
+    UPLOAD_S3_ENDPOINT_URL: Optional[str] = None
+    UPLOAD_S3_PREFIX: str = ""
+    # Batch voucher imports (zip or several files; see services/voucher_imports.py)
+    VOUCHER_IMPORT_MAX_FILES: int = 200
+    VOUCHER_IMPORT_MAX_ZIP_SIZE: int = 209715200  # 200MB; each file inside is still held to MAX_UPLOAD_SIZE
+    VOUCHER_EXTRACT_CONCURRENCY: int = 4  # vouchers sent to the extraction model at once
+
+    # Response compression (brotli when available, gzip otherwise)
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes — smaller responses are sent as-is
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
     
     # API Keys
     OPENAI_API_KEY: Optional[str] = None
@@ -31,6 +46,72 @@ class Settings(BaseSettings):
     # External tools paths
     POPPLER_PATH: Optional[str] = None
     TESSERACT_PATH: Optional[str] = None
+
+    # RDB permit booking page scraped for slot availability. Point this at
+    # benchmarks/permit_replay_server.py to run the scrapers offline.
+    PERMIT_SITE_URL: str = "https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml"
+
+    # Scrape workers (scrape_worker.py) split the 2-year horizon using leases in scrape_work_items
+    SCRAPE_IN_API_PROCESS: bool = False  # run one worker inside the API process (single-box setups)
+    SCRAPE_LEASE_SECONDS: int = 300  # a worker that stops heartbeating loses its item after this
+    SCRAPE_HEARTBEAT_SECONDS: int = 60
+    SCRAPE_REVISIT_SECONDS: int = 0  # minimum age before a range is scraped again; 0 = continuous
+    SCRAPE_WORKER_POLL_SECONDS: int = 30  # idle wait when nothing is due
+    SCRAPE_JOB_POLL_SECONDS: float = 2  # how often workers look for on-demand scrape jobs and report progress
+
+    # Scheduler and in-process scrape worker run in one API process only (see services/leader.py)
+    BACKGROUND_SERVICES: str = "auto"  # "auto" = elect a leader, "always" = no election, "off" = API-only worker
+    LEADER_LEASE_SECONDS: int = 60  # a leader that stops renewing is replaced after this
+    LEADER_RENEW_SECONDS: int = 15  # renewal interval; standbys retry the claim this often
+    STARTUP_LEASE_SECONDS: int = 300  # startup seeds/backfills run one process at a time; a crashed holder blocks others this long
+
+    # Retry queue for dates a scrape run could not resolve
+    SCRAPE_RETRY_DRAIN_INTERVAL: int = 60  # seconds between drain passes; 0 disables draining
+    SCRAPE_RETRY_BASE_DELAY: int = 60  # first backoff in seconds, doubled per failed attempt
+    SCRAPE_RETRY_MAX_DELAY: int = 1800
+    SCRAPE_RETRY_BATCH: int = 20  # dates re-checked per product per pass
+    SCRAPE_RETRY_TABS: int = 4
+
+    # Low-slot alerts, evaluated as availability is written (see services/slot_alerts.py)
+    SLOT_ALERT_THRESHOLDS: str = "gorilla:20,golden_monkey:10"  # product key:threshold defaults
+    SLOT_ALERT_HYSTERESIS: int = 5  # a low date re-arms once its headroom is threshold + this
+    SLOT_ALERT_COOLDOWN_HOURS: float = 24.0
+    SLOT_ALERT_SWEEP_MINUTES: int = 60  # re-check stored availability (bookings and rules change too)
+
+    # Bookings beyond a date's net availability (scraped slots less our pending bookings):
+    # "warn" returns a capacity warning, "block" refuses them with 409, "off" skips the check
+    OVERBOOKING_POLICY: str = "warn"
+
+    # Scrape telemetry (scrape_runs / scrape_batches / scrape_date_timings)
+    SCRAPE_TELEMETRY_DETAIL_DAYS: int = 14  # per-date rows older than this are rolled up and deleted
+    SCRAPE_TELEMETRY_RUN_DAYS: int = 180  # runs and batches older than this are deleted
+
+    # Prometheus-style /metrics endpoint (see utils/metrics.py); off by default
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: Optional[str] = None  # when set, /metrics requires "Authorization: Bearer <token>"
+
+    # Adaptive concurrency/pacing shared by all scraper engines (see utils/adaptive_concurrency.py)
+    SCRAPER_INITIAL_CONCURRENCY: int = 6
+    SCRAPER_MIN_CONCURRENCY: int = 1
+    SCRAPER_MAX_CONCURRENCY: int = 16
+    SCRAPER_INITIAL_DELAY: float = 1.0  # seconds; scales the pauses between page steps and batches
+    SCRAPER_MIN_DELAY: float = 0.2
+    SCRAPER_MAX_DELAY: float = 10.0
+    SCRAPER_CONTROL_SYNC_SECONDS: int = 10  # workers re-read the knobs and re-split the limit this often
+    SCRAPER_AJAX_TIMEOUT_MS: int = 15000  # longest wait for a form step's JSF partial response (utils/jsf_waits.py)
+    SCRAPER_RENDER_TIMEOUT_MS: int = 3000  # longest wait for a date's slots/"No slots" to render after it
+
+    # Lean page mode for scrape tabs (see utils/lean_pages.py); resource types as Playwright names them
+    SCRAPER_LEAN_PAGES: bool = True
+    SCRAPER_BLOCK_RESOURCE_TYPES: str = "image,media,font,stylesheet"
+    SCRAPER_BLOCK_THIRD_PARTY: bool = True  # abort requests to hosts other than PERMIT_SITE_URL's
+    SCRAPER_THIRD_PARTY_ALLOW: str = ""  # comma-separated hosts the form does need (e.g. a script CDN)
+    SCRAPER_CACHE_RESOURCE_TYPES: str = "script,stylesheet"
+    SCRAPER_ASSET_CACHE_DIR: str = ""  # default: <tmp>/trekdesk_asset_cache
+    SCRAPER_ASSET_CACHE_SECONDS: int = 86400  # 0 disables the asset cache
+
+    # Load OCR models at startup instead of on the first passport upload
+    OCR_WARMUP: bool = False
     
     class Config:
         env_file = ".env"
@@ -3,14 +3,19 @@ import asyncio
 import sys
 import os
 import logging
+import socket
+import threading
 from datetime import datetime
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
-from .routes import api_router, auth, users, bookings, notifications, finance, passport, voucher, authorization
+from .routes import api_router, auth, users, bookings, notifications, finance, passport, voucher, authorization, metrics as metrics_routes
+from .config import settings
 from .database import Base, engine, SessionLocal
 from .models.agent_client import AgentClient  # ensure table is created
+from .services.catalogue_seed import seed_initial_data
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -64,6 +69,133 @@ def backfill_missing_payments(db):
         logger.info(f"Backfilled {created} missing payment records")
 
 
+def migrate_proof_documents(db):
+    """Copy legacy comma-separated AuthorizationRequest.proof_documents into proof_documents rows."""
+    from .models.authorization import AuthorizationRequest, ProofDocument
+
+    requests = (
+        db.query(AuthorizationRequest)
+        .filter(AuthorizationRequest.proof_documents.isnot(None), AuthorizationRequest.proof_documents != "")
+        .filter(~AuthorizationRequest.documents.any())
+        .all()
+    )
+    created = 0
+    for req in requests:
+        seen = set()
+        for name in req.proof_documents.split(","):
+            name = name.strip()
+            if name and name not in seen:
+                seen.add(name)
+                db.add(ProofDocument(authorization_request_id=req.id, filename=name, original_filename=name))
+                created += 1
+    if created:
+        db.commit()
+        logger.info(f"Migrated {created} proof documents to the proof_documents table")
+
+
+def migrate_product_scrape_columns():
+    """Add the Product scraping columns to databases created before they existed.
+    The two products that had their own scrapers start out enabled."""
+    from sqlalchemy import inspect, text
+    columns = {
+        "scrape_enabled": "BOOLEAN NOT NULL DEFAULT FALSE",
+        "permit_site_label": "VARCHAR",
+        "permit_product_label": "VARCHAR",
+    }
+    try:
+        existing = {column["name"] for column in inspect(engine).get_columns("products")}
+        missing = [name for name in columns if name not in existing]
+        if not missing:
+            return
+        with engine.begin() as conn:
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} {columns[name]}"))
+            if "scrape_enabled" in missing:
+                conn.execute(text(
+                    "UPDATE products SET scrape_enabled = TRUE "
+                    "WHERE name IN ('Mountain gorillas', 'Golden Monkeys')"
+                ))
+        logger.info(f"Added product scrape columns: {', '.join(missing)}")
+    except Exception as exc:
+        logger.error(f"Product scrape column migration failed (non-fatal): {exc}")
+
+
+def migrate_product_availability(db):
+    """Copy legacy gorilla / golden monkey slot rows into product_availability."""
+    from .models.product_availability import ProductAvailability
+    from .services.product_catalogue import LEGACY_SLOT_MODELS, get_target
+
+    copied = 0
+    for key, model in LEGACY_SLOT_MODELS.items():
+        target = get_target(db, key)
+        if target is None or db.query(ProductAvailability).filter(
+            ProductAvailability.product_id == target.product_id
+        ).first():
+            continue
+        latest = {}
+        for row in db.query(model).all():
+            # The legacy tables have no unique date constraint; keep the freshest row
+            current = latest.get(row.date)
+            if current is None or (row.updated_at or datetime.min) > (current.updated_at or datetime.min):
+                latest[row.date] = row
+        for row in latest.values():
+            db.add(ProductAvailability(
+                product_id=target.product_id, date=row.date, slots=row.slots,
+                created_at=row.created_at, updated_at=row.updated_at,
+            ))
+            copied += 1
+    if copied:
+        db.commit()
+        logger.info(f"Copied {copied} legacy slot rows to product_availability")
+
+
+def migrate_rolling_deposit_aggregates(db):
+    """Index the ledger by agent and build the rolling-deposit aggregates for
+    ledgers written before they were maintained."""
+    from sqlalchemy import text
+    from .models.agent_client import RollingDepositTotals, RollingDepositTransaction
+    from .services.rolling_deposit import reconcile_rolling_deposit
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_rolling_deposit_transactions_agent_client_id "
+            "ON rolling_deposit_transactions (agent_client_id)"
+        ))
+    if db.query(RollingDepositTotals).first() or not db.query(RollingDepositTransaction).first():
+        return
+    result = reconcile_rolling_deposit(db, repair=True)
+    db.commit()
+    logger.info(f"Built rolling deposit aggregates for {result['agents_checked']} agents "
+                f"and {result['bookings_checked']} bookings")
+
+
+def migrate_booking_events(db):
+    """Give bookings that predate the booking event log a reconstructed history."""
+    from sqlalchemy import exists
+    from .models.booking import Booking
+    from .models.booking_event import BookingEvent
+    from .services.booking_events import backfill_booking_events
+
+    unlogged = db.query(Booking.id).filter(~exists().where(BookingEvent.booking_id == Booking.id)).first()
+    if unlogged is None:
+        return
+    backfill_booking_events(db)
+    db.commit()
+
+
+def migrate_capacity_index(db):
+    """Build the capacity index for bookings made before it was maintained."""
+    from .models.booking import Booking
+    from .models.capacity import CapacityContribution
+    from .services.capacity_index import reconcile_capacity_index
+
+    if db.query(CapacityContribution).first() or not db.query(Booking.id).first():
+        return
+    result = reconcile_capacity_index(db, repair=True)
+    db.commit()
+    logger.info(f"Built the capacity index for {result['bookings_checked']} bookings")
+
+
 def migrate_booking_status_enum():
     """
     Add new BookingStatus values (as uppercase Python names) to the PostgreSQL native enum.
@@ -444,46 +576,6 @@ def seed_demo_bookings(db):
     logger.info("Demo bookings seeded (one per status)")
 
 
-def seed_initial_data(db):
-    from .models.site import Site, Product
-    if db.query(Site).count() > 0:
-        return  # already seeded
-    site1 = Site(name="Volcanoes National Park")
-    site2 = Site(name="Nyungwe Forest National Park")
-    db.add_all([site1, site2])
-    db.flush()
-    products = [
-        # Volcanoes National Park
-        Product(name="Mountain gorillas", unit_cost=1500, site_id=site1.id),
-        Product(name="Golden Monkeys", unit_cost=100, site_id=site1.id),
-        Product(name="Bisoke", unit_cost=75, site_id=site1.id),
-        Product(name="Dian Fossey Tomb", unit_cost=75, site_id=site1.id),
-        Product(name="Gahinga", unit_cost=75, site_id=site1.id),
-        Product(name="Muhabura", unit_cost=75, site_id=site1.id),
-        Product(name="Muhabura-Gahinga", unit_cost=75, site_id=site1.id),
-        Product(name="Nature walk", unit_cost=50, site_id=site1.id),
-        Product(name="Sabyinyo Volcano Climbing", unit_cost=75, site_id=site1.id),
-        Product(name="Buhanga Eco-park", unit_cost=50, site_id=site1.id),
-        Product(name="Buhanga Eco-park(1 day picnic including Camping)", unit_cost=50, site_id=site1.id),
-        Product(name="Hiking on a chain of volcanoes", unit_cost=75, site_id=site1.id),
-        # Nyungwe Forest National Park
-        Product(name="Canopy Walk", unit_cost=60, site_id=site2.id),
-        Product(name="Canopy Walk Exclusive", unit_cost=120, site_id=site2.id),
-        Product(name="Chimps Trek", unit_cost=90, site_id=site2.id),
-        Product(name="Chimps Trek Exclusive", unit_cost=180, site_id=site2.id),
-        Product(name="Bird Walk - Nyungwe Forest", unit_cost=50, site_id=site2.id),
-        Product(name="Waterfall- Kamiranzovu", unit_cost=50, site_id=site2.id),
-        Product(name="Waterfall- Ndambarare", unit_cost=50, site_id=site2.id),
-        Product(name="Colubus / Mangabey Monkey", unit_cost=50, site_id=site2.id),
-        Product(name="Colubus / Mangabey Monkey Exclusive", unit_cost=100, site_id=site2.id),
-        Product(name="Entry fee 1st Night", unit_cost=30, site_id=site2.id),
-        Product(name="Entry fee Extra Night", unit_cost=20, site_id=site2.id),
-        Product(name="Nature Trails (Nyungwe National Park)", unit_cost=50, site_id=site2.id),
-        Product(name="Nature Walk 0-5km", unit_cost=40, site_id=site2.id),
-    ]
-    db.add_all(products)
-    db.commit()
-
 # Path to the log file written next to run.py (backend root)
 _BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _SCHEDULER_LOG = os.path.join(_BACKEND_DIR, "scheduler.log")
@@ -500,37 +592,9 @@ def _log(msg: str):
     logger.info(msg)
 
 
-async def _scrape_all_batches():
-    """Scrape 2 years of data in batches of 30 days, same logic as run_scrapers.py."""
-    from async_panda_headless import scrape_slots
-    from async_golden_monkey import scrape_golden_monkey_slots
-    from datetime import timedelta
-
-    total_days = 365 * 2
-    batch_size = 30
-    total_batches = (total_days + batch_size - 1) // batch_size  # 25 batches
-
-    _log(f"Starting full 2-year scrape: {total_batches} batches of {batch_size} days")
-
-    for batch in range(total_batches):
-        start_offset = batch * batch_size
-        _log(f"Batch {batch + 1}/{total_batches} (days {start_offset}–{start_offset + batch_size - 1})")
-        try:
-            await scrape_slots(start_offset=start_offset)
-            await asyncio.sleep(30)
-            await scrape_golden_monkey_slots(start_offset=start_offset)
-            if batch < total_batches - 1:
-                await asyncio.sleep(30)
-        except Exception as e:
-            _log(f"Batch {batch + 1} error: {e} — continuing")
-            continue
-
-    _log("Full 2-year scrape complete")
-
-
-def _run_scraper_in_thread():
+def _run_scraper_in_thread(coro_fn=None):
     """
-    Run the full 2-year scrape in a fresh ProactorEventLoop.
+    Run a Playwright job (the in-process scrape worker by default) in a fresh ProactorEventLoop.
     Required on Windows: uvicorn uses SelectorEventLoop which does not
     support subprocess creation (needed by Playwright).
     """
@@ -540,63 +604,191 @@ def _run_scraper_in_thread():
         loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
-        loop.run_until_complete(_scrape_all_batches())
+        return loop.run_until_complete((coro_fn or _run_scrape_worker)())
     finally:
         loop.close()
 
 
+_scrape_stop = threading.Event()
+
+
+async def _run_scrape_worker():
+    from scrape_worker import run_worker
+    await run_worker(worker_id=f"api:{socket.gethostname()}:{os.getpid()}", stop=_scrape_stop.is_set)
+
+
 async def _scrape_task():
-    """Background task: runs a full 2-year scrape continuously — as soon as one cycle
-    finishes, the next begins immediately so all dates are always kept fresh."""
-    _log("Background scrape task started")
-    while True:
-        _log("Scrape cycle starting...")
+    """Background task: runs a scrape worker inside the API process (SCRAPE_IN_API_PROCESS).
+    Normally scraping runs in separate scrape_worker.py processes instead; this worker
+    claims work from the same lease table, so it can run alongside them."""
+    _log("Background scrape worker started")
+    while not _scrape_stop.is_set():
         try:
             loop = asyncio.get_event_loop()
             await loop.run_in_executor(None, _run_scraper_in_thread)
-            _log("Scrape cycle completed — restarting immediately")
         except Exception as e:
             import traceback
-            _log(f"Scrape cycle FAILED: {traceback.format_exc()}")
+            _log(f"Scrape worker FAILED: {traceback.format_exc()}")
             # Brief pause on failure to avoid hammering the site on repeated errors
             await asyncio.sleep(60)
 
 
+class _BackgroundServices:
+    """The scheduler and (with SCRAPE_IN_API_PROCESS) the in-process scrape worker.
+    Started and stopped as a unit when this process gains or loses leadership."""
+
+    def __init__(self):
+        self.scheduler = None
+        self.scrape_task = None
+
+    @property
+    def running(self) -> bool:
+        return self.scheduler is not None
+
+    def start(self):
+        from .scheduler import create_scheduler
+        from .utils.metrics import background_leader
+        self.scheduler = create_scheduler()
+        self.scheduler.start()
+        _log("Background scheduler started")
+        if settings.SCRAPE_IN_API_PROCESS:
+            _scrape_stop.clear()
+            self.scrape_task = asyncio.create_task(_scrape_task())
+            _log("Scrape task created")
+        else:
+            _log("Scraping runs in scrape_worker.py (SCRAPE_IN_API_PROCESS is off)")
+        background_leader.set(1)
+
+    async def stop(self):
+        from .utils.metrics import background_leader
+        if self.scrape_task is not None:
+            # The worker thread stops after its current item; don't wait for it
+            _scrape_stop.set()
+            self.scrape_task.cancel()
+            try:
+                await self.scrape_task
+            except asyncio.CancelledError:
+                pass
+            self.scrape_task = None
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+            _log("Scheduler stopped")
+        background_leader.set(0)
+
+
+async def _leader_task(services: _BackgroundServices):
+    """Run ``services`` only while this process holds the background lease
+    (BACKGROUND_SERVICES=auto). Standbys keep retrying, so one of them takes
+    over within LEADER_LEASE_SECONDS of the leader dying.
+
+    The services run only until a local deadline: the start of the last
+    successful renewal plus the lease TTL, less a margin. A renewal that
+    hangs (a lock wait or a dead connection) is abandoned at that deadline
+    and the services are stopped, before any standby can see the lease as
+    expired."""
+    from .services import leader
+    owner = leader.process_id()
+    loop = asyncio.get_running_loop()
+    margin = min(settings.LEADER_RENEW_SECONDS, settings.LEADER_LEASE_SECONDS / 2)
+    deadline = None
+
+    def renew() -> bool:
+        with SessionLocal() as db:
+            return leader.acquire(db, leader.BACKGROUND, owner)
+
+    try:
+        while True:
+            started = loop.time()
+            if services.running and deadline is not None:
+                timeout = deadline - started
+            else:
+                timeout = settings.LEADER_LEASE_SECONDS - margin
+            try:
+                held = await asyncio.wait_for(loop.run_in_executor(None, renew), max(timeout, 0))
+                if held:
+                    # The lease runs LEADER_LEASE_SECONDS from some time after ``started``
+                    deadline = started + settings.LEADER_LEASE_SECONDS - margin
+                    held = loop.time() < deadline
+            except asyncio.TimeoutError:
+                logger.error(f"Leader lease renewal did not finish within {timeout:.1f}s")
+                held = False
+            except Exception as exc:
+                # Can't prove we still hold the lease, so behave as if we lost it
+                logger.error(f"Leader lease renewal failed: {exc}")
+                held = False
+            if held and not services.running:
+                _log(f"Acquired background lease as {owner}")
+                services.start()
+            elif not held and services.running:
+                _log(f"Lost background lease; stopping background services on {owner}")
+                await services.stop()
+            await asyncio.sleep(settings.LEADER_RENEW_SECONDS)
+    finally:
+        if services.running:
+            await services.stop()
+            try:
+                with SessionLocal() as db:
+                    leader.release(db, leader.BACKGROUND, owner)
+                _log(f"Released background lease held by {owner}")
+            except Exception as exc:
+                logger.error(f"Could not release background lease: {exc}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    _log("Lifespan startup - seeding database and launching scrape task")
+    _log("Lifespan startup - seeding database")
     migrate_booking_status_enum()
+    migrate_product_scrape_columns()
     try:
-        with SessionLocal() as db:
+        # Workers take turns here (see services/leader.py), so backfills run once
+        from .services import leader
+        with SessionLocal() as db, leader.held(db, leader.STARTUP, ttl=settings.STARTUP_LEASE_SECONDS):
             seed_initial_data(db)
+            migrate_product_availability(db)
             backfill_missing_payments(db)
             migrate_users_role_enum(db)
             seed_superuser(db)
             seed_authorizer_user(db)
             seed_demo_bookings(db)
             auto_flag_authorization_requests(db)
+            migrate_proof_documents(db)
+            migrate_rolling_deposit_aggregates(db)
+            migrate_booking_events(db)
+            migrate_capacity_index(db)
     except Exception as exc:
         logger.error(f"Startup seeding error (non-fatal): {exc}")
 
-    # Start background scheduler (chase, overdue, slot alerts, etc.)
-    from .scheduler import create_scheduler
-    scheduler = create_scheduler()
-    scheduler.start()
-    _log("Background scheduler started")
+    # Background scheduler (chase, overdue, slot alerts, etc.) and the optional
+    # in-process scrape worker run in one process per deployment
+    services = _BackgroundServices()
+    leader_task = None
+    mode = settings.BACKGROUND_SERVICES.lower()
+    if mode == "off":
+        _log("Background services disabled in this process (BACKGROUND_SERVICES=off)")
+    elif mode == "always":
+        services.start()
+    else:
+        leader_task = asyncio.create_task(_leader_task(services))
 
-    task = asyncio.create_task(_scrape_task())
-    _log("Scrape task created")
+    if settings.OCR_WARMUP:
+        # Load the shared OCR engines off the event loop so startup isn't blocked
+        from .utils.ocr_engines import ocr_engines
+        asyncio.get_running_loop().run_in_executor(None, ocr_engines.warm_up)
+        _log("OCR warm-up started")
 
     yield
 
-    _log("Lifespan shutdown - cancelling scrape task and stopping scheduler")
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
-    scheduler.shutdown(wait=False)
-    _log("Scheduler stopped")
+    _log("Lifespan shutdown - stopping background services")
+    if leader_task is not None:
+        # Stops the services and releases the lease so a standby takes over at once
+        leader_task.cancel()
+        try:
+            await leader_task
+        except asyncio.CancelledError:
+            pass
+    else:
+        await services.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -610,6 +802,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (bookings / AR / slot lists run to several MB).
+# Brotli is used when brotli-asgi is installed — it falls back to gzip for
+# clients that don't send "br" in Accept-Encoding. Range/file responses are
+# exempt (see utils/compression.py): MarkUncompressed sits inside the
+# compressor and StripIdentityEncoding outside it.
+from .utils.compression import MarkUncompressed, StripIdentityEncoding
+app.add_middleware(MarkUncompressed)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=settings.COMPRESSION_BROTLI_QUALITY,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_fallback=True,
+    )
+except ImportError:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+    )
+app.add_middleware(StripIdentityEncoding)
+
+# Request latency and per-request DB work for /metrics. Added last so it is
+# the outermost middleware; nothing is installed when metrics are off.
+if settings.METRICS_ENABLED:
+    from .utils.metrics import MetricsMiddleware, instrument_engine
+    instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
@@ -622,6 +844,7 @@ app.include_router(finance.router, prefix="/api/finance", tags=["finance"])
 app.include_router(passport.router, prefix="/api/passport", tags=["passport"])
 app.include_router(voucher.router, prefix="/api/voucher", tags=["voucher"])
 app.include_router(authorization.router, prefix="/api/authorization", tags=["authorization"])
+app.include_router(metrics_routes.router, tags=["metrics"])
 
 
 @app.get("/")
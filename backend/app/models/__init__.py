@@ -4,17 +4,29 @@ from ..database import Base
 from .user import User
 from .site import Site, Product
 from .booking import Booking
+from .booking_event import BookingEvent
 from .payment import Payment
 from .activity_log import ActivityLog
 from .notification import Notification
 from .available_slots import AvailableSlot
 from .golden_monkey_slots import GoldenMonkeySlot
+from .product_availability import ProductAvailability
 from .scrape_status import ScrapeStatus
-from .authorization import AuthorizationRequest, Appeal
+from .scrape_retry import ScrapeRetry
+from .scrape_work import ScrapeWorkItem
+from .scrape_job import ScrapeJob
+from .scraper_control import ScraperControl, ScraperWorkerState
+from .slot_alert import SlotAlertRule, SlotAlertState
+from .capacity import CapacityIndex, CapacityContribution
+from .voucher_import import VoucherImport, VoucherImportFile
+from .service_lease import ServiceLease
+from .scrape_telemetry import ScrapeRun, ScrapeBatch, ScrapeDateTiming, ScrapeTelemetryDaily, ScrapePageLoad
+from .authorization import AuthorizationRequest, Appeal, ProofDocument
 from .chase import ChaseRecord, ChaseStatus
 from .amendment import AmendmentRequest, AmendmentFeeType, AmendmentStatus
 from .cancellation import CancellationRequest, CancellationStatus
 from .agent_client import (
     AgentClient, AgentClientType, PaymentTermsAnchor,
-    RollingDepositTransaction, RollingDepositTransactionType, PaymentDueAudit
+    RollingDepositTransaction, RollingDepositTransactionType, PaymentDueAudit,
+    RollingDepositTotals, RollingDepositBookingState,
 )
\ No newline at end of file
@@ -58,7 +58,7 @@ class RollingDepositTransaction(Base):
     __tablename__ = "rolling_deposit_transactions"
 
     id             = Column(Integer, primary_key=True, index=True)
-    agent_client_id = Column(Integer, ForeignKey("agent_clients.id"), nullable=False)
+    agent_client_id = Column(Integer, ForeignKey("agent_clients.id"), nullable=False, index=True)
     booking_id     = Column(Integer, ForeignKey("bookings.id"), nullable=True)
     type           = Column(SQLEnum(RollingDepositTransactionType, values_callable=lambda x: [e.value for e in x]), nullable=False)
     amount         = Column(Float, nullable=False)   # always positive
@@ -72,6 +72,40 @@ class RollingDepositTransaction(Base):
     creator      = relationship("User", foreign_keys=[created_by])
 
 
+class RollingDepositTotals(Base):
+    """Per-agent ledger totals, maintained by services/rolling_deposit.py.
+
+    Derived from rolling_deposit_transactions; rebuild_rolling_deposit_aggregates()
+    recomputes them from the ledger.
+    """
+    __tablename__ = "rolling_deposit_totals"
+
+    agent_client_id = Column(Integer, ForeignKey("agent_clients.id"), primary_key=True)
+    topped_up       = Column(Float, default=0.0, nullable=False)
+    applied         = Column(Float, default=0.0, nullable=False)
+    returned        = Column(Float, default=0.0, nullable=False)
+    adjusted        = Column(Float, default=0.0, nullable=False)   # signed net of adjustments
+    pending_return  = Column(Float, default=0.0, nullable=False)   # applied - returned over applied bookings
+    transactions    = Column(Integer, default=0, nullable=False)
+    last_transaction_at = Column(DateTime, nullable=True)
+    updated_at      = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RollingDepositBookingState(Base):
+    """How much rolling deposit one booking has drawn and had returned."""
+    __tablename__ = "rolling_deposit_booking_states"
+
+    booking_id      = Column(Integer, ForeignKey("bookings.id"), primary_key=True)
+    agent_client_id = Column(Integer, ForeignKey("agent_clients.id"), nullable=False, index=True)
+    applied         = Column(Float, default=0.0, nullable=False)
+    returned        = Column(Float, default=0.0, nullable=False)
+    outstanding     = Column(Float, default=0.0, nullable=False)   # applied - returned
+    first_applied_at = Column(DateTime, nullable=True)
+    updated_at      = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    booking = relationship("Booking")
+
+
 class PaymentDueAudit(Base):
     __tablename__ = "payment_due_audits"
 
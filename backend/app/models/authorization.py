@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from . import Base
 from datetime import datetime
@@ -10,7 +10,7 @@ class AuthorizationRequest(Base):
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"))
     reason = Column(Text)
-    proof_documents = Column(String)      # comma-separated filenames / URLs
+    proof_documents = Column(String)      # legacy comma-separated filenames; see ProofDocument
     deadline = Column(DateTime)
     status = Column(String, default="pending")   # pending | authorized | declined
     requested_by = Column(Integer, ForeignKey("users.id"))
@@ -23,6 +23,36 @@ class AuthorizationRequest(Base):
     requester = relationship("User", foreign_keys=[requested_by])
     authorizer_user = relationship("User", foreign_keys=[authorizer_id])
     appeal = relationship("Appeal", back_populates="authorization_request", uselist=False)
+    documents = relationship(
+        "ProofDocument", back_populates="authorization_request",
+        order_by="ProofDocument.id", cascade="all, delete-orphan",
+    )
+
+
+class ProofDocument(Base):
+    """A proof document attached to an authorization request.
+
+    ``filename`` is the upload-store name under proof_documents/ (the content
+    hash plus extension for uploads, or a legacy timestamped name / URL).
+    """
+    __tablename__ = "proof_documents"
+    __table_args__ = (
+        UniqueConstraint("authorization_request_id", "filename", name="uq_proof_document_request_file"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    authorization_request_id = Column(Integer, ForeignKey("authorization_requests.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False, index=True)
+    original_filename = Column(String)
+    content_type = Column(String)
+    size = Column(Integer)
+    sha256 = Column(String(64))
+    preview_filename = Column(String)     # under proof_documents/previews/
+    preview_status = Column(String, default="pending")   # pending | ready | unsupported | failed
+    uploaded_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    authorization_request = relationship("AuthorizationRequest", back_populates="documents")
 
 
 class Appeal(Base):
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, String, Text
+from sqlalchemy.orm import relationship
+from . import Base
+from datetime import datetime
+
+
+class BookingEvent(Base):
+    """One entry in a booking's append-only history (see services/booking_events.py)."""
+    __tablename__ = "booking_events"
+    __table_args__ = (
+        # Timeline reads are a single range scan on (booking_id, created_at)
+        Index("ix_booking_events_booking_created", "booking_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=False)
+    event_type = Column(String, nullable=False, index=True)
+    from_status = Column(String, nullable=True)   # BookingStatus values; null when the status didn't move
+    to_status = Column(String, nullable=True)
+    detail = Column(Text, nullable=True)
+    actor_id = Column(Integer, ForeignKey("users.id"), nullable=True)   # null for scheduler / system
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    booking = relationship("Booking")
+    actor = relationship("User")
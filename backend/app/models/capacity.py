@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, String
+from . import Base
+from datetime import datetime
+
+
+class CapacityIndex(Base):
+    """Our own permit demand for one product on one date, maintained by
+    services/capacity_index.py from capacity_contributions."""
+    __tablename__ = "capacity_index"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    committed = Column(Integer, nullable=False, default=0)  # people on bookings whose permits are bought
+    pending = Column(Integer, nullable=False, default=0)  # people on open bookings still to be bought
+    bookings = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CapacityContribution(Base):
+    """What one booking currently counts for in capacity_index, so a change
+    can take the old amount off before adding the new one."""
+    __tablename__ = "capacity_contributions"
+
+    booking_id = Column(Integer, ForeignKey("bookings.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    people = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # committed, pending
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from . import Base
+from datetime import datetime
+
+class ProductAvailability(Base):
+    """Scraped permit availability for one catalogue product on one date."""
+    __tablename__ = "product_availability"
+    __table_args__ = (UniqueConstraint("product_id", "date", name="uq_product_availability_product_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    date = Column(String, nullable=False)  # Date in format "dd/mm/yyyy"
+    slots = Column(String)  # Number of slots or "Sold Out"
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,33 @@
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, String
+from . import Base
+from datetime import datetime
+
+
+class ScrapeJob(Base):
+    """An on-demand scrape of chosen products over a date range, queued through
+    the API and run by a scrape worker ahead of the background sweep
+    (see services/scrape_jobs.py)."""
+    __tablename__ = "scrape_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    products = Column(String, nullable=False)  # comma-separated catalogue keys
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    dates = Column(String, nullable=True)  # comma-separated ISO dates when only some dates in the range are wanted
+    status = Column(String, nullable=False, default="queued", index=True)  # queued/running/completed/failed/cancelled
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    total_checks = Column(Integer, default=0, nullable=False)  # dates x products
+    done_checks = Column(Integer, default=0, nullable=False)
+    skipped_checks = Column(Integer, default=0, nullable=False)  # already refreshed by the sweep since submission
+    resolved_checks = Column(Integer, default=0, nullable=False)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    error = Column(String, nullable=True)
+
+    lease_owner = Column(String, nullable=True)  # worker id running the job
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
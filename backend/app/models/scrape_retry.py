@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, DateTime, String, UniqueConstraint
+from . import Base
+from datetime import datetime
+
+class ScrapeRetry(Base):
+    """A (product, date) the scrapers failed to resolve, waiting to be re-checked."""
+    __tablename__ = "scrape_retry_queue"
+    __table_args__ = (UniqueConstraint("product", "date", name="uq_scrape_retry_product_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    product = Column(String, nullable=False, index=True)  # 'gorilla' or 'golden_monkey'
+    date = Column(String, nullable=False)  # Date in format "dd/mm/yyyy"
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    source = Column(String, nullable=True)  # scraper that last failed it
+    first_failed_at = Column(DateTime, default=datetime.utcnow)
+    last_attempt_at = Column(DateTime, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,87 @@
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, UniqueConstraint
+from . import Base
+from datetime import datetime
+
+class ScrapeRun(Base):
+    """One scrape cycle: a worker's pass over the horizon, or a one-off engine call."""
+    __tablename__ = "scrape_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    engine = Column(String, nullable=False)  # e.g. 'scrape_worker', 'async_product_scraper'
+    worker_id = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="running")  # running, completed, failed, stopped
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_s = Column(Float, nullable=True)
+    batches = Column(Integer, default=0, nullable=False)
+    dates_checked = Column(Integer, default=0, nullable=False)
+    dates_resolved = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+
+class ScrapeBatch(Base):
+    """One engine call within a run: a set of products over one date range."""
+    __tablename__ = "scrape_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("scrape_runs.id", ondelete="CASCADE"), nullable=True, index=True)
+    engine = Column(String, nullable=False)
+    products = Column(String, nullable=False)  # comma-separated product keys
+    start_offset = Column(Integer, nullable=False, default=0)
+    days = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_s = Column(Float, nullable=True)
+    dates_checked = Column(Integer, default=0, nullable=False)  # (product, date) checks
+    dates_resolved = Column(Integer, default=0, nullable=False)
+    retries = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+
+class ScrapeDateTiming(Base):
+    """How one (product, date) check went within a batch. Kept for
+    SCRAPE_TELEMETRY_DETAIL_DAYS, then rolled up into scrape_telemetry_daily."""
+    __tablename__ = "scrape_date_timings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(Integer, ForeignKey("scrape_batches.id", ondelete="CASCADE"), nullable=True, index=True)
+    engine = Column(String, nullable=False)
+    product = Column(String, nullable=False)
+    date = Column(String, nullable=False)  # trek date, "dd/mm/yyyy"
+    latency_ms = Column(Float, nullable=True)  # summed over attempts
+    attempts = Column(Integer, default=1, nullable=False)
+    outcome = Column(String, nullable=False)  # ok, sold_out, empty, timeout, error
+    checked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ScrapeTelemetryDaily(Base):
+    """Per-day, per-product, per-engine rollup of scrape_date_timings."""
+    __tablename__ = "scrape_telemetry_daily"
+    __table_args__ = (UniqueConstraint("day", "engine", "product", name="uq_scrape_telemetry_daily"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(String, nullable=False, index=True)  # "yyyy-mm-dd" (UTC) the checks ran on
+    engine = Column(String, nullable=False)
+    product = Column(String, nullable=False)
+    checks = Column(Integer, default=0, nullable=False)
+    resolved = Column(Integer, default=0, nullable=False)
+    timeouts = Column(Integer, default=0, nullable=False)
+    errors = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    avg_latency_ms = Column(Float, nullable=True)
+    p95_latency_ms = Column(Float, nullable=True)
+    max_latency_ms = Column(Float, nullable=True)
+
+class ScrapePageLoad(Base):
+    """One browser tab's page load within a batch: load time and what its requests cost.
+    Kept for SCRAPE_TELEMETRY_DETAIL_DAYS, like the date timings."""
+    __tablename__ = "scrape_page_loads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(Integer, ForeignKey("scrape_batches.id", ondelete="CASCADE"), nullable=True, index=True)
+    engine = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # tab, retry
+    load_ms = Column(Float, nullable=True)
+    requests = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)  # aborted by the lean page policy
+    cache_hits = Column(Integer, default=0, nullable=False)
+    network_bytes = Column(Integer, default=0, nullable=False)
+    cache_bytes = Column(Integer, default=0, nullable=False)  # served from the shared asset cache instead
+    loaded_at = Column(DateTime, default=datetime.utcnow, index=True)
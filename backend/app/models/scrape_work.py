@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, DateTime, String, UniqueConstraint
+from . import Base
+from datetime import datetime
+
+class ScrapeWorkItem(Base):
+    """A unit of scraping work (one product's date range, or the retry-queue drain)
+    that scrape workers claim with a renewable lease."""
+    __tablename__ = "scrape_work_items"
+    __table_args__ = (UniqueConstraint("kind", "product", "start_offset", name="uq_scrape_work_item"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, default="batch")  # 'batch' or 'retry_drain'
+    product = Column(String, nullable=True)  # 'gorilla' / 'golden_monkey'; '*' for retry_drain
+    start_offset = Column(Integer, nullable=False, default=0)  # days from today
+    days = Column(Integer, nullable=False, default=0)
+
+    lease_owner = Column(String, nullable=True)  # worker id holding the lease
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    last_started_at = Column(DateTime, nullable=True)
+    last_completed_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(String, nullable=True)
+    runs = Column(Integer, default=0, nullable=False)
+    failures = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
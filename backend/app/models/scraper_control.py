@@ -0,0 +1,27 @@
+from sqlalchemy import JSON, Column, DateTime, Float, Integer, String
+from . import Base
+from datetime import datetime
+
+
+class ScraperControl(Base):
+    """Knobs for one adaptive controller (utils/adaptive_concurrency.py), shared
+    by every scrape worker. Workers re-apply them whenever ``version`` moves."""
+    __tablename__ = "scraper_control"
+
+    name = Column(String, primary_key=True)  # controller name, e.g. 'permit_site'
+    knobs = Column(JSON, nullable=False)  # AdaptiveController.TUNABLE values
+    pinned_limit = Column(Float, nullable=True)  # site-wide limit set by an admin, split across workers
+    pinned_delay = Column(Float, nullable=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ScraperWorkerState(Base):
+    """Each scrape worker's latest controller snapshot, refreshed on every sync.
+    The live rows decide how the concurrency budget is split."""
+    __tablename__ = "scraper_worker_states"
+
+    worker_id = Column(String, primary_key=True)
+    controller = Column(String, nullable=False)
+    snapshot = Column(JSON, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, String
+from . import Base
+
+
+class ServiceLease(Base):
+    """A named lease that at most one process holds at a time, e.g. the right
+    to run the scheduler and in-process scrape worker (see services/leader.py)."""
+    __tablename__ = "service_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=True)  # host:pid of the holder
+    expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    acquired_at = Column(DateTime, nullable=True)  # when the current holder took over
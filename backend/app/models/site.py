@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Boolean
 from sqlalchemy.orm import relationship
 from . import Base
 
@@ -16,4 +16,8 @@ class Product(Base):
     name = Column(String)
     unit_cost = Column(Numeric(10, 2), nullable=False)
     site_id = Column(Integer, ForeignKey("sites.id"))
-    site = relationship("Site", back_populates="products")
\ No newline at end of file
+    site = relationship("Site", back_populates="products")
+    # Availability scraping (async_product_scraper.py)
+    scrape_enabled = Column(Boolean, default=False, nullable=False)
+    permit_site_label = Column(String, nullable=True)  # site dropdown label on the permit site; defaults to site.name
+    permit_product_label = Column(String, nullable=True)  # product dropdown label; defaults to name
\ No newline at end of file
@@ -0,0 +1,33 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, UniqueConstraint
+from . import Base
+from datetime import datetime
+
+
+class SlotAlertRule(Base):
+    """An admin's low-availability rule for one catalogue product. Unset columns
+    fall back to SLOT_ALERT_THRESHOLDS / SLOT_ALERT_HYSTERESIS / SLOT_ALERT_COOLDOWN_HOURS."""
+    __tablename__ = "slot_alert_rules"
+
+    product = Column(String, primary_key=True)  # catalogue key, e.g. 'gorilla'
+    threshold = Column(Integer, nullable=True)  # alert when headroom drops below this
+    clear_at = Column(Integer, nullable=True)  # re-arm once headroom is back up to this
+    cooldown_hours = Column(Float, nullable=True)  # least time between two alerts for one date
+    count_bookings = Column(Boolean, nullable=True)  # subtract people on bookings still awaiting permits
+    enabled = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SlotAlertState(Base):
+    """Where one product/date stands against its rule: ``low`` once it has crossed
+    below the threshold, until it recovers to clear_at."""
+    __tablename__ = "slot_alert_states"
+    __table_args__ = (UniqueConstraint("product", "date", name="uq_slot_alert_state_product_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    product = Column(String, nullable=False, index=True)
+    date = Column(String, nullable=False)  # Date in format "dd/mm/yyyy"
+    low = Column(Boolean, nullable=False, default=False)
+    slots = Column(String)  # last value seen, as stored
+    headroom = Column(Integer)  # slots less the people held by pending bookings
+    fired_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
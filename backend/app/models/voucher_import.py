@@ -0,0 +1,39 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from . import Base
+from datetime import datetime
+
+
+class VoucherImport(Base):
+    """A batch of vouchers (a zip or several files) turned into bookings in the
+    background by services/voucher_imports.py."""
+    __tablename__ = "voucher_imports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued/running/completed/failed
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    total_files = Column(Integer, default=0, nullable=False)  # files queued for extraction
+    extracted_files = Column(Integer, default=0, nullable=False)  # extractions finished, whatever the outcome
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class VoucherImportFile(Base):
+    """One file of a voucher import and what became of it."""
+    __tablename__ = "voucher_import_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    import_id = Column(Integer, ForeignKey("voucher_imports.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False)  # as uploaded, or the path inside the zip
+    storage_key = Column(String, nullable=True)  # upload store key; None when the file was rejected
+    sha256 = Column(String, nullable=True)
+    # queued, extracted, created, updated, duplicate, incomplete, rejected, error
+    status = Column(String, nullable=False, default="queued")
+    booking_reference = Column(String, nullable=True, index=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=True)
+    duplicate_of = Column(Integer, nullable=True)  # voucher_import_files.id whose copy was used
+    missing_fields = Column(String, nullable=True)  # comma-separated
+    data = Column(Text, nullable=True)  # extracted voucher fields, JSON
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -8,6 +8,8 @@ from ..models.booking import Booking, BookingStatus
 from ..models.amendment import AmendmentRequest, AmendmentFeeType, AmendmentStatus
 from ..utils.auth import get_current_user
 from .notifications import create_simple_notification
+from ..services.booking_events import transition_booking
+from ..services.capacity_index import check_capacity, enforce_capacity, sync_booking
 
 router = APIRouter()
 
@@ -52,6 +54,15 @@ async def request_amendment(
     if not booking.date:
         raise HTTPException(status_code=400, detail="Booking has no trek date set")
 
+    # The new date's permits come out of what is left after our other pending bookings
+    capacity_warning = None
+    if booking.product_rel:
+        capacity = check_capacity(db, booking.product_rel, body.requested_date, booking.people or 0, booking.id)
+        try:
+            capacity_warning = enforce_capacity(capacity, booking.product_rel.name)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
     fee_type, fee_amount = _calc_fee(booking, body.requested_date)
 
     amendment = AmendmentRequest(
@@ -64,7 +75,9 @@ async def request_amendment(
         requested_by=current_user.id,
     )
     db.add(amendment)
-    booking.booking_status = BookingStatus.AMENDMENT_REQUESTED
+    reason = f" ({body.reason})" if body.reason else ""
+    transition_booking(db, booking, BookingStatus.AMENDMENT_REQUESTED, "amendment",
+                       f"{booking.date} → {body.requested_date}{reason}", current_user.id)
     db.flush()
 
     from ..services.email_service import email_amendment_requested
@@ -97,6 +110,7 @@ async def request_amendment(
         "fee_type": fee_type.value,
         "fee_amount": fee_amount,
         "message": f"Amendment requested. Fee of ${fee_amount:.2f} must be paid before admin can confirm.",
+        "capacity_warning": capacity_warning,
     }
 
 
@@ -147,9 +161,11 @@ async def confirm_amendment(
     amendment.confirmed_by = current_user.id
 
     booking = amendment.booking
+    transition_booking(db, booking, BookingStatus.CONFIRMED, "amendment_confirmed",
+                       f"{booking.date} → {amendment.requested_date}", current_user.id)
     booking.date = amendment.requested_date
     booking.trekking_date = amendment.requested_date
-    booking.booking_status = BookingStatus.CONFIRMED
+    sync_booking(db, booking)
 
     create_simple_notification(
         db, booking.user_id, "Amendment Confirmed",
@@ -174,7 +190,8 @@ async def reject_amendment(
 
     amendment.status = AmendmentStatus.REJECTED
     amendment.confirmed_by = current_user.id
-    amendment.booking.booking_status = BookingStatus.CONFIRMED  # Revert to confirmed
+    transition_booking(db, amendment.booking, BookingStatus.CONFIRMED, "amendment_rejected",  # Revert to confirmed
+                       f"By {current_user.username}", current_user.id)
 
     create_simple_notification(
         db, amendment.booking.user_id, "Amendment Rejected",
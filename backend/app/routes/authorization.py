@@ -1,21 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Request, BackgroundTasks
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional, List
+import mimetypes
 import os
-import shutil
 
 from ..database import get_db
 from ..models.user import User, UserRole
 from ..models.booking import Booking, BookingStatus
-from ..models.authorization import AuthorizationRequest, Appeal
+from ..models.authorization import AuthorizationRequest, Appeal, ProofDocument
 from ..utils.auth import get_current_user
+from ..utils.file_responses import ranged_file_response
+from ..services.upload_store import get_upload_store, UploadTooLarge, StoredFile
+from ..services.document_previews import generate_preview, file_sha256
 from .notifications import create_simple_notification
-
-_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_DIR = os.path.join(_BASE_DIR, "uploads", "proof_documents")
+from ..services.booking_events import record_event, transition_booking
 
 router = APIRouter()
 
@@ -48,6 +50,34 @@ class AppealReview(BaseModel):
 # Helpers
 # ---------------------------------------------------------------------------
 
+def _document_to_dict(doc: ProofDocument) -> dict:
+    return {
+        "id": doc.id,
+        "filename": doc.filename,
+        "original_filename": doc.original_filename or doc.filename,
+        "content_type": doc.content_type,
+        "size": doc.size,
+        "preview_status": doc.preview_status,
+        "url": f"/api/authorization/documents/{doc.filename}",
+        "preview_url": f"/api/authorization/documents/{doc.filename}/preview",
+        "created_at": doc.created_at,
+    }
+
+
+def _add_documents(req: AuthorizationRequest, names: List[str]) -> List[ProofDocument]:
+    """Attach legacy/free-text document names (no upload metadata) to a request."""
+    known = {d.filename for d in req.documents}
+    added = []
+    for name in names:
+        name = name.strip()
+        if name and name not in known:
+            doc = ProofDocument(filename=name, original_filename=name)
+            req.documents.append(doc)
+            known.add(name)
+            added.append(doc)
+    return added
+
+
 def _auth_request_to_dict(req: AuthorizationRequest) -> dict:
     appeal = None
     if req.appeal:
@@ -63,7 +93,9 @@ def _auth_request_to_dict(req: AuthorizationRequest) -> dict:
         "booking_id": req.booking_id,
         "booking_name": req.booking.booking_name if req.booking else None,
         "reason": req.reason,
-        "proof_documents": req.proof_documents,
+        # Comma-separated form kept for older clients; "documents" is the source of truth
+        "proof_documents": ",".join(d.filename for d in req.documents) or None,
+        "documents": [_document_to_dict(d) for d in req.documents],
         "deadline": req.deadline,
         "status": req.status,
         "auto_flagged": req.auto_flagged,
@@ -101,13 +133,18 @@ def create_auth_request_for_booking(
     req = AuthorizationRequest(
         booking_id=booking.id,
         reason=reason,
-        proof_documents=proof_documents,
         deadline=datetime.utcnow() + timedelta(days=deadline_days),
         status="pending",
         requested_by=requested_by_id,
         auto_flagged=auto_flagged,
     )
     db.add(req)
+    if proof_documents:
+        _add_documents(req, proof_documents.split(","))
+    requester = db.get(User, requested_by_id) if requested_by_id else None
+    reason_short = (reason[:80] + "…") if reason and len(reason) > 80 else (reason or "—")
+    record_event(db, booking, "auth_requested",
+                 f"By {requester.username if requester else 'Unknown'}: {reason_short}", requested_by_id)
     db.flush()
 
     from ..services.email_service import email_authorization_requested
@@ -159,9 +196,26 @@ async def request_authorization(
     return _auth_request_to_dict(req)
 
 
+async def _store_upload(file: UploadFile, namespace: str) -> StoredFile:
+    """Stream a document into the upload store."""
+    try:
+        return await get_upload_store().save(file, namespace)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+
+
+def _merge_documents(existing: str, new_names: List[str]) -> List[str]:
+    docs = [d for d in existing.split(",") if d]
+    for name in new_names:
+        if name not in docs:
+            docs.append(name)
+    return docs
+
+
 @router.post("/{request_id}/upload-proof")
 async def upload_proof_documents(
     request_id: int,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -180,46 +234,129 @@ async def upload_proof_documents(
     allowed_types = {"application/pdf", "image/jpeg", "image/png", "image/tiff",
                      "message/rfc822", "application/octet-stream"}
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    saved = []
     for file in files:
         if file.content_type not in allowed_types:
             raise HTTPException(
                 status_code=400,
                 detail=f"Unsupported file type: {file.content_type}. Allowed: PDF, JPEG, PNG, TIFF, EML"
             )
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        safe_name = "".join(c for c in file.filename if c.isalnum() or c in ("-", "_", "."))
-        dest = os.path.join(UPLOAD_DIR, f"{request_id}_{timestamp}_{safe_name}")
-        with open(dest, "wb") as buf:
-            shutil.copyfileobj(file.file, buf)
-        saved.append(os.path.basename(dest))
-
-    # Append filenames to existing proof_documents (comma-separated)
-    existing = req.proof_documents or ""
-    all_docs = [d for d in existing.split(",") if d] + saved
-    req.proof_documents = ",".join(all_docs)
+
+    saved = []
+    new_docs = []
+    known = {d.filename for d in req.documents}
+    for file in files:
+        stored = await _store_upload(file, "proof_documents")
+        saved.append(stored.filename)
+        # Identical files hash to the same name, so re-uploads aren't listed twice
+        if stored.filename in known:
+            continue
+        known.add(stored.filename)
+        doc = ProofDocument(
+            filename=stored.filename,
+            original_filename=file.filename,
+            content_type=file.content_type,
+            size=stored.size,
+            sha256=stored.sha256,
+            uploaded_by=current_user.id,
+        )
+        # Same bytes uploaded to another request: reuse its preview
+        twin = (
+            db.query(ProofDocument)
+            .filter(ProofDocument.filename == stored.filename, ProofDocument.preview_status != "pending")
+            .first()
+        )
+        if twin:
+            doc.preview_filename = twin.preview_filename
+            doc.preview_status = twin.preview_status
+        req.documents.append(doc)
+        new_docs.append(doc)
     db.commit()
-    return {"uploaded": saved, "proof_documents": req.proof_documents}
+
+    for doc in new_docs:
+        if doc.preview_status == "pending":
+            background_tasks.add_task(generate_preview, doc.id)
+
+    return {
+        "uploaded": saved,
+        "proof_documents": ",".join(d.filename for d in req.documents),
+        "documents": [_document_to_dict(d) for d in req.documents],
+    }
+
+
+async def _find_document(db: Session, filename: str):
+    """Return (ProofDocument, local path) for a stored proof document, or 404."""
+    # Prevent path traversal
+    safe_name = os.path.basename(filename)
+    doc = db.query(ProofDocument).filter(ProofDocument.filename == safe_name).first() if safe_name else None
+    store = get_upload_store()
+    if not doc or not await store.backend.exists(f"proof_documents/{safe_name}"):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc, await store.local_path(f"proof_documents/{safe_name}")
 
 
 @router.get("/documents/{filename}")
 async def serve_proof_document(
     filename: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Serve a proof document file. Accessible to authorizers, admins, and superusers."""
+    """Serve a proof document file with Range/ETag support. Accessible to authorizers, admins, and superusers."""
     allowed = [UserRole.AUTHORIZER, UserRole.ADMIN, UserRole.SUPERUSER, UserRole.FINANCE_ADMIN]
     if current_user.role not in allowed:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # Prevent path traversal
-    safe_name = os.path.basename(filename)
-    file_path = os.path.join(UPLOAD_DIR, safe_name)
-    if not os.path.isfile(file_path):
-        raise HTTPException(status_code=404, detail="Document not found")
-    return FileResponse(file_path, filename=safe_name)
+    doc, file_path = await _find_document(db, filename)
+    if not doc.sha256 or doc.size is None:
+        # Rows migrated from the old comma-separated column have no hash yet
+        doc.sha256 = await run_in_threadpool(file_sha256, file_path)
+        doc.size = os.path.getsize(file_path)
+        db.commit()
+
+    media_type = doc.content_type or mimetypes.guess_type(doc.filename)[0] or "application/octet-stream"
+    return ranged_file_response(
+        request, file_path,
+        etag=f'"{doc.sha256}"',
+        media_type=media_type,
+        filename=doc.original_filename or doc.filename,
+    )
+
+
+@router.get("/documents/{filename}/preview")
+async def serve_proof_document_preview(
+    filename: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """First-page JPEG thumbnail of a proof document.
+
+    Returns 202 while the preview is still being rendered in the background.
+    """
+    allowed = [UserRole.AUTHORIZER, UserRole.ADMIN, UserRole.SUPERUSER, UserRole.FINANCE_ADMIN]
+    if current_user.role not in allowed:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    doc, _ = await _find_document(db, filename)
+    if doc.preview_status == "unsupported":
+        raise HTTPException(status_code=404, detail="No preview available for this document type")
+    if doc.preview_status == "failed":
+        raise HTTPException(status_code=404, detail="Preview could not be rendered")
+
+    store = get_upload_store()
+    preview_key = f"proof_documents/previews/{doc.preview_filename}"
+    if doc.preview_status != "ready" or not doc.preview_filename or not await store.backend.exists(preview_key):
+        background_tasks.add_task(generate_preview, doc.id)
+        return JSONResponse(status_code=202, content={"status": "pending"}, headers={"Retry-After": "2"})
+
+    preview_path = await store.local_path(preview_key)
+    return ranged_file_response(
+        request, preview_path,
+        etag=f'"{os.path.splitext(doc.preview_filename)[0]}"',
+        media_type="image/jpeg",
+        max_age=86400,
+    )
 
 
 class FlagAuthBody(BaseModel):
@@ -270,7 +407,12 @@ async def list_authorization_requests(
     if current_user.role not in allowed:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    requests = db.query(AuthorizationRequest).order_by(AuthorizationRequest.created_at.desc()).all()
+    requests = (
+        db.query(AuthorizationRequest)
+        .options(selectinload(AuthorizationRequest.documents))
+        .order_by(AuthorizationRequest.created_at.desc())
+        .all()
+    )
     return [_auth_request_to_dict(r) for r in requests]
 
 
@@ -286,6 +428,7 @@ async def get_booking_auth_requests(
 
     requests = (
         db.query(AuthorizationRequest)
+        .options(selectinload(AuthorizationRequest.documents))
         .filter(AuthorizationRequest.booking_id == booking_id)
         .order_by(AuthorizationRequest.created_at.desc())
         .all()
@@ -316,8 +459,12 @@ async def authorize_request(
     req.authorizer_notes = data.authorizer_notes
     # Move booking to AUTHORIZED so permits can be purchased
     booking = db.query(Booking).filter(Booking.id == req.booking_id).first()
+    notes = f": {data.authorizer_notes}" if data.authorizer_notes else ""
     if booking and booking.booking_status == BookingStatus.AWAITING_AUTHORIZATION:
-        booking.booking_status = BookingStatus.AUTHORIZED
+        transition_booking(db, booking, BookingStatus.AUTHORIZED, "auth_approved",
+                           f"By {current_user.username}{notes}", current_user.id)
+    elif booking:
+        record_event(db, booking, "auth_approved", f"By {current_user.username}{notes}", current_user.id)
     db.commit()
 
     booking_name = req.booking.booking_name
@@ -365,6 +512,8 @@ async def decline_request(
     req.status = "declined"
     req.authorizer_id = current_user.id
     req.authorizer_notes = data.authorizer_notes
+    notes = f": {data.authorizer_notes}" if data.authorizer_notes else ""
+    record_event(db, req.booking, "auth_declined", f"By {current_user.username}{notes}", current_user.id)
     db.commit()
 
     # Notify requester — they can now appeal
@@ -380,9 +529,6 @@ async def decline_request(
     return _auth_request_to_dict(req)
 
 
-APPEAL_UPLOAD_DIR = os.path.join(_BASE_DIR, "uploads", "appeal_documents")
-
-
 @router.post("/{request_id}/upload-appeal-proof")
 async def upload_appeal_proof(
     request_id: int,
@@ -403,7 +549,6 @@ async def upload_appeal_proof(
 
     allowed_types = {"application/pdf", "image/jpeg", "image/png", "image/tiff",
                      "message/rfc822", "application/octet-stream"}
-    os.makedirs(APPEAL_UPLOAD_DIR, exist_ok=True)
     saved = []
     for file in files:
         if file.content_type not in allowed_types:
@@ -411,15 +556,10 @@ async def upload_appeal_proof(
                 status_code=400,
                 detail=f"Unsupported file type: {file.content_type}. Allowed: PDF, JPEG, PNG, TIFF, EML"
             )
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        safe_name = "".join(c for c in file.filename if c.isalnum() or c in ("-", "_", "."))
-        dest = os.path.join(APPEAL_UPLOAD_DIR, f"appeal_{request_id}_{timestamp}_{safe_name}")
-        with open(dest, "wb") as buf:
-            shutil.copyfileobj(file.file, buf)
-        saved.append(os.path.basename(dest))
+        saved.append((await _store_upload(file, "appeal_documents")).filename)
 
     existing = req.appeal.appeal_documents or ""
-    all_docs = [d for d in existing.split(",") if d] + saved
+    all_docs = _merge_documents(existing, saved)
     req.appeal.appeal_documents = ",".join(all_docs)
     db.commit()
     return {"uploaded": saved, "appeal_documents": req.appeal.appeal_documents}
@@ -447,6 +587,9 @@ async def submit_appeal(
         status="pending",
     )
     db.add(appeal)
+    notes = data.appeal_notes
+    record_event(db, req.booking, "appeal", (notes[:80] + "…") if notes and len(notes) > 80 else (notes or "—"),
+                 current_user.id)
     db.commit()
 
     # Notify authorizers
@@ -502,6 +645,9 @@ async def review_appeal(
         auth_req.authorizer_id = None
         auth_req.authorizer_notes = data.reviewed_notes
 
+    notes = f": {data.reviewed_notes}" if data.reviewed_notes else ""
+    record_event(db, auth_req.booking, "appeal_reviewed",
+                 f"{data.decision.title()} by {current_user.username}{notes}", current_user.id)
     db.commit()
 
     # Notify requester
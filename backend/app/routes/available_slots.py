@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-from ..database import get_db
+from datetime import date, datetime, timedelta
+from ..database import SessionLocal, get_db
 from ..models.available_slots import AvailableSlot
 from ..models.golden_monkey_slots import GoldenMonkeySlot
+from ..models.product_availability import ProductAvailability
 from ..models.scrape_status import ScrapeStatus
+from ..models.user import UserRole
 from ..utils.auth import get_current_user
+from ..utils.fast_json import FastJSONResponse, dumps
+from ..utils.file_responses import etag_matches
 from async_panda_headless import scrape_slots
+import asyncio
 import logging
 
 # Configure logging
@@ -20,6 +26,36 @@ class SlotData(BaseModel):
     date: str
     slots: str
 
+class ScraperControlUpdate(BaseModel):
+    limit: Optional[int] = None
+    delay: Optional[float] = None
+    min_limit: Optional[int] = None
+    max_limit: Optional[int] = None
+    increase_step: Optional[float] = None
+    decrease_factor: Optional[float] = None
+    cooldown: Optional[float] = None
+    min_delay: Optional[float] = None
+    max_delay: Optional[float] = None
+    latency_tolerance: Optional[float] = None
+
+class ScrapeProductUpdate(BaseModel):
+    scrape_enabled: Optional[bool] = None
+    permit_site_label: Optional[str] = None
+    permit_product_label: Optional[str] = None
+
+class SlotAlertRuleUpdate(BaseModel):
+    threshold: Optional[int] = None
+    clear_at: Optional[int] = None
+    cooldown_hours: Optional[float] = None
+    count_bookings: Optional[bool] = None
+    enabled: Optional[bool] = None
+
+class ScrapeJobCreate(BaseModel):
+    products: Optional[List[str]] = None  # catalogue keys; default every enabled product
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None  # defaults to start_date
+    dates: Optional[List[date]] = None  # instead of a range, e.g. five specific dates
+
 def format_relative_time(updated_at):
     """Format the relative time in a human-readable format"""
     if not updated_at:
@@ -45,7 +81,7 @@ def format_relative_time(updated_at):
         days = seconds // 86400
         return f"{days} day{'s' if days != 1 else ''} ago"
 
-@router.get("")
+@router.get("", response_class=FastJSONResponse)
 async def get_available_slots(
     start_date: str = None,
     end_date: str = None,
@@ -56,9 +92,15 @@ async def get_available_slots(
     try:
         logger.info(f"Fetching slots for type: {slot_type} from {start_date} to {end_date}")
         
-        # Choose model based on slot type
-        Model = AvailableSlot if slot_type == "gorilla" else GoldenMonkeySlot
-        query = db.query(Model)
+        # Choose model based on slot type: any catalogue key reads product_availability;
+        # anything else that isn't "gorilla" ("golden-monkey", "monkey") means golden monkeys
+        from ..services.product_catalogue import LEGACY_SLOT_MODELS, get_target
+        target = None if slot_type in LEGACY_SLOT_MODELS else get_target(db, slot_type)
+        if target is not None:
+            query = db.query(ProductAvailability).filter(ProductAvailability.product_id == target.product_id)
+        else:
+            Model = AvailableSlot if slot_type == "gorilla" else GoldenMonkeySlot
+            query = db.query(Model)
         
         # Get tomorrow's date in DD/MM/YYYY format
         tomorrow = (datetime.now() + timedelta(days=1)).strftime("%d/%m/%Y")
@@ -118,11 +160,11 @@ async def get_available_slots(
         # Get the most recent update time from all slots
         most_recent_update = max((slot.updated_at for slot in filtered_slots), default=None)
         
-        return {
+        return FastJSONResponse({
             "slots": slot_list,
             "total": len(slot_list),
             "last_update": format_relative_time(most_recent_update)
-        }
+        })
         
     except HTTPException:
         raise
@@ -133,6 +175,73 @@ async def get_available_slots(
             detail=str(e)
         )
 
+CALENDAR_MAX_DAYS = 3 * 366
+
+@router.get("/calendar")
+async def get_availability_calendar(
+    request: Request,
+    products: str = "gorilla,golden_monkey",
+    start_date: str = None,
+    end_date: str = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Columnar availability for several catalogue products over a date range (default: two years from tomorrow)."""
+    from ..services.availability_calendar import calendar
+
+    keys = [key.strip() for key in products.split(",") if key.strip()]
+    if not keys:
+        raise HTTPException(status_code=400, detail="products must name at least one product")
+    try:
+        start = datetime.strptime(start_date, "%d/%m/%Y").date() if start_date else date.today() + timedelta(days=1)
+        end = datetime.strptime(end_date, "%d/%m/%Y").date() if end_date else start + timedelta(days=729)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Expected DD/MM/YYYY")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    if (end - start).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The range can span at most {CALENDAR_MAX_DAYS} days")
+
+    try:
+        version, body = calendar(db, keys, start, end)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown product: {e.args[0]}")
+    headers = {"ETag": f'"{version}"', "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/net", response_class=FastJSONResponse)
+async def get_net_availability(
+    product: str = "gorilla",
+    start_date: str = None,
+    end_date: str = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Scraped slots less our pending bookings' people, per date (default: the next 90 days)."""
+    from ..models.site import Product
+    from ..services.capacity_index import net_availability
+    from ..services.product_catalogue import get_target
+
+    target = get_target(db, product)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    try:
+        start = datetime.strptime(start_date, "%d/%m/%Y").date() if start_date else date.today() + timedelta(days=1)
+        end = datetime.strptime(end_date, "%d/%m/%Y").date() if end_date else start + timedelta(days=89)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Expected DD/MM/YYYY")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    if (end - start).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The range can span at most {CALENDAR_MAX_DAYS} days")
+    return FastJSONResponse({
+        "product": target.key,
+        "dates": net_availability(db, db.get(Product, target.product_id), start, end),
+    })
+
 @router.post("")
 async def create_or_update_slots(
     slots_data: List[dict],
@@ -140,6 +249,10 @@ async def create_or_update_slots(
     db: Session = Depends(get_db)
 ):
     try:
+        from ..services.product_catalogue import get_target
+        from ..services.slot_alerts import SlotAlerts
+        alerts = SlotAlerts(db)
+        target = get_target(db, "gorilla")
         for slot in slots_data:
             existing_slot = db.query(AvailableSlot).filter(
                 AvailableSlot.date == slot['Date']
@@ -154,7 +267,9 @@ async def create_or_update_slots(
                     slots=slot['Attendance']
                 )
                 db.add(new_slot)
+            alerts.observe(target, slot['Date'], slot['Attendance'])
         
+        alerts.send()
         db.commit()
         return {"message": "Slots updated successfully"}
     except Exception as e:
@@ -178,58 +293,361 @@ async def get_scrape_status(
         "slots_count": slots_count
     }
 
-async def run_scrape_with_status(status_record_id: int):
-    """Wrapper that runs the scraper and updates ScrapeStatus on completion or failure."""
-    db = None
+@router.get("/scraper-control")
+async def get_scraper_control(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Shared scraper knobs plus each scrape worker's live limit, delay, latency and outcome counters."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from ..services.scraper_control import control_status
+    from ..utils.adaptive_concurrency import permit_site_controller
+    return control_status(db, permit_site_controller.name)
+
+@router.put("/scraper-control")
+async def update_scraper_control(
+    update: ScraperControlUpdate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Adjust the scraper knobs (or pin the pool's limit/delay) without a restart.
+    Workers pick the change up within SCRAPER_CONTROL_SYNC_SECONDS."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from ..services.scraper_control import control_status, update_control
+    from ..utils.adaptive_concurrency import permit_site_controller
     try:
-        from ..database import SessionLocal
-        db = SessionLocal()
-        results = await scrape_slots()
-        slots_found = len(results) if results else 0
-        record = db.query(ScrapeStatus).filter(ScrapeStatus.id == status_record_id).first()
-        if record:
-            record.status = "success"
-            record.message = f"Scraped {slots_found} slots"
-            db.commit()
-    except Exception as e:
-        logger.error(f"Background scrape failed: {str(e)}")
-        if db:
-            record = db.query(ScrapeStatus).filter(ScrapeStatus.id == status_record_id).first()
-            if record:
-                record.status = "failed"
-                record.message = f"Scraping failed: {str(e)}"
-                db.commit()
-    finally:
-        if db:
-            db.close()
+        update_control(db, permit_site_controller.name, update.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return control_status(db, permit_site_controller.name)
 
+@router.get("/workers", response_class=FastJSONResponse)
+async def get_scrape_workers(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Scrape work items with their current lease holder, last run and failure counts,
+    plus the API process currently running the scheduler."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from ..services.leader import lease_holder
+    from ..services.scrape_leases import lease_status
+    items = lease_status(db)
+    return {
+        "workers": sorted({item["lease_owner"] for item in items if item["lease_owner"]}),
+        "items": items,
+        "background_leader": lease_holder(db),
+    }
 
-@router.post("/trigger-slot-scrape")
-async def trigger_slot_scrape(
-    background_tasks: BackgroundTasks,
+def _require_scrape_admin(current_user):
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+def _get_scrape_job(db: Session, job_id: int):
+    from ..models.scrape_job import ScrapeJob
+    job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Scrape job not found")
+    return job
+
+@router.post("/scrape-jobs", response_class=FastJSONResponse)
+async def create_scrape_job(
+    data: ScrapeJobCreate,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Queue an on-demand scrape of some products over a date range or a list of dates.
+
+    Returns at once (202) with the job; a scrape worker picks it up within
+    SCRAPE_JOB_POLL_SECONDS, ahead of the background sweep. When an active job
+    already covers the request, that job is returned instead (200).
+    """
+    _require_scrape_admin(current_user)
+    from ..services.scrape_jobs import job_dict, submit_job
     try:
-        # Create initial status record
-        status_record = ScrapeStatus(
-            status="queued",
-            message="Scraping queued",
-            last_run=datetime.utcnow()
-        )
-        db.add(status_record)
-        db.commit()
-        db.refresh(status_record)
+        job, created = submit_job(db, data.products, data.start_date, data.end_date, data.dates,
+                                  requested_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({**job_dict(job), "deduplicated": not created},
+                            status_code=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
 
-        background_tasks.add_task(run_scrape_with_status, status_record.id)
+@router.get("/scrape-jobs", response_class=FastJSONResponse)
+async def list_scrape_jobs(
+    job_status: Optional[str] = None,
+    limit: int = 50,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Most recent scrape jobs first, optionally filtered by status."""
+    _require_scrape_admin(current_user)
+    from ..models.scrape_job import ScrapeJob
+    from ..services.scrape_jobs import job_dict
+    query = db.query(ScrapeJob)
+    if job_status:
+        query = query.filter(ScrapeJob.status == job_status)
+    jobs = query.order_by(ScrapeJob.id.desc()).limit(max(1, min(limit, 500))).all()
+    return FastJSONResponse({"jobs": [job_dict(job) for job in jobs]})
 
-        return {"message": "Slot scraping initiated"}
-    except Exception as e:
+@router.get("/scrape-jobs/{job_id}", response_class=FastJSONResponse)
+async def get_scrape_job(
+    job_id: int,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    _require_scrape_admin(current_user)
+    from ..services.scrape_jobs import job_dict
+    return FastJSONResponse(job_dict(_get_scrape_job(db, job_id)))
+
+@router.get("/scrape-jobs/{job_id}/events")
+async def stream_scrape_job(
+    job_id: int,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-sent events: the job's progress whenever it changes, until it finishes."""
+    _require_scrape_admin(current_user)
+    from ..models.scrape_job import ScrapeJob
+    from ..services.scrape_jobs import ACTIVE, job_dict
+    _get_scrape_job(db, job_id)
+
+    async def events():
+        last = None
+        while True:
+            with SessionLocal() as session:
+                job = session.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+                if job is None:
+                    return
+                payload = dumps(job_dict(job)).decode()
+                finished = job.status not in ACTIVE
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            if finished:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/scrape-jobs/{job_id}/cancel", response_class=FastJSONResponse)
+async def cancel_scrape_job(
+    job_id: int,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cancel a queued job at once, or ask the worker running it to stop."""
+    _require_scrape_admin(current_user)
+    from ..services.scrape_jobs import ACTIVE, cancel_job, job_dict
+    job = _get_scrape_job(db, job_id)
+    if job.status not in ACTIVE:
+        raise HTTPException(status_code=400, detail=f"Scrape job is already {job.status}")
+    return FastJSONResponse(job_dict(cancel_job(db, job)))
+
+@router.get("/products", response_class=FastJSONResponse)
+async def get_scrape_products(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Catalogue products with their slot_type key, permit site labels and scrape state."""
+    from sqlalchemy import func
+    from ..services.product_catalogue import scrape_targets
+
+    stats = {
+        product_id: (count, last)
+        for product_id, count, last in db.query(
+            ProductAvailability.product_id,
+            func.count(ProductAvailability.id),
+            func.max(ProductAvailability.updated_at),
+        ).group_by(ProductAvailability.product_id).all()
+    }
+    products = []
+    for target in scrape_targets(db, enabled_only=False):
+        count, last = stats.get(target.product_id, (0, None))
+        products.append({
+            "product_id": target.product_id,
+            "key": target.key,
+            "name": target.name,
+            "site_label": target.site_label,
+            "product_label": target.product_label,
+            "scrape_enabled": target.enabled,
+            "dates_stored": count,
+            "last_update": format_relative_time(last),
+        })
+    return FastJSONResponse({"products": products})
+
+@router.put("/products/{product_id}")
+async def update_scrape_product(
+    product_id: int,
+    update: ScrapeProductUpdate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Turn availability scraping on or off for a product, or correct its permit site labels."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from ..models.site import Product
+    from ..services.product_catalogue import target_for
+
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    values = update.model_dump(exclude_none=True)
+    if "scrape_enabled" in values:
+        product.scrape_enabled = values["scrape_enabled"]
+    for field in ("permit_site_label", "permit_product_label"):
+        if field in values:
+            # An empty label falls back to the site / product name
+            setattr(product, field, values[field].strip() or None)
+    db.commit()
+    db.refresh(product)
+    target = target_for(product)
+    return {
+        "product_id": target.product_id,
+        "key": target.key,
+        "site_label": target.site_label,
+        "product_label": target.product_label,
+        "scrape_enabled": target.enabled,
+    }
+
+@router.get("/alert-rules", response_class=FastJSONResponse)
+async def get_slot_alert_rules(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Each product's low-slot alert rule, with defaults filled in."""
+    from dataclasses import asdict
+    from ..services.slot_alerts import alert_rules
+    _require_scrape_admin(current_user)
+    return FastJSONResponse({"rules": [asdict(rule) for rule in alert_rules(db).values()]})
+
+@router.put("/alert-rules/{product}")
+async def update_slot_alert_rule(
+    product: str,
+    update: SlotAlertRuleUpdate,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Set a product's alert threshold, hysteresis (clear_at), cooldown or booking handling; null restores a default."""
+    from dataclasses import asdict
+    from ..services.product_catalogue import get_target
+    from ..services.slot_alerts import update_rule
+    _require_scrape_admin(current_user)
+    if get_target(db, product) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    try:
+        rule = update_rule(db, product, update.model_dump(exclude_unset=True))
+    except ValueError as e:
         db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+        raise HTTPException(status_code=400, detail=str(e))
+    return asdict(rule)
+
+@router.get("/telemetry/runs", response_class=FastJSONResponse)
+async def get_scrape_runs(
+    days: int = 30,
+    engine: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Scrape cycles over time: duration, batches and dates checked per run, oldest first."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    from ..services.scrape_telemetry import run_history
+    runs = run_history(db, days, engine)
+    return FastJSONResponse({"runs": runs, "total": len(runs)})
+
+@router.get("/telemetry/slowest-dates", response_class=FastJSONResponse)
+async def get_slowest_dates(
+    hours: int = 24,
+    limit: int = 20,
+    product: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """(product, date) checks with the highest average latency in the last ``hours`` hours."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if hours < 1 or limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="hours must be positive and limit between 1 and 500")
+    from ..services.scrape_telemetry import slowest_dates
+    return FastJSONResponse({"dates": slowest_dates(db, hours, limit, product)})
+
+@router.get("/telemetry/page-loads", response_class=FastJSONResponse)
+async def get_page_loads(
+    hours: int = 24,
+    engine: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Scrape tab load time and bytes downloaded, served from cache or blocked, by engine."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if hours < 1 or hours > 24 * 90:
+        raise HTTPException(status_code=400, detail="hours must be between 1 and 2160")
+    from ..services.scrape_telemetry import page_load_summary
+    return FastJSONResponse({"page_loads": page_load_summary(db, hours, engine)})
+
+@router.get("/telemetry/daily", response_class=FastJSONResponse)
+async def get_scrape_daily(
+    days: int = 30,
+    product: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Per-day check counts, outcomes and latency percentiles by product and engine."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    from ..services.scrape_telemetry import daily_summary
+    return FastJSONResponse({"days": daily_summary(db, days, product)})
+
+@router.get("/stale", response_class=FastJSONResponse)
+async def get_stale_dates(
+    slot_type: str = "all",
+    days: int = 60,
+    max_age_hours: int = 24,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upcoming dates whose availability is missing, outdated or waiting in the retry queue."""
+    from ..services.product_catalogue import get_target
+    from ..services.scrape_retry_queue import stale_dates
+
+    _require_scrape_admin(current_user)
+    if slot_type != "all" and get_target(db, slot_type) is None:
+        raise HTTPException(status_code=400, detail="slot_type must be 'all' or a product key from /products")
+    if days < 1 or days > 730:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 730")
+
+    entries = stale_dates(db, None if slot_type == "all" else slot_type, days, max_age_hours)
+    for entry in entries:
+        entry["relative_time"] = format_relative_time(entry["last_updated_at"])
+    counts = {}
+    for entry in entries:
+        counts[entry["reason"]] = counts.get(entry["reason"], 0) + 1
+    return FastJSONResponse({
+        "stale": entries,
+        "total": len(entries),
+        "by_reason": counts,
+    })
+
+@router.post("/trigger-slot-scrape")
+async def trigger_slot_scrape(
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a scrape job for gorilla permits over the next 30 days."""
+    from ..services.scrape_jobs import submit_job
+    today = datetime.now().date()
+    try:
+        job, _ = submit_job(db, ["gorilla"], today, today + timedelta(days=29), requested_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Slot scraping initiated", "job_id": job.id}
 
 @router.post("/test-scrape")
 async def test_scrape(
@@ -290,27 +708,14 @@ async def trigger_scrape(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Manually trigger the scraper"""
+    """Queue a scrape job for every enabled product over the whole horizon.
+    Poll /scrape-jobs/{job_id} for progress."""
+    from ..services.scrape_jobs import submit_job
+    from ..services.scrape_leases import HORIZON_DAYS
+    today = datetime.now().date()
     try:
-        logger.info("Manually triggering scraper")
-        from run_scrapers import run_scrapers
-        
-        # Run the scraper
-        await run_scrapers()
-        
-        # Count slots after scraping
-        gorilla_count = db.query(AvailableSlot).count()
-        monkey_count = db.query(GoldenMonkeySlot).count()
-        
-        return {
-            "message": "Scraping completed",
-            "gorilla_slots": gorilla_count,
-            "monkey_slots": monkey_count
-        }
-        
-    except Exception as e:
-        logger.error(f"Error triggering scrape: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        ) 
\ No newline at end of file
+        job, _ = submit_job(db, None, today, today + timedelta(days=HORIZON_DAYS - 1), requested_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Manually triggered scrape queued as job {job.id}")
+    return {"message": "Scraping queued", "job_id": job.id}
@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from ..database import SessionLocal, get_db
 from ..models.user import User, UserRole
 from ..models.booking import Booking, BookingStatus
 from ..models.site import Site, Product
-from ..models.payment import Payment, PaymentStatus, ValidationStatus
+from ..models.payment import Payment
 from ..models.available_slots import AvailableSlot
 from ..models.golden_monkey_slots import GoldenMonkeySlot
 from ..utils.auth import get_current_user
 from pydantic import BaseModel
 from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 from .notifications import create_simple_notification
 from ..models.authorization import AuthorizationRequest
 from ..models.passport_data import PassportData
+from ..utils.fast_json import FastJSONResponse
+from ..utils.tabular_export import check_export_args, export_response
+from ..services.booking_events import (
+    booking_timeline, recent_events, record_event, status_label, transition_booking,
+)
+from ..services.capacity_index import (
+    PENDING, check_capacity, demand_kind, enforce_capacity, forget_booking, sync_booking,
+)
+from ..services import booking_workflow
+from ..services.booking_workflow import WorkflowBatch, WorkflowError, run_bulk, run_one
+from ..models.booking_event import BookingEvent
+from ..models.voucher_import import VoucherImportFile
 
 
 def _lookup_slots(db: Session, booking_date, product_name: str) -> str | None:
@@ -82,6 +96,15 @@ async def create_booking(
     except ValueError:
         booking_status_value = BookingStatus.PROVISIONAL
 
+    # An open booking will need permits from what is left after our other pending bookings
+    capacity = capacity_warning = None
+    if demand_kind(booking_status_value) == PENDING:
+        capacity = check_capacity(db, product, booking_data.date, booking_data.number_of_people)
+        try:
+            capacity_warning = enforce_capacity(capacity, product.name)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
     # Create the booking
     booking = Booking(
         date=booking_data.date,
@@ -97,7 +120,11 @@ async def create_booking(
     )
 
     db.add(booking)
+    record_event(db, booking, "created", f"Initial status: {status_label(booking_status_value)}",
+                 current_user.id, to_status=booking_status_value)
     try:
+        db.flush()
+        sync_booking(db, booking)
         db.commit()
         db.refresh(booking)
 
@@ -121,6 +148,8 @@ async def create_booking(
             "number_of_people": booking.people,
             "status": booking.booking_status.value if booking.booking_status else None,
             "payment_status": "pending",
+            "capacity": capacity.as_dict() if capacity else None,
+            "capacity_warning": capacity_warning,
         }
     except Exception as e:
         db.rollback()
@@ -190,10 +219,6 @@ async def get_booking_timeline(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    from ..models.amendment import AmendmentRequest
-    from ..models.cancellation import CancellationRequest
-    from ..models.chase import ChaseRecord
-
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -202,147 +227,7 @@ async def get_booking_timeline(
     if current_user.role not in elevated_roles and booking.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    events = []
-
-    # 1. Booking created
-    events.append({
-        "timestamp": booking.created_at.isoformat() if booking.created_at else None,
-        "type": "created",
-        "title": "Booking Created",
-        "detail": f"Initial status: {booking.booking_status.value.replace('_', ' ').title() if booking.booking_status else 'Unknown'}",
-        "color": "gray",
-        "is_current": False,
-    })
-
-    # 2. Authorization requests
-    auth_requests = (
-        db.query(AuthorizationRequest)
-        .filter(AuthorizationRequest.booking_id == booking_id)
-        .order_by(AuthorizationRequest.created_at)
-        .all()
-    )
-    for auth in auth_requests:
-        requester_name = auth.requester.username if auth.requester else "Unknown"
-        reason_short = (auth.reason[:80] + "…") if auth.reason and len(auth.reason) > 80 else (auth.reason or "—")
-        events.append({
-            "timestamp": auth.created_at.isoformat() if auth.created_at else None,
-            "type": "auth_requested",
-            "title": "Authorization Requested",
-            "detail": f"By {requester_name}: {reason_short}",
-            "color": "orange",
-            "is_current": False,
-        })
-        if auth.status == "authorized":
-            authorizer_name = auth.authorizer_user.username if auth.authorizer_user else "Authorizer"
-            notes = f": {auth.authorizer_notes}" if auth.authorizer_notes else ""
-            events.append({
-                "timestamp": auth.created_at.isoformat(),
-                "type": "auth_approved",
-                "title": "Authorization Approved",
-                "detail": f"By {authorizer_name}{notes}",
-                "color": "green",
-                "is_current": False,
-            })
-        elif auth.status == "declined":
-            authorizer_name = auth.authorizer_user.username if auth.authorizer_user else "Authorizer"
-            notes = f": {auth.authorizer_notes}" if auth.authorizer_notes else ""
-            events.append({
-                "timestamp": auth.created_at.isoformat(),
-                "type": "auth_declined",
-                "title": "Authorization Declined",
-                "detail": f"By {authorizer_name}{notes}",
-                "color": "red",
-                "is_current": False,
-            })
-        if auth.appeal:
-            appeal_text = (auth.appeal.appeal_notes[:80] + "…") if auth.appeal.appeal_notes and len(auth.appeal.appeal_notes) > 80 else (auth.appeal.appeal_notes or "—")
-            events.append({
-                "timestamp": auth.appeal.created_at.isoformat() if auth.appeal.created_at else None,
-                "type": "appeal",
-                "title": "Appeal Filed",
-                "detail": appeal_text,
-                "color": "purple",
-                "is_current": False,
-            })
-
-    # 3. Payment events
-    if booking.payment:
-        p = booking.payment
-        pay_status = p.payment_status.value.replace("_", " ").title() if p.payment_status else "—"
-        events.append({
-            "timestamp": p.created_at.isoformat() if p.created_at else None,
-            "type": "payment_recorded",
-            "title": "Payment Recorded",
-            "detail": f"Status: {pay_status}",
-            "color": "blue",
-            "is_current": False,
-        })
-        if p.validated_at:
-            val = p.validation_status.value.replace("_", " ").title() if p.validation_status else "Unknown"
-            notes = f" — {p.validation_notes}" if p.validation_notes else ""
-            events.append({
-                "timestamp": p.validated_at.isoformat(),
-                "type": "payment_validated",
-                "title": "Payment Validated",
-                "detail": f"Validation: {val}{notes}",
-                "color": "green",
-                "is_current": False,
-            })
-
-    # 4. Amendment requests
-    amendments = (
-        db.query(AmendmentRequest)
-        .filter(AmendmentRequest.booking_id == booking_id)
-        .order_by(AmendmentRequest.created_at)
-        .all()
-    )
-    for amend in amendments:
-        reason_short = f" ({amend.reason})" if amend.reason else ""
-        events.append({
-            "timestamp": amend.created_at.isoformat() if amend.created_at else None,
-            "type": "amendment",
-            "title": "Amendment Requested",
-            "detail": f"{amend.original_date} → {amend.requested_date}{reason_short}",
-            "color": "orange",
-            "is_current": False,
-        })
-
-    # 5. Cancellation requests
-    cancellations = (
-        db.query(CancellationRequest)
-        .filter(CancellationRequest.booking_id == booking_id)
-        .order_by(CancellationRequest.created_at)
-        .all()
-    )
-    for cancel in cancellations:
-        events.append({
-            "timestamp": cancel.created_at.isoformat() if cancel.created_at else None,
-            "type": "cancellation",
-            "title": "Cancellation Requested",
-            "detail": cancel.reason or "—",
-            "color": "red",
-            "is_current": False,
-        })
-
-    # 6. Chase record
-    chase = db.query(ChaseRecord).filter(ChaseRecord.booking_id == booking_id).first()
-    if chase:
-        chase_status = f" — {chase.status.value}" if chase.status else ""
-        events.append({
-            "timestamp": chase.created_at.isoformat() if chase.created_at else None,
-            "type": "chase",
-            "title": "Chase Initiated",
-            "detail": f"{chase.chase_count}/5 chase attempts{chase_status}",
-            "color": "red",
-            "is_current": False,
-        })
-
-    # Sort by timestamp ascending, None timestamps go last
-    events.sort(key=lambda e: e["timestamp"] or "9999-99-99")
-
-    # Mark the last event as current
-    if events:
-        events[-1]["is_current"] = True
+    events = booking_timeline(db, booking_id)
 
     return {
         "booking": {
@@ -360,7 +245,7 @@ async def get_booking_timeline(
     }
 
 
-@router.get("")
+@router.get("", response_class=FastJSONResponse)
 async def get_bookings(
     current_user: User = Depends(verify_booking_access),
     db: Session = Depends(get_db)
@@ -411,7 +296,8 @@ async def get_bookings(
     today = date.today()
 
     product_name = lambda b: b.product_rel.name if b.product_rel else b.product
-    return [{
+    # Rows are already plain values — FastJSONResponse skips the jsonable_encoder pass
+    return FastJSONResponse([{
         "id": booking.id,
         "date": booking.date,
         "booking_name": booking.booking_name,
@@ -441,7 +327,111 @@ async def get_bookings(
         "agent_client_trusted": booking.agent_client_rel.is_trusted if booking.agent_client_rel else None,
         "passport_count": passport_counts.get(booking.id, 0),
         "days_to_trek": (booking.date - today).days if booking.date else None,
-    } for booking in bookings]
+    } for booking in bookings])
+
+EXPORT_BATCH = 1000
+
+_EXPORT_COLUMNS = (
+    ("id", "Booking ID"), ("booking_ref", "Booking ref"), ("booking_name", "Booking name"),
+    ("date", "Trek date"), ("date_of_request", "Request date"), ("number_of_people", "People"),
+    ("status", "Status"), ("site", "Site"), ("product", "Product"),
+    ("agent_client_name", "Agent / client"), ("head_of_file", "Head of file"),
+    ("unit_cost", "Unit cost"), ("total_amount", "Total amount"), ("amount_received", "Amount received"),
+    ("balance", "Balance"), ("payment_status", "Payment status"), ("validation_status", "Validation status"),
+    ("deposit_due_date", "Deposit due"), ("balance_due_date", "Balance due date"),
+    ("available_slots", "Available slots"),
+)
+
+
+def _booking_export_rows(user_id: int, role: UserRole, start_date, end_date, agent_id):
+    # Own session: the response body is produced after the request's dependencies return
+    db = SessionLocal()
+    try:
+        query = db.query(Booking).options(
+            joinedload(Booking.site), joinedload(Booking.product_rel),
+            joinedload(Booking.payment), joinedload(Booking.agent_client_rel),
+        )
+        # Same visibility as GET /api/bookings
+        if role == UserRole.USER:
+            query = query.filter(Booking.user_id == user_id)
+        elif role == UserRole.FINANCE_ADMIN:
+            query = query.filter(Booking.booking_status != BookingStatus.PROVISIONAL)
+        trek_date = func.coalesce(Booking.trekking_date, Booking.date)
+        if start_date:
+            query = query.filter(trek_date >= start_date)
+        if end_date:
+            query = query.filter(trek_date <= end_date)
+        if agent_id is not None:
+            query = query.filter(Booking.agent_client_id == agent_id)
+
+        slot_cache = {}
+        for booking in query.order_by(Booking.date.asc().nullslast(), Booking.id).yield_per(EXPORT_BATCH):
+            product = booking.product_rel
+            payment = booking.payment
+            product_name = product.name if product else booking.product
+            total = float(product.unit_cost * booking.people) if product and booking.people else 0
+            received = float(payment.deposit_paid or 0) if payment else 0
+            slot_key = (booking.date, product_name)
+            if slot_key not in slot_cache:
+                slot_cache[slot_key] = _lookup_slots(db, booking.date, product_name)
+            yield {
+                "id": booking.id,
+                "booking_ref": booking.booking_ref,
+                "booking_name": booking.booking_name,
+                "date": booking.date,
+                "date_of_request": booking.date_of_request,
+                "number_of_people": booking.people,
+                "status": booking.booking_status,
+                "site": booking.site.name if booking.site else None,
+                "product": product_name,
+                "agent_client_name": booking.agent_client_rel.name if booking.agent_client_rel else booking.agent_client,
+                "head_of_file": booking.head_of_file,
+                "unit_cost": float(product.unit_cost) if product else 0,
+                "total_amount": total,
+                "amount_received": received,
+                "balance": total - received if total else 0,
+                "payment_status": payment.payment_status if payment else None,
+                "validation_status": payment.validation_status if payment else None,
+                "deposit_due_date": payment.deposit_due_date if payment else None,
+                "balance_due_date": payment.balance_due_date if payment else None,
+                "available_slots": slot_cache[slot_key],
+            }
+    finally:
+        db.close()
+
+
+@router.get("/export")
+async def export_bookings(
+    fmt: str = Query("csv", alias="format"),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    agent_id: int | None = None,
+    current_user: User = Depends(verify_booking_access),
+):
+    """Stream the booking ledger as CSV or XLSX, filtered by trek date range and agent."""
+    check_export_args(fmt, start_date, end_date)
+    rows = _booking_export_rows(current_user.id, current_user.role, start_date, end_date, agent_id)
+    return export_response(_EXPORT_COLUMNS, rows, fmt, "bookings")
+
+
+@router.get("/events")
+async def get_booking_events(
+    limit: int = 100,
+    before_id: int | None = None,
+    event_type: str | None = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Audit feed of booking events across all bookings, newest first; page with before_id."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER, UserRole.FINANCE_ADMIN, UserRole.AUTHORIZER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    events = recent_events(db, limit, before_id, event_type)
+    return {
+        "events": events,
+        "next_before_id": events[-1]["id"] if len(events) == limit else None,
+    }
 
 @router.get("/my-bookings")
 async def get_my_bookings(
@@ -520,6 +510,12 @@ async def delete_booking(
     if current_user.role != UserRole.ADMIN and booking.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this booking")
 
+    # The only place events are removed: a deleted booking takes its history with it
+    db.query(BookingEvent).filter(BookingEvent.booking_id == booking.id).delete(synchronize_session=False)
+    # Import reports keep the file row but lose the link to the deleted booking
+    db.query(VoucherImportFile).filter(VoucherImportFile.booking_id == booking.id) \
+        .update({VoucherImportFile.booking_id: None}, synchronize_session=False)
+    forget_booking(db, booking)
     db.delete(booking)
     db.commit()
     return {"message": "Booking deleted successfully"}
@@ -528,6 +524,7 @@ async def delete_booking(
 async def update_booking(
     booking_id: int,
     booking_data: BookingCreate,
+    response: Response,
     current_user: User = Depends(verify_booking_access),
     db: Session = Depends(get_db)
 ):
@@ -539,15 +536,32 @@ async def update_booking(
     if current_user.role != UserRole.ADMIN and booking.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to modify this booking")
 
+    needs_more = (booking_data.date, booking_data.number_of_people) != (booking.date, booking.people)
     booking.booking_name = booking_data.booking_name
     booking.people = booking_data.number_of_people
     booking.number_of_permits = booking_data.number_of_people
     booking.date = booking_data.date
+    transitioned = False
     if booking_data.status:
         try:
-            booking.booking_status = BookingStatus(booking_data.status)
+            new_status = BookingStatus(booking_data.status)
         except ValueError:
-            pass
+            new_status = None
+        if new_status and new_status != booking.booking_status:
+            transition_booking(db, booking, new_status, actor_id=current_user.id)
+            transitioned = True
+    if not transitioned:  # transition_booking has already synced the index
+        sync_booking(db, booking)
+
+    if needs_more and demand_kind(booking.booking_status) == PENDING and booking.product_rel and booking.date:
+        capacity = check_capacity(db, booking.product_rel, booking.date, booking.people, booking_id=booking.id)
+        try:
+            warning = enforce_capacity(capacity, booking.product_rel.name)
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        if warning:
+            response.headers["X-Capacity-Warning"] = warning
 
     db.commit()
     db.refresh(booking)
@@ -577,7 +591,8 @@ async def request_confirmation(
             detail="Can only request confirmation for provisional bookings"
         )
 
-    booking.booking_status = BookingStatus.REQUESTED
+    transition_booking(db, booking, BookingStatus.REQUESTED, "confirmation_requested",
+                       f"By {current_user.username}", current_user.id)
 
     # Create notification for admins
     admins = db.query(User).filter(User.role == UserRole.ADMIN).all()
@@ -613,27 +628,11 @@ async def send_to_finance(
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
-    # Can only send to finance if status is REQUESTED
-    if booking.booking_status != BookingStatus.REQUESTED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Can only send requested bookings to finance"
-        )
-
-    _create_payment_for_booking(booking, db)
-    booking.booking_status = BookingStatus.VR  # validation_request
-
-    # Create notification for finance admins
-    finance_admins = db.query(User).filter(User.role == UserRole.FINANCE_ADMIN).all()
-    for admin in finance_admins:
-        create_simple_notification(
-            db, admin.id, "Validation Request",
-            f"New validation request for booking {booking.booking_name}"
-        )
-
     try:
-        db.commit()
+        run_one(db, current_user, booking_workflow.send_to_finance, booking)
         return {"message": "Booking sent to finance successfully"}
+    except WorkflowError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -641,64 +640,15 @@ async def send_to_finance(
             detail=str(e)
         )
 
-def _create_payment_for_booking(booking: Booking, db: Session, confirmed_by_id: int | None = None):
-    """
-    Create a Payment record for a booking using the agent's payment terms.
-    If the agent has a rolling deposit, auto-apply it (deposit or full based on 45-day rule).
-    """
-    from ..services.rolling_deposit import calculate_due_dates, apply_rolling_deposit
-    from ..models.agent_client import AgentClient, PaymentTermsAnchor
-
-    if booking.payment:
-        return
-
-    unit_cost = float(booking.product_rel.unit_cost) if booking.product_rel else 0
-    units     = booking.people or 0
-    total     = unit_cost * units
-    deposit_amount = round(total * 0.3, 2)
 
-    ac = booking.agent_client_rel
-
-    if ac:
-        deposit_due, balance_due_dt, require_full = calculate_due_dates(booking, ac)
-    else:
-        deposit_due   = datetime.utcnow() + timedelta(days=14)
-        balance_due_dt = (
-            datetime.combine(booking.date, datetime.min.time()) - timedelta(days=45)
-            if booking.date else datetime.utcnow() + timedelta(days=30)
-        )
-        require_full = False
-
-    payment = Payment(
-        booking_id=booking.id,
-        payment_status=PaymentStatus.PENDING,
-        validation_status=ValidationStatus.PENDING,
-        unit_cost=unit_cost,
-        units=units,
-        amount=total,
-        deposit_amount=deposit_amount,
-        deposit_paid=0,
-        balance_due=total,
-        deposit_due_date=deposit_due,
-        balance_due_date=balance_due_dt,
-    )
-    db.add(payment)
-    db.flush()  # give payment an id
-
-    # Auto-apply rolling deposit if available
-    if ac and ac.has_rolling_deposit and ac.rolling_deposit_balance > 0:
-        applied = apply_rolling_deposit(db, booking, ac, payment, confirmed_by_id)
-        if not applied:
-            # Insufficient balance — notify finance
-            create_simple_notification(
-                db,
-                confirmed_by_id or booking.user_id,
-                "Rolling Deposit Insufficient",
-                f"Booking '{booking.booking_name}' for {ac.name}: rolling deposit balance "
-                f"${ac.rolling_deposit_balance:.2f} is below required "
-                f"{'full' if require_full else 'deposit'} amount ${total if require_full else deposit_amount:.2f}. "
-                f"Manual action required."
-            )
+def _workflow_action(db: Session, current_user: User, booking_id: int, action, *args) -> dict:
+    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    try:
+        return run_one(db, current_user, action, booking, *args)
+    except WorkflowError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
 @router.post("/{booking_id}/confirm")
@@ -710,18 +660,7 @@ async def confirm_booking(
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can confirm bookings")
 
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-
-    if booking.booking_status != BookingStatus.REQUESTED:
-        raise HTTPException(status_code=400, detail="Only requested bookings can be confirmed")
-
-    booking.booking_status = BookingStatus.CONFIRMED
-    _create_payment_for_booking(booking, db, confirmed_by_id=current_user.id)
-    create_simple_notification(db, booking.user_id, "Booking Confirmed",
-        f"Your booking '{booking.booking_name}' has been confirmed.")
-    db.commit()
+    _workflow_action(db, current_user, booking_id, booking_workflow.confirm)
     return {"message": "Booking confirmed successfully"}
 
 
@@ -734,17 +673,7 @@ async def reject_booking(
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can reject bookings")
 
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-
-    if booking.booking_status not in [BookingStatus.REQUESTED, BookingStatus.PROVISIONAL]:
-        raise HTTPException(status_code=400, detail="Only provisional/requested bookings can be rejected")
-
-    booking.booking_status = BookingStatus.REJECTED
-    create_simple_notification(db, booking.user_id, "Booking Rejected",
-        f"Your booking '{booking.booking_name}' has been rejected.")
-    db.commit()
+    _workflow_action(db, current_user, booking_id, booking_workflow.reject)
     return {"message": "Booking rejected successfully"}
 
 
@@ -765,41 +694,57 @@ async def purchase_permits(
     if body.purchase_type not in ["full", "deposit", "authorization"]:
         raise HTTPException(status_code=400, detail="purchase_type must be full, deposit, or authorization")
 
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
+    result = _workflow_action(db, current_user, booking_id, booking_workflow.purchase_permits, body.purchase_type)
+    label = booking_workflow.PURCHASE_LABELS[body.purchase_type]
+    return {"message": f"Permits purchased {label}", "booking_status": result["booking_status"]}
 
-    purchasable = [BookingStatus.CONFIRMED, BookingStatus.AWAITING_AUTHORIZATION, BookingStatus.AUTHORIZED]
-    if booking.booking_status not in purchasable:
-        raise HTTPException(status_code=400, detail="Booking must be confirmed or authorized to purchase permits")
 
-    status_map = {
-        "full": BookingStatus.SECURED_FULL,
-        "deposit": BookingStatus.SECURED_DEPOSIT,
-        "authorization": BookingStatus.SECURED_AUTHORIZATION,
-    }
-    booking.booking_status = status_map[body.purchase_type]
+class BulkActionBody(BaseModel):
+    action: str  # confirm | reject | send_to_finance | purchase_permits | validate_payment | resolve_chase
+    booking_ids: List[int]
+    purchase_type: Optional[str] = None  # purchase_permits
+    validation_status: Optional[str] = None  # validate_payment
+    validation_notes: Optional[str] = None
+    amounts: Optional[Dict[int, float]] = None  # validate_payment: amount received, required per booking id
 
-    from ..services.email_service import email_permits_purchased
-    label_map = {"full": "in full", "deposit": "on deposit", "authorization": "under authorization"}
-    trek_date_str = booking.date.strftime("%Y-%m-%d") if booking.date else "TBD"
-    create_simple_notification(
-        db, booking.user_id, "Permits Secured",
-        f"Permits for your booking '{booking.booking_name}' have been purchased {label_map[body.purchase_type]}."
-    )
-    if body.purchase_type == "deposit":
-        create_simple_notification(
-            db, booking.user_id, "Balance Top-up Required",
-            f"Your booking '{booking.booking_name}' is secured on deposit. The balance must be paid 45 days before your trek date."
-        )
-    if booking.user and booking.user.email:
-        email_permits_purchased(
-            booking.user.email, booking.booking_name,
-            label_map[body.purchase_type], trek_date_str
-        )
 
-    db.commit()
-    return {"message": f"Permits purchased {label_map[body.purchase_type]}", "booking_status": booking.booking_status.value}
+BULK_MAX_BOOKINGS = 500
+
+@router.post("/bulk")
+async def bulk_booking_action(
+    body: BulkActionBody,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Apply one workflow action to many bookings in one transaction, with a result per booking."""
+    if not body.booking_ids:
+        raise HTTPException(status_code=400, detail="booking_ids must not be empty")
+    if len(body.booking_ids) > BULK_MAX_BOOKINGS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_BOOKINGS} bookings per request")
+
+    batch = WorkflowBatch(db, current_user)
+    try:
+        results = run_bulk(batch, body.action, body.booking_ids, purchase_type=body.purchase_type,
+                           validation_status=body.validation_status, validation_notes=body.validation_notes,
+                           amounts=body.amounts)
+        notifications = batch.flush_notifications()
+        db.commit()
+    except WorkflowError as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    background_tasks.add_task(batch.send_emails)
+    succeeded = sum(result["ok"] for result in results)
+    return {
+        "action": body.action,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "notifications": notifications,
+        "results": results,
+    }
 
 
 class RequestDetailsBody(BaseModel):
@@ -857,7 +802,7 @@ async def get_request_count(
     return {"count": count}
 
 
-@router.get("/all")
+@router.get("/all", response_class=FastJSONResponse)
 async def get_all_bookings(
     current_user: User = Depends(verify_booking_access),
     db: Session = Depends(get_db)
@@ -7,6 +7,7 @@ from ..models.booking import Booking, BookingStatus
 from ..models.cancellation import CancellationRequest, CancellationStatus
 from ..utils.auth import get_current_user
 from .notifications import create_simple_notification
+from ..services.booking_events import transition_booking
 from datetime import datetime
 
 router = APIRouter()
@@ -42,7 +43,8 @@ async def request_cancellation(
         requested_by=current_user.id,
     )
     db.add(cancellation)
-    booking.booking_status = BookingStatus.CANCELLATION_REQUESTED
+    transition_booking(db, booking, BookingStatus.CANCELLATION_REQUESTED, "cancellation",
+                       body.reason or "—", current_user.id)
     db.flush()
 
     admins = db.query(User).filter(User.role.in_([UserRole.ADMIN, UserRole.SUPERUSER])).all()
@@ -78,7 +80,7 @@ async def confirm_cancellation(
     )
 
     booking = cancellation.booking
-    booking.booking_status = BookingStatus.CANCELLED
+    transition_booking(db, booking, BookingStatus.CANCELLED, "cancelled", cancellation.admin_notes, current_user.id)
     # Payment record is intentionally preserved for audit purposes
 
     create_simple_notification(
@@ -107,7 +109,8 @@ async def reject_cancellation(
 
     cancellation.status = CancellationStatus.REJECTED
     cancellation.confirmed_by = current_user.id
-    cancellation.booking.booking_status = BookingStatus.CONFIRMED  # Revert
+    transition_booking(db, cancellation.booking, BookingStatus.CONFIRMED, "cancellation_rejected",  # Revert
+                       f"By {current_user.username}", current_user.id)
 
     create_simple_notification(
         db, cancellation.booking.user_id, "Cancellation Rejected",
@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.user import User, UserRole
-from ..models.booking import Booking, BookingStatus
+from ..models.booking import Booking
 from ..models.chase import ChaseRecord, ChaseStatus
 from ..utils.auth import get_current_user
-from .notifications import create_simple_notification
+from ..services import booking_workflow
+from ..services.booking_workflow import WorkflowError, run_one
 
 router = APIRouter()
 
@@ -57,17 +58,8 @@ async def resolve_chase(
         raise HTTPException(status_code=403, detail="Only admins can resolve chases")
 
     record = db.query(ChaseRecord).filter(ChaseRecord.id == chase_id).first()
-    if not record:
-        raise HTTPException(status_code=404, detail="Chase record not found")
-    if record.status != ChaseStatus.ACTIVE:
-        raise HTTPException(status_code=400, detail="Chase is not active")
-
-    record.status = ChaseStatus.RESOLVED
-    record.booking.booking_status = BookingStatus.CONFIRMED
-
-    create_simple_notification(
-        db, record.booking.user_id, "Booking Reinstated",
-        f"Your booking '{record.booking.booking_name}' has been reinstated. Finance will now validate your payment."
-    )
-    db.commit()
+    try:
+        run_one(db, current_user, booking_workflow.resolve_chase, record)
+    except WorkflowError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     return {"message": "Chase resolved — booking returned to confirmed for payment validation"}
@@ -2,27 +2,30 @@
 Accounts Receivable / Payable + Rolling Deposit management routes.
 All endpoints require FINANCE_ADMIN, ADMIN, or SUPERUSER.
 """
-from collections import defaultdict
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from typing import Optional
 
-from ..database import get_db
+from ..database import SessionLocal, get_db
 from ..models.user import User, UserRole
 from ..models.booking import Booking, BookingStatus
 from ..models.payment import Payment, PaymentStatus, ValidationStatus
 from ..models.agent_client import (
-    AgentClient, RollingDepositTransaction, RollingDepositTransactionType,
-    PaymentTermsAnchor,
+    AgentClient, RollingDepositTransaction,
+    PaymentTermsAnchor, RollingDepositTotals, RollingDepositBookingState,
 )
 from ..models.available_slots import AvailableSlot
 from ..models.golden_monkey_slots import GoldenMonkeySlot
+from ..models.capacity import CapacityIndex
 from ..utils.auth import get_current_user
+from ..utils.fast_json import FastJSONResponse
+from ..utils.tabular_export import check_export_args, export_response
 from ..services.rolling_deposit import (
     return_rolling_deposit, top_up_rolling_deposit,
-    adjust_rolling_deposit, update_due_date,
+    adjust_rolling_deposit, update_due_date, reconcile_rolling_deposit,
 )
 
 router = APIRouter()
@@ -59,25 +62,43 @@ def _require_finance(current_user: User):
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
-def _slot_count(booking: Booking, db: Session):
+def _slot_count(booking: Booking, db: Session, cache: Optional[dict] = None):
+    """Slots left on the booking's trek date; ``cache`` memoises lookups across a long export."""
     if not booking.date:
         return None
     # Slots tables store date as "dd/mm/yyyy" string
     date_str = booking.date.strftime("%d/%m/%Y")
     product_lower = (booking.product or "").lower()
     if "gorilla" in product_lower:
-        row = db.query(AvailableSlot).filter(AvailableSlot.date == date_str).first()
-        try:
-            return int(row.slots) if row and row.slots and row.slots.isdigit() else None
-        except (ValueError, AttributeError):
-            return None
-    if "golden" in product_lower or "monkey" in product_lower:
-        row = db.query(GoldenMonkeySlot).filter(GoldenMonkeySlot.date == date_str).first()
-        try:
-            return int(row.slots) if row and row.slots and row.slots.isdigit() else None
-        except (ValueError, AttributeError):
-            return None
-    return None
+        model = AvailableSlot
+    elif "golden" in product_lower or "monkey" in product_lower:
+        model = GoldenMonkeySlot
+    else:
+        return None
+    if cache is not None and (model, date_str) in cache:
+        return cache[(model, date_str)]
+    row = db.query(model).filter(model.date == date_str).first()
+    try:
+        slots = int(row.slots) if row and row.slots and row.slots.isdigit() else None
+    except (ValueError, AttributeError):
+        slots = None
+    if cache is not None:
+        cache[(model, date_str)] = slots
+    return slots
+
+
+def _net_available(booking: Booking, db: Session, slots, cache: Optional[dict] = None):
+    """Slots left once our pending bookings on the date are bought (capacity index)."""
+    if slots is None or booking.product_id is None:
+        return None
+    key = ("pending", booking.product_id, booking.date)
+    if cache is None or key not in cache:
+        cell = db.get(CapacityIndex, (booking.product_id, booking.date))
+        pending = cell.pending if cell is not None else 0
+        if cache is None:
+            return slots - pending
+        cache[key] = pending
+    return slots - cache[key]
 
 
 def _urgency(slots):
@@ -90,17 +111,19 @@ def _urgency(slots):
     return "normal"
 
 
-def _rd_applied_for_booking(booking_id: int, db: Session) -> bool:
-    return db.query(RollingDepositTransaction).filter(
-        RollingDepositTransaction.booking_id == booking_id,
-        RollingDepositTransaction.type == RollingDepositTransactionType.APPLIED,
-    ).first() is not None
+def _rd_applied_booking_ids(db: Session) -> set:
+    """Bookings that have drawn on a rolling deposit (one query for a whole AR list)."""
+    return {
+        booking_id for (booking_id,) in
+        db.query(RollingDepositBookingState.booking_id).filter(RollingDepositBookingState.applied > 0)
+    }
 
 
-def _booking_ar_row(booking: Booking, db: Session) -> dict:
+def _booking_ar_row(booking: Booking, db: Session, rd_applied_ids: set, slot_cache: Optional[dict] = None) -> dict:
     p = booking.payment
     ac = booking.agent_client_rel
-    slots = _slot_count(booking, db)
+    slots = _slot_count(booking, db, slot_cache)
+    net_available = _net_available(booking, db, slots, slot_cache)
     now = datetime.utcnow()
 
     deposit_overdue = p and p.deposit_due_date and p.deposit_due_date < now and p.payment_status == PaymentStatus.PENDING
@@ -114,7 +137,7 @@ def _booking_ar_row(booking: Booking, db: Session) -> dict:
             amount_owed = float(p.balance_due or 0)
 
     rd_applied = (
-        _rd_applied_for_booking(booking.id, db)
+        booking.id in rd_applied_ids
         if (ac and ac.has_rolling_deposit) else False
     )
 
@@ -136,7 +159,8 @@ def _booking_ar_row(booking: Booking, db: Session) -> dict:
         "has_rolling_deposit": ac.has_rolling_deposit if ac else False,
         "rd_applied":          rd_applied,
         "slots_available":     slots,
-        "urgency":             _urgency(slots),
+        "net_available":       net_available,
+        "urgency":             _urgency(net_available if net_available is not None else slots),
         "payment_id":          p.id if p else None,
         "payment_status":      p.payment_status.value if p else "no_payment",
         "validation_status":   p.validation_status.value if p else None,
@@ -177,7 +201,7 @@ def _booking_ap_row(booking: Booking) -> dict:
 
 # ─── AR: Accounts Receivable ──────────────────────────────────────────────────
 
-@router.get("/ar")
+@router.get("/ar", response_class=FastJSONResponse)
 async def get_accounts_receivable(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -192,11 +216,13 @@ async def get_accounts_receivable(
         .all()
     )
 
-    all_rows = [_booking_ar_row(b, db) for b in bookings]
+    rd_applied_ids = _rd_applied_booking_ids(db)
+    slot_cache = {}
+    all_rows = [_booking_ar_row(b, db, rd_applied_ids, slot_cache) for b in bookings]
     # Exclude fully-paid — they live in AP only
     rows = [r for r in all_rows if r["payment_status"] != PaymentStatus.FULLY_PAID.value]
 
-    return {
+    return FastJSONResponse({
         "metrics": {
             "total_ar":       round(sum(r["amount_owed"] for r in rows), 2),
             "overdue_ar":     round(sum(r["amount_owed"] for r in rows if r["deposit_overdue"] or r["balance_overdue"]), 2),
@@ -205,12 +231,12 @@ async def get_accounts_receivable(
             "total_bookings": len(rows),
         },
         "bookings": rows,
-    }
+    })
 
 
 # ─── AP: Accounts Payable (permits purchased) ─────────────────────────────────
 
-@router.get("/ap")
+@router.get("/ap", response_class=FastJSONResponse)
 async def get_accounts_payable(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -227,14 +253,113 @@ async def get_accounts_payable(
 
     rows = [_booking_ap_row(b) for b in bookings]
 
-    return {
+    return FastJSONResponse({
         "metrics": {
             "total_ap":      round(sum(r["permit_cost"] for r in rows), 2),
             "total_permits": len(rows),
             "total_people":  sum(r["people"] or 0 for r in rows),
         },
         "bookings": rows,
-    }
+    })
+
+
+# ─── Streaming exports ────────────────────────────────────────────────────────
+
+EXPORT_BATCH = 1000
+
+_AR_EXPORT_COLUMNS = (
+    ("booking_id", "Booking ID"), ("booking_ref", "Booking ref"), ("booking_name", "Booking name"),
+    ("product", "Product"), ("trek_date", "Trek date"), ("people", "People"),
+    ("booking_status", "Booking status"), ("agent_client_name", "Agent / client"),
+    ("has_rolling_deposit", "Rolling deposit"), ("rd_applied", "RD applied"),
+    ("slots_available", "Slots available"), ("urgency", "Urgency"),
+    ("payment_status", "Payment status"), ("validation_status", "Validation status"),
+    ("amount", "Amount"), ("deposit_amount", "Deposit amount"), ("deposit_paid", "Deposit paid"),
+    ("balance_due", "Balance due"), ("amount_owed", "Amount owed"),
+    ("deposit_due_date", "Deposit due"), ("balance_due_date", "Balance due date"),
+    ("deposit_overdue", "Deposit overdue"), ("balance_overdue", "Balance overdue"),
+)
+
+_AP_EXPORT_COLUMNS = (
+    ("booking_id", "Booking ID"), ("booking_ref", "Booking ref"), ("booking_name", "Booking name"),
+    ("product", "Product"), ("trek_date", "Trek date"), ("people", "People"),
+    ("booking_status", "Booking status"), ("agent_client_name", "Agent / client"),
+    ("unit_cost", "Unit cost"), ("permit_cost", "Permit cost"), ("payment_status", "Payment status"),
+    ("processed_by", "Processed by"), ("processed_at", "Processed at"),
+)
+
+
+def _export_bookings(db: Session, statuses, start_date, end_date, agent_id):
+    """Bookings in ``statuses`` by trek date, read in batches rather than all at once."""
+    trek_date = func.coalesce(Booking.trekking_date, Booking.date)
+    query = (
+        db.query(Booking)
+        .options(
+            joinedload(Booking.payment).joinedload(Payment.validator),
+            joinedload(Booking.agent_client_rel),
+        )
+        .filter(Booking.booking_status.in_(statuses))
+    )
+    if start_date:
+        query = query.filter(trek_date >= start_date)
+    if end_date:
+        query = query.filter(trek_date <= end_date)
+    if agent_id is not None:
+        query = query.filter(Booking.agent_client_id == agent_id)
+    return query.order_by(Booking.trekking_date.asc().nullslast(), Booking.id).yield_per(EXPORT_BATCH)
+
+
+def _ar_export_rows(start_date, end_date, agent_id):
+    # Own session: the response body is produced after the request's dependencies return
+    db = SessionLocal()
+    try:
+        rd_applied_ids = _rd_applied_booking_ids(db)
+        slot_cache = {}
+        for booking in _export_bookings(db, _OUTSTANDING_STATUSES, start_date, end_date, agent_id):
+            row = _booking_ar_row(booking, db, rd_applied_ids, slot_cache)
+            if row["payment_status"] != PaymentStatus.FULLY_PAID.value:
+                yield row
+    finally:
+        db.close()
+
+
+def _ap_export_rows(start_date, end_date, agent_id):
+    db = SessionLocal()
+    try:
+        for booking in _export_bookings(db, _SECURED_STATUSES, start_date, end_date, agent_id):
+            yield _booking_ap_row(booking)
+    finally:
+        db.close()
+
+
+@router.get("/ar/export")
+async def export_accounts_receivable(
+    fmt: str = Query("csv", alias="format"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    agent_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+):
+    """Stream the AR list as CSV or XLSX, filtered by trek date range and agent."""
+    _require_finance(current_user)
+    check_export_args(fmt, start_date, end_date)
+    return export_response(_AR_EXPORT_COLUMNS, _ar_export_rows(start_date, end_date, agent_id),
+                           fmt, "accounts-receivable")
+
+
+@router.get("/ap/export")
+async def export_accounts_payable(
+    fmt: str = Query("csv", alias="format"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    agent_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+):
+    """Stream the AP (permits purchased) list as CSV or XLSX."""
+    _require_finance(current_user)
+    check_export_args(fmt, start_date, end_date)
+    return export_response(_AP_EXPORT_COLUMNS, _ap_export_rows(start_date, end_date, agent_id),
+                           fmt, "accounts-payable")
 
 
 # ─── AP: Rolling Deposit (what we hold on behalf of agents) ───────────────────
@@ -247,27 +372,16 @@ async def get_rolling_deposit_summary(
     """Summary of all agent rolling deposit accounts."""
     _require_finance(current_user)
 
-    agents = db.query(AgentClient).filter(AgentClient.has_rolling_deposit == True).all()
+    agents = (
+        db.query(AgentClient, RollingDepositTotals)
+        .outerjoin(RollingDepositTotals, RollingDepositTotals.agent_client_id == AgentClient.id)
+        .filter(AgentClient.has_rolling_deposit == True)
+        .all()
+    )
 
     rows = []
-    for ac in agents:
-        txns = (
-            db.query(RollingDepositTransaction)
-            .filter(RollingDepositTransaction.agent_client_id == ac.id)
-            .all()
-        )
-        applied_by_booking  = defaultdict(float)
-        returned_by_booking = defaultdict(float)
-        for t in txns:
-            if t.type == RollingDepositTransactionType.APPLIED:
-                applied_by_booking[t.booking_id] += t.amount
-            elif t.type == RollingDepositTransactionType.RETURNED:
-                returned_by_booking[t.booking_id] += t.amount
-
-        pending_return = round(
-            sum(applied_by_booking[bid] - returned_by_booking.get(bid, 0)
-                for bid in applied_by_booking), 2
-        )
+    for ac, totals in agents:
+        pending_return = round(totals.pending_return, 2) if totals else 0.0
 
         rows.append({
             "agent_client_id":         ac.id,
@@ -293,45 +407,54 @@ async def get_rolling_deposit_summary(
 @router.get("/rolling-deposit/{agent_id}/ledger")
 async def get_agent_ledger(
     agent_id: int,
+    limit: int = 100,
+    offset: int = 0,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Full transaction ledger for one agent, plus pending returns list."""
+    """One page of an agent's transaction ledger (newest first), plus pending returns list."""
     _require_finance(current_user)
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
 
     ac = db.query(AgentClient).filter(AgentClient.id == agent_id).first()
     if not ac:
         raise HTTPException(status_code=404, detail="Agent not found")
 
+    ledger = db.query(RollingDepositTransaction).filter(RollingDepositTransaction.agent_client_id == agent_id)
+    total = ledger.count()
     txns = (
-        db.query(RollingDepositTransaction)
-        .filter(RollingDepositTransaction.agent_client_id == agent_id)
-        .order_by(RollingDepositTransaction.created_at.desc())
+        ledger
+        .options(joinedload(RollingDepositTransaction.booking), joinedload(RollingDepositTransaction.creator))
+        .order_by(RollingDepositTransaction.created_at.desc(), RollingDepositTransaction.id.desc())
+        .offset(offset)
+        .limit(limit)
         .all()
     )
 
-    # Build pending returns: bookings where applied > returned
-    applied_by_booking  = defaultdict(float)
-    returned_by_booking = defaultdict(float)
-    booking_names       = {}
-    for t in txns:
-        if t.booking_id:
-            booking_names[t.booking_id] = t.booking.booking_name if t.booking else f"#{t.booking_id}"
-        if t.type == RollingDepositTransactionType.APPLIED:
-            applied_by_booking[t.booking_id] += t.amount
-        elif t.type == RollingDepositTransactionType.RETURNED:
-            returned_by_booking[t.booking_id] += t.amount
-
+    # Pending returns: bookings where applied > returned, from the maintained per-booking state
+    pending = (
+        db.query(RollingDepositBookingState, Booking.booking_name)
+        .outerjoin(Booking, Booking.id == RollingDepositBookingState.booking_id)
+        .filter(
+            RollingDepositBookingState.agent_client_id == agent_id,
+            RollingDepositBookingState.applied > 0,
+            RollingDepositBookingState.outstanding > 0.01,
+        )
+        .order_by(RollingDepositBookingState.first_applied_at.desc())
+        .all()
+    )
     pending_returns = [
         {
-            "booking_id":   bid,
-            "booking_name": booking_names.get(bid, f"#{bid}"),
-            "applied":      round(applied_by_booking[bid], 2),
-            "returned":     round(returned_by_booking.get(bid, 0), 2),
-            "outstanding":  round(applied_by_booking[bid] - returned_by_booking.get(bid, 0), 2),
+            "booking_id":   state.booking_id,
+            "booking_name": booking_name or f"#{state.booking_id}",
+            "applied":      round(state.applied, 2),
+            "returned":     round(state.returned, 2),
+            "outstanding":  round(state.outstanding, 2),
         }
-        for bid in applied_by_booking
-        if applied_by_booking[bid] - returned_by_booking.get(bid, 0) > 0.01
+        for state, booking_name in pending
     ]
 
     return {
@@ -340,6 +463,9 @@ async def get_agent_ledger(
         "rolling_deposit_limit":   ac.rolling_deposit_limit,
         "rolling_deposit_balance": ac.rolling_deposit_balance,
         "pending_returns":         pending_returns,
+        "total_transactions":      total,
+        "limit":                   limit,
+        "offset":                  offset,
         "transactions": [
             {
                 "id":           t.id,
@@ -357,6 +483,21 @@ async def get_agent_ledger(
     }
 
 
+@router.post("/rolling-deposit/reconcile")
+async def post_reconcile_rolling_deposit(
+    agent_id: Optional[int] = None,
+    repair: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Check the maintained rolling-deposit totals against the ledger; repair=true rebuilds them."""
+    _require_finance(current_user)
+    result = reconcile_rolling_deposit(db, agent_id, repair=repair)
+    if repair:
+        db.commit()
+    return result
+
+
 class TopUpBody(BaseModel):
     amount: float
     notes: Optional[str] = ""
@@ -544,7 +685,8 @@ async def get_finance_metrics(
     now = datetime.utcnow()
 
     ar_bookings = db.query(Booking).filter(Booking.booking_status.in_(_OUTSTANDING_STATUSES)).all()
-    ar_rows = [r for r in [_booking_ar_row(b, db) for b in ar_bookings]
+    rd_applied_ids = _rd_applied_booking_ids(db)
+    ar_rows = [r for r in [_booking_ar_row(b, db, rd_applied_ids) for b in ar_bookings]
                if r["payment_status"] != PaymentStatus.FULLY_PAID.value]
 
     ap_bookings = db.query(Booking).filter(Booking.booking_status.in_(_SECURED_STATUSES)).all()
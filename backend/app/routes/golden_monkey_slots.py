@@ -1,20 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from ..database import get_db, SessionLocal
+from ..database import get_db
 from ..models.golden_monkey_slots import GoldenMonkeySlot
-from ..models.scrape_status import ScrapeStatus
 from ..utils.auth import get_current_user
-import sys
-import os
+from ..utils.fast_json import FastJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Allow importing scraper from backend root
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-from async_golden_monkey import scrape_golden_monkey_slots
-
 router = APIRouter()
 
 
@@ -42,7 +36,7 @@ def format_relative_time(updated_at):
         return f"{days} day{'s' if days != 1 else ''} ago"
 
 
-@router.get("")
+@router.get("", response_class=FastJSONResponse)
 async def get_golden_monkey_slots(
     start_date: str = None,
     end_date: str = None,
@@ -106,11 +100,11 @@ async def get_golden_monkey_slots(
             default=None
         )
 
-        return {
+        return FastJSONResponse({
             "slots": slot_list,
             "total": len(slot_list),
             "last_update": format_relative_time(most_recent_update)
-        }
+        })
 
     except HTTPException:
         raise
@@ -122,53 +116,16 @@ async def get_golden_monkey_slots(
         )
 
 
-async def run_golden_monkey_scrape_with_status(status_record_id: int):
-    """Wrapper that runs the scraper and updates ScrapeStatus on completion or failure."""
-    db = None
-    try:
-        db = SessionLocal()
-        results = await scrape_golden_monkey_slots()
-        slots_found = len(results) if results else 0
-        record = db.query(ScrapeStatus).filter(ScrapeStatus.id == status_record_id).first()
-        if record:
-            record.status = "success"
-            record.message = f"Scraped {slots_found} golden monkey slots"
-            db.commit()
-    except Exception as e:
-        logger.error(f"Background golden monkey scrape failed: {str(e)}")
-        if db:
-            record = db.query(ScrapeStatus).filter(ScrapeStatus.id == status_record_id).first()
-            if record:
-                record.status = "failed"
-                record.message = f"Scraping failed: {str(e)}"
-                db.commit()
-    finally:
-        if db:
-            db.close()
-
-
 @router.post("/trigger-scrape")
 async def trigger_golden_monkey_scrape(
-    background_tasks: BackgroundTasks,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Queue a scrape job for golden monkey permits over the next 30 days."""
+    from ..services.scrape_jobs import submit_job
+    today = datetime.now().date()
     try:
-        status_record = ScrapeStatus(
-            status="queued",
-            message="Golden monkey scraping queued",
-            last_run=datetime.utcnow()
-        )
-        db.add(status_record)
-        db.commit()
-        db.refresh(status_record)
-
-        background_tasks.add_task(run_golden_monkey_scrape_with_status, status_record.id)
-
-        return {"message": "Golden Monkey slot scraping initiated"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+        job, _ = submit_job(db, ["golden_monkey"], today, today + timedelta(days=29), requested_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Golden Monkey slot scraping initiated", "job_id": job.id}
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+
+from ..config import settings
+from ..database import SessionLocal
+from ..utils import metrics
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@metrics.on_collect
+def collect_scrape_metrics():
+    """Per-product scrape staleness, retry backlog and last-hour throughput."""
+    from ..models.product_availability import ProductAvailability
+    from ..models.scrape_retry import ScrapeRetry
+    from ..models.scrape_telemetry import ScrapeDateTiming
+    from ..services.product_catalogue import LEGACY_SLOT_MODELS, scrape_targets
+
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for gauge in (metrics.scrape_dates_stored, metrics.scrape_oldest_age, metrics.scrape_newest_age,
+                      metrics.scrape_retry_pending, metrics.scrape_checks_last_hour, metrics.scrape_latency_last_hour):
+            gauge.clear()
+
+        for target in scrape_targets(db):
+            # Legacy products are read from their own tables, as availability_rows() does
+            model = LEGACY_SLOT_MODELS.get(target.key) or ProductAvailability
+            query = db.query(func.count(model.id), func.min(model.updated_at), func.max(model.updated_at))
+            if model is ProductAvailability:
+                query = query.filter(ProductAvailability.product_id == target.product_id)
+            count, oldest, newest = query.one()
+            metrics.scrape_dates_stored.set(count, product=target.key)
+            if oldest is not None:
+                metrics.scrape_oldest_age.set((now - oldest).total_seconds(), product=target.key)
+                metrics.scrape_newest_age.set((now - newest).total_seconds(), product=target.key)
+            metrics.scrape_retry_pending.set(0, product=target.key)
+
+        for product, pending in db.query(ScrapeRetry.product, func.count()).group_by(ScrapeRetry.product):
+            metrics.scrape_retry_pending.set(pending, product=product)
+
+        since = now - timedelta(hours=1)
+        rows = (
+            db.query(ScrapeDateTiming.product, ScrapeDateTiming.outcome, func.count(), func.avg(ScrapeDateTiming.latency_ms))
+            .filter(ScrapeDateTiming.checked_at >= since)
+            .group_by(ScrapeDateTiming.product, ScrapeDateTiming.outcome)
+            .all()
+        )
+        latency = {}
+        for product, outcome, checks, avg_ms in rows:
+            metrics.scrape_checks_last_hour.set(checks, product=product, outcome=outcome)
+            total, n = latency.get(product, (0.0, 0))
+            latency[product] = (total + (avg_ms or 0) * checks, n + checks)
+        for product, (total, n) in latency.items():
+            metrics.scrape_latency_last_hour.set(total / n / 1000.0, product=product)
+    finally:
+        db.close()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of the in-process metrics (404 when disabled)."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=CONTENT_TYPE)
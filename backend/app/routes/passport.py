@@ -2,26 +2,22 @@ from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile,
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.passport_data import PassportData
-from ..models.user import User
+from ..models.user import User, UserRole
 from ..utils.auth import get_current_user
 from datetime import datetime
-import shutil
 import os
 from typing import Optional, List, Dict
 from pydantic import BaseModel
 from datetime import date
 import logging
 from ..utils.passport_extractor import PassportExtractor
+from ..services.upload_store import get_upload_store, UploadTooLarge
 from fastapi.responses import JSONResponse
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Absolute path for uploads so os.path.exists() works regardless of working directory
-_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_DIR = os.path.join(_BASE_DIR, "uploads", "passports")
-
 class PassportDataCreate(BaseModel):
     full_name: str
     date_of_birth: date
@@ -99,7 +95,6 @@ async def upload_passport_documents(
     db: Session = Depends(get_db)
 ):
     uploaded_files = []
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
     
     # Validate file types
     allowed_types = {
@@ -122,15 +117,10 @@ async def upload_passport_documents(
                 ))
                 continue
 
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_filename = "".join(c for c in file.filename if c.isalnum() or c in ('-', '_', '.'))
-            file_path = os.path.join(UPLOAD_DIR, f"{current_user.id}_{timestamp}_{safe_filename}")
-            
-            # Save file
+            # Stream to the shared upload store (deduplicated by content hash)
             try:
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                stored = await get_upload_store().save(file, "passports")
+                file_path = await get_upload_store().local_path(stored.key)
                 
                 uploaded_files.append(UploadResponse(
                     filename=file.filename,
@@ -138,6 +128,13 @@ async def upload_passport_documents(
                     status="success"
                 ))
                 
+            except UploadTooLarge as e:
+                uploaded_files.append(UploadResponse(
+                    filename=file.filename,
+                    path="",
+                    status="error",
+                    error=str(e)
+                ))
             except Exception as e:
                 logger.error(f"Error saving file {file.filename}: {str(e)}")
                 uploaded_files.append(UploadResponse(
@@ -306,4 +303,19 @@ async def extract_passport_data(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.get("/ocr-status")
+async def get_ocr_status(
+    warm_up: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Memory and load status of the shared OCR engines; optionally load them now"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPERUSER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    from ..utils.ocr_engines import ocr_engines
+    if warm_up:
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, ocr_engines.warm_up)
+    return ocr_engines.memory_report()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
 import os
@@ -6,16 +6,17 @@ import logging
 from pydantic import BaseModel
 from ..utils.auth import get_current_user
 from ..utils.voucher_extractor import extract_voucher_data, VoucherData
-from ..models import Booking, User
+from ..models import Booking, User, VoucherImport
+from ..models.user import UserRole
 from ..database import get_db
+from ..services.upload_store import get_upload_store
+from ..services.booking_events import record_event
+from ..services.capacity_index import sync_booking
+from ..services.voucher_imports import QUEUED, REQUIRED_FIELDS, import_report, run_import, stage_upload
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_DIR = os.path.join(_BASE_DIR, "uploads", "vouchers")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 class ExtractRequest(BaseModel):
     file_paths: List[str]
     booking_id: Optional[int] = None
@@ -52,12 +53,9 @@ async def upload_voucher(
                 })
                 continue
 
-            # Save file
-            safe_name = "".join(c for c in file.filename if c.isalnum() or c in ('-', '_', '.'))
-            file_path = os.path.join(UPLOAD_DIR, safe_name)
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            # Stream to the shared upload store (deduplicated by content hash)
+            stored = await get_upload_store().save(file, "vouchers")
+            file_path = await get_upload_store().local_path(stored.key)
             
             results.append({
                 "filename": file.filename,
@@ -104,11 +102,7 @@ async def extract_data(
             voucher_dict = await extract_voucher_data(file_path)
             
             # Check if all required fields are present
-            required_fields = [
-                'booking_name', 'booking_reference', 'trek_date',
-                'head_of_file', 'request_date', 'product_type', 'number_of_people'
-            ]
-            missing_fields = [field for field in required_fields if not voucher_dict.get(field)]
+            missing_fields = [field for field in REQUIRED_FIELDS if not voucher_dict.get(field)]
             
             if missing_fields:
                 results[file_path] = ExtractionResult(
@@ -124,7 +118,11 @@ async def extract_data(
                     Booking.id == request.booking_id
                 ).first()
                 if target_booking:
-                    target_booking.update_from_voucher(voucher_dict)
+                    previous_status = target_booking.booking_status
+                    target_booking.update_from_voucher(voucher_dict)  # moves the booking to REQUESTED
+                    record_event(db, target_booking, "voucher_submitted", f"Voucher {voucher_dict['booking_reference']}",
+                                 current_user.id, from_status=previous_status, to_status=target_booking.booking_status)
+                    sync_booking(db, target_booking)
                     db.commit()
                     logger.info(f"Updated booking {request.booking_id} with voucher data")
                 else:
@@ -136,7 +134,11 @@ async def extract_data(
                 ).first()
 
                 if existing_booking:
-                    existing_booking.update_from_voucher(voucher_dict)
+                    previous_status = existing_booking.booking_status
+                    existing_booking.update_from_voucher(voucher_dict)  # moves the booking to REQUESTED
+                    record_event(db, existing_booking, "voucher_submitted", f"Voucher {voucher_dict['booking_reference']}",
+                                 current_user.id, from_status=previous_status, to_status=existing_booking.booking_status)
+                    sync_booking(db, existing_booking)
                     db.commit()
                     logger.info(f"Updated existing booking: {existing_booking.booking_ref}")
                 else:
@@ -144,6 +146,10 @@ async def extract_data(
                     new_booking.user_id = current_user.id
                     new_booking.update_from_voucher(voucher_dict)
                     db.add(new_booking)
+                    record_event(db, new_booking, "created", f"From voucher {voucher_dict['booking_reference']}",
+                                 current_user.id, to_status=new_booking.booking_status)
+                    db.flush()
+                    sync_booking(db, new_booking)
                     db.commit()
                     logger.info(f"Created new booking: {new_booking.booking_ref}")
             
@@ -158,12 +164,36 @@ async def extract_data(
                 status="error",
                 error=str(e)
             )
-        finally:
-            # Cleanup uploaded file
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception as e:
-                logger.warning(f"Error cleaning up file {file_path}: {str(e)}")
     
-    return results 
\ No newline at end of file
+    return results 
+
+@router.post("/imports", status_code=status.HTTP_202_ACCEPTED)
+async def create_voucher_import(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import a zip or several voucher files; extraction and booking upserts continue in the background."""
+    try:
+        job = await stage_upload(db, files, current_user.id)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    db.commit()
+    if job.status == QUEUED:
+        background_tasks.add_task(run_import, job.id)
+    return import_report(db, job)
+
+@router.get("/imports/{import_id}")
+async def get_voucher_import(
+    import_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """An import's progress and per-file report."""
+    job = db.get(VoucherImport, import_id)
+    if job is None or (job.requested_by != current_user.id
+                       and current_user.role not in (UserRole.ADMIN, UserRole.SUPERUSER)):
+        raise HTTPException(status_code=404, detail="Import not found")
+    return import_report(db, job)
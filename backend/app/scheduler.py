@@ -4,9 +4,12 @@ Daily background scheduler — runs booking/payment/slot maintenance jobs.
 Jobs:
   1. advance_chase        — send weekly chase notifications; auto-release after 5
   2. detect_overdue       — flag bookings with overdue deposits → CHASE / AWAITING_AUTHORIZATION
-  3. slot_alerts          — notify admins when gorilla (<20) or monkey (<10) slots are low
+  3. slot_alerts          — sweep stored availability for low-slot crossings the writers missed
   4. topup_alerts         — remind finance + owner of upcoming 45-day balance due date
   5. passport_alerts      — alert admins about bookings with missing passport/voucher data
+  6. scrape_telemetry     — roll up and prune old scrape timings
+  7. rolling_deposit      — rebuild rolling-deposit totals that drifted from the ledger
+  8. capacity_index       — rebuild per-date booking demand that drifted from the bookings
 """
 
 import logging
@@ -50,6 +53,7 @@ def advance_chase():
     from .models.chase import ChaseRecord, ChaseStatus
     from .models.booking import BookingStatus
     from .models.user import UserRole
+    from .services.booking_events import transition_booking
 
     db = _db()
     try:
@@ -75,7 +79,8 @@ def advance_chase():
             if record.chase_count >= 5:
                 # Auto-release after 5 weekly chases
                 record.status = ChaseStatus.RELEASED
-                booking.booking_status = BookingStatus.RELEASED
+                transition_booking(db, booking, BookingStatus.RELEASED, "released",
+                                   f"Auto-released after {record.chase_count} unanswered chase reminders")
                 # Notify owner
                 _notify(
                     db, booking.user_id,
@@ -140,6 +145,7 @@ def detect_overdue():
     from .models.payment import Payment, PaymentStatus
     from .models.chase import ChaseRecord, ChaseStatus
     from .models.user import UserRole
+    from .services.booking_events import transition_booking
 
     db = _db()
     try:
@@ -160,7 +166,8 @@ def detect_overdue():
         for booking in overdue_bookings:
             agent = booking.user
             if agent and (agent.is_trusted_agent or agent.has_rolling_deposit):
-                booking.booking_status = BookingStatus.AWAITING_AUTHORIZATION
+                transition_booking(db, booking, BookingStatus.AWAITING_AUTHORIZATION, "overdue",
+                                   "Deposit overdue — trusted agent, routed to authorization")
                 _notify(
                     db, booking.user_id,
                     "Payment Overdue — Authorization Required",
@@ -182,7 +189,8 @@ def detect_overdue():
                 if existing:
                     continue
 
-                booking.booking_status = BookingStatus.CHASE
+                transition_booking(db, booking, BookingStatus.CHASE, "chase",
+                                   "Deposit overdue — 1/5 chase attempts")
                 chase = ChaseRecord(
                     booking_id=booking.id,
                     chase_count=1,
@@ -222,67 +230,21 @@ def detect_overdue():
 
 def slot_alerts():
     """
-    Notify admins when available slots are low:
-      - Gorilla: < 20 (threshold) on any upcoming date
-      - Golden Monkey: < 10 on any upcoming date
-    """
-    from .models.available_slots import AvailableSlot
-    from .models.golden_monkey_slots import GoldenMonkeySlot
-    from .models.user import UserRole
+    Re-check stored availability against the low-slot alert rules.
 
-    GORILLA_THRESHOLD = 20
-    MONKEY_THRESHOLD = 10
+    The scrapers alert as they write (services/slot_alerts.py). This sweep
+    catches dates that crossed without a new scrape: bookings placed on them,
+    or a rule tightened by an admin.
+    """
+    from .services.slot_alerts import sweep
 
     db = _db()
     try:
-        today = datetime.utcnow().date()
-
-        gorilla_low = (
-            db.query(AvailableSlot)
-            .filter(
-                AvailableSlot.date >= today,
-                AvailableSlot.available_slots < GORILLA_THRESHOLD,
-                AvailableSlot.available_slots > 0,
-            )
-            .order_by(AvailableSlot.date)
-            .limit(10)
-            .all()
-        )
-
-        monkey_low = (
-            db.query(GoldenMonkeySlot)
-            .filter(
-                GoldenMonkeySlot.date >= today,
-                GoldenMonkeySlot.available_slots < MONKEY_THRESHOLD,
-                GoldenMonkeySlot.available_slots > 0,
-            )
-            .order_by(GoldenMonkeySlot.date)
-            .limit(10)
-            .all()
-        )
-
-        if gorilla_low:
-            dates_str = ", ".join(f"{s.date} ({s.available_slots} slots)" for s in gorilla_low)
-            _notify_role(
-                db, [UserRole.ADMIN, UserRole.SUPERUSER],
-                "Low Gorilla Slots Alert",
-                f"Gorilla slots below {GORILLA_THRESHOLD} on: {dates_str}",
-            )
-
-        if monkey_low:
-            dates_str = ", ".join(f"{s.date} ({s.available_slots} slots)" for s in monkey_low)
-            _notify_role(
-                db, [UserRole.ADMIN, UserRole.SUPERUSER],
-                "Low Golden Monkey Slots Alert",
-                f"Golden Monkey slots below {MONKEY_THRESHOLD} on: {dates_str}",
-            )
-
-        db.commit()
-        if gorilla_low or monkey_low:
-            logger.info(
-                f"[Scheduler] slot_alerts: {len(gorilla_low)} gorilla dates, {len(monkey_low)} monkey dates below threshold"
-            )
+        crossed = sweep(db)
+        if crossed:
+            logger.info(f"[Scheduler] slot_alerts: {crossed} dates crossed their threshold")
     except Exception as exc:
+        db.rollback()
         logger.error(f"[Scheduler] slot_alerts error: {exc}")
     finally:
         db.close()
@@ -464,6 +426,78 @@ def passport_voucher_alerts():
         db.close()
 
 
+# ---------------------------------------------------------------------------
+# Job 6 — Scrape telemetry retention
+# ---------------------------------------------------------------------------
+
+def scrape_telemetry_rollup():
+    """
+    Fold per-date scrape timings older than SCRAPE_TELEMETRY_DETAIL_DAYS into
+    daily rollups, delete runs/batches older than SCRAPE_TELEMETRY_RUN_DAYS,
+    and mark runs left 'running' by a dead worker as abandoned.
+    """
+    from .services.scrape_telemetry import rollup_and_prune
+
+    db = _db()
+    try:
+        result = rollup_and_prune(db)
+        logger.info(f"[Scheduler] scrape_telemetry_rollup: {result}")
+    except Exception as exc:
+        db.rollback()
+        logger.error(f"[Scheduler] scrape_telemetry_rollup error: {exc}")
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Job 7 — Rolling deposit aggregate reconciliation
+# ---------------------------------------------------------------------------
+
+def rolling_deposit_reconcile():
+    """
+    Check the maintained rolling-deposit totals and per-booking states against
+    the ledger and rewrite any that drifted (e.g. after a manual SQL fix).
+    """
+    from .services.rolling_deposit import reconcile_rolling_deposit
+
+    db = _db()
+    try:
+        result = reconcile_rolling_deposit(db, repair=True)
+        db.commit()
+        logger.info(
+            f"[Scheduler] rolling_deposit_reconcile: {len(result['discrepancies'])} discrepancies, "
+            f"{len(result['balance_drift'])} balance mismatches"
+        )
+    except Exception as exc:
+        db.rollback()
+        logger.error(f"[Scheduler] rolling_deposit_reconcile error: {exc}")
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Job 8 — Capacity index reconciliation
+# ---------------------------------------------------------------------------
+
+def capacity_index_reconcile():
+    """
+    Check the per-date committed/pending permit counts against the bookings
+    and rewrite any that drifted (e.g. a booking changed outside the API).
+    """
+    from .services.capacity_index import reconcile_capacity_index
+
+    db = _db()
+    try:
+        result = reconcile_capacity_index(db, repair=True)
+        db.commit()
+        logger.info(f"[Scheduler] capacity_index_reconcile: {len(result['discrepancies'])} discrepancies")
+    except Exception as exc:
+        db.rollback()
+        logger.error(f"[Scheduler] capacity_index_reconcile error: {exc}")
+    finally:
+        db.close()
+
+
 # ---------------------------------------------------------------------------
 # Scheduler setup
 # ---------------------------------------------------------------------------
@@ -472,29 +506,63 @@ def create_scheduler():
     """
     Build and return a configured APScheduler AsyncIOScheduler.
     Call scheduler.start() in lifespan startup and scheduler.shutdown() on exit.
+    Jobs are wrapped for the /metrics job duration and last-success series.
     """
     from apscheduler.schedulers.asyncio import AsyncIOScheduler
     from apscheduler.triggers.cron import CronTrigger
     from apscheduler.triggers.interval import IntervalTrigger
 
+    from .config import settings
+    from .utils.metrics import instrument_job
+
     scheduler = AsyncIOScheduler()
 
     # Chase advancement — every hour (catches due records promptly)
-    scheduler.add_job(advance_chase, IntervalTrigger(hours=1), id="advance_chase", replace_existing=True)
+    scheduler.add_job(
+        instrument_job("advance_chase", advance_chase), IntervalTrigger(hours=1),
+        id="advance_chase", replace_existing=True,
+    )
 
     # Overdue detection — daily at 06:00 UTC
-    scheduler.add_job(detect_overdue, CronTrigger(hour=6, minute=0), id="detect_overdue", replace_existing=True)
+    scheduler.add_job(
+        instrument_job("detect_overdue", detect_overdue), CronTrigger(hour=6, minute=0),
+        id="detect_overdue", replace_existing=True,
+    )
 
-    # Slot alerts — daily at 07:00 UTC
-    scheduler.add_job(slot_alerts, CronTrigger(hour=7, minute=0), id="slot_alerts", replace_existing=True)
+    # Slot alert sweep — every SLOT_ALERT_SWEEP_MINUTES (scrapes alert as they write)
+    scheduler.add_job(
+        instrument_job("slot_alerts", slot_alerts), IntervalTrigger(minutes=settings.SLOT_ALERT_SWEEP_MINUTES),
+        id="slot_alerts", replace_existing=True,
+    )
 
     # Top-up / balance due alerts — daily at 07:30 UTC
-    scheduler.add_job(topup_alerts, CronTrigger(hour=7, minute=30), id="topup_alerts", replace_existing=True)
+    scheduler.add_job(
+        instrument_job("topup_alerts", topup_alerts), CronTrigger(hour=7, minute=30),
+        id="topup_alerts", replace_existing=True,
+    )
 
     # Passport / voucher alerts — daily at 08:00 UTC
     scheduler.add_job(
-        passport_voucher_alerts, CronTrigger(hour=8, minute=0),
+        instrument_job("passport_voucher_alerts", passport_voucher_alerts), CronTrigger(hour=8, minute=0),
         id="passport_voucher_alerts", replace_existing=True,
     )
 
+    # Scrape telemetry rollup / retention — daily at 03:00 UTC
+    scheduler.add_job(
+        instrument_job("scrape_telemetry_rollup", scrape_telemetry_rollup), CronTrigger(hour=3, minute=0),
+        id="scrape_telemetry_rollup", replace_existing=True,
+    )
+
+    # Rolling deposit reconciliation — daily at 03:30 UTC
+    scheduler.add_job(
+        instrument_job("rolling_deposit_reconcile", rolling_deposit_reconcile), CronTrigger(hour=3, minute=30),
+        id="rolling_deposit_reconcile", replace_existing=True,
+    )
+
+    # Capacity index reconciliation — daily at 03:45 UTC
+    scheduler.add_job(
+        instrument_job("capacity_index_reconcile", capacity_index_reconcile), CronTrigger(hour=3, minute=45),
+        id="capacity_index_reconcile", replace_existing=True,
+    )
+
     return scheduler
@@ -0,0 +1,139 @@
+"""
+Columnar availability calendar for several products at once.
+
+GET /available-slots returns one dict per date and product, each with an
+id, a timestamp and a relative_time string, so a two-year view of both
+legacy products means two large responses. ``calendar`` answers any set of
+catalogue products over a date range in one payload:
+
+  - ``dates``: every day in the range, dd/mm/yyyy
+  - per product, ``slots`` (int, or null when the date has no usable
+    value) and ``sold_out`` (0/1), both aligned with ``dates``
+  - ``months`` plus per product ``month_updated_at``: when the scraper last
+    wrote anything in each month, and ``updated_at``, the latest of those
+
+The version is the scraper's own write stamp: for each product and month in
+the range, the row count and latest updated_at. Every writer (the engines,
+the retry queue, fast_scrapers and the manual upload) sets updated_at, so
+the version moves exactly when stored availability does. Encoded payloads
+are kept per (products, range) in a small in-process LRU and reused while
+their version is unchanged. The route also serves the version as an ETag,
+so an unchanged calendar costs the client a 304.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, func
+from sqlalchemy.orm import Session
+
+from ..utils.fast_json import dumps
+from .product_catalogue import DATE_FORMAT, availability_query, slot_count
+
+CACHE_ENTRIES = 32
+
+_cache: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _month(day: date) -> str:
+    return day.strftime("%m/%Y")
+
+
+def _months(start: date, end: date) -> List[str]:
+    months, day = [], start.replace(day=1)
+    while day <= end:
+        months.append(_month(day))
+        day = (day + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def month_stamps(db: Session, keys: Sequence[str], months: Sequence[str]) -> Dict[str, Dict[str, tuple]]:
+    """{key: {"mm/yyyy": (rows, latest updated_at)}} for the given months.
+
+    Raises KeyError for a key that is not in the catalogue.
+    """
+    wanted = set(months)
+    stamps = {}
+    for key in keys:
+        found = availability_query(db, key)
+        if found is None:
+            raise KeyError(key)
+        model, query = found
+        month = func.substr(model.date, 4, 7, type_=String)
+        rows = query.with_entities(month, func.count(model.id), func.max(model.updated_at)).group_by(month).all()
+        stamps[key] = {month: (count, latest) for month, count, latest in rows if month in wanted}
+    return stamps
+
+
+def _version(stamps: Dict[str, Dict[str, tuple]]) -> str:
+    digest = hashlib.sha1()
+    for key in sorted(stamps):
+        for month, (count, latest) in sorted(stamps[key].items()):
+            digest.update(f"{key}|{month}|{count}|{latest.isoformat() if latest else ''};".encode())
+    return digest.hexdigest()[:20]
+
+
+def _build(db: Session, keys: Sequence[str], start: date, end: date, months: List[str],
+           stamps: Dict[str, Dict[str, tuple]], version: str) -> dict:
+    days = (end - start).days + 1
+    dates = [(start + timedelta(days=offset)).strftime(DATE_FORMAT) for offset in range(days)]
+    products = {}
+    for key in keys:
+        slots: List[Optional[int]] = [None] * days
+        sold_out = [0] * days
+        _, query = availability_query(db, key)
+        for row in query.all():
+            try:
+                offset = (datetime.strptime(row.date, DATE_FORMAT).date() - start).days
+            except (TypeError, ValueError):
+                continue
+            if 0 <= offset < days:
+                slots[offset] = slot_count(row.slots)
+                sold_out[offset] = int(slots[offset] == 0)
+        month_updated_at = [stamps[key].get(month, (0, None))[1] for month in months]
+        products[key] = {
+            "slots": slots,
+            "sold_out": sold_out,
+            "updated_at": max((stamp for stamp in month_updated_at if stamp), default=None),
+            "month_updated_at": month_updated_at,
+        }
+    return {
+        "version": version,
+        "start_date": dates[0],
+        "end_date": dates[-1],
+        "dates": dates,
+        "months": months,
+        "products": products,
+    }
+
+
+def calendar(db: Session, keys: Sequence[str], start: date, end: date) -> Tuple[str, bytes]:
+    """(version, encoded JSON payload) for ``keys`` from ``start`` to ``end`` inclusive.
+
+    Raises KeyError for a key that is not in the catalogue.
+    """
+    keys = list(dict.fromkeys(keys))
+    months = _months(start, end)
+    stamps = month_stamps(db, keys, months)
+    version = _version(stamps)
+    cache_key = (tuple(keys), start, end)
+    with _lock:
+        cached = _cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(cache_key)
+            return cached
+    body = dumps(_build(db, keys, start, end, months, stamps, version))
+    with _lock:
+        _cache[cache_key] = (version, body)
+        _cache.move_to_end(cache_key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return version, body
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,238 @@
+"""
+Booking event log — the append-only history behind booking timelines.
+
+Every booking status change goes through ``transition_booking``, which sets
+the new status and writes a booking_events row in the caller's transaction
+(the caller commits). Milestones that don't move the status, such as an
+authorization request or an appeal, use ``record_event``. Each row stores the
+real time of the change and a ready-to-show detail line. ``booking_timeline``
+therefore reads a booking's history with one indexed range scan instead of
+reassembling it from the authorization, amendment, cancellation and chase
+tables.
+
+``backfill_booking_events`` builds a best-effort history for bookings that
+predate the log, from those same tables.
+
+Rows are never updated. The one exception to append-only is deleting a
+booking (DELETE /bookings/{id}): its events go with it, because a timeline
+cannot be read without its booking.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from ..models.booking import Booking, BookingStatus
+from ..models.booking_event import BookingEvent
+from ..models.user import User
+from .capacity_index import sync_booking
+
+logger = logging.getLogger(__name__)
+
+# event_type -> (timeline title, timeline colour)
+EVENT_STYLES = {
+    "created":                ("Booking Created", "gray"),
+    "status_changed":         ("Status Changed", "gray"),
+    "voucher_submitted":      ("Voucher Submitted", "blue"),
+    "confirmation_requested": ("Confirmation Requested", "blue"),
+    "sent_to_finance":        ("Sent to Finance", "blue"),
+    "confirmed":              ("Booking Confirmed", "green"),
+    "rejected":               ("Booking Rejected", "red"),
+    "payment_recorded":       ("Payment Recorded", "blue"),
+    "payment_validated":      ("Payment Validated", "green"),
+    "overdue":                ("Payment Overdue", "red"),
+    "auth_requested":         ("Authorization Requested", "orange"),
+    "auth_approved":          ("Authorization Approved", "green"),
+    "auth_declined":          ("Authorization Declined", "red"),
+    "appeal":                 ("Appeal Filed", "purple"),
+    "appeal_reviewed":        ("Appeal Reviewed", "purple"),
+    "chase":                  ("Chase Initiated", "red"),
+    "chase_resolved":         ("Chase Resolved", "green"),
+    "released":               ("Booking Released", "red"),
+    "permits_secured":        ("Permits Secured", "green"),
+    "amendment":              ("Amendment Requested", "orange"),
+    "amendment_confirmed":    ("Amendment Confirmed", "green"),
+    "amendment_rejected":     ("Amendment Rejected", "gray"),
+    "cancellation":           ("Cancellation Requested", "red"),
+    "cancelled":              ("Booking Cancelled", "red"),
+    "cancellation_rejected":  ("Cancellation Rejected", "gray"),
+}
+
+
+def _status_value(status) -> Optional[str]:
+    return status.value if hasattr(status, "value") else status
+
+
+def status_label(status) -> str:
+    value = _status_value(status)
+    return value.replace("_", " ").title() if value else "Unknown"
+
+
+def record_event(
+    db: Session,
+    booking: Booking,
+    event_type: str,
+    detail: Optional[str] = None,
+    actor_id: Optional[int] = None,
+    from_status=None,
+    to_status=None,
+    at: Optional[datetime] = None,
+) -> BookingEvent:
+    """Append an event for ``booking`` (which may not be flushed yet)."""
+    if event_type not in EVENT_STYLES:
+        raise ValueError(f"Unknown booking event type: {event_type}")
+    event = BookingEvent(
+        booking=booking,
+        event_type=event_type,
+        from_status=_status_value(from_status),
+        to_status=_status_value(to_status),
+        detail=detail,
+        actor_id=actor_id,
+        created_at=at or datetime.utcnow(),
+    )
+    db.add(event)
+    return event
+
+
+def transition_booking(
+    db: Session,
+    booking: Booking,
+    new_status: BookingStatus,
+    event_type: str = "status_changed",
+    detail: Optional[str] = None,
+    actor_id: Optional[int] = None,
+) -> BookingEvent:
+    """Move ``booking`` to ``new_status``, log the change and update the capacity index; the caller commits."""
+    old_status = booking.booking_status
+    booking.booking_status = new_status
+    sync_booking(db, booking)
+    if detail is None:
+        detail = f"{status_label(old_status)} → {status_label(new_status)}"
+    return record_event(db, booking, event_type, detail, actor_id, from_status=old_status, to_status=new_status)
+
+
+def booking_timeline(db: Session, booking_id: int) -> list:
+    """Timeline entries for a booking, oldest first, with the last marked current."""
+    rows = (
+        db.query(BookingEvent, User.username)
+        .outerjoin(User, User.id == BookingEvent.actor_id)
+        .filter(BookingEvent.booking_id == booking_id)
+        .order_by(BookingEvent.created_at, BookingEvent.id)
+        .all()
+    )
+    events = [_event_dict(event, username) for event, username in rows]
+    if events:
+        events[-1]["is_current"] = True
+    return events
+
+
+def _event_dict(event: BookingEvent, username: Optional[str]) -> dict:
+    title, color = EVENT_STYLES.get(event.event_type, (event.event_type.replace("_", " ").title(), "gray"))
+    return {
+        "id": event.id,
+        "booking_id": event.booking_id,
+        "timestamp": event.created_at.isoformat() if event.created_at else None,
+        "type": event.event_type,
+        "title": title,
+        "detail": event.detail,
+        "color": color,
+        "from_status": event.from_status,
+        "to_status": event.to_status,
+        "actor": username,
+        "is_current": False,
+    }
+
+
+def recent_events(db: Session, limit: int = 100, before_id: Optional[int] = None,
+                  event_type: Optional[str] = None) -> list:
+    """Newest events across all bookings (keyset-paginated on id) for audit views."""
+    query = (
+        db.query(BookingEvent, User.username)
+        .outerjoin(User, User.id == BookingEvent.actor_id)
+    )
+    if before_id is not None:
+        query = query.filter(BookingEvent.id < before_id)
+    if event_type:
+        query = query.filter(BookingEvent.event_type == event_type)
+    return [_event_dict(event, username)
+            for event, username in query.order_by(BookingEvent.id.desc()).limit(limit)]
+
+
+def _short(text: Optional[str], length: int = 80) -> str:
+    if not text:
+        return "—"
+    return text[:length] + "…" if len(text) > length else text
+
+
+def backfill_booking_events(db: Session) -> int:
+    """Write reconstructed history for every booking that has no events yet.
+
+    Decision times were never stored before the log existed, so approvals and
+    declines are stamped with the request's creation time, as the old
+    timeline did. The caller commits.
+    """
+    from ..models.amendment import AmendmentRequest
+    from ..models.authorization import Appeal, AuthorizationRequest
+    from ..models.cancellation import CancellationRequest
+    from ..models.chase import ChaseRecord
+    from ..models.payment import Payment
+
+    logged = db.query(BookingEvent.booking_id).distinct().subquery()
+    missing = db.query(Booking.id).filter(Booking.id.notin_(db.query(logged.c.booking_id))).subquery()
+    usernames = dict(db.query(User.id, User.username))
+    rows = []
+
+    def add(booking_id, event_type, at, detail, actor_id=None, to_status=None):
+        rows.append({
+            "booking_id": booking_id, "event_type": event_type, "detail": detail, "actor_id": actor_id,
+            "to_status": to_status, "created_at": at or datetime.utcnow(),
+        })
+
+    for booking_id, created_at, status in db.query(Booking.id, Booking.created_at, Booking.booking_status).filter(
+        Booking.id.in_(db.query(missing.c.id))
+    ):
+        add(booking_id, "created", created_at, f"Current status: {status_label(status)}", to_status=_status_value(status))
+
+    for auth in db.query(AuthorizationRequest).filter(AuthorizationRequest.booking_id.in_(db.query(missing.c.id))):
+        add(auth.booking_id, "auth_requested", auth.created_at,
+            f"By {usernames.get(auth.requested_by, 'Unknown')}: {_short(auth.reason)}", auth.requested_by)
+        if auth.status in ("authorized", "declined"):
+            notes = f": {auth.authorizer_notes}" if auth.authorizer_notes else ""
+            add(auth.booking_id, "auth_approved" if auth.status == "authorized" else "auth_declined", auth.created_at,
+                f"By {usernames.get(auth.authorizer_id, 'Authorizer')}{notes}", auth.authorizer_id)
+
+    for appeal, booking_id in (
+        db.query(Appeal, AuthorizationRequest.booking_id)
+        .join(AuthorizationRequest, AuthorizationRequest.id == Appeal.authorization_request_id)
+        .filter(AuthorizationRequest.booking_id.in_(db.query(missing.c.id)))
+    ):
+        add(booking_id, "appeal", appeal.created_at, _short(appeal.appeal_notes))
+
+    for p in db.query(Payment).filter(Payment.booking_id.in_(db.query(missing.c.id))):
+        add(p.booking_id, "payment_recorded", p.created_at,
+            f"Status: {p.payment_status.value.replace('_', ' ').title() if p.payment_status else '—'}")
+        if p.validated_at:
+            val = p.validation_status.value.replace("_", " ").title() if p.validation_status else "Unknown"
+            notes = f" — {p.validation_notes}" if p.validation_notes else ""
+            add(p.booking_id, "payment_validated", p.validated_at, f"Validation: {val}{notes}", p.validated_by)
+
+    for amend in db.query(AmendmentRequest).filter(AmendmentRequest.booking_id.in_(db.query(missing.c.id))):
+        reason = f" ({amend.reason})" if amend.reason else ""
+        add(amend.booking_id, "amendment", amend.created_at,
+            f"{amend.original_date} → {amend.requested_date}{reason}", amend.requested_by)
+
+    for cancel in db.query(CancellationRequest).filter(CancellationRequest.booking_id.in_(db.query(missing.c.id))):
+        add(cancel.booking_id, "cancellation", cancel.created_at, cancel.reason or "—", cancel.requested_by)
+
+    for chase in db.query(ChaseRecord).filter(ChaseRecord.booking_id.in_(db.query(missing.c.id))):
+        status = f" — {chase.status.value}" if chase.status else ""
+        add(chase.booking_id, "chase", chase.created_at, f"{chase.chase_count}/5 chase attempts{status}")
+
+    rows.sort(key=lambda row: (row["booking_id"], row["created_at"]))
+    for start in range(0, len(rows), 1000):
+        db.execute(BookingEvent.__table__.insert(), rows[start:start + 1000])
+    if rows:
+        logger.info(f"Backfilled {len(rows)} booking events")
+    return len(rows)
+
@@ -0,0 +1,524 @@
+"""
+Booking workflow actions, one booking or many at a time.
+
+Confirm, reject, send-to-finance, permit purchase, payment validation and
+chase resolution each used to live in their route. Every call reloaded the
+booking and the role users, queued its notifications one by one and
+committed. On a peak-season purchase day that meant hundreds of round
+trips. The actions now live here as functions of a ``WorkflowBatch`` and one
+booking. The batch holds what the actions share:
+
+  - the acting user
+  - a cache of user ids per role set, so admins or finance are looked up
+    once per batch
+  - the notifications, grouped by (recipient, title); a recipient who
+    would get the same notification for 40 bookings gets one summary
+    listing them
+  - the emails, sent only after the caller commits
+
+The single-booking routes run a batch of one, so their notifications read
+as before. POST /bookings/bulk runs a list of bookings through one action in
+one transaction. Each item runs in its own savepoint: a booking in the wrong
+status fails on its own, with its changes and notifications dropped, and
+the rest commit together.
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from ..models.booking import Booking, BookingStatus
+from ..models.chase import ChaseRecord, ChaseStatus
+from ..models.notification import Notification, NotificationType
+from ..models.payment import Payment, PaymentStatus, ValidationStatus
+from ..models.user import User, UserRole
+from .booking_events import record_event, status_label, transition_booking
+
+logger = logging.getLogger(__name__)
+
+ADMINS = (UserRole.ADMIN, UserRole.SUPERUSER)
+
+PURCHASE_STATUSES = {
+    "full": BookingStatus.SECURED_FULL,
+    "deposit": BookingStatus.SECURED_DEPOSIT,
+    "authorization": BookingStatus.SECURED_AUTHORIZATION,
+}
+PURCHASE_LABELS = {"full": "in full", "deposit": "on deposit", "authorization": "under authorization"}
+PURCHASABLE = (BookingStatus.CONFIRMED, BookingStatus.AWAITING_AUTHORIZATION, BookingStatus.AUTHORIZED)
+OK_TO_PURCHASE = (ValidationStatus.OK_TO_PURCHASE_FULL, ValidationStatus.OK_TO_PURCHASE_DEPOSIT)
+
+
+class WorkflowError(Exception):
+    """An action that does not apply to this booking; carries the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class WorkflowBatch:
+    """Shared state for one or more workflow actions in a single transaction."""
+
+    def __init__(self, db: Session, actor: User):
+        self.db = db
+        self.actor = actor
+        self._role_users: Dict[Tuple[UserRole, ...], List[int]] = {}
+        # (user_id, title) -> (summary, [(booking_name, message)])
+        self._notifications: "OrderedDict[Tuple[int, str], Tuple[str, list]]" = OrderedDict()
+        self._emails: List[Tuple[Callable, tuple]] = []
+        self._staged: Optional[Tuple[list, list]] = None
+
+    def users(self, *roles: UserRole) -> List[int]:
+        """Ids of the users holding any of ``roles``, looked up once per batch."""
+        key = tuple(sorted(roles, key=lambda role: role.value))
+        if key not in self._role_users:
+            self._role_users[key] = [row[0] for row in self.db.query(User.id).filter(User.role.in_(key)).all()]
+        return self._role_users[key]
+
+    def notify(self, user_id: Optional[int], title: str, message: str, booking: Booking,
+               summary: Optional[str] = None):
+        """Queue a notification about ``booking``.
+
+        ``summary`` introduces the list of bookings when the recipient gets this
+        title for several of them; it defaults to the title.
+        """
+        if user_id is None:
+            return
+        entry = ((user_id, title), summary or title, booking.booking_name, message)
+        if self._staged is not None:
+            self._staged[0].append(entry)
+        else:
+            self._queue(entry)
+
+    def email(self, send: Callable, *args):
+        """Queue an email for after the commit."""
+        if self._staged is not None:
+            self._staged[1].append((send, args))
+        else:
+            self._emails.append((send, args))
+
+    def _queue(self, entry):
+        key, summary, name, message = entry
+        self._notifications.setdefault(key, (summary, []))[1].append((name, message))
+
+    def run(self, booking_id: int, action: Callable[[], Optional[dict]]) -> dict:
+        """Run one item in a savepoint; its result, or its error with its changes undone."""
+        self._staged = ([], [])
+        try:
+            with self.db.begin_nested():
+                extra = action() or {}
+        except WorkflowError as e:
+            return {"booking_id": booking_id, "ok": False, "status_code": e.status_code, "error": e.detail}
+        finally:
+            staged, self._staged = self._staged, None
+        for entry in staged[0]:
+            self._queue(entry)
+        self._emails += staged[1]
+        return {"booking_id": booking_id, "ok": True, **extra}
+
+    def flush_notifications(self) -> int:
+        """Add the queued notifications to the session (caller commits). Returns how many."""
+        rows = []
+        for (user_id, title), (summary, items) in self._notifications.items():
+            if len(items) == 1:
+                rows.append(Notification(user_id=user_id, title=title, message=items[0][1], type=NotificationType.INFO))
+            else:
+                names = ", ".join(name or "(unnamed)" for name, _ in items)
+                rows.append(Notification(
+                    user_id=user_id, title=f"{title} ({len(items)} bookings)",
+                    message=f"{summary}: {names}", type=NotificationType.INFO,
+                ))
+        self.db.add_all(rows)
+        self._notifications.clear()
+        return len(rows)
+
+    def send_emails(self):
+        """Send the queued emails; call once the transaction has committed."""
+        emails, self._emails = self._emails, []
+        for send, args in emails:
+            send(*args)
+
+
+def load_bookings(db: Session, booking_ids: Iterable[int]) -> Dict[int, Booking]:
+    """The bookings with what the actions read from them, in one round trip per relationship."""
+    ids = list(dict.fromkeys(booking_ids))
+    if not ids:
+        return {}
+    bookings = (
+        db.query(Booking)
+        .options(
+            selectinload(Booking.user), selectinload(Booking.product_rel), selectinload(Booking.payment),
+            selectinload(Booking.agent_client_rel), selectinload(Booking.chase_record),
+        )
+        .filter(Booking.id.in_(ids))
+        .all()
+    )
+    return {booking.id: booking for booking in bookings}
+
+
+def run_one(db: Session, actor: User, action: Callable, *args) -> dict:
+    """Run one action as its own batch: apply, notify, commit, then email.
+
+    WorkflowError propagates with nothing committed.
+    """
+    batch = WorkflowBatch(db, actor)
+    result = action(batch, *args)
+    batch.flush_notifications()
+    db.commit()
+    batch.send_emails()
+    return result
+
+
+# ─── Actions ─────────────────────────────────────────────────────────────────
+
+def create_payment_for_booking(batch: WorkflowBatch, booking: Booking, confirmed_by_id: Optional[int] = None):
+    """
+    Create a Payment record for a booking using the agent's payment terms.
+    If the agent has a rolling deposit, auto-apply it (deposit or full based on 45-day rule).
+    """
+    from .rolling_deposit import calculate_due_dates, apply_rolling_deposit
+
+    if booking.payment:
+        return
+
+    db = batch.db
+    unit_cost = float(booking.product_rel.unit_cost) if booking.product_rel else 0
+    units     = booking.people or 0
+    total     = unit_cost * units
+    deposit_amount = round(total * 0.3, 2)
+
+    ac = booking.agent_client_rel
+
+    if ac:
+        deposit_due, balance_due_dt, require_full = calculate_due_dates(booking, ac)
+    else:
+        deposit_due   = datetime.utcnow() + timedelta(days=14)
+        balance_due_dt = (
+            datetime.combine(booking.date, datetime.min.time()) - timedelta(days=45)
+            if booking.date else datetime.utcnow() + timedelta(days=30)
+        )
+        require_full = False
+
+    payment = Payment(
+        booking_id=booking.id,
+        payment_status=PaymentStatus.PENDING,
+        validation_status=ValidationStatus.PENDING,
+        unit_cost=unit_cost,
+        units=units,
+        amount=total,
+        deposit_amount=deposit_amount,
+        deposit_paid=0,
+        balance_due=total,
+        deposit_due_date=deposit_due,
+        balance_due_date=balance_due_dt,
+    )
+    db.add(payment)
+    db.flush()  # give payment an id
+
+    # Auto-apply rolling deposit if available
+    if ac and ac.has_rolling_deposit and ac.rolling_deposit_balance > 0:
+        applied = apply_rolling_deposit(db, booking, ac, payment, confirmed_by_id)
+        if not applied:
+            # Insufficient balance — notify finance
+            batch.notify(
+                confirmed_by_id or booking.user_id,
+                "Rolling Deposit Insufficient",
+                f"Booking '{booking.booking_name}' for {ac.name}: rolling deposit balance "
+                f"${ac.rolling_deposit_balance:.2f} is below required "
+                f"{'full' if require_full else 'deposit'} amount ${total if require_full else deposit_amount:.2f}. "
+                f"Manual action required.",
+                booking, "Rolling deposit too low; manual action required for",
+            )
+
+    record_event(db, booking, "payment_recorded", f"Status: {status_label(payment.payment_status)}", confirmed_by_id)
+
+
+def confirm(batch: WorkflowBatch, booking: Booking) -> dict:
+    if booking.booking_status != BookingStatus.REQUESTED:
+        raise WorkflowError(400, "Only requested bookings can be confirmed")
+    actor = batch.actor
+    transition_booking(batch.db, booking, BookingStatus.CONFIRMED, "confirmed", f"By {actor.username}", actor.id)
+    create_payment_for_booking(batch, booking, confirmed_by_id=actor.id)
+    batch.notify(booking.user_id, "Booking Confirmed",
+                 f"Your booking '{booking.booking_name}' has been confirmed.", booking,
+                 "These bookings have been confirmed")
+    return {"booking_status": booking.booking_status.value}
+
+
+def reject(batch: WorkflowBatch, booking: Booking) -> dict:
+    if booking.booking_status not in [BookingStatus.REQUESTED, BookingStatus.PROVISIONAL]:
+        raise WorkflowError(400, "Only provisional/requested bookings can be rejected")
+    actor = batch.actor
+    transition_booking(batch.db, booking, BookingStatus.REJECTED, "rejected", f"By {actor.username}", actor.id)
+    batch.notify(booking.user_id, "Booking Rejected",
+                 f"Your booking '{booking.booking_name}' has been rejected.", booking,
+                 "These bookings have been rejected")
+    return {"booking_status": booking.booking_status.value}
+
+
+def send_to_finance(batch: WorkflowBatch, booking: Booking) -> dict:
+    # Can only send to finance if status is REQUESTED
+    if booking.booking_status != BookingStatus.REQUESTED:
+        raise WorkflowError(400, "Can only send requested bookings to finance")
+    actor = batch.actor
+    create_payment_for_booking(batch, booking)
+    transition_booking(batch.db, booking, BookingStatus.VR, "sent_to_finance",  # validation_request
+                       f"By {actor.username}", actor.id)
+    for user_id in batch.users(UserRole.FINANCE_ADMIN):
+        batch.notify(user_id, "Validation Request",
+                     f"New validation request for booking {booking.booking_name}", booking,
+                     "New validation requests for bookings")
+    return {"booking_status": booking.booking_status.value}
+
+
+def purchase_permits(batch: WorkflowBatch, booking: Booking, purchase_type: str) -> dict:
+    from .email_service import email_permits_purchased
+
+    if purchase_type not in PURCHASE_STATUSES:
+        raise WorkflowError(400, "purchase_type must be full, deposit, or authorization")
+    if booking.booking_status not in PURCHASABLE:
+        raise WorkflowError(400, "Booking must be confirmed or authorized to purchase permits")
+    label = PURCHASE_LABELS[purchase_type]
+    transition_booking(batch.db, booking, PURCHASE_STATUSES[purchase_type], "permits_secured",
+                       f"Purchased {label} by {batch.actor.username}", batch.actor.id)
+    trek_date_str = booking.date.strftime("%Y-%m-%d") if booking.date else "TBD"
+    batch.notify(
+        booking.user_id, "Permits Secured",
+        f"Permits for your booking '{booking.booking_name}' have been purchased {label}.", booking,
+        f"Permits have been purchased {label} for",
+    )
+    if purchase_type == "deposit":
+        batch.notify(
+            booking.user_id, "Balance Top-up Required",
+            f"Your booking '{booking.booking_name}' is secured on deposit. The balance must be paid 45 days before your trek date.",
+            booking, "These bookings are secured on deposit; each balance is due 45 days before its trek date",
+        )
+    if booking.user and booking.user.email:
+        batch.email(email_permits_purchased, booking.user.email, booking.booking_name, label, trek_date_str)
+    return {"booking_status": booking.booking_status.value}
+
+
+def booking_total(booking: Booking) -> float:
+    return (float(booking.product_rel.unit_cost) * booking.people
+            if booking.product_rel and booking.people else 0)
+
+
+def validate_payment(batch: WorkflowBatch, booking: Booking, amount_received: float,
+                     validation_status: str, validation_notes: Optional[str] = None) -> dict:
+    from .email_service import email_payment_validated_ok, email_payment_do_not_purchase
+
+    # Validate the validation status
+    if validation_status not in [status.value for status in ValidationStatus]:
+        raise WorkflowError(
+            400, f"Invalid validation status. Must be one of: {[status.value for status in ValidationStatus]}"
+        )
+    db, actor = batch.db, batch.actor
+
+    # Get or create payment record
+    payment = booking.payment
+    if not payment:
+        payment = Payment(booking_id=booking.id)
+        db.add(payment)
+
+    # Update payment details
+    payment.deposit_paid = Decimal(str(amount_received))
+    payment.validation_status = ValidationStatus(validation_status)
+    payment.validation_notes = validation_notes
+    payment.validated_by = actor.id
+    payment.validated_at = datetime.utcnow()
+
+    total_amount = booking_total(booking)
+
+    # Calculate payment status based on amount received
+    if payment.deposit_paid >= total_amount:
+        payment.payment_status = PaymentStatus.FULLY_PAID
+    elif payment.deposit_paid > 0:
+        payment.payment_status = PaymentStatus.DEPOSIT_PAID
+    else:
+        payment.payment_status = PaymentStatus.PENDING
+
+    validation_enum = ValidationStatus(validation_status)
+    validation_detail = (
+        f"Validation: {validation_enum.value.replace('_', ' ').title()}"
+        + (f" — {validation_notes}" if validation_notes else "")
+    )
+
+    if validation_enum in OK_TO_PURCHASE:
+        # Payment received — booking stays CONFIRMED, admin will purchase permits
+        transition_booking(db, booking, BookingStatus.CONFIRMED, "payment_validated",
+                           validation_detail, actor.id)
+        batch.notify(
+            booking.user_id, "Payment Validated",
+            f"Payment for your booking '{booking.booking_name}' has been validated. Permits will be purchased shortly.",
+            booking, "Payment has been validated for these bookings; permits will be purchased shortly",
+        )
+        # Passport check — mandatory for full payment, warn for deposit
+        if validation_enum == ValidationStatus.OK_TO_PURCHASE_FULL:
+            from ..models.passport_data import PassportData
+            passport_count = db.query(PassportData).filter(PassportData.booking_id == booking.id).count()
+            expected = booking.people or 1
+            if passport_count < expected:
+                missing = expected - passport_count
+                batch.notify(
+                    booking.user_id, "⚠ Passport Copies Required — Immediate Action",
+                    f"Full payment confirmed for '{booking.booking_name}'. Passport copies are mandatory before permits can be purchased. "
+                    f"Please upload {missing} missing passport(s) via Passport Management immediately.",
+                    booking, "Full payment confirmed; upload the missing passport copies now for",
+                )
+        # Notify admins to proceed
+        for user_id in batch.users(*ADMINS):
+            batch.notify(
+                user_id, "Ready to Purchase Permits",
+                f"Booking '{booking.booking_name}' payment validated ({validation_status}). Proceed with permit purchase.",
+                booking, f"Payment validated ({validation_status}); proceed with permit purchase for",
+            )
+        # Email the agent
+        if booking.user and booking.user.email:
+            batch.email(email_payment_validated_ok, booking.user.email, booking.booking_name,
+                        float(payment.deposit_paid or 0), validation_status)
+    else:
+        # do_not_purchase — no payment received; route based on agent/client trust level.
+        # AgentClient trust takes priority; fall back to internal user trust for legacy bookings.
+        ac = booking.agent_client_rel
+        agent = booking.user
+        is_trusted = (
+            (ac is not None and (ac.is_trusted or ac.has_rolling_deposit))
+            or (ac is None and agent is not None and (agent.is_trusted_agent or agent.has_rolling_deposit))
+        )
+        trusted_label = (ac.name if ac else (agent.username if agent else "agent"))
+        if is_trusted:
+            # Trusted path — submit authorization request with proof
+            transition_booking(db, booking, BookingStatus.AWAITING_AUTHORIZATION, "payment_validated",
+                               f"{validation_detail} (routed to authorization)", actor.id)
+            batch.notify(
+                booking.user_id, "Authorization Required",
+                f"No payment received for booking '{booking.booking_name}'. Please submit an authorization request with proof of incoming payment.",
+                booking, "No payment received; submit an authorization request with proof of payment for",
+            )
+            for user_id in batch.users(*ADMINS):
+                batch.notify(
+                    user_id, "Booking Awaiting Authorization",
+                    f"Booking '{booking.booking_name}' for {trusted_label} has no payment. Routed to authorization (trusted agent/client).",
+                    booking, "No payment; routed to authorization (trusted agent/client)",
+                )
+        else:
+            # Untrusted path — start chase system
+            transition_booking(db, booking, BookingStatus.CHASE, "payment_validated",
+                               f"{validation_detail} (chase started)", actor.id)
+            if not booking.chase_record:
+                record_event(db, booking, "chase", "1/5 chase attempts — active")
+                db.add(ChaseRecord(
+                    booking_id=booking.id,
+                    chase_count=1,
+                    last_chase_at=datetime.utcnow(),
+                    next_chase_at=datetime.utcnow() + timedelta(days=7),
+                    status=ChaseStatus.ACTIVE,
+                ))
+            batch.notify(
+                booking.user_id, "Payment Overdue — Action Required",
+                f"No payment received for booking '{booking.booking_name}'. This is chase attempt 1 of 5. Please arrange payment within 7 days or the booking will be released.",
+                booking, "No payment received (chase attempt 1 of 5); pay within 7 days or these bookings will be released",
+            )
+            for user_id in batch.users(*ADMINS, UserRole.FINANCE_ADMIN):
+                batch.notify(
+                    user_id, "Booking Entered Chase",
+                    f"Booking '{booking.booking_name}' has no payment. Chase system started (1/5).",
+                    booking, "No payment; chase system started (1/5) for",
+                )
+        # Email the internal user regardless of trust path
+        if agent and agent.email:
+            batch.email(email_payment_do_not_purchase, agent.email, booking.booking_name, is_trusted)
+
+    return {
+        "validation_status": validation_status,
+        "payment_status": payment.payment_status.value,
+        "amount_received": float(payment.deposit_paid),
+        "total_amount": float(total_amount),
+        "booking_status": booking.booking_status.value,
+    }
+
+
+def resolve_chase(batch: WorkflowBatch, record: Optional[ChaseRecord]) -> dict:
+    """Admin resolves a chase manually — payment eventually arrived; the booking goes back to CONFIRMED."""
+    if not record:
+        raise WorkflowError(404, "Chase record not found")
+    if record.status != ChaseStatus.ACTIVE:
+        raise WorkflowError(400, "Chase is not active")
+    booking = record.booking
+    record.status = ChaseStatus.RESOLVED
+    transition_booking(batch.db, booking, BookingStatus.CONFIRMED, "chase_resolved",
+                       f"Resolved by {batch.actor.username} after {record.chase_count}/5 chase attempts",
+                       batch.actor.id)
+    batch.notify(
+        booking.user_id, "Booking Reinstated",
+        f"Your booking '{booking.booking_name}' has been reinstated. Finance will now validate your payment.",
+        booking, "These bookings have been reinstated; finance will now validate your payment",
+    )
+    return {"booking_status": booking.booking_status.value}
+
+
+# ─── Bulk ────────────────────────────────────────────────────────────────────
+
+# action -> roles allowed to run it
+ACTION_ROLES = {
+    "confirm": (UserRole.ADMIN,),
+    "reject": (UserRole.ADMIN,),
+    "send_to_finance": (UserRole.ADMIN,),
+    "purchase_permits": ADMINS,
+    "validate_payment": (UserRole.FINANCE_ADMIN, UserRole.ADMIN),
+    "resolve_chase": ADMINS,
+}
+
+
+def run_bulk(batch: WorkflowBatch, action: str, booking_ids: List[int], purchase_type: Optional[str] = None,
+             validation_status: Optional[str] = None, validation_notes: Optional[str] = None,
+             amounts: Optional[Dict[int, float]] = None) -> List[dict]:
+    """Apply ``action`` to each booking in turn; per-item results, in request order (caller commits).
+
+    Raises WorkflowError when the request as a whole is invalid.
+    """
+    if action not in ACTION_ROLES:
+        raise WorkflowError(400, f"action must be one of: {', '.join(ACTION_ROLES)}")
+    if batch.actor.role not in ACTION_ROLES[action]:
+        raise WorkflowError(403, f"Not allowed to {action.replace('_', ' ')} bookings")
+    if action == "purchase_permits" and purchase_type not in PURCHASE_STATUSES:
+        raise WorkflowError(400, "purchase_type must be full, deposit, or authorization")
+    if action == "validate_payment" and validation_status not in [status.value for status in ValidationStatus]:
+        raise WorkflowError(
+            400, f"Invalid validation status. Must be one of: {[status.value for status in ValidationStatus]}"
+        )
+
+    amounts = amounts or {}
+    bookings = load_bookings(batch.db, booking_ids)
+
+    def amount_received(booking: Booking) -> float:
+        if booking.id not in amounts:
+            raise WorkflowError(400, "amount_received is required to validate this booking's payment")
+        return amounts[booking.id]
+
+    actions = {
+        "confirm": lambda booking: confirm(batch, booking),
+        "reject": lambda booking: reject(batch, booking),
+        "send_to_finance": lambda booking: send_to_finance(batch, booking),
+        "purchase_permits": lambda booking: purchase_permits(batch, booking, purchase_type),
+        "validate_payment": lambda booking: validate_payment(
+            batch, booking, amount_received(booking), validation_status, validation_notes,
+        ),
+        "resolve_chase": lambda booking: resolve_chase(batch, booking.chase_record),
+    }
+    apply = actions[action]
+
+    def item(booking_id: int):
+        booking = bookings.get(booking_id)
+        if booking is None:
+            raise WorkflowError(404, "Booking not found")
+        return apply(booking)
+
+    results = [batch.run(booking_id, lambda: item(booking_id)) for booking_id in dict.fromkeys(booking_ids)]
+    done = sum(result["ok"] for result in results)
+    logger.info(f"Bulk {action} by {batch.actor.username}: {done} of {len(results)} bookings")
+    return results
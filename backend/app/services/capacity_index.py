@@ -0,0 +1,285 @@
+"""
+Capacity index — our own permit demand per product and date.
+
+BookingCreate takes available_slots from the client, and nothing on the
+server compared the people on open bookings with the scraped availability.
+capacity_index keeps, per (product, date), the people on bookings whose
+permits are bought (``committed``) and on bookings still to be bought
+(``pending``). capacity_contributions records what each booking currently
+counts for.
+
+``sync_booking`` takes a booking's old contribution off and adds its
+current one, in the caller's transaction. It is idempotent, so it is safe
+to call after any change. The callers are:
+
+  - transition_booking, on every status change (covers cancel and release)
+  - booking create, update and delete
+  - amendment confirmation (the date change)
+  - voucher imports
+
+``reconcile_capacity_index`` rebuilds both tables from the bookings and
+reports or repairs any drift. The scheduler runs it daily, like the
+rolling-deposit aggregates.
+
+Permits we have bought are already missing from the site's count, so
+*net availability* is the scraped slots less our pending people.
+``check_capacity`` compares a booking's people with that figure. Create
+and amendment requests warn about an over-commitment or, with
+OVERBOOKING_POLICY=block, refuse it.
+"""
+import logging
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.booking import Booking, BookingStatus
+from ..models.capacity import CapacityContribution, CapacityIndex
+from ..models.site import Product
+from .product_catalogue import DATE_FORMAT, availability_rows, product_key, slot_count
+
+logger = logging.getLogger(__name__)
+
+COMMITTED = "committed"
+PENDING = "pending"
+
+# Permits bought; an amendment or cancellation request keeps them until it is resolved
+COMMITTED_STATUSES = (
+    BookingStatus.SECURED_FULL,
+    BookingStatus.SECURED_DEPOSIT,
+    BookingStatus.SECURED_AUTHORIZATION,
+    BookingStatus.AMENDMENT_REQUESTED,
+    BookingStatus.CANCELLATION_REQUESTED,
+)
+# Open bookings that will still need permits from the site's remaining slots
+PENDING_STATUSES = (
+    BookingStatus.PROVISIONAL,
+    BookingStatus.REQUESTED,
+    BookingStatus.VR,
+    BookingStatus.CONFIRMED,
+    BookingStatus.AWAITING_AUTHORIZATION,
+    BookingStatus.AUTHORIZED,
+    BookingStatus.CHASE,
+)
+
+
+def demand_kind(status) -> Optional[str]:
+    if status in COMMITTED_STATUSES:
+        return COMMITTED
+    if status in PENDING_STATUSES:
+        return PENDING
+    return None
+
+
+def _contribution_of(booking: Booking) -> Optional[Tuple[int, date, int, str]]:
+    kind = demand_kind(booking.booking_status)
+    if kind is None or booking.product_id is None or booking.date is None or not booking.people:
+        return None
+    return booking.product_id, booking.date, booking.people, kind
+
+
+def _bump(db: Session, product_id: int, day: date, people: int, kind: str, sign: int):
+    """Add (sign=1) or remove (sign=-1) one booking's people in the index, atomically."""
+    column = CapacityIndex.committed if kind == COMMITTED else CapacityIndex.pending
+    values = {column: column + sign * people, CapacityIndex.bookings: CapacityIndex.bookings + sign,
+              CapacityIndex.updated_at: datetime.utcnow()}
+    cell = db.query(CapacityIndex).filter(CapacityIndex.product_id == product_id, CapacityIndex.date == day)
+    if cell.update(values, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(CapacityIndex(product_id=product_id, date=day, committed=0, pending=0, bookings=0))
+    except IntegrityError:
+        pass  # another transaction created the cell first
+    cell.update(values, synchronize_session=False)
+
+
+def sync_booking(db: Session, booking: Booking):
+    """Make the index count ``booking`` as it is now (caller commits).
+
+    A booking that has not been flushed yet has no id; the index picks it
+    up from the next sync or reconcile.
+    """
+    if booking.id is None:
+        return
+    stored = db.get(CapacityContribution, booking.id)
+    old = (stored.product_id, stored.date, stored.people, stored.kind) if stored is not None else None
+    new = _contribution_of(booking)
+    if old == new:
+        return
+    if old is not None:
+        _bump(db, *old, sign=-1)
+    if new is None:
+        db.delete(stored)
+        return
+    _bump(db, *new, sign=1)
+    if stored is None:
+        stored = CapacityContribution(booking_id=booking.id)
+        db.add(stored)
+    stored.product_id, stored.date, stored.people, stored.kind = new
+    db.flush()  # sessions here do not autoflush; a second sync in this transaction must see the row
+
+
+def forget_booking(db: Session, booking: Booking):
+    """Take a booking that is about to be deleted out of the index (caller commits)."""
+    stored = db.get(CapacityContribution, booking.id)
+    if stored is not None:
+        _bump(db, stored.product_id, stored.date, stored.people, stored.kind, sign=-1)
+        db.delete(stored)
+
+
+def reconcile_capacity_index(db: Session, repair: bool = False) -> dict:
+    """Compare both tables with what the bookings say; optionally rewrite them (caller commits)."""
+    expected_contributions = {}
+    for booking in db.query(Booking).filter(Booking.product_id.isnot(None), Booking.date.isnot(None)):
+        contribution = _contribution_of(booking)
+        if contribution is not None:
+            expected_contributions[booking.id] = contribution
+    expected_cells: Dict[Tuple[int, date], Dict[str, int]] = {}
+    for product_id, day, people, kind in expected_contributions.values():
+        cell = expected_cells.setdefault((product_id, day), {COMMITTED: 0, PENDING: 0, "bookings": 0})
+        cell[kind] += people
+        cell["bookings"] += 1
+
+    discrepancies = []
+    stored_contributions = {row.booking_id: row for row in db.query(CapacityContribution)}
+    for booking_id, contribution in expected_contributions.items():
+        row = stored_contributions.pop(booking_id, None)
+        have = (row.product_id, row.date, row.people, row.kind) if row is not None else None
+        if have != contribution:
+            discrepancies.append({"kind": "booking", "id": booking_id, "stored": have, "expected": contribution})
+            if repair:
+                row = row or CapacityContribution(booking_id=booking_id)
+                row.product_id, row.date, row.people, row.kind = contribution
+                db.add(row)
+    for booking_id, row in stored_contributions.items():
+        discrepancies.append({"kind": "booking", "id": booking_id, "stored": row.kind, "expected": None})
+        if repair:
+            db.delete(row)
+
+    stored_cells = {(row.product_id, row.date): row for row in db.query(CapacityIndex)}
+    empty = {COMMITTED: 0, PENDING: 0, "bookings": 0}
+    for key in set(expected_cells) | set(stored_cells):
+        want = expected_cells.get(key, empty)
+        row = stored_cells.get(key)
+        have = {COMMITTED: row.committed, PENDING: row.pending, "bookings": row.bookings} if row is not None else empty
+        if have != want:
+            discrepancies.append({"kind": "cell", "id": [key[0], key[1].isoformat()], "stored": have, "expected": want})
+            if repair:
+                row = row or CapacityIndex(product_id=key[0], date=key[1])
+                row.committed, row.pending, row.bookings = want[COMMITTED], want[PENDING], want["bookings"]
+                db.add(row)
+
+    if discrepancies:
+        logger.warning(f"Capacity index: {len(discrepancies)} discrepancies{' (repaired)' if repair else ''}")
+    if repair:
+        db.flush()
+    return {
+        "bookings_checked": len(expected_contributions),
+        "cells_checked": len(expected_cells),
+        "discrepancies": discrepancies,
+        "repaired": repair,
+    }
+
+
+# ─── Net availability ────────────────────────────────────────────────────────
+
+@dataclass
+class CapacityCheck:
+    product_id: int
+    date: date
+    people: int
+    slots: Optional[int]  # scraped; None when the date has not been scraped
+    committed: int
+    pending: int  # other open bookings' people
+    net_available: Optional[int]  # slots - pending
+    over_by: int  # people beyond net_available
+
+    @property
+    def ok(self) -> bool:
+        return self.over_by <= 0
+
+    def message(self, product_name: str) -> str:
+        return (f"Only {max(self.net_available, 0)} {product_name} permits left on {self.date:%d/%m/%Y} "
+                f"({self.slots} on the permit site, {self.pending} held by other pending bookings); "
+                f"{self.people} requested")
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "ok": self.ok}
+
+
+def scraped_slots(db: Session, product: Product, days: List[date]) -> Dict[date, Optional[int]]:
+    """The availability cache's slots for ``product`` on ``days`` (dates never scraped are left out)."""
+    rows = availability_rows(db, product_key(product.name), [day.strftime(DATE_FORMAT) for day in days])
+    return {datetime.strptime(row.date, DATE_FORMAT).date(): slot_count(row.slots) for row in rows}
+
+
+def check_capacity(db: Session, product: Product, day: date, people: int,
+                   booking_id: Optional[int] = None) -> CapacityCheck:
+    """Would ``people`` more permits for ``product`` on ``day`` fit in the net availability?
+
+    ``booking_id`` is a booking being changed: its own pending people are not counted twice.
+    """
+    cell = db.get(CapacityIndex, (product.id, day))
+    committed, pending = (cell.committed, cell.pending) if cell is not None else (0, 0)
+    if booking_id is not None:
+        own = db.get(CapacityContribution, booking_id)
+        if own is not None and own.kind == PENDING and (own.product_id, own.date) == (product.id, day):
+            pending -= own.people
+    slots = scraped_slots(db, product, [day]).get(day)
+    net = slots - pending if slots is not None else None
+    over_by = people - net if net is not None else 0
+    return CapacityCheck(product.id, day, people, slots, committed, pending, net, over_by)
+
+
+def enforce_capacity(check: CapacityCheck, product_name: str) -> Optional[str]:
+    """Apply OVERBOOKING_POLICY: a warning to return, or ValueError when it blocks."""
+    policy = settings.OVERBOOKING_POLICY.lower()
+    if check.ok or policy == "off":
+        return None
+    message = check.message(product_name)
+    if policy == "block":
+        raise ValueError(message)
+    return message
+
+
+def net_availability(db: Session, product: Product, start: date, end: date) -> List[dict]:
+    """Per date from ``start`` to ``end``: scraped slots, our committed and pending people, and the net."""
+    cells = {
+        row.date: row for row in db.query(CapacityIndex).filter(
+            CapacityIndex.product_id == product.id, CapacityIndex.date >= start, CapacityIndex.date <= end,
+        )
+    }
+    key = product_key(product.name)
+    slots = {}
+    for row in availability_rows(db, key):
+        try:
+            day = datetime.strptime(row.date, DATE_FORMAT).date()
+        except (TypeError, ValueError):
+            continue
+        if start <= day <= end:
+            slots[day] = slot_count(row.slots)
+    rows = []
+    for day in sorted(set(cells) | set(slots)):
+        cell = cells.get(day)
+        committed, pending, bookings = (cell.committed, cell.pending, cell.bookings) if cell else (0, 0, 0)
+        available = slots.get(day)
+        rows.append({
+            "date": day.strftime(DATE_FORMAT),
+            "slots": available,
+            "committed": committed,
+            "pending": pending,
+            "bookings": bookings,
+            "net_available": available - pending if available is not None else None,
+        })
+    return rows
+
+
+def pending_by_date(db: Session, product_id: int, start: date) -> Dict[date, int]:
+    """Pending people per date from ``start`` on, for one product."""
+    return dict(db.query(CapacityIndex.date, CapacityIndex.pending).filter(
+        CapacityIndex.product_id == product_id, CapacityIndex.date >= start, CapacityIndex.pending > 0,
+    ).all())
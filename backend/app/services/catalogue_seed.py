@@ -0,0 +1,50 @@
+"""
+Seeds the parks and their products into an empty database.
+
+Kept apart from app.main so scripts (benchmarks/) can seed a database
+without importing the routes, some of which need API keys at import time.
+"""
+from sqlalchemy.orm import Session
+
+from ..models.site import Product, Site
+
+
+def seed_initial_data(db: Session):
+    """Add both sites and their products, unless a site already exists."""
+    if db.query(Site).count() > 0:
+        return  # already seeded
+    site1 = Site(name="Volcanoes National Park")
+    site2 = Site(name="Nyungwe Forest National Park")
+    db.add_all([site1, site2])
+    db.flush()
+    products = [
+        # Volcanoes National Park
+        Product(name="Mountain gorillas", unit_cost=1500, site_id=site1.id, scrape_enabled=True),
+        Product(name="Golden Monkeys", unit_cost=100, site_id=site1.id, scrape_enabled=True),
+        Product(name="Bisoke", unit_cost=75, site_id=site1.id),
+        Product(name="Dian Fossey Tomb", unit_cost=75, site_id=site1.id),
+        Product(name="Gahinga", unit_cost=75, site_id=site1.id),
+        Product(name="Muhabura", unit_cost=75, site_id=site1.id),
+        Product(name="Muhabura-Gahinga", unit_cost=75, site_id=site1.id),
+        Product(name="Nature walk", unit_cost=50, site_id=site1.id),
+        Product(name="Sabyinyo Volcano Climbing", unit_cost=75, site_id=site1.id),
+        Product(name="Buhanga Eco-park", unit_cost=50, site_id=site1.id),
+        Product(name="Buhanga Eco-park(1 day picnic including Camping)", unit_cost=50, site_id=site1.id),
+        Product(name="Hiking on a chain of volcanoes", unit_cost=75, site_id=site1.id),
+        # Nyungwe Forest National Park
+        Product(name="Canopy Walk", unit_cost=60, site_id=site2.id),
+        Product(name="Canopy Walk Exclusive", unit_cost=120, site_id=site2.id),
+        Product(name="Chimps Trek", unit_cost=90, site_id=site2.id),
+        Product(name="Chimps Trek Exclusive", unit_cost=180, site_id=site2.id),
+        Product(name="Bird Walk - Nyungwe Forest", unit_cost=50, site_id=site2.id),
+        Product(name="Waterfall- Kamiranzovu", unit_cost=50, site_id=site2.id),
+        Product(name="Waterfall- Ndambarare", unit_cost=50, site_id=site2.id),
+        Product(name="Colubus / Mangabey Monkey", unit_cost=50, site_id=site2.id),
+        Product(name="Colubus / Mangabey Monkey Exclusive", unit_cost=100, site_id=site2.id),
+        Product(name="Entry fee 1st Night", unit_cost=30, site_id=site2.id),
+        Product(name="Entry fee Extra Night", unit_cost=20, site_id=site2.id),
+        Product(name="Nature Trails (Nyungwe National Park)", unit_cost=50, site_id=site2.id),
+        Product(name="Nature Walk 0-5km", unit_cost=40, site_id=site2.id),
+    ]
+    db.add_all(products)
+    db.commit()
@@ -0,0 +1,115 @@
+"""
+Proof-document previews — first-page JPEG thumbnails rendered once per document.
+
+Previews are rendered in the background after upload (or the first time one
+is asked for) and saved in the upload store under proof_documents/previews/.
+The authorizer dashboard can then show small images instead of downloading
+every original.
+"""
+import hashlib
+import io
+import logging
+import os
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from ..database import SessionLocal
+from ..models.authorization import ProofDocument
+from .upload_store import get_upload_store
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MAX_SIZE = (480, 640)
+PREVIEW_NAMESPACE = "proof_documents/previews"
+_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".gif", ".webp"}
+
+# Document ids with a render in progress, so repeated preview polls don't stack jobs
+_in_flight = set()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_preview_bytes(path: str, content_type: Optional[str] = None) -> Optional[bytes]:
+    """Render the first page of a PDF or image as a JPEG thumbnail.
+
+    Returns None for formats that have no visual preview (e.g. .eml).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf" or content_type == "application/pdf":
+        from pdf2image import convert_from_path
+        from ..utils.ocr_processor import POPPLER_PATH
+        pages = convert_from_path(
+            path, dpi=72, first_page=1, last_page=1,
+            size=(PREVIEW_MAX_SIZE[0], None), poppler_path=POPPLER_PATH,
+        )
+        if not pages:
+            return None
+        image = pages[0]
+    elif ext in _IMAGE_EXTENSIONS or (content_type or "").startswith("image/"):
+        image = Image.open(path)
+        image.seek(0)
+    else:
+        return None
+
+    image = image.convert("RGB")
+    image.thumbnail(PREVIEW_MAX_SIZE)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=80, optimize=True)
+    return out.getvalue()
+
+
+async def generate_preview(document_id: int):
+    """Background task: render and store the preview for one ProofDocument."""
+    if document_id in _in_flight:
+        return
+    _in_flight.add(document_id)
+    db = SessionLocal()
+    try:
+        doc = db.query(ProofDocument).filter(ProofDocument.id == document_id).first()
+        if not doc or doc.preview_status == "ready":
+            return
+
+        store = get_upload_store()
+        key = f"proof_documents/{doc.filename}"
+        if not await store.backend.exists(key):
+            doc.preview_status = "failed"
+            db.commit()
+            return
+
+        path = await store.local_path(key)
+        try:
+            preview = await run_in_threadpool(render_preview_bytes, path, doc.content_type)
+        except Exception as e:
+            logger.warning(f"Preview rendering failed for {doc.filename}: {str(e)}")
+            doc.preview_status = "failed"
+            db.commit()
+            return
+
+        if preview is None:
+            doc.preview_status = "unsupported"
+            db.commit()
+            return
+
+        async def _chunks():
+            yield preview
+
+        stored = await store.save_stream(_chunks(), PREVIEW_NAMESPACE, "preview.jpg")
+        # Every row that shares this content can use the same preview
+        for row in db.query(ProofDocument).filter(ProofDocument.filename == doc.filename).all():
+            row.preview_filename = stored.filename
+            row.preview_status = "ready"
+        db.commit()
+    except Exception as e:
+        logger.error(f"Preview job for document {document_id} failed: {str(e)}")
+        db.rollback()
+    finally:
+        _in_flight.discard(document_id)
+        db.close()
@@ -0,0 +1,117 @@
+"""
+Leader election for background services in multi-worker deployments.
+
+Under ``uvicorn --workers N`` (or several API containers) every process runs
+the lifespan. Without coordination, each one would start its own APScheduler
+and so send every chase email, overdue flag and slot alert N times. Instead
+the processes compete for the "background" row in service_leases, using the
+same compare-and-set UPDATE as the scrape work leases: a claim succeeds only
+if the lease is free, has expired, or is already ours. The winner renews it
+every LEADER_RENEW_SECONDS. If that process dies or hangs, the lease lapses
+after LEADER_LEASE_SECONDS and the next standby to retry takes over.
+
+The leader never relies on a renewal coming back in time. It keeps a local
+deadline: the start of its last successful renewal plus the TTL, less a
+margin. It stops its services at that deadline even if a renewal is still
+blocked in the database, which is before any standby can see the lease as
+expired (main._leader_task).
+
+The "startup" lease is used as a mutex rather than an election: every
+process takes it in turn to run the lifespan seeds and backfills (``held``).
+Each one sees the previous holder's commits and skips work already done, so
+workers started together neither race nor duplicate rows.
+
+This works on PostgreSQL and SQLite alike, and across machines, which a
+lock file would not.
+"""
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.service_lease import ServiceLease
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "background"
+STARTUP = "startup"
+
+
+def process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _ensure_row(db: Session, name: str):
+    if db.get(ServiceLease, name) is None:
+        db.add(ServiceLease(name=name))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another process created it first
+
+
+def acquire(db: Session, name: str, owner: str, ttl: Optional[int] = None) -> bool:
+    """Claim or renew the lease ``name`` for ``owner``. Returns True while ``owner`` holds it."""
+    _ensure_row(db, name)
+    now = datetime.utcnow()
+    held = db.query(ServiceLease).filter(
+        ServiceLease.name == name,
+        or_(ServiceLease.owner.is_(None), ServiceLease.owner == owner, ServiceLease.expires_at < now),
+    ).update({
+        ServiceLease.acquired_at: case((ServiceLease.owner == owner, ServiceLease.acquired_at), else_=now),
+        ServiceLease.owner: owner,
+        ServiceLease.expires_at: now + timedelta(seconds=ttl or settings.LEADER_LEASE_SECONDS),
+        ServiceLease.heartbeat_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return held == 1
+
+
+def release(db: Session, name: str, owner: str) -> bool:
+    """Give up the lease so a standby can take over without waiting for it to expire."""
+    released = db.query(ServiceLease).filter(
+        ServiceLease.name == name, ServiceLease.owner == owner
+    ).update({
+        ServiceLease.owner: None,
+        ServiceLease.expires_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    return released == 1
+
+
+@contextmanager
+def held(db: Session, name: str, ttl: Optional[int] = None, poll: float = 1.0):
+    """Block until this process holds the lease ``name``; release it on exit."""
+    owner = process_id()
+    waited = False
+    while not acquire(db, name, owner, ttl):
+        if not waited:
+            logger.info(f"Waiting for the {name} lease")
+            waited = True
+        time.sleep(poll)
+    try:
+        yield
+    finally:
+        db.rollback()
+        release(db, name, owner)
+
+
+def lease_holder(db: Session, name: str = BACKGROUND) -> Optional[dict]:
+    """The live holder of ``name``, or None when nobody holds it."""
+    lease = db.get(ServiceLease, name)
+    if lease is None or lease.owner is None or lease.expires_at is None or lease.expires_at < datetime.utcnow():
+        return None
+    return {
+        "owner": lease.owner,
+        "acquired_at": lease.acquired_at,
+        "heartbeat_at": lease.heartbeat_at,
+        "expires_at": lease.expires_at,
+    }
@@ -0,0 +1,154 @@
+"""
+Product catalogue → scrape targets.
+
+The generic availability engine (async_product_scraper.py) scrapes every
+Product row with ``scrape_enabled`` set. Each product is identified in the
+retry queue, the work-lease table and the API by a short key: "gorilla"
+and "golden_monkey" for the two products that had their own scrapers and
+tables, and a slug of the product name (e.g. "chimps_trek") for everything
+else.
+
+Results go to product_availability. The two legacy products are also
+mirrored into available_slots and golden_monkey_slots, because bookings,
+finance and the slot alerts still read those tables.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import String, and_, func
+from sqlalchemy.orm import Session, joinedload
+
+from ..models.available_slots import AvailableSlot
+from ..models.golden_monkey_slots import GoldenMonkeySlot
+from ..models.product_availability import ProductAvailability
+from ..models.site import Product
+
+DATE_FORMAT = "%d/%m/%Y"
+
+LEGACY_KEYS = {
+    "Mountain gorillas": "gorilla",
+    "Golden Monkeys": "golden_monkey",
+}
+LEGACY_SLOT_MODELS = {
+    "gorilla": AvailableSlot,
+    "golden_monkey": GoldenMonkeySlot,
+}
+
+
+def product_key(name: str) -> str:
+    return LEGACY_KEYS.get(name) or re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+@dataclass(frozen=True)
+class ScrapeTarget:
+    """What the engine needs to check one product, detached from any session."""
+    key: str
+    product_id: int
+    name: str
+    site_label: str
+    product_label: str
+    enabled: bool
+
+
+def target_for(product: Product) -> ScrapeTarget:
+    return ScrapeTarget(
+        key=product_key(product.name),
+        product_id=product.id,
+        name=product.name,
+        site_label=product.permit_site_label or (product.site.name if product.site else ""),
+        product_label=product.permit_product_label or product.name,
+        enabled=bool(product.scrape_enabled),
+    )
+
+
+def scrape_targets(db: Session, keys: Optional[Iterable[str]] = None, enabled_only: bool = True) -> List[ScrapeTarget]:
+    """Targets for the given keys (any product), or for every enabled product."""
+    products = db.query(Product).options(joinedload(Product.site)).order_by(Product.site_id, Product.id).all()
+    targets = [target_for(product) for product in products]
+    if keys is not None:
+        keys = set(keys)
+        return [target for target in targets if target.key in keys]
+    return [target for target in targets if target.enabled or not enabled_only]
+
+
+def get_target(db: Session, key: str) -> Optional[ScrapeTarget]:
+    targets = scrape_targets(db, [key])
+    return targets[0] if targets else None
+
+
+def save_availability(db: Session, target: ScrapeTarget, date: str, slots: str):
+    """Upsert one date's availability (caller commits)."""
+    now = datetime.utcnow()
+    row = db.query(ProductAvailability).filter(
+        ProductAvailability.product_id == target.product_id, ProductAvailability.date == date
+    ).first()
+    if row:
+        row.slots = slots
+        row.updated_at = now
+    else:
+        db.add(ProductAvailability(product_id=target.product_id, date=date, slots=slots))
+
+    model = LEGACY_SLOT_MODELS.get(target.key)
+    if model is not None:
+        legacy = db.query(model).filter(model.date == date).first()
+        if legacy:
+            legacy.slots = slots
+            legacy.updated_at = now
+        else:
+            db.add(model(date=date, slots=slots))
+
+
+def slot_count(slots: Optional[str]) -> Optional[int]:
+    """A stored slots value as a number: 0 for "Sold Out", None for anything unreadable."""
+    value = (slots or "").strip()
+    if value.lower() == "sold out":
+        return 0
+    return int(value) if value.isdigit() else None
+
+
+def availability_query(db: Session, key: str):
+    """(model, query) over the stored rows for a product key, or None for an unknown key.
+
+    The legacy products read their own tables, which other writers
+    (fast_scrapers, the manual upload endpoint) still update directly.
+    """
+    model = LEGACY_SLOT_MODELS.get(key)
+    if model is not None:
+        return model, db.query(model)
+    target = get_target(db, key)
+    if target is None:
+        return None
+    return ProductAvailability, db.query(ProductAvailability).filter(ProductAvailability.product_id == target.product_id)
+
+
+def availability_rows(db: Session, key: str, dates: Optional[Iterable[str]] = None) -> list:
+    """Stored rows (with .date, .slots, .updated_at) for a product key."""
+    found = availability_query(db, key)
+    if found is None:
+        return []
+    model, query = found
+    if dates is not None:
+        query = query.filter(model.date.in_(list(dates)))
+    return query.all()
+
+
+def date_before(column, day):
+    """SQL condition: the dd/mm/yyyy string ``column`` is a date before ``day``.
+
+    The string is rearranged to yyyymmdd so the database can compare it;
+    values of any other length never match.
+    """
+    year, month, day_of_month = (func.substr(column, start, length, type_=String)
+                                 for start, length in ((7, 4), (4, 2), (1, 2)))
+    sortable = year + month + day_of_month
+    return and_(func.length(column) == 10, sortable < day.strftime("%Y%m%d"))
+
+
+def purge_past(db: Session):
+    """Delete availability for dates that have already passed."""
+    today = datetime.now().date()
+    for model in (ProductAvailability, *LEGACY_SLOT_MODELS.values()):
+        db.query(model).filter(date_before(model.date, today)).delete(synchronize_session=False)
+    db.commit()
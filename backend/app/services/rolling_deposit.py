@@ -1,18 +1,30 @@
 """
 Rolling deposit service — apply, return, top-up, and due-date calculation logic.
+
+Every ledger posting goes through _post_transaction(), which moves the agent's
+balance, writes the RollingDepositTransaction and updates the materialised
+aggregates (RollingDepositTotals per agent, RollingDepositBookingState per
+booking) in the same transaction. reconcile_rolling_deposit() recomputes the
+aggregates from the ledger and reports or repairs any drift.
 """
+import logging
 from datetime import datetime, timedelta, date
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
 from ..models.agent_client import (
     AgentClient, PaymentTermsAnchor,
     RollingDepositTransaction, RollingDepositTransactionType,
+    RollingDepositTotals, RollingDepositBookingState,
 )
 from ..models.booking import Booking
 from ..models.payment import Payment, PaymentStatus
 from ..models.agent_client import PaymentDueAudit
 
+logger = logging.getLogger(__name__)
+
 FULL_PAYMENT_DAYS_THRESHOLD = 45   # if trek is within this many days, require full payment
+TOLERANCE = 0.01                   # aggregate differences below this are rounding, not drift
 
 
 def _days_until_trek(booking: Booking) -> int:
@@ -59,6 +71,221 @@ def calculate_due_dates(booking: Booking, ac: AgentClient):
     return deposit_due, balance_due, False
 
 
+# ─── Ledger postings and materialised aggregates ──────────────────────────────
+
+def _pending(state: RollingDepositBookingState) -> float:
+    """A booking's share of its agent's pending_return."""
+    return state.outstanding if state.applied > 0 else 0.0
+
+
+def _agent_totals(db: Session, agent_client_id: int) -> RollingDepositTotals:
+    totals = db.get(RollingDepositTotals, agent_client_id)
+    if totals is not None:
+        return totals
+    has_ledger = db.query(RollingDepositTransaction.id).filter(
+        RollingDepositTransaction.agent_client_id == agent_client_id
+    ).first() is not None
+    if has_ledger:
+        # Ledger predates the aggregates — build them from it first
+        reconcile_rolling_deposit(db, agent_client_id, repair=True)
+        return db.get(RollingDepositTotals, agent_client_id)
+    totals = RollingDepositTotals(
+        agent_client_id=agent_client_id, topped_up=0.0, applied=0.0, returned=0.0,
+        adjusted=0.0, pending_return=0.0, transactions=0,
+    )
+    db.add(totals)
+    return totals
+
+
+def _post_transaction(
+    db: Session,
+    ac: AgentClient,
+    txn_type: RollingDepositTransactionType,
+    amount: float,           # as stored on the ledger row (always positive)
+    delta: float,            # signed change to the balance
+    booking: Booking | None = None,
+    notes: str = "",
+    created_by_id: int | None = None,
+):
+    """Move the balance, write the ledger row and update the aggregates."""
+    totals = _agent_totals(db, ac.id)
+    now = datetime.utcnow()
+
+    ac.rolling_deposit_balance = round(ac.rolling_deposit_balance + delta, 2)
+    db.add(RollingDepositTransaction(
+        agent_client_id=ac.id,
+        booking_id=booking.id if booking else None,
+        type=txn_type,
+        amount=amount,
+        balance_after=ac.rolling_deposit_balance,
+        notes=notes,
+        created_by=created_by_id,
+        created_at=now,
+    ))
+
+    totals.transactions += 1
+    totals.last_transaction_at = now
+    if txn_type == RollingDepositTransactionType.TOP_UP:
+        totals.topped_up = round(totals.topped_up + amount, 2)
+    elif txn_type == RollingDepositTransactionType.ADJUSTMENT:
+        totals.adjusted = round(totals.adjusted + delta, 2)
+    elif txn_type == RollingDepositTransactionType.APPLIED:
+        totals.applied = round(totals.applied + amount, 2)
+    else:
+        totals.returned = round(totals.returned + amount, 2)
+
+    if booking is None or txn_type not in (RollingDepositTransactionType.APPLIED,
+                                           RollingDepositTransactionType.RETURNED):
+        return
+
+    state = db.get(RollingDepositBookingState, booking.id)
+    if state is None:
+        state = RollingDepositBookingState(
+            booking_id=booking.id, agent_client_id=ac.id, applied=0.0, returned=0.0, outstanding=0.0,
+        )
+        db.add(state)
+    before = _pending(state)
+    if txn_type == RollingDepositTransactionType.APPLIED:
+        state.applied = round(state.applied + amount, 2)
+        state.first_applied_at = state.first_applied_at or now
+    else:
+        state.returned = round(state.returned + amount, 2)
+    state.outstanding = round(state.applied - state.returned, 2)
+    totals.pending_return = round(totals.pending_return + _pending(state) - before, 2)
+
+
+def _ledger_aggregates(db: Session, agent_client_id: int | None = None):
+    """Recompute ({agent_id: totals dict}, {booking_id: state dict}) from the ledger."""
+    T = RollingDepositTransaction
+    kind = RollingDepositTransactionType
+    # The ledger stores adjustments unsigned; the sign is the direction the balance moved
+    previous = func.lag(T.balance_after).over(partition_by=T.agent_client_id, order_by=T.id)
+    ledger = db.query(
+        T.agent_client_id, T.booking_id, T.type, T.amount, T.balance_after, T.created_at,
+        previous.label("previous_balance"),
+    )
+    if agent_client_id is not None:
+        ledger = ledger.filter(T.agent_client_id == agent_client_id)
+    sub = ledger.subquery()
+
+    def total(txn_type, value=sub.c.amount):
+        return func.coalesce(func.sum(case((sub.c.type == txn_type, value), else_=0.0)), 0.0)
+
+    signed = case(
+        (sub.c.balance_after < func.coalesce(sub.c.previous_balance, 0.0), -sub.c.amount), else_=sub.c.amount,
+    )
+    agents = {}
+    for agent_id, topped_up, applied, returned, adjusted, count, last_at in db.query(
+        sub.c.agent_client_id, total(kind.TOP_UP), total(kind.APPLIED), total(kind.RETURNED),
+        total(kind.ADJUSTMENT, signed), func.count(), func.max(sub.c.created_at),
+    ).group_by(sub.c.agent_client_id):
+        agents[agent_id] = {
+            "topped_up": round(topped_up, 2), "applied": round(applied, 2), "returned": round(returned, 2),
+            "adjusted": round(adjusted, 2), "pending_return": 0.0, "transactions": count,
+            "last_transaction_at": last_at,
+        }
+
+    bookings = {}
+    for booking_id, agent_id, applied, returned, first_applied_at in db.query(
+        sub.c.booking_id, func.min(sub.c.agent_client_id), total(kind.APPLIED), total(kind.RETURNED),
+        func.min(case((sub.c.type == kind.APPLIED, sub.c.created_at))),
+    ).filter(
+        sub.c.booking_id.isnot(None), sub.c.type.in_([kind.APPLIED, kind.RETURNED]),
+    ).group_by(sub.c.booking_id):
+        state = {
+            "agent_client_id": agent_id, "applied": round(applied, 2), "returned": round(returned, 2),
+            "outstanding": round(applied - returned, 2), "first_applied_at": first_applied_at,
+        }
+        bookings[booking_id] = state
+        if state["applied"] > 0:
+            agents[agent_id]["pending_return"] = round(agents[agent_id]["pending_return"] + state["outstanding"], 2)
+    return agents, bookings
+
+
+def reconcile_rolling_deposit(db: Session, agent_client_id: int | None = None, repair: bool = False) -> dict:
+    """Compare the materialised aggregates with the ledger; optionally rewrite them.
+
+    Returns the discrepancies found. Balance drift (agent_clients.rolling_deposit_balance
+    not matching the last ledger row) is reported but never repaired — the balance is
+    the operational figure and needs a finance adjustment, not a silent rewrite.
+    The caller commits.
+    """
+    agents, bookings = _ledger_aggregates(db, agent_client_id)
+
+    totals_query = db.query(RollingDepositTotals)
+    states_query = db.query(RollingDepositBookingState)
+    if agent_client_id is not None:
+        totals_query = totals_query.filter(RollingDepositTotals.agent_client_id == agent_client_id)
+        states_query = states_query.filter(RollingDepositBookingState.agent_client_id == agent_client_id)
+        agents.setdefault(agent_client_id, {
+            "topped_up": 0.0, "applied": 0.0, "returned": 0.0, "adjusted": 0.0, "pending_return": 0.0,
+            "transactions": 0, "last_transaction_at": None,
+        })
+    stored_totals = {row.agent_client_id: row for row in totals_query}
+    stored_states = {row.booking_id: row for row in states_query}
+
+    discrepancies = []
+
+    def sync(kind, key, stored, expected, fields, make):
+        if stored is None:
+            discrepancies.append({"kind": kind, "id": key, "field": None, "stored": None, "expected": "missing row"})
+            if repair:
+                db.add(make())
+            return
+        for field in fields:
+            have, want = getattr(stored, field), expected[field]
+            if isinstance(want, float) or isinstance(have, float):
+                differs = abs((have or 0.0) - want) > TOLERANCE
+            else:
+                differs = have != want
+            if differs:
+                discrepancies.append({"kind": kind, "id": key, "field": field, "stored": have, "expected": want})
+                if repair:
+                    setattr(stored, field, want)
+
+    total_fields = ("topped_up", "applied", "returned", "adjusted", "pending_return", "transactions")
+    for agent_id, expected in agents.items():
+        sync("agent", agent_id, stored_totals.pop(agent_id, None), expected, total_fields,
+             lambda: RollingDepositTotals(agent_client_id=agent_id, **expected))
+    state_fields = ("applied", "returned", "outstanding")
+    for booking_id, expected in bookings.items():
+        sync("booking", booking_id, stored_states.pop(booking_id, None), expected, state_fields,
+             lambda: RollingDepositBookingState(booking_id=booking_id, **expected))
+
+    # Aggregate rows with no ledger behind them
+    for kind, leftovers in (("agent", stored_totals), ("booking", stored_states)):
+        for key, row in leftovers.items():
+            discrepancies.append({"kind": kind, "id": key, "field": None, "stored": "row", "expected": "no ledger rows"})
+            if repair:
+                db.delete(row)
+
+    last_ids = db.query(func.max(RollingDepositTransaction.id)).group_by(RollingDepositTransaction.agent_client_id)
+    if agent_client_id is not None:
+        last_ids = last_ids.filter(RollingDepositTransaction.agent_client_id == agent_client_id)
+    balance_drift = [
+        {"agent_client_id": ac.id, "balance": ac.rolling_deposit_balance, "ledger_balance": txn.balance_after}
+        for txn, ac in db.query(RollingDepositTransaction, AgentClient)
+        .join(AgentClient, AgentClient.id == RollingDepositTransaction.agent_client_id)
+        .filter(RollingDepositTransaction.id.in_(last_ids.scalar_subquery()))
+        if abs((ac.rolling_deposit_balance or 0.0) - txn.balance_after) > TOLERANCE
+    ]
+
+    if discrepancies or balance_drift:
+        logger.warning(
+            f"Rolling deposit aggregates: {len(discrepancies)} discrepancies, "
+            f"{len(balance_drift)} balance mismatches{' (repaired aggregates)' if repair else ''}"
+        )
+    if repair:
+        db.flush()
+    return {
+        "agents_checked": len(agents),
+        "bookings_checked": len(bookings),
+        "discrepancies": discrepancies,
+        "balance_drift": balance_drift,
+        "repaired": repair,
+    }
+
+
 def apply_rolling_deposit(
     db: Session,
     booking: Booking,
@@ -84,21 +311,12 @@ def apply_rolling_deposit(
     if ac.rolling_deposit_balance < amount:
         return False   # insufficient — flag to finance, don't auto-apply
 
-    ac.rolling_deposit_balance = round(ac.rolling_deposit_balance - amount, 2)
-
     note = (
         f"{'Full payment' if require_full else 'Deposit'} applied for booking "
         f"'{booking.booking_name}' (trek in {days_left} days)"
     )
-    db.add(RollingDepositTransaction(
-        agent_client_id=ac.id,
-        booking_id=booking.id,
-        type=RollingDepositTransactionType.APPLIED,
-        amount=amount,
-        balance_after=ac.rolling_deposit_balance,
-        notes=note,
-        created_by=created_by_id,
-    ))
+    _post_transaction(db, ac, RollingDepositTransactionType.APPLIED, amount, -amount,
+                      booking=booking, notes=note, created_by_id=created_by_id)
 
     # Mark payment as covered by rolling deposit
     if require_full:
@@ -121,17 +339,11 @@ def return_rolling_deposit(
     notes: str = "",
 ):
     """Restore funds to the rolling deposit after agent pays the booking."""
-    ac.rolling_deposit_balance = round(ac.rolling_deposit_balance + amount, 2)
-
-    db.add(RollingDepositTransaction(
-        agent_client_id=ac.id,
-        booking_id=booking.id,
-        type=RollingDepositTransactionType.RETURNED,
-        amount=amount,
-        balance_after=ac.rolling_deposit_balance,
+    _post_transaction(
+        db, ac, RollingDepositTransactionType.RETURNED, amount, amount, booking=booking,
         notes=notes or f"Funds returned after payment received for '{booking.booking_name}'",
-        created_by=created_by_id,
-    ))
+        created_by_id=created_by_id,
+    )
 
 
 def top_up_rolling_deposit(
@@ -142,17 +354,8 @@ def top_up_rolling_deposit(
     notes: str = "",
 ):
     """Finance admin records agent top-up (agent sent funds to replenish pot)."""
-    ac.rolling_deposit_balance = round(ac.rolling_deposit_balance + amount, 2)
-
-    db.add(RollingDepositTransaction(
-        agent_client_id=ac.id,
-        booking_id=None,
-        type=RollingDepositTransactionType.TOP_UP,
-        amount=amount,
-        balance_after=ac.rolling_deposit_balance,
-        notes=notes or "Agent top-up",
-        created_by=created_by_id,
-    ))
+    _post_transaction(db, ac, RollingDepositTransactionType.TOP_UP, amount, amount,
+                      notes=notes or "Agent top-up", created_by_id=created_by_id)
 
 
 def adjust_rolling_deposit(
@@ -163,17 +366,8 @@ def adjust_rolling_deposit(
     notes: str = "",
 ):
     """Manual correction by finance admin."""
-    ac.rolling_deposit_balance = round(ac.rolling_deposit_balance + amount, 2)
-
-    db.add(RollingDepositTransaction(
-        agent_client_id=ac.id,
-        booking_id=None,
-        type=RollingDepositTransactionType.ADJUSTMENT,
-        amount=abs(amount),
-        balance_after=ac.rolling_deposit_balance,
-        notes=notes or "Manual adjustment",
-        created_by=created_by_id,
-    ))
+    _post_transaction(db, ac, RollingDepositTransactionType.ADJUSTMENT, abs(amount), amount,
+                      notes=notes or "Manual adjustment", created_by_id=created_by_id)
 
 
 def update_due_date(
@@ -0,0 +1,254 @@
+"""
+On-demand scrape jobs — "refresh these products for these dates now".
+
+The API queues a scrape_jobs row and returns its id straight away. Every
+scrape worker (scrape_worker.py, or the one inside the API process) polls
+for queued jobs on a separate lane every SCRAPE_JOB_POLL_SECONDS. So a job
+starts within seconds, even while a 30-day background batch is running.
+Jobs are claimed with the same compare-and-set lease as scrape work items,
+and while any job is waiting or running, workers hold off claiming new
+background items. Jobs therefore come first.
+
+Work is deduplicated twice. A request that an active job already covers
+gets that job back instead of a new one. When a job runs, it skips dates
+whose availability every requested product has already had refreshed since
+the job was submitted, i.e. dates the background sweep got to first.
+
+The worker stores progress and renews its lease on each poll. It also picks
+up cancellation requests then, so a cancel takes effect within one poll
+interval.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.scrape_job import ScrapeJob
+from .product_catalogue import DATE_FORMAT, availability_rows, scrape_targets
+from .scrape_leases import HORIZON_DAYS
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+def job_products(job: ScrapeJob) -> List[str]:
+    return job.products.split(",")
+
+
+def job_dates(job: ScrapeJob) -> List[date]:
+    """Every date the job covers, in order."""
+    if job.dates:
+        return [date.fromisoformat(value) for value in job.dates.split(",")]
+    return [job.start_date + timedelta(days=i) for i in range((job.end_date - job.start_date).days + 1)]
+
+
+def submit_job(db: Session, products: Optional[Iterable[str]], start_date: Optional[date] = None,
+               end_date: Optional[date] = None, dates: Optional[Iterable[date]] = None,
+               requested_by: Optional[int] = None) -> Tuple[ScrapeJob, bool]:
+    """Queue a job, or return the active job that already covers the request.
+
+    Give either ``dates`` or a ``start_date``/``end_date`` range (the end
+    defaults to the start). ``products`` defaults to every enabled product.
+    Returns (job, created). Raises ValueError for a bad request.
+    """
+    today = datetime.now().date()
+    horizon_end = today + timedelta(days=HORIZON_DAYS - 1)
+
+    if products:
+        products = sorted(set(products))
+        known = {target.key for target in scrape_targets(db, products)}
+        unknown = [key for key in products if key not in known]
+        if unknown:
+            raise ValueError(f"Unknown product keys: {', '.join(unknown)}")
+    else:
+        products = sorted(target.key for target in scrape_targets(db))
+        if not products:
+            raise ValueError("No products have scraping enabled")
+
+    if dates:
+        wanted = sorted(set(dates))
+        start_date, end_date = wanted[0], wanted[-1]
+    elif start_date:
+        end_date = end_date or start_date
+        if end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        wanted = None
+    else:
+        raise ValueError("Give either dates or a start_date")
+    if start_date < today or end_date > horizon_end:
+        raise ValueError(f"Dates must be between {today.isoformat()} and {horizon_end.isoformat()}")
+
+    wanted_dates = set(wanted) if wanted else None
+    for job in db.query(ScrapeJob).filter(
+        ScrapeJob.status.in_(ACTIVE), ScrapeJob.cancel_requested.is_(False)
+    ).order_by(ScrapeJob.id):
+        if not set(products) <= set(job_products(job)):
+            continue
+        if job.start_date > start_date or job.end_date < end_date:
+            continue
+        if job.dates and not (wanted_dates and wanted_dates <= set(job_dates(job))):
+            continue
+        return job, False
+
+    day_count = len(wanted) if wanted else (end_date - start_date).days + 1
+    job = ScrapeJob(
+        products=",".join(products),
+        start_date=start_date,
+        end_date=end_date,
+        dates=",".join(d.isoformat() for d in wanted) if wanted else None,
+        requested_by=requested_by,
+        total_checks=day_count * len(products),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info(f"Queued scrape job {job.id}: {job.products} {start_date} to {end_date} ({job.total_checks} checks)")
+    return job, True
+
+
+def _lease_free(now: datetime):
+    return or_(ScrapeJob.lease_owner.is_(None), ScrapeJob.lease_expires_at < now)
+
+
+def jobs_pending(db: Session) -> bool:
+    """True while any job waits or runs; background items wait for them."""
+    return db.query(ScrapeJob.id).filter(
+        ScrapeJob.status.in_(ACTIVE), ScrapeJob.cancel_requested.is_(False)
+    ).first() is not None
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[int]:
+    """Lease the oldest waiting job (or one whose worker died). Returns its id, or None."""
+    now = datetime.utcnow()
+    # A worker that died after a cancel was requested never finishes its job
+    abandoned = db.query(ScrapeJob).filter(
+        ScrapeJob.status == RUNNING, ScrapeJob.cancel_requested.is_(True), ScrapeJob.lease_expires_at < now,
+    ).update({
+        ScrapeJob.status: CANCELLED,
+        ScrapeJob.finished_at: now,
+        ScrapeJob.lease_owner: None,
+        ScrapeJob.lease_expires_at: None,
+    }, synchronize_session=False)
+    if abandoned:
+        db.commit()
+    candidates = [row.id for row in db.query(ScrapeJob.id).filter(
+        ScrapeJob.status.in_(ACTIVE), ScrapeJob.cancel_requested.is_(False), _lease_free(now),
+    ).order_by(ScrapeJob.created_at, ScrapeJob.id).limit(5)]
+    for job_id in candidates:
+        claimed = db.query(ScrapeJob).filter(ScrapeJob.id == job_id, _lease_free(now)).update({
+            ScrapeJob.lease_owner: worker_id,
+            ScrapeJob.lease_expires_at: now + timedelta(seconds=settings.SCRAPE_LEASE_SECONDS),
+            ScrapeJob.heartbeat_at: now,
+            ScrapeJob.status: RUNNING,
+            ScrapeJob.started_at: now,
+            # A job taken over from a dead worker starts its count again
+            ScrapeJob.done_checks: 0,
+            ScrapeJob.skipped_checks: 0,
+            ScrapeJob.resolved_checks: 0,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed == 1:
+            return job_id
+    return None
+
+
+def report_progress(db: Session, job_id: int, worker_id: str, progress: Dict[str, int]) -> Optional[bool]:
+    """Store progress and renew the lease.
+
+    Returns whether cancellation was requested, or None if the lease was lost.
+    """
+    now = datetime.utcnow()
+    renewed = db.query(ScrapeJob).filter(
+        ScrapeJob.id == job_id, ScrapeJob.lease_owner == worker_id
+    ).update({
+        ScrapeJob.lease_expires_at: now + timedelta(seconds=settings.SCRAPE_LEASE_SECONDS),
+        ScrapeJob.heartbeat_at: now,
+        ScrapeJob.done_checks: progress["done"],
+        ScrapeJob.skipped_checks: progress["skipped"],
+        ScrapeJob.resolved_checks: progress["resolved"],
+    }, synchronize_session=False)
+    db.commit()
+    if renewed != 1:
+        return None
+    return db.query(ScrapeJob.cancel_requested).filter(ScrapeJob.id == job_id).scalar()
+
+
+def finish_job(db: Session, job_id: int, worker_id: str, status: str, error: Optional[str] = None) -> bool:
+    finished = db.query(ScrapeJob).filter(
+        ScrapeJob.id == job_id, ScrapeJob.lease_owner == worker_id
+    ).update({
+        ScrapeJob.status: status,
+        ScrapeJob.error: error[:500] if error else None,
+        ScrapeJob.finished_at: datetime.utcnow(),
+        ScrapeJob.lease_owner: None,
+        ScrapeJob.lease_expires_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    if finished != 1:
+        logger.warning(f"Worker {worker_id} no longer held scrape job {job_id}")
+    return finished == 1
+
+
+def cancel_job(db: Session, job: ScrapeJob) -> ScrapeJob:
+    """Cancel a waiting job at once; ask the worker running one to stop."""
+    if job.status == QUEUED:
+        cancelled = db.query(ScrapeJob).filter(
+            ScrapeJob.id == job.id, ScrapeJob.status == QUEUED
+        ).update({
+            ScrapeJob.status: CANCELLED,
+            ScrapeJob.cancel_requested: True,
+            ScrapeJob.finished_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        if cancelled == 1:
+            db.commit()
+            db.refresh(job)
+            return job
+        db.refresh(job)  # claimed in the meantime
+    if job.status == RUNNING:
+        job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def dates_to_check(db: Session, job: ScrapeJob, dates: List[date]) -> List[date]:
+    """``dates`` minus those every product of ``job`` has had refreshed since it was submitted."""
+    wanted = {d.strftime(DATE_FORMAT): d for d in dates}
+    fresh = None
+    for key in job_products(job):
+        refreshed = {row.date for row in availability_rows(db, key, list(wanted))
+                     if row.updated_at and row.updated_at >= job.created_at}
+        fresh = refreshed if fresh is None else fresh & refreshed
+    return [d for value, d in wanted.items() if value not in (fresh or set())]
+
+
+def job_dict(job: ScrapeJob) -> dict:
+    return {
+        "id": job.id,
+        "products": job_products(job),
+        "start_date": job.start_date,
+        "end_date": job.end_date,
+        "dates": job.dates.split(",") if job.dates else None,
+        "status": job.status,
+        "total_checks": job.total_checks,
+        "done_checks": job.done_checks,
+        "skipped_checks": job.skipped_checks,
+        "resolved_checks": job.resolved_checks,
+        "progress": round((job.done_checks + job.skipped_checks) / job.total_checks, 3) if job.total_checks else 1.0,
+        "cancel_requested": job.cancel_requested,
+        "error": job.error,
+        "worker": job.lease_owner if job.status == RUNNING else None,
+        "requested_by": job.requested_by,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
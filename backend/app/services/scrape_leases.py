@@ -0,0 +1,190 @@
+"""
+Scrape work leases — lets several scrape workers split the 2-year horizon.
+
+The horizon is cut into scrape_work_items rows, one per (product, 30-day
+range), plus a single row for draining the retry queue. A worker claims an
+item by setting lease_owner/lease_expires_at with a conditional UPDATE that
+only succeeds if nobody else holds a live lease. That compare-and-set works
+the same on PostgreSQL and SQLite. While it works the item, the worker
+renews the lease with heartbeats. If the worker dies, the lease expires and
+another worker picks the item up.
+
+Items are handed out least-recently-completed first, so a pool of workers
+cycles through the whole horizon without repeating a range until every
+range has had its turn. Batch items exist for every product with
+scrape_enabled set. A worker that claims one range also claims the other
+products' items for the same range, so that one sweep over the dates
+checks them all.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.scrape_work import ScrapeWorkItem
+from .product_catalogue import scrape_targets
+
+logger = logging.getLogger(__name__)
+
+BATCH = "batch"
+RETRY_DRAIN = "retry_drain"
+# product of the retry-drain item; NULLs never collide under uq_scrape_work_item
+ALL_PRODUCTS = "*"
+
+HORIZON_DAYS = 365 * 2
+BATCH_DAYS = 30  # the Playwright scrapers cover 30 days per call
+
+
+def ensure_work_items(db: Session, products: Optional[Iterable[str]] = None):
+    """Create any missing work items for the configured horizon (idempotent).
+
+    Without ``products``, this covers every enabled product and drops the
+    unleased batch items of products that are no longer enabled. Every worker
+    calls this, so a concurrent insert of the same item is expected and
+    rolled back.
+    """
+    # Drain items from before ALL_PRODUCTS (product NULL) could be duplicated
+    db.query(ScrapeWorkItem).filter(
+        ScrapeWorkItem.kind == RETRY_DRAIN,
+        ScrapeWorkItem.product.is_(None),
+        _lease_free(datetime.utcnow()),
+    ).delete(synchronize_session=False)
+    if products is None:
+        products = [target.key for target in scrape_targets(db)]
+        db.query(ScrapeWorkItem).filter(
+            ScrapeWorkItem.kind == BATCH,
+            ScrapeWorkItem.product.notin_(products),
+            _lease_free(datetime.utcnow()),
+        ).delete(synchronize_session=False)
+    products = list(products)
+    wanted = {(BATCH, product, offset)
+              for product in products
+              for offset in range(0, HORIZON_DAYS, BATCH_DAYS)}
+    wanted.add((RETRY_DRAIN, ALL_PRODUCTS, 0))
+    existing = {(row.kind, row.product, row.start_offset) for row in db.query(ScrapeWorkItem).all()}
+    for kind, product, offset in sorted(wanted - existing):
+        db.add(ScrapeWorkItem(
+            kind=kind, product=product, start_offset=offset,
+            days=BATCH_DAYS if kind == BATCH else 0,
+        ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker created some of the same items first; the next call adds any still missing
+        db.rollback()
+
+
+def _lease_free(now: datetime):
+    return or_(ScrapeWorkItem.lease_owner.is_(None), ScrapeWorkItem.lease_expires_at < now)
+
+
+def claim_next(db: Session, worker_id: str, kinds: Iterable[str] = (BATCH,),
+               products: Optional[Iterable[str]] = None,
+               completed_before: Optional[datetime] = None,
+               start_offset: Optional[int] = None) -> Optional[ScrapeWorkItem]:
+    """Lease the most overdue free item, or return None if nothing is due.
+
+    An item is due when it has never completed or last completed more than
+    its revisit interval ago. For batches, ``completed_before`` overrides
+    that cutoff (used to make exactly one pass over the horizon), and
+    ``start_offset`` restricts the claim to one date range.
+    """
+    now = datetime.utcnow()
+    for kind in kinds:
+        if kind == RETRY_DRAIN:
+            if settings.SCRAPE_RETRY_DRAIN_INTERVAL <= 0:
+                continue
+            cutoff = now - timedelta(seconds=settings.SCRAPE_RETRY_DRAIN_INTERVAL)
+        else:
+            cutoff = completed_before or now - timedelta(seconds=settings.SCRAPE_REVISIT_SECONDS)
+        query = db.query(ScrapeWorkItem).filter(
+            ScrapeWorkItem.kind == kind,
+            _lease_free(now),
+            or_(ScrapeWorkItem.last_completed_at.is_(None), ScrapeWorkItem.last_completed_at < cutoff),
+        )
+        if products is not None and kind == BATCH:
+            query = query.filter(ScrapeWorkItem.product.in_(list(products)))
+        if start_offset is not None and kind == BATCH:
+            query = query.filter(ScrapeWorkItem.start_offset == start_offset)
+        candidates = query.order_by(
+            ScrapeWorkItem.last_completed_at.asc().nullsfirst(), ScrapeWorkItem.start_offset
+        ).limit(5).all()
+
+        for candidate in candidates:
+            claimed = db.query(ScrapeWorkItem).filter(
+                ScrapeWorkItem.id == candidate.id, _lease_free(now)
+            ).update({
+                ScrapeWorkItem.lease_owner: worker_id,
+                ScrapeWorkItem.lease_expires_at: now + timedelta(seconds=settings.SCRAPE_LEASE_SECONDS),
+                ScrapeWorkItem.heartbeat_at: now,
+                ScrapeWorkItem.last_started_at: now,
+                ScrapeWorkItem.runs: ScrapeWorkItem.runs + 1,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed == 1:
+                db.refresh(candidate)
+                return candidate
+    return None
+
+
+def heartbeat(db: Session, item_id: int, worker_id: str) -> bool:
+    """Extend a held lease. Returns False if the lease was lost to another worker."""
+    now = datetime.utcnow()
+    renewed = db.query(ScrapeWorkItem).filter(
+        ScrapeWorkItem.id == item_id, ScrapeWorkItem.lease_owner == worker_id
+    ).update({
+        ScrapeWorkItem.lease_expires_at: now + timedelta(seconds=settings.SCRAPE_LEASE_SECONDS),
+        ScrapeWorkItem.heartbeat_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return renewed == 1
+
+
+def release(db: Session, item_id: int, worker_id: str, error: Optional[str] = None) -> bool:
+    """Give up a lease and mark the item done for this pass.
+
+    A failed run (``error``) also counts as done, so a broken range goes to the
+    back of the line instead of being claimed again straight away. Its dates
+    are already in the retry queue.
+    """
+    values = {
+        ScrapeWorkItem.lease_owner: None,
+        ScrapeWorkItem.lease_expires_at: None,
+        ScrapeWorkItem.last_completed_at: datetime.utcnow(),
+        ScrapeWorkItem.last_error: error[:500] if error else None,
+    }
+    if error:
+        values[ScrapeWorkItem.failures] = ScrapeWorkItem.failures + 1
+    released = db.query(ScrapeWorkItem).filter(
+        ScrapeWorkItem.id == item_id, ScrapeWorkItem.lease_owner == worker_id
+    ).update(values, synchronize_session=False)
+    db.commit()
+    if released != 1:
+        logger.warning(f"Worker {worker_id} no longer held the lease on work item {item_id}")
+    return released == 1
+
+
+def lease_status(db: Session) -> List[dict]:
+    now = datetime.utcnow()
+    items = db.query(ScrapeWorkItem).order_by(
+        ScrapeWorkItem.kind, ScrapeWorkItem.product, ScrapeWorkItem.start_offset
+    ).all()
+    return [{
+        "id": item.id,
+        "kind": item.kind,
+        "product": item.product,
+        "start_offset": item.start_offset,
+        "days": item.days,
+        "lease_owner": item.lease_owner if item.lease_expires_at and item.lease_expires_at >= now else None,
+        "lease_expires_at": item.lease_expires_at,
+        "heartbeat_at": item.heartbeat_at,
+        "last_started_at": item.last_started_at,
+        "last_completed_at": item.last_completed_at,
+        "last_error": item.last_error,
+        "runs": item.runs,
+        "failures": item.failures,
+    } for item in items]
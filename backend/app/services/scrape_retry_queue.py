@@ -0,0 +1,253 @@
+"""
+Scrape retry queue — durable record of (product, date) pairs the scrapers failed to resolve.
+
+The batch scrapers only retry a date once, in a fresh tab, inside the same
+run. Anything still unresolved used to wait for the next 2-year cycle to come
+round again. Now those dates go into scrape_retry_queue with an attempt count
+and an exponential backoff. The scrape workers' retry-drain work item calls
+``drain_once`` to re-check whatever is due, nearest trek date first. A
+successful scrape from any source clears the entry. Products are keyed as in
+app/services/product_catalogue.py.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.scrape_retry import ScrapeRetry
+from .product_catalogue import (
+    DATE_FORMAT, LEGACY_SLOT_MODELS, availability_rows, date_before, get_target, save_availability, scrape_targets,
+)
+from .slot_alerts import SlotAlerts
+
+logger = logging.getLogger(__name__)
+
+
+def product_for_model(model) -> str:
+    for product, slot_model in LEGACY_SLOT_MODELS.items():
+        if slot_model is model:
+            return product
+    raise ValueError(f"No retry queue product for {model.__name__}")
+
+
+def _parse(date: str) -> datetime:
+    return datetime.strptime(date, DATE_FORMAT)
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff (base * 2^(attempts-1)) capped at SCRAPE_RETRY_MAX_DELAY, with 10% jitter."""
+    base = settings.SCRAPE_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+    seconds = min(base, settings.SCRAPE_RETRY_MAX_DELAY)
+    return timedelta(seconds=seconds * random.uniform(0.9, 1.1))
+
+
+def record_failures(db: Session, product: str, dates: Iterable[str], error: str, source: str = None):
+    """Add or bump queue entries for dates that could not be scraped."""
+    dates = list(dict.fromkeys(dates))
+    if not dates:
+        return
+    now = datetime.utcnow()
+    existing = {
+        row.date: row for row in db.query(ScrapeRetry).filter(
+            ScrapeRetry.product == product, ScrapeRetry.date.in_(dates)
+        ).all()
+    }
+    for date in dates:
+        row = existing.get(date)
+        if row is None:
+            row = ScrapeRetry(product=product, date=date, attempts=0, first_failed_at=now)
+            db.add(row)
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = (error or "unknown error")[:500]
+        row.source = source
+        row.last_attempt_at = now
+        row.next_attempt_at = now + backoff_delay(row.attempts)
+    db.commit()
+
+
+def record_successes(db: Session, product: str, dates: Iterable[str]):
+    """Drop queue entries for dates that have now been scraped."""
+    dates = list(dates)
+    if not dates:
+        return
+    db.query(ScrapeRetry).filter(
+        ScrapeRetry.product == product, ScrapeRetry.date.in_(dates)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def record_scrape_outcome(db: Session, product: str, requested: Iterable[str],
+                          results: Iterable[Tuple[str, str]], source: str,
+                          error: str = "no slot value after in-run retry"):
+    """Queue the requested dates a scraper run did not resolve and clear the ones it did."""
+    try:
+        resolved = {date for date, slots in results if date and slots}
+        record_successes(db, product, resolved)
+        record_failures(db, product, [d for d in requested if d not in resolved], error, source)
+    except Exception as e:
+        logger.error(f"Could not update scrape retry queue for {product}: {str(e)}")
+        db.rollback()
+
+
+def purge_past(db: Session):
+    """Remove entries for dates that have already passed."""
+    expired = db.query(ScrapeRetry).filter(
+        date_before(ScrapeRetry.date, datetime.now().date())
+    ).delete(synchronize_session=False)
+    if expired:
+        db.commit()
+
+
+def due_retries(db: Session, product: str, limit: int, now: Optional[datetime] = None) -> List[ScrapeRetry]:
+    """Entries whose backoff has elapsed, nearest trek date first."""
+    now = now or datetime.utcnow()
+    rows = db.query(ScrapeRetry).filter(
+        ScrapeRetry.product == product, ScrapeRetry.next_attempt_at <= now
+    ).all()
+    rows.sort(key=lambda row: _parse(row.date))
+    return rows[:limit]
+
+
+def stale_dates(db: Session, product: Optional[str] = None, days: int = 60, max_age_hours: int = 24) -> List[dict]:
+    """Dates in the next ``days`` days whose availability can't be trusted, and why.
+
+    A date is stale when it is waiting in the retry queue, has never been
+    scraped, or was last refreshed more than ``max_age_hours`` ago.
+    """
+    products = [product] if product else [target.key for target in scrape_targets(db)]
+    today = datetime.now().date()
+    window = [(today + timedelta(days=i)).strftime(DATE_FORMAT) for i in range(days)]
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+
+    stale = []
+    for name in products:
+        slots = {row.date: row for row in availability_rows(db, name, window)}
+        queued = {
+            row.date: row for row in db.query(ScrapeRetry).filter(ScrapeRetry.product == name).all()
+        }
+        for date in window:
+            slot = slots.get(date)
+            retry = queued.get(date)
+            if retry:
+                reason = "retry_pending"
+            elif slot is None:
+                reason = "never_scraped"
+            elif slot.updated_at is None or slot.updated_at < cutoff:
+                reason = "outdated"
+            else:
+                continue
+            stale.append({
+                "product": name,
+                "date": date,
+                "reason": reason,
+                "last_error": retry.last_error if retry else None,
+                "attempts": retry.attempts if retry else 0,
+                "source": retry.source if retry else None,
+                "first_failed_at": retry.first_failed_at if retry else None,
+                "next_attempt_at": retry.next_attempt_at if retry else None,
+                "last_known_slots": slot.slots if slot else None,
+                "last_updated_at": slot.updated_at if slot else None,
+            })
+    stale.sort(key=lambda entry: (_parse(entry["date"]), entry["product"]))
+    return stale
+
+
+async def _browser_check(product: str, dates: List[str]) -> Dict[str, Tuple[Optional[str], str]]:
+    """Re-check dates with Playwright, a few tabs at a time.
+
+    Returns {date: (slots or None, reason)}.
+    """
+    from playwright.async_api import async_playwright
+    from async_product_scraper import check_target, USER_AGENTS
+    from ..utils import lean_pages
+
+    db = SessionLocal()
+    try:
+        target = get_target(db, product)
+    finally:
+        db.close()
+    if target is None:
+        return {date: (None, f"{product} is not in the product catalogue") for date in dates}
+
+    outcome = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=True,
+            args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage'],
+        )
+        context = await browser.new_context(
+            user_agent=random.choice(USER_AGENTS),
+            viewport={'width': 1280, 'height': 720},
+        )
+        await lean_pages.install(context)
+        semaphore = asyncio.Semaphore(settings.SCRAPE_RETRY_TABS)
+
+        async def check(date: str):
+            async with semaphore:
+                page = await context.new_page()
+                try:
+                    await page.goto(settings.PERMIT_SITE_URL, timeout=20000, wait_until='domcontentloaded')
+                    result = await check_target(page, date, target)
+                    if result:
+                        outcome[date] = (result[1], "")
+                    else:
+                        outcome[date] = (None, "no slot value or 'No slots' message on page")
+                except Exception as e:
+                    outcome[date] = (None, f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+                finally:
+                    await page.close()
+
+        try:
+            await asyncio.gather(*(check(date) for date in dates))
+        finally:
+            await context.close()
+            await browser.close()
+    return outcome
+
+
+async def drain_once(check=None) -> Dict[str, dict]:
+    """Re-check every due entry once.
+
+    ``check(product, dates)`` must return {date: (slots or None, reason)};
+    it defaults to a Playwright re-check against PERMIT_SITE_URL.
+    """
+    check = check or _browser_check
+    summary = {}
+    db = SessionLocal()
+    try:
+        purge_past(db)
+        products = [row[0] for row in db.query(ScrapeRetry.product).distinct().order_by(ScrapeRetry.product).all()]
+        for product in products:
+            due = [row.date for row in due_retries(db, product, settings.SCRAPE_RETRY_BATCH)]
+            if not due:
+                continue
+            target = get_target(db, product)
+            try:
+                outcome = await check(product, due)
+            except Exception as e:
+                logger.error(f"Retry drain for {product} failed: {str(e)}")
+                outcome = {date: (None, f"{type(e).__name__}: {str(e)}") for date in due}
+
+            resolved = []
+            alerts = SlotAlerts(db)
+            for date in due:
+                slots, reason = outcome.get(date, (None, "not checked"))
+                if slots and target is not None:
+                    save_availability(db, target, date, slots)
+                    alerts.observe(target, date, slots)
+                    resolved.append(date)
+                else:
+                    record_failures(db, product, [date], reason, source="retry_drain")
+            alerts.send()
+            db.commit()
+            record_successes(db, product, resolved)
+            summary[product] = {"checked": len(due), "resolved": len(resolved)}
+            logger.info(f"Retry drain for {product}: {len(resolved)}/{len(due)} dates resolved")
+    finally:
+        db.close()
+    return summary
@@ -0,0 +1,332 @@
+"""
+Scrape telemetry — structured timings for scrape runs, batches and date checks.
+
+A *run* is one scrape cycle: a worker's pass over the horizon (it rolls over
+to a new run when the worker comes back round to a range it has already
+done), or a single direct engine call. Each engine call inside a run is a
+*batch*. Each (product, date) check in a batch is a *date timing*, with its
+latency summed over attempts, the number of attempts, and the outcome.
+Each browser tab a batch opened is a *page load*: its load time and what
+its requests cost in bytes, cache hits and blocked requests
+(app/utils/lean_pages.py).
+
+Date timings and page loads are kept for SCRAPE_TELEMETRY_DETAIL_DAYS. After that, the
+nightly ``rollup_and_prune`` job folds them into scrape_telemetry_daily and
+deletes them. Runs and batches are kept for SCRAPE_TELEMETRY_RUN_DAYS.
+
+Recording never raises: a telemetry failure is logged and the scrape carries on.
+"""
+import logging
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.scrape_telemetry import ScrapeBatch, ScrapeDateTiming, ScrapePageLoad, ScrapeRun, ScrapeTelemetryDaily
+
+logger = logging.getLogger(__name__)
+
+RESOLVED_OUTCOMES = ("ok", "sold_out")
+ABANDONED_AFTER = timedelta(hours=6)  # a running run with no batch for this long is marked abandoned
+
+
+@dataclass
+class DateTiming:
+    product: str
+    date: str
+    latency_ms: float
+    attempts: int
+    outcome: str
+    checked_at: datetime = field(default_factory=datetime.utcnow)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * pct) - 1)]
+
+
+# -- recording -----------------------------------------------------------------
+
+def start_run(db: Session, engine: str, worker_id: Optional[str] = None) -> Optional[int]:
+    try:
+        run = ScrapeRun(engine=engine, worker_id=worker_id, status="running", started_at=datetime.utcnow())
+        db.add(run)
+        db.commit()
+        return run.id
+    except Exception as e:
+        logger.error(f"Could not start scrape run record: {str(e)}")
+        db.rollback()
+        return None
+
+
+def finish_run(db: Session, run_id: Optional[int], status: str = "completed", error: Optional[str] = None):
+    if run_id is None:
+        return
+    try:
+        run = db.query(ScrapeRun).filter(ScrapeRun.id == run_id).first()
+        if run is None:
+            return
+        run.status = status
+        run.error = error[:500] if error else None
+        run.finished_at = datetime.utcnow()
+        run.duration_s = (run.finished_at - run.started_at).total_seconds()
+        db.commit()
+    except Exception as e:
+        logger.error(f"Could not finish scrape run {run_id}: {str(e)}")
+        db.rollback()
+
+
+def record_batch(db: Session, run_id: Optional[int], engine: str, products: Iterable[str],
+                 start_offset: int, days: int, started_at: datetime, timings: Iterable[DateTiming] = (),
+                 error: Optional[str] = None, checked: Optional[int] = None,
+                 resolved: Optional[int] = None, page_loads: Iterable = ()) -> Optional[int]:
+    """Store a batch with its date timings and page loads (lean_pages.PageLoad) and add its counts to the run.
+
+    ``checked``/``resolved`` override the counts taken from ``timings``, for
+    callers that don't time individual dates (the retry drain).
+    """
+    timings = list(timings)
+    try:
+        finished_at = datetime.utcnow()
+        batch = ScrapeBatch(
+            run_id=run_id, engine=engine, products=",".join(products),
+            start_offset=start_offset, days=days,
+            started_at=started_at, finished_at=finished_at,
+            duration_s=(finished_at - started_at).total_seconds(),
+            dates_checked=checked if checked is not None else len(timings),
+            dates_resolved=resolved if resolved is not None else sum(t.outcome in RESOLVED_OUTCOMES for t in timings),
+            retries=sum(max(t.attempts - 1, 0) for t in timings),
+            error=error[:500] if error else None,
+        )
+        db.add(batch)
+        db.flush()
+        db.bulk_insert_mappings(ScrapeDateTiming, [{
+            "batch_id": batch.id, "engine": engine, "product": t.product, "date": t.date,
+            "latency_ms": round(t.latency_ms, 1), "attempts": t.attempts, "outcome": t.outcome,
+            "checked_at": t.checked_at,
+        } for t in timings])
+        db.bulk_insert_mappings(ScrapePageLoad, [{
+            "batch_id": batch.id, "engine": engine, "kind": load.kind,
+            "load_ms": round(load.load_ms, 1) if load.load_ms is not None else None,
+            "requests": load.requests, "blocked": load.blocked, "cache_hits": load.cache_hits,
+            "network_bytes": load.network_bytes, "cache_bytes": load.cache_bytes, "loaded_at": load.loaded_at,
+        } for load in page_loads])
+        if run_id is not None:
+            db.query(ScrapeRun).filter(ScrapeRun.id == run_id).update({
+                ScrapeRun.batches: ScrapeRun.batches + 1,
+                ScrapeRun.dates_checked: ScrapeRun.dates_checked + batch.dates_checked,
+                ScrapeRun.dates_resolved: ScrapeRun.dates_resolved + batch.dates_resolved,
+            }, synchronize_session=False)
+        db.commit()
+        return batch.id
+    except Exception as e:
+        logger.error(f"Could not record scrape batch telemetry: {str(e)}")
+        db.rollback()
+        return None
+
+
+# -- queries -------------------------------------------------------------------
+
+def run_history(db: Session, days: int = 30, engine: Optional[str] = None) -> List[dict]:
+    """Runs started in the last ``days`` days, oldest first, with duration and throughput."""
+    since = datetime.utcnow() - timedelta(days=days)
+    query = db.query(ScrapeRun).filter(ScrapeRun.started_at >= since)
+    if engine:
+        query = query.filter(ScrapeRun.engine == engine)
+    now = datetime.utcnow()
+    history = []
+    for run in query.order_by(ScrapeRun.started_at).all():
+        duration = run.duration_s if run.duration_s is not None else (now - run.started_at).total_seconds()
+        history.append({
+            "id": run.id,
+            "engine": run.engine,
+            "worker_id": run.worker_id,
+            "status": run.status,
+            "started_at": run.started_at,
+            "finished_at": run.finished_at,
+            "duration_s": round(duration, 1),
+            "batches": run.batches,
+            "dates_checked": run.dates_checked,
+            "dates_resolved": run.dates_resolved,
+            "dates_per_min": round(run.dates_checked / duration * 60, 2) if duration else None,
+            "error": run.error,
+        })
+    return history
+
+
+def slowest_dates(db: Session, hours: int = 24, limit: int = 20, product: Optional[str] = None) -> List[dict]:
+    """(product, date) pairs with the highest average check latency in the last ``hours`` hours."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    failures = func.sum(case((ScrapeDateTiming.outcome.in_(RESOLVED_OUTCOMES), 0), else_=1))
+    query = db.query(
+        ScrapeDateTiming.product,
+        ScrapeDateTiming.date,
+        func.count(ScrapeDateTiming.id),
+        func.avg(ScrapeDateTiming.latency_ms),
+        func.max(ScrapeDateTiming.latency_ms),
+        func.sum(ScrapeDateTiming.attempts),
+        failures,
+    ).filter(ScrapeDateTiming.checked_at >= since, ScrapeDateTiming.latency_ms.isnot(None))
+    if product:
+        query = query.filter(ScrapeDateTiming.product == product)
+    rows = query.group_by(ScrapeDateTiming.product, ScrapeDateTiming.date).order_by(
+        func.avg(ScrapeDateTiming.latency_ms).desc()
+    ).limit(limit).all()
+    return [{
+        "product": product_key,
+        "date": date,
+        "checks": checks,
+        "avg_latency_ms": round(avg, 1) if avg is not None else None,
+        "max_latency_ms": round(worst, 1) if worst is not None else None,
+        "attempts": int(attempts or 0),
+        "failures": int(failed or 0),
+    } for product_key, date, checks, avg, worst, attempts, failed in rows]
+
+
+def page_load_summary(db: Session, hours: int = 24, engine: Optional[str] = None) -> List[dict]:
+    """Per engine and tab kind: page load time and bytes downloaded, from cache and blocked."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    query = db.query(ScrapePageLoad).filter(ScrapePageLoad.loaded_at >= since)
+    if engine:
+        query = query.filter(ScrapePageLoad.engine == engine)
+    grouped = defaultdict(list)
+    for load in query.all():
+        grouped[(load.engine, load.kind)].append(load)
+    summary = []
+    for (engine_name, kind), loads in sorted(grouped.items()):
+        times = [load.load_ms for load in loads if load.load_ms is not None]
+        network = sum(load.network_bytes for load in loads)
+        cached = sum(load.cache_bytes for load in loads)
+        summary.append({
+            "engine": engine_name,
+            "kind": kind,
+            "page_loads": len(loads),
+            "avg_load_ms": round(sum(times) / len(times), 1) if times else None,
+            "p95_load_ms": _percentile(times, 0.95),
+            "requests": sum(load.requests for load in loads),
+            "blocked": sum(load.blocked for load in loads),
+            "cache_hits": sum(load.cache_hits for load in loads),
+            "network_bytes": network,
+            "cache_bytes": cached,
+            "avg_network_bytes": round(network / len(loads)),
+        })
+    return summary
+
+
+def daily_summary(db: Session, days: int = 30, product: Optional[str] = None) -> List[dict]:
+    """Per-day check counts and latency, from the rollup table plus the not-yet-rolled detail rows."""
+    since = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+    query = db.query(ScrapeTelemetryDaily).filter(ScrapeTelemetryDaily.day >= since)
+    if product:
+        query = query.filter(ScrapeTelemetryDaily.product == product)
+    summary = [_daily_dict(row) for row in query.all()]
+
+    detail = db.query(ScrapeDateTiming).filter(
+        ScrapeDateTiming.checked_at >= datetime.strptime(since, "%Y-%m-%d")
+    )
+    if product:
+        detail = detail.filter(ScrapeDateTiming.product == product)
+    rolled = {(entry["day"], entry["engine"], entry["product"]) for entry in summary}
+    for key, stats in _aggregate(detail.all()).items():
+        if key not in rolled:
+            summary.append({"day": key[0], "engine": key[1], "product": key[2], **stats})
+    summary.sort(key=lambda entry: (entry["day"], entry["product"], entry["engine"]))
+    return summary
+
+
+def _daily_dict(row: ScrapeTelemetryDaily) -> dict:
+    return {
+        "day": row.day, "engine": row.engine, "product": row.product,
+        "checks": row.checks, "resolved": row.resolved, "timeouts": row.timeouts,
+        "errors": row.errors, "attempts": row.attempts,
+        "avg_latency_ms": row.avg_latency_ms, "p95_latency_ms": row.p95_latency_ms,
+        "max_latency_ms": row.max_latency_ms,
+    }
+
+
+def _aggregate(timings: Iterable[ScrapeDateTiming]) -> Dict[tuple, dict]:
+    grouped = defaultdict(list)
+    for timing in timings:
+        grouped[(timing.checked_at.strftime("%Y-%m-%d"), timing.engine, timing.product)].append(timing)
+    stats = {}
+    for key, rows in grouped.items():
+        latencies = [row.latency_ms for row in rows if row.latency_ms is not None]
+        stats[key] = {
+            "checks": len(rows),
+            "resolved": sum(row.outcome in RESOLVED_OUTCOMES for row in rows),
+            "timeouts": sum(row.outcome == "timeout" for row in rows),
+            "errors": sum(row.outcome == "error" for row in rows),
+            "attempts": sum(row.attempts or 0 for row in rows),
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "p95_latency_ms": _percentile(latencies, 0.95),
+            "max_latency_ms": max(latencies) if latencies else None,
+        }
+    return stats
+
+
+# -- retention -----------------------------------------------------------------
+
+def rollup_and_prune(db: Session, now: Optional[datetime] = None) -> dict:
+    """Fold expired date timings into scrape_telemetry_daily, delete old runs/batches,
+    and close runs whose worker died without finishing them."""
+    now = now or datetime.utcnow()
+    detail_cutoff = (now - timedelta(days=settings.SCRAPE_TELEMETRY_DETAIL_DAYS)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    expired = db.query(ScrapeDateTiming).filter(ScrapeDateTiming.checked_at < detail_cutoff)
+    rolled_up = 0
+    for (day, engine, product), stats in _aggregate(expired.all()).items():
+        row = db.query(ScrapeTelemetryDaily).filter(
+            ScrapeTelemetryDaily.day == day, ScrapeTelemetryDaily.engine == engine,
+            ScrapeTelemetryDaily.product == product,
+        ).first()
+        if row is None:
+            db.add(ScrapeTelemetryDaily(day=day, engine=engine, product=product, **stats))
+        else:
+            # Merge with an earlier rollup of the same day (weighted mean, worst-case p95)
+            total = row.checks + stats["checks"]
+            if row.avg_latency_ms is not None and stats["avg_latency_ms"] is not None:
+                row.avg_latency_ms = round(
+                    (row.avg_latency_ms * row.checks + stats["avg_latency_ms"] * stats["checks"]) / total, 1
+                )
+            else:
+                row.avg_latency_ms = row.avg_latency_ms if row.avg_latency_ms is not None else stats["avg_latency_ms"]
+            row.p95_latency_ms = max(filter(None, (row.p95_latency_ms, stats["p95_latency_ms"])), default=None)
+            row.max_latency_ms = max(filter(None, (row.max_latency_ms, stats["max_latency_ms"])), default=None)
+            for name in ("checks", "resolved", "timeouts", "errors", "attempts"):
+                setattr(row, name, getattr(row, name) + stats[name])
+        rolled_up += stats["checks"]
+    expired.delete(synchronize_session=False)
+    db.query(ScrapePageLoad).filter(ScrapePageLoad.loaded_at < detail_cutoff).delete(synchronize_session=False)
+
+    run_cutoff = now - timedelta(days=settings.SCRAPE_TELEMETRY_RUN_DAYS)
+    old_runs = [row.id for row in db.query(ScrapeRun.id).filter(ScrapeRun.started_at < run_cutoff).all()]
+    batches_deleted = db.query(ScrapeBatch).filter(
+        (ScrapeBatch.started_at < run_cutoff) | ScrapeBatch.run_id.in_(old_runs)
+    ).delete(synchronize_session=False)
+    runs_deleted = db.query(ScrapeRun).filter(ScrapeRun.id.in_(old_runs)).delete(synchronize_session=False)
+
+    abandoned = 0
+    for run in db.query(ScrapeRun).filter(ScrapeRun.status == "running").all():
+        last_batch = db.query(func.max(ScrapeBatch.finished_at)).filter(ScrapeBatch.run_id == run.id).scalar()
+        last_seen = last_batch or run.started_at
+        if now - last_seen > ABANDONED_AFTER:
+            run.status = "abandoned"
+            run.finished_at = last_seen
+            run.duration_s = (last_seen - run.started_at).total_seconds()
+            abandoned += 1
+
+    db.commit()
+    return {
+        "timings_rolled_up": rolled_up,
+        "runs_deleted": runs_deleted,
+        "batches_deleted": batches_deleted,
+        "runs_abandoned": abandoned,
+    }
@@ -0,0 +1,144 @@
+"""
+Scraper controller knobs shared by every scrape worker.
+
+Scraping runs in scrape_worker.py processes, each with its own
+AdaptiveController, so tuning the API process's controller would change
+nothing. The knobs live in the scraper_control table instead. Every worker
+syncs with it each SCRAPER_CONTROL_SYNC_SECONDS, doing three things:
+
+  - re-applies the knobs whenever their version has moved; a limit or delay
+    pinned by an admin is applied once, with that version
+  - reports its controller snapshot in scraper_worker_states, which also
+    marks it as live
+  - caps its limit at max_limit divided by the number of live workers, so
+    the whole pool stays within the site-wide limit
+
+/available-slots/scraper-control reads and writes through here.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.scraper_control import ScraperControl, ScraperWorkerState
+from ..utils.adaptive_concurrency import AdaptiveController
+
+logger = logging.getLogger(__name__)
+
+
+def _default_knobs() -> dict:
+    return {
+        "min_limit": settings.SCRAPER_MIN_CONCURRENCY,
+        "max_limit": settings.SCRAPER_MAX_CONCURRENCY,
+        "increase_step": 1.0,
+        "decrease_factor": 0.5,
+        "cooldown": 5.0,
+        "min_delay": settings.SCRAPER_MIN_DELAY,
+        "max_delay": settings.SCRAPER_MAX_DELAY,
+        "latency_tolerance": 2.5,
+    }
+
+
+def get_control(db: Session, name: str) -> ScraperControl:
+    row = db.get(ScraperControl, name)
+    if row is None:
+        db.add(ScraperControl(name=name, knobs=_default_knobs(), version=1))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another process created it first
+        row = db.get(ScraperControl, name)
+    return row
+
+
+def update_control(db: Session, name: str, values: dict) -> ScraperControl:
+    """Validate and store new knobs; ``limit``/``delay`` pin the pool's current state.
+
+    Raises ValueError (bad values) or KeyError (unknown knob), like
+    AdaptiveController.configure.
+    """
+    row = get_control(db, name)
+    knobs = {**_default_knobs(), **row.knobs}
+    probe = AdaptiveController(
+        name, initial_limit=knobs["max_limit"], min_limit=knobs["min_limit"], max_limit=knobs["max_limit"],
+        initial_delay=settings.SCRAPER_INITIAL_DELAY, min_delay=knobs["min_delay"], max_delay=knobs["max_delay"],
+        increase_step=knobs["increase_step"], decrease_factor=knobs["decrease_factor"],
+        cooldown=knobs["cooldown"], latency_tolerance=knobs["latency_tolerance"],
+    )
+    snapshot = probe.configure(**values)
+    row.knobs = snapshot["knobs"]
+    # Pins belong to the version they were set with, so later knob changes don't re-apply them
+    row.pinned_limit = float(snapshot["limit"]) if values.get("limit") is not None else None
+    row.pinned_delay = snapshot["delay_s"] if values.get("delay") is not None else None
+    row.version = (row.version or 0) + 1
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def live_workers(db: Session, name: str) -> List[ScraperWorkerState]:
+    cutoff = datetime.utcnow() - timedelta(seconds=3 * settings.SCRAPER_CONTROL_SYNC_SECONDS)
+    return db.query(ScraperWorkerState).filter(
+        ScraperWorkerState.controller == name, ScraperWorkerState.heartbeat_at >= cutoff,
+    ).order_by(ScraperWorkerState.worker_id).all()
+
+
+def sync(db: Session, controller: AdaptiveController, worker_id: str,
+         applied_version: Optional[int] = None) -> int:
+    """Bring ``controller`` in line with the shared knobs and report on it.
+
+    Returns the knob version now applied; pass it back on the next call.
+    """
+    row = get_control(db, controller.name)
+    workers = max(1, len({state.worker_id for state in live_workers(db, controller.name)} | {worker_id}))
+    if row.version != applied_version:
+        values = dict(row.knobs)
+        if row.pinned_limit is not None:
+            values["limit"] = row.pinned_limit / workers
+        if row.pinned_delay is not None:
+            values["delay"] = row.pinned_delay
+        controller.configure(**values)
+    controller.set_budget(max(1, controller.max_limit // workers))
+
+    state = db.get(ScraperWorkerState, worker_id)
+    if state is None:
+        state = ScraperWorkerState(worker_id=worker_id, controller=controller.name)
+        db.add(state)
+    state.snapshot = controller.snapshot()
+    state.heartbeat_at = datetime.utcnow()
+    db.commit()
+    return row.version
+
+
+def leave(db: Session, worker_id: str):
+    """Drop a stopping worker so the others get its share of the budget."""
+    db.query(ScraperWorkerState).filter(ScraperWorkerState.worker_id == worker_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def control_status(db: Session, name: str) -> dict:
+    """Shared knobs plus every live worker's controller, summed for the pool."""
+    row = get_control(db, name)
+    knobs = {**_default_knobs(), **row.knobs}
+    workers = [{"worker_id": state.worker_id, "heartbeat_at": state.heartbeat_at, **(state.snapshot or {})}
+               for state in live_workers(db, name)]
+    if workers:
+        limit = sum(worker.get("limit", 0) for worker in workers)
+        delay = max(worker.get("delay_s", 0) for worker in workers)
+    else:
+        limit = row.pinned_limit or min(max(settings.SCRAPER_INITIAL_CONCURRENCY, knobs["min_limit"]), knobs["max_limit"])
+        delay = row.pinned_delay or min(max(settings.SCRAPER_INITIAL_DELAY, knobs["min_delay"]), knobs["max_delay"])
+    return {
+        "name": name,
+        "limit": int(limit),
+        "in_flight": sum(worker.get("in_flight", 0) for worker in workers),
+        "delay_s": delay,
+        "knobs": knobs,
+        "version": row.version,
+        "pinned_limit": row.pinned_limit,
+        "pinned_delay": row.pinned_delay,
+        "workers": workers,
+    }
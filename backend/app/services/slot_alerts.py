@@ -0,0 +1,265 @@
+"""
+Low-slot alerts, evaluated as availability is written.
+
+The daily 07:00 job only saw a date that dropped from 25 to 4 slots the
+next morning. Now every writer of availability (the scrape engines, the
+retry queue, fast_scrapers and the manual upload) passes each value it
+stores to a ``SlotAlerts`` batch. The batch checks the value against the
+product's rule and ``send()`` notifies before the writer commits, so an
+alert goes out within one scrape of the change.
+
+A rule (SLOT_ALERT_THRESHOLDS, overridden per product in slot_alert_rules)
+compares a date's *headroom* with a threshold. Headroom is the slots left
+on the permit site, less the people on our own bookings for that date
+that still await their permits (``count_bookings``): the net
+availability from services/capacity_index.py. Each product/date
+keeps a state row in slot_alert_states:
+
+  - it alerts when headroom first drops below ``threshold``, and is then low
+  - a low date stays quiet, however its count moves, until its headroom
+    is back up to ``clear_at`` (threshold + SLOT_ALERT_HYSTERESIS by
+    default); this hysteresis keeps a date hovering at the line from
+    flapping
+  - a date that re-crosses within ``cooldown_hours`` of its last alert is
+    marked low again but not re-announced
+
+Admins get one notification per product listing the dates that crossed.
+Owners of the pending bookings on those dates get one each. The
+scheduler's slot_alerts job runs ``sweep`` over stored availability, which
+catches crossings caused by bookings or rules changing between scrapes.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.booking import Booking
+from ..models.notification import Notification, NotificationType
+from ..models.slot_alert import SlotAlertRule, SlotAlertState
+from ..models.user import User, UserRole
+from .capacity_index import PENDING_STATUSES, pending_by_date
+from .product_catalogue import DATE_FORMAT, ScrapeTarget, availability_rows, date_before, get_target, slot_count
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class AlertRule:
+    product: str
+    threshold: int
+    clear_at: int
+    cooldown_hours: float
+    count_bookings: bool
+    enabled: bool
+
+
+@dataclass
+class Crossing:
+    """One date that dropped below its product's threshold."""
+    target: ScrapeTarget
+    date: str
+    slots: int
+    held: int
+    rule: AlertRule
+
+
+def _default_thresholds() -> Dict[str, int]:
+    thresholds = {}
+    for part in settings.SLOT_ALERT_THRESHOLDS.split(","):
+        key, _, value = part.partition(":")
+        if key.strip() and value.strip():
+            thresholds[key.strip()] = int(value)
+    return thresholds
+
+
+def _rule(product: str, row: Optional[SlotAlertRule], default_threshold: Optional[int]) -> Optional[AlertRule]:
+    threshold = row.threshold if row is not None and row.threshold is not None else default_threshold
+    if threshold is None:
+        return None
+
+    def value(field, default):
+        stored = getattr(row, field) if row is not None else None
+        return default if stored is None else stored
+
+    return AlertRule(
+        product=product,
+        threshold=threshold,
+        clear_at=value("clear_at", threshold + settings.SLOT_ALERT_HYSTERESIS),
+        cooldown_hours=value("cooldown_hours", settings.SLOT_ALERT_COOLDOWN_HOURS),
+        count_bookings=value("count_bookings", True),
+        enabled=value("enabled", True),
+    )
+
+
+def alert_rules(db: Session) -> Dict[str, AlertRule]:
+    """Every product's effective rule: its slot_alert_rules row over the settings defaults."""
+    defaults = _default_thresholds()
+    rows = {row.product: row for row in db.query(SlotAlertRule).all()}
+    rules = {}
+    for product in sorted(set(defaults) | set(rows)):
+        rule = _rule(product, rows.get(product), defaults.get(product))
+        if rule is not None:
+            rules[product] = rule
+    return rules
+
+
+def update_rule(db: Session, product: str, values: dict) -> AlertRule:
+    """Store an admin's rule for ``product``; None leaves a field at its default.
+
+    Raises ValueError for values that could never (or always) alert.
+    """
+    row = db.get(SlotAlertRule, product) or SlotAlertRule(product=product)
+    for field, value in values.items():
+        setattr(row, field, value)
+    rule = _rule(product, row, _default_thresholds().get(product))
+    if rule is None:
+        raise ValueError(f"{product} has no default threshold; set one")
+    if rule.threshold < 1:
+        raise ValueError("threshold must be at least 1")
+    if rule.clear_at < rule.threshold:
+        raise ValueError("clear_at must not be below threshold")
+    if rule.cooldown_hours < 0:
+        raise ValueError("cooldown_hours must not be negative")
+    db.add(row)
+    db.commit()
+    return rule
+
+
+class SlotAlerts:
+    """Evaluates one writer's batch of availability against the alert rules.
+
+    Call ``observe`` for each value stored, then ``send`` before committing.
+    State rows and pending bookings are loaded once per product.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.now = datetime.utcnow()
+        self.today = self.now.date()
+        self.rules = {key: rule for key, rule in alert_rules(db).items() if rule.enabled}
+        self.crossings: List[Crossing] = []
+        self._states: Dict[str, Dict[str, SlotAlertState]] = {}
+        self._held: Dict[str, Dict[date_type, int]] = {}
+
+    def _state(self, key: str, date: str) -> Optional[SlotAlertState]:
+        # Only dates that have gone low have a row
+        if key not in self._states:
+            self._states[key] = {
+                state.date: state
+                for state in self.db.query(SlotAlertState).filter(SlotAlertState.product == key).all()
+            }
+        return self._states[key].get(date)
+
+    def _held_on(self, target: ScrapeTarget, day: date_type) -> int:
+        if target.key not in self._held:
+            self._held[target.key] = pending_by_date(self.db, target.product_id, self.today)
+        return self._held[target.key].get(day, 0)
+
+    def observe(self, target: Optional[ScrapeTarget], date: str, slots: Optional[str]) -> Optional[Crossing]:
+        """Check one stored value; returns the Crossing when it alerts."""
+        rule = self.rules.get(target.key) if target is not None else None
+        count = slot_count(slots)
+        if rule is None or count is None:
+            return None
+        try:
+            day = datetime.strptime(date, DATE_FORMAT).date()
+        except ValueError:
+            return None
+        if day < self.today:
+            return None
+
+        held = self._held_on(target, day) if rule.count_bookings else 0
+        headroom = count - held
+        state = self._state(target.key, date)
+        if state is not None:
+            state.slots, state.headroom = slots, headroom
+            if state.low:
+                if headroom >= rule.clear_at:
+                    state.low = False
+                return None
+        if headroom >= rule.threshold:
+            return None
+
+        if state is None:
+            state = SlotAlertState(product=target.key, date=date, slots=slots, headroom=headroom)
+            self._states[target.key][date] = state
+            self.db.add(state)
+        state.low = True
+        if state.fired_at is not None and self.now - state.fired_at < timedelta(hours=rule.cooldown_hours):
+            return None
+        state.fired_at = self.now
+        crossing = Crossing(target=target, date=date, slots=count, held=held, rule=rule)
+        self.crossings.append(crossing)
+        return crossing
+
+    def send(self) -> int:
+        """Queue the notifications for this batch's crossings (caller commits). Returns how many."""
+        if not self.crossings:
+            return 0
+        notifications = []
+        admins = [row[0] for row in self.db.query(User.id).filter(
+            User.role.in_([UserRole.ADMIN, UserRole.SUPERUSER])
+        ).all()]
+        by_product = defaultdict(list)
+        for crossing in self.crossings:
+            by_product[crossing.target.key].append(crossing)
+
+        for crossings in by_product.values():
+            target, rule = crossings[0].target, crossings[0].rule
+            details = ", ".join(_describe(crossing) for crossing in crossings)
+            message = f"{target.name} slots below {rule.threshold} on: {details}"
+            notifications += [(user_id, f"Low {target.name} Slots Alert", message) for user_id in admins]
+
+            owners: Dict[int, List[str]] = defaultdict(list)
+            days = {datetime.strptime(crossing.date, DATE_FORMAT).date(): crossing for crossing in crossings}
+            for user_id, day, name in self.db.query(Booking.user_id, Booking.date, Booking.booking_name).filter(
+                Booking.product_id == target.product_id,
+                Booking.booking_status.in_(PENDING_STATUSES),
+                Booking.date.in_(list(days)),
+            ).all():
+                if user_id is not None:
+                    owners[user_id].append(f"{name} on {days[day].date} ({_slots_left(days[day].slots)})")
+            notifications += [
+                (user_id, f"{target.name} permits running low",
+                 f"Permits are running low for your pending bookings: {'; '.join(lines)}")
+                for user_id, lines in owners.items()
+            ]
+
+        self.db.add_all(
+            Notification(user_id=user_id, title=title, message=message, type=NotificationType.WARNING)
+            for user_id, title, message in notifications
+        )
+        logger.info(f"Slot alerts: {len(self.crossings)} dates crossed, {len(notifications)} notifications")
+        self.crossings = []
+        return len(notifications)
+
+
+def _slots_left(slots: int) -> str:
+    return "sold out" if slots == 0 else f"{slots} slots left"
+
+
+def _describe(crossing: Crossing) -> str:
+    held = f", {crossing.held} held by pending bookings" if crossing.held else ""
+    return f"{crossing.date} ({_slots_left(crossing.slots)}{held})"
+
+
+def sweep(db: Session) -> int:
+    """Re-check every product's stored upcoming availability; returns the dates that crossed.
+
+    Also deletes the state of dates that have passed.
+    """
+    alerts = SlotAlerts(db)
+    for key in alerts.rules:
+        target = get_target(db, key)
+        if target is None:
+            continue
+        for row in availability_rows(db, key):
+            alerts.observe(target, row.date, row.slots)
+    crossed = len(alerts.crossings)
+    alerts.send()
+    db.query(SlotAlertState).filter(date_before(SlotAlertState.date, alerts.today)).delete(synchronize_session=False)
+    db.commit()
+    return crossed
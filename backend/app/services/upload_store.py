@@ -0,0 +1,295 @@
+"""
+Upload store — streams uploaded files to storage in chunks, deduplicated by content.
+
+Files are hashed (SHA-256) while they are written to a staging file, so the
+whole upload is never held in memory and the event loop is never blocked
+by disk I/O. The final key is ``<namespace>/<sha256><ext>``. If the same
+bytes were uploaded before, the staged copy is thrown away and the existing
+object is reused.
+
+MAX_UPLOAD_SIZE is checked after every chunk. Oversized uploads are cut
+off as soon as they cross the limit and never reach storage.
+
+Backends:
+  LocalBackend — files under app/uploads (the default)
+  S3Backend    — any S3-compatible object store (AWS, MinIO, ...), via a
+                 boto3-style client
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_UPLOAD_ROOT = os.path.join(_BASE_DIR, "uploads")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File exceeds maximum upload size of {max_size // 1048576} MB")
+
+
+@dataclass
+class StoredFile:
+    key: str              # "<namespace>/<sha256><ext>"
+    sha256: str
+    size: int
+    deduplicated: bool    # True when identical content was already stored
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.key)
+
+
+def _safe_extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext[1:].isalnum() or len(ext) > 10:
+        return ""
+    return ext
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class StorageBackend(ABC):
+    """Where finished uploads live. Staged files are always on local disk."""
+
+    name = "base"
+
+    @abstractmethod
+    def staging_dir(self) -> str:
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def commit(self, key: str, staged_path: str) -> None:
+        """Move a fully written staging file to ``key`` (takes ownership of it)."""
+
+    @abstractmethod
+    async def local_path(self, key: str) -> str:
+        """A path on local disk holding the object's bytes."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str = DEFAULT_UPLOAD_ROOT):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def staging_dir(self) -> str:
+        # Same filesystem as the final location so commit is an atomic rename
+        path = os.path.join(self.root, ".staging")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    async def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    async def commit(self, key: str, staged_path: str) -> None:
+        dest = self._path(key)
+
+        def _move():
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(staged_path, dest)
+
+        await run_in_threadpool(_move)
+
+    async def local_path(self, key: str) -> str:
+        return self._path(key)
+
+    async def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.isfile(path):
+            await run_in_threadpool(os.remove, path)
+
+
+class S3Backend(StorageBackend):
+    """S3-compatible object storage.
+
+    ``client`` is anything with the boto3 S3 client methods used here
+    (head_object, upload_file, download_file, delete_object), which lets
+    tests run against a local stand-in. When omitted, a boto3 client is
+    created for ``endpoint_url`` (e.g. http://localhost:9000 for MinIO).
+    Objects are downloaded to ``cache_dir`` on demand for code that needs
+    a local path (OCR, voucher extraction, FileResponse).
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, client=None, prefix: str = "",
+                 endpoint_url: Optional[str] = None, cache_dir: Optional[str] = None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "trekdesk-upload-cache")
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def staging_dir(self) -> str:
+        path = os.path.join(self.cache_dir, ".staging")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    async def exists(self, key: str) -> bool:
+        def _head():
+            try:
+                self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+                return True
+            except Exception as e:
+                code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+                if code in ("404", "NoSuchKey", "NotFound"):
+                    return False
+                raise
+
+        return await run_in_threadpool(_head)
+
+    async def commit(self, key: str, staged_path: str) -> None:
+        def _upload():
+            try:
+                self.client.upload_file(staged_path, self.bucket, self._object_key(key))
+            finally:
+                os.remove(staged_path)
+
+        await run_in_threadpool(_upload)
+
+    async def local_path(self, key: str) -> str:
+        path = os.path.join(self.cache_dir, key)
+        if os.path.isfile(path):
+            return path
+
+        def _download():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f"{path}.part"
+            self.client.download_file(self.bucket, self._object_key(key), partial)
+            os.replace(partial, path)
+
+        await run_in_threadpool(_download)
+        return path
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(
+            self.client.delete_object, Bucket=self.bucket, Key=self._object_key(key)
+        )
+        cached = os.path.join(self.cache_dir, key)
+        if os.path.isfile(cached):
+            os.remove(cached)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class UploadStore:
+
+    def __init__(self, backend: StorageBackend,
+                 max_size: int = settings.MAX_UPLOAD_SIZE,
+                 chunk_size: int = settings.UPLOAD_CHUNK_SIZE):
+        self.backend = backend
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+
+    async def save(self, upload: UploadFile, namespace: str) -> StoredFile:
+        """Stream an UploadFile into the store."""
+        async def _chunks():
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+        return await self.save_stream(_chunks(), namespace, upload.filename)
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], namespace: str,
+                          filename: Optional[str] = None) -> StoredFile:
+        """Write an async stream of byte chunks into the store."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, staged_path = tempfile.mkstemp(dir=self.backend.staging_dir(), suffix=".part")
+        staged = os.fdopen(fd, "wb")
+
+        def _write(chunk: bytes):
+            digest.update(chunk)
+            staged.write(chunk)
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_size:
+                    raise UploadTooLarge(self.max_size)
+                await run_in_threadpool(_write, chunk)
+            await run_in_threadpool(staged.close)
+        except BaseException:
+            staged.close()
+            os.remove(staged_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        key = f"{namespace}/{sha256}{_safe_extension(filename)}"
+        if await self.backend.exists(key):
+            os.remove(staged_path)
+            logger.info(f"Upload {filename!r} deduplicated to existing {key}")
+            return StoredFile(key=key, sha256=sha256, size=size, deduplicated=True)
+
+        await self.backend.commit(key, staged_path)
+        logger.info(f"Stored upload {filename!r} as {key} ({size} bytes)")
+        return StoredFile(key=key, sha256=sha256, size=size, deduplicated=False)
+
+    async def local_path(self, key: str) -> str:
+        return await self.backend.local_path(key)
+
+    async def delete(self, key: str) -> None:
+        await self.backend.delete(key)
+
+
+def _backend_from_settings() -> StorageBackend:
+    if settings.UPLOAD_STORAGE_BACKEND == "s3":
+        if not settings.UPLOAD_S3_BUCKET:
+            raise RuntimeError("UPLOAD_S3_BUCKET must be set when UPLOAD_STORAGE_BACKEND=s3")
+        return S3Backend(
+            bucket=settings.UPLOAD_S3_BUCKET,
+            prefix=settings.UPLOAD_S3_PREFIX,
+            endpoint_url=settings.UPLOAD_S3_ENDPOINT_URL,
+        )
+    return LocalBackend()
+
+
+_store: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """The process-wide store configured from settings (built on first use)."""
+    global _store
+    if _store is None:
+        _store = UploadStore(_backend_from_settings())
+    return _store
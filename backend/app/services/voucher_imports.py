@@ -0,0 +1,351 @@
+"""
+Batch voucher imports — a zip or a pile of voucher files in, bookings out.
+
+POST /voucher/extract walks its file paths one by one: an extraction call,
+then a booking create or update with its own commit, per file. An agent's
+batch of 50 vouchers keeps the request open for minutes. An import runs in
+two stages instead:
+
+  - ``stage_upload`` runs inside the request. It streams each upload into
+    the upload store, content-addressed, so same-named files never
+    overwrite each other. A zip is spooled to disk and unpacked one member
+    at a time. Each file gets a voucher_import_files row (queued, rejected,
+    or a duplicate of an identical file in the batch), and the route
+    returns that per-file report at once.
+  - ``run_import`` runs as a background task. It sends queued files to the
+    extraction model, at most VOUCHER_EXTRACT_CONCURRENCY at once. The
+    extractor blocks, so each call runs in a worker thread. Each file's
+    outcome is stored as soon as it lands, so polling
+    GET /voucher/imports/{id} shows progress. Finished vouchers are then
+    deduplicated by booking_reference (the last file in the batch wins)
+    and upserted in one transaction: the existing bookings are fetched in
+    one query, and the new ones are flushed together.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.booking import Booking
+from ..models.user import User, UserRole
+from ..models.voucher_import import VoucherImport, VoucherImportFile
+from .booking_events import record_event
+from .capacity_index import sync_booking
+from .upload_store import UploadTooLarge, get_upload_store
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+EXTRACTED = "extracted"
+CREATED = "created"
+UPDATED = "updated"
+DUPLICATE = "duplicate"
+INCOMPLETE = "incomplete"
+REJECTED = "rejected"
+ERROR = "error"
+
+ACCEPTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png")
+REQUIRED_FIELDS = [
+    'booking_name', 'booking_reference', 'trek_date',
+    'head_of_file', 'request_date', 'product_type', 'number_of_people'
+]
+NAMESPACE = "vouchers"
+
+
+def extract_file(path: str) -> dict:
+    """Extract one voucher; blocking, so call it from a worker thread."""
+    from ..utils.voucher_extractor import extract_voucher_data  # needs OPENAI_API_KEY at import
+    return asyncio.run(extract_voucher_data(path))
+
+
+def is_zip(upload: UploadFile) -> bool:
+    return (upload.filename or "").lower().endswith(".zip") or upload.content_type in (
+        "application/zip", "application/x-zip-compressed",
+    )
+
+
+# ─── Staging (in the request) ────────────────────────────────────────────────
+
+class _Stager:
+    def __init__(self, db: Session, job: VoucherImport):
+        self.db = db
+        self.job = job
+        self.store = get_upload_store()
+        self.files = 0
+        self.by_sha: Dict[str, int] = {}
+
+    def _add(self, **values) -> VoucherImportFile:
+        row = VoucherImportFile(import_id=self.job.id, **values)
+        self.db.add(row)
+        self.db.flush()
+        return row
+
+    async def file(self, filename: str, chunks: AsyncIterator[bytes]):
+        self.files += 1
+        if self.files > settings.VOUCHER_IMPORT_MAX_FILES:
+            raise ValueError(f"An import can hold at most {settings.VOUCHER_IMPORT_MAX_FILES} files")
+        if not filename.lower().endswith(ACCEPTED_EXTENSIONS):
+            self._add(filename=filename, status=REJECTED,
+                      error="Invalid file type. Only PDF and image files are allowed.")
+            return
+        try:
+            stored = await self.store.save_stream(chunks, NAMESPACE, filename)
+        except UploadTooLarge as e:
+            self._add(filename=filename, status=REJECTED, error=str(e))
+            return
+        first = self.by_sha.get(stored.sha256)
+        if first is not None:
+            self._add(filename=filename, storage_key=stored.key, sha256=stored.sha256, status=DUPLICATE,
+                      duplicate_of=first)
+            return
+        row = self._add(filename=filename, storage_key=stored.key, sha256=stored.sha256, status=QUEUED)
+        self.by_sha[stored.sha256] = row.id
+
+    async def zip(self, upload: UploadFile):
+        fd, spooled = tempfile.mkstemp(dir=self.store.backend.staging_dir(), suffix=".zip.part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                size = 0
+                while chunk := await upload.read(self.store.chunk_size):
+                    size += len(chunk)
+                    if size > settings.VOUCHER_IMPORT_MAX_ZIP_SIZE:
+                        raise ValueError(f"{upload.filename} exceeds the maximum archive size of "
+                                         f"{settings.VOUCHER_IMPORT_MAX_ZIP_SIZE // 1048576} MB")
+                    await run_in_threadpool(out.write, chunk)
+            try:
+                archive = zipfile.ZipFile(spooled)
+            except zipfile.BadZipFile:
+                raise ValueError(f"{upload.filename} is not a valid zip archive")
+            with archive:
+                for member in archive.infolist():
+                    name = member.filename
+                    if member.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                        continue
+                    await self.file(name, self._member_chunks(archive, member))
+        finally:
+            os.remove(spooled)
+
+    def _member_chunks(self, archive: zipfile.ZipFile, member: zipfile.ZipInfo) -> AsyncIterator[bytes]:
+        chunk_size = self.store.chunk_size
+
+        async def chunks():
+            handle = await run_in_threadpool(archive.open, member)
+            try:
+                while chunk := await run_in_threadpool(handle.read, chunk_size):
+                    yield chunk
+            finally:
+                handle.close()
+        return chunks()
+
+
+async def stage_upload(db: Session, uploads: List[UploadFile], requested_by: Optional[int]) -> VoucherImport:
+    """Store the uploads and record a queued import with one row per file (caller commits).
+
+    Raises ValueError when the batch as a whole is unusable: too many files,
+    an oversized or corrupt zip.
+    """
+    job = VoucherImport(status=QUEUED, requested_by=requested_by)
+    db.add(job)
+    db.flush()
+    stager = _Stager(db, job)
+    for upload in uploads:
+        if is_zip(upload):
+            await stager.zip(upload)
+        else:
+            async def chunks(upload=upload):
+                while chunk := await upload.read(stager.store.chunk_size):
+                    yield chunk
+            await stager.file(upload.filename or "upload", chunks())
+    job.total_files = db.query(VoucherImportFile).filter(
+        VoucherImportFile.import_id == job.id, VoucherImportFile.status == QUEUED
+    ).count()
+    if not job.total_files:
+        job.status = COMPLETED
+        job.finished_at = datetime.utcnow()
+    return job
+
+
+# ─── Processing (in the background) ─────────────────────────────────────────
+
+def _record_extraction(file: VoucherImportFile, outcome):
+    if isinstance(outcome, Exception):
+        file.status, file.error = ERROR, str(outcome)
+        return
+    file.data = json.dumps(outcome, default=str)
+    file.booking_reference = outcome.get("booking_reference") or None
+    missing = [field for field in REQUIRED_FIELDS if not outcome.get(field)]
+    if missing:
+        file.status, file.missing_fields = INCOMPLETE, ",".join(missing)
+    else:
+        file.status = EXTRACTED
+
+
+async def extract_all(db: Session, job: VoucherImport, files: List[VoucherImportFile]):
+    """Extract every file, VOUCHER_EXTRACT_CONCURRENCY at a time, committing each outcome as it lands."""
+    store = get_upload_store()
+    semaphore = asyncio.Semaphore(max(1, settings.VOUCHER_EXTRACT_CONCURRENCY))
+
+    async def one(file: VoucherImportFile, key: str):
+        async with semaphore:
+            try:
+                outcome = await asyncio.to_thread(extract_file, await store.local_path(key))
+            except Exception as e:
+                logger.error(f"Voucher import {job.id}: could not extract {file.filename}: {e}")
+                outcome = e
+        # Only this event loop touches the session, one outcome at a time
+        _record_extraction(file, outcome)
+        job.extracted_files += 1
+        db.commit()
+
+    # Read the keys up front: each commit expires the rows
+    await asyncio.gather(*(one(file, file.storage_key) for file in files))
+
+
+def upsert_bookings(db: Session, job: VoucherImport, files: List[VoucherImportFile]) -> Dict[str, int]:
+    """Turn the extracted files into bookings, one per booking_reference (caller commits)."""
+    user = db.get(User, job.requested_by) if job.requested_by else None
+    is_admin = user is not None and user.role in (UserRole.ADMIN, UserRole.SUPERUSER)
+
+    by_reference: "OrderedDict[str, List[VoucherImportFile]]" = OrderedDict()
+    for file in files:
+        if file.status == EXTRACTED:
+            by_reference.setdefault(file.booking_reference, []).append(file)
+    winners = []
+    for copies in by_reference.values():
+        *earlier, latest = copies
+        for file in earlier:
+            file.status, file.duplicate_of = DUPLICATE, latest.id
+        winners.append(latest)
+
+    existing = {
+        booking.booking_ref: booking
+        for booking in db.query(Booking).filter(Booking.booking_ref.in_(list(by_reference)))
+    } if by_reference else {}
+
+    new = []
+    for file in winners:
+        voucher = json.loads(file.data)
+        reference = voucher["booking_reference"]
+        booking = existing.get(reference)
+        if booking is None:
+            new.append((file, voucher))
+            continue
+        if not is_admin and booking.user_id != job.requested_by:
+            file.status, file.error = ERROR, f"Booking {reference} belongs to another agent"
+            continue
+        previous_status = booking.booking_status
+        booking.update_from_voucher(voucher)  # moves the booking to REQUESTED
+        record_event(db, booking, "voucher_submitted", f"Voucher {reference}", job.requested_by,
+                     from_status=previous_status, to_status=booking.booking_status)
+        sync_booking(db, booking)
+        file.status, file.booking_id = UPDATED, booking.id
+    db.flush()
+
+    def booking_from(voucher: dict) -> Booking:
+        booking = Booking(user_id=job.requested_by)
+        booking.update_from_voucher(voucher)
+        return booking
+
+    created = [(file, voucher, booking_from(voucher)) for file, voucher in new]
+    try:
+        with db.begin_nested():
+            db.add_all(booking for _, _, booking in created)
+            db.flush()
+    except IntegrityError:
+        # Another import created one of these references meanwhile: insert them one at a time
+        retried = []
+        for file, voucher, _ in created:
+            booking = booking_from(voucher)
+            try:
+                with db.begin_nested():
+                    db.add(booking)
+                    db.flush()
+                retried.append((file, voucher, booking))
+            except IntegrityError:
+                file.status, file.error = ERROR, f"Booking {voucher['booking_reference']} was created by another import"
+        created = retried
+    for file, voucher, booking in created:
+        record_event(db, booking, "created", f"From voucher {voucher['booking_reference']}", job.requested_by,
+                     to_status=booking.booking_status)
+        sync_booking(db, booking)
+        file.status, file.booking_id = CREATED, booking.id
+
+    counts: Dict[str, int] = {}
+    for file in files:
+        counts[file.status] = counts.get(file.status, 0) + 1
+    return counts
+
+
+async def run_import(import_id: int):
+    """Background task: extract the queued files of an import, then upsert their bookings."""
+    db = SessionLocal()
+    try:
+        job = db.get(VoucherImport, import_id)
+        if job is None or job.status != QUEUED:
+            return
+        job.status, job.started_at = RUNNING, datetime.utcnow()
+        db.commit()
+        files = db.query(VoucherImportFile).filter(
+            VoucherImportFile.import_id == import_id, VoucherImportFile.status == QUEUED
+        ).order_by(VoucherImportFile.id).all()
+        try:
+            await extract_all(db, job, files)
+            counts = upsert_bookings(db, job, files)
+            job.status = COMPLETED
+            logger.info(f"Voucher import {import_id}: {counts}")
+        except Exception as e:
+            logger.error(f"Voucher import {import_id} failed: {e}")
+            db.rollback()
+            job.status, job.error = FAILED, str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def import_report(db: Session, job: VoucherImport) -> dict:
+    files = db.query(VoucherImportFile).filter(VoucherImportFile.import_id == job.id).order_by(VoucherImportFile.id)
+    report = []
+    for file in files:
+        report.append({
+            "id": file.id,
+            "filename": file.filename,
+            "status": file.status,
+            "booking_reference": file.booking_reference,
+            "booking_id": file.booking_id,
+            "duplicate_of": file.duplicate_of,
+            "missing_fields": file.missing_fields.split(",") if file.missing_fields else [],
+            "data": json.loads(file.data) if file.data else None,
+            "error": file.error,
+        })
+    counts: Dict[str, int] = {}
+    for row in report:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total_files": job.total_files,
+        "extracted_files": job.extracted_files,
+        "counts": counts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "files": report,
+    }
@@ -15,6 +15,7 @@ Uses the real PostgreSQL database — no SQLite shim.
 Seed data is idempotent; tests create uniquely-named resources.
 """
 
+import json
 import pytest
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
@@ -530,3 +531,1845 @@ class TestNotifications:
         assert r.status_code == 200
         notifs = r.json()
         assert len(notifs) > 0, "Authorizer should have at least one notification"
+
+
+class TestLargeListResponses:
+
+    def test_booking_list_is_compressed(self):
+        token = _login(*ADMIN)
+        r = client.get("/api/bookings/all", headers={**_auth(token), "Accept-Encoding": "gzip"})
+        assert r.status_code == 200
+        assert isinstance(r.json(), list)
+        if len(r.content) >= 1024:
+            assert r.headers.get("content-encoding") == "gzip"
+
+    def test_ar_list_serialises_dates_and_enums(self):
+        token = _login(*FINANCE)
+        r = client.get("/api/finance-ar/ar", headers=_auth(token))
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert "metrics" in data
+        for row in data["bookings"]:
+            assert isinstance(row["booking_status"], str)
+            assert row["trek_date"] is None or isinstance(row["trek_date"], str)
+
+
+class TestOCREngines:
+
+    def test_ocr_status_is_admin_only(self):
+        token = _login(*USER)
+        r = client.get("/api/passport/ocr-status", headers=_auth(token))
+        assert r.status_code == 403
+
+    def test_ocr_status_reports_memory_without_loading_models(self):
+        token = _login(*ADMIN)
+        r = client.get("/api/passport/ocr-status", headers=_auth(token))
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert "rss_mb" in data
+        assert data["easyocr_loaded"] is False
+
+    def test_tesseract_probe_is_cached(self):
+        from ..utils.ocr_engines import OCREngineRegistry
+        engines = OCREngineRegistry()
+        first = engines.tesseract_available()
+        assert engines.tesseract_available() == first
+        assert engines.stats["tesseract_probes"] == 1
+
+
+class TestUploadStore:
+
+    def _auth_request_id(self):
+        from ..models.booking import Booking, BookingStatus
+        user_token = _login(*USER)
+        booking_id = _make_booking(user_token, f"UploadTest_{datetime.utcnow().strftime('%f')}")
+        db = _db()
+        try:
+            booking = db.query(Booking).filter(Booking.id == booking_id).first()
+            booking.booking_status = BookingStatus.AWAITING_AUTHORIZATION
+            db.commit()
+        finally:
+            db.close()
+        r = client.post("/api/authorization/request", json={
+            "booking_id": booking_id,
+            "reason": "Upload test",
+        }, headers=_auth(user_token))
+        return r.json()["id"], user_token
+
+    def test_backends_must_implement_every_storage_method(self):
+        from ..services.upload_store import LocalBackend, StorageBackend
+
+        class NoDelete(StorageBackend):
+            staging_dir = LocalBackend.staging_dir
+            exists = LocalBackend.exists
+            commit = LocalBackend.commit
+            local_path = LocalBackend.local_path
+
+        with pytest.raises(TypeError):
+            StorageBackend()
+        with pytest.raises(TypeError):
+            NoDelete()
+
+    def test_identical_proof_uploads_are_stored_once(self):
+        import hashlib
+        from ..services.upload_store import get_upload_store
+
+        request_id, user_token = self._auth_request_id()
+        content = f"%PDF-1.4 proof {datetime.utcnow().isoformat()}".encode()
+        expected = hashlib.sha256(content).hexdigest() + ".pdf"
+        try:
+            for name in ("wire.pdf", "wire-copy.pdf"):
+                r = client.post(
+                    f"/api/authorization/{request_id}/upload-proof",
+                    files={"files": (name, content, "application/pdf")},
+                    headers=_auth(user_token),
+                )
+                assert r.status_code == 200, r.text
+                assert r.json()["uploaded"] == [expected]
+            assert r.json()["proof_documents"] == expected
+
+            r = client.get(f"/api/authorization/documents/{expected}", headers=_auth(_login(*ADMIN)))
+            assert r.status_code == 200
+            assert r.content == content
+        finally:
+            import asyncio
+            asyncio.run(get_upload_store().delete(f"proof_documents/{expected}"))
+
+    async def test_oversized_upload_is_cut_off_while_streaming(self, tmp_path):
+        from ..services.upload_store import LocalBackend, UploadStore, UploadTooLarge
+
+        store = UploadStore(LocalBackend(str(tmp_path)), max_size=10, chunk_size=4)
+        consumed = []
+
+        async def chunks():
+            for _ in range(100):
+                consumed.append(1)
+                yield b"abcd"
+
+        with pytest.raises(UploadTooLarge):
+            await store.save_stream(chunks(), "passports", "big.pdf")
+        assert len(consumed) == 3
+        assert not (tmp_path / "passports").exists()
+        assert list((tmp_path / ".staging").iterdir()) == []
+
+    async def test_s3_backend_against_local_stand_in(self, tmp_path):
+        import shutil
+        from ..services.upload_store import S3Backend, UploadStore
+
+        class DirS3Client:
+            """Directory-backed stand-in for the boto3 S3 client calls the backend uses."""
+            def __init__(self, root):
+                self.root = root
+
+            def _path(self, bucket, key):
+                return self.root / bucket / key
+
+            def head_object(self, Bucket, Key):
+                if not self._path(Bucket, Key).exists():
+                    error = Exception("Not Found")
+                    error.response = {"Error": {"Code": "404"}}
+                    raise error
+                return {}
+
+            def upload_file(self, filename, bucket, key):
+                dest = self._path(bucket, key)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(filename, dest)
+
+            def download_file(self, bucket, key, filename):
+                shutil.copyfile(self._path(bucket, key), filename)
+
+            def delete_object(self, Bucket, Key):
+                self._path(Bucket, Key).unlink()
+
+        async def chunks():
+            yield b"voucher "
+            yield b"bytes"
+
+        backend = S3Backend("uploads", client=DirS3Client(tmp_path / "s3"), prefix="trekdesk",
+                            cache_dir=str(tmp_path / "cache"))
+        store = UploadStore(backend)
+        first = await store.save_stream(chunks(), "vouchers", "v.pdf")
+        second = await store.save_stream(chunks(), "vouchers", "other-name.pdf")
+        assert first.key == second.key
+        assert not first.deduplicated and second.deduplicated
+        assert (tmp_path / "s3" / "uploads" / "trekdesk" / first.key).exists()
+
+        path = await store.local_path(first.key)
+        with open(path, "rb") as f:
+            assert f.read() == b"voucher bytes"
+
+        await store.delete(first.key)
+        assert not await backend.exists(first.key)
+
+
+class TestProofDocuments:
+
+    def _upload_png(self):
+        import io
+        from PIL import Image
+
+        request_id, user_token = TestUploadStore()._auth_request_id()
+        buf = io.BytesIO()
+        Image.new("RGB", (900, 1200), (200, 30, int(datetime.utcnow().microsecond % 255))).save(buf, format="PNG")
+        r = client.post(
+            f"/api/authorization/{request_id}/upload-proof",
+            files={"files": ("bank slip.png", buf.getvalue(), "image/png")},
+            headers=_auth(user_token),
+        )
+        assert r.status_code == 200, r.text
+        return request_id, r.json()["documents"][0], buf.getvalue()
+
+    def _cleanup(self, filename):
+        import asyncio
+        from ..models.authorization import ProofDocument
+        from ..services.upload_store import get_upload_store
+
+        db = _db()
+        try:
+            doc = db.query(ProofDocument).filter(ProofDocument.filename == filename).first()
+            preview = doc.preview_filename if doc else None
+        finally:
+            db.close()
+        store = get_upload_store()
+        asyncio.run(store.delete(f"proof_documents/{filename}"))
+        if preview:
+            asyncio.run(store.delete(f"proof_documents/previews/{preview}"))
+
+    def test_documents_are_listed_from_table(self):
+        request_id, doc, _ = self._upload_png()
+        try:
+            assert doc["original_filename"] == "bank slip.png"
+            r = client.get("/api/authorization/", headers=_auth(_login(*ADMIN)))
+            assert r.status_code == 200
+            req = next(x for x in r.json() if x["id"] == request_id)
+            assert [d["filename"] for d in req["documents"]] == [doc["filename"]]
+            assert req["proof_documents"] == doc["filename"]
+        finally:
+            self._cleanup(doc["filename"])
+
+    def test_range_and_etag(self):
+        _, doc, content = self._upload_png()
+        headers = _auth(_login(*ADMIN))
+        url = f"/api/authorization/documents/{doc['filename']}"
+        try:
+            r = client.get(url, headers=headers)
+            assert r.status_code == 200
+            assert r.content == content
+            etag = r.headers["etag"]
+            assert etag == '"' + doc["filename"].split(".")[0] + '"'
+            assert r.headers["accept-ranges"] == "bytes"
+
+            r = client.get(url, headers={**headers, "Range": "bytes=0-9"})
+            assert r.status_code == 206
+            assert r.content == content[:10]
+            assert r.headers["content-range"] == f"bytes 0-9/{len(content)}"
+
+            # Ranges count raw bytes, so file responses are never compressed
+            for encoding in ("gzip", "br"):
+                r = client.get(url, headers={**headers, "Range": "bytes=0-9", "Accept-Encoding": encoding})
+                assert r.status_code == 206 and "content-encoding" not in r.headers
+                assert r.headers["content-length"] == "10" and r.content == content[:10]
+
+            r = client.get(url, headers={**headers, "Range": "bytes=-4"})
+            assert r.status_code == 206
+            assert r.content == content[-4:]
+
+            r = client.get(url, headers={**headers, "Range": f"bytes={len(content)}-"})
+            assert r.status_code == 416
+
+            r = client.get(url, headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 304
+        finally:
+            self._cleanup(doc["filename"])
+
+    def test_preview_is_rendered_in_background(self):
+        import io
+        from PIL import Image
+
+        _, doc, _ = self._upload_png()
+        try:
+            # TestClient runs background tasks before returning, so the preview is ready
+            r = client.get(doc["preview_url"], headers=_auth(_login(*AUTH)))
+            assert r.status_code == 200, r.text
+            assert r.headers["content-type"] == "image/jpeg"
+            thumb = Image.open(io.BytesIO(r.content))
+            assert max(thumb.size) <= 640
+        finally:
+            self._cleanup(doc["filename"])
+
+
+# ---------------------------------------------------------------------------
+# Scrape retry queue
+# ---------------------------------------------------------------------------
+
+class TestScrapeRetryQueue:
+
+    def _dates(self, *offsets):
+        return [(datetime.now() + timedelta(days=700 + o)).strftime("%d/%m/%Y") for o in offsets]
+
+    def _cleanup(self, dates):
+        from ..models.available_slots import AvailableSlot
+        from ..models.product_availability import ProductAvailability
+        from ..models.scrape_retry import ScrapeRetry
+        db = _db()
+        try:
+            db.query(ScrapeRetry).filter(ScrapeRetry.date.in_(dates)).delete(synchronize_session=False)
+            db.query(AvailableSlot).filter(AvailableSlot.date.in_(dates)).delete(synchronize_session=False)
+            db.query(ProductAvailability).filter(ProductAvailability.date.in_(dates)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def test_unresolved_dates_are_queued_and_reported_stale(self):
+        from ..services.scrape_retry_queue import record_scrape_outcome
+        resolved, failed = self._dates(0, 1)
+        self._cleanup([resolved, failed])
+        db = _db()
+        try:
+            record_scrape_outcome(db, "gorilla", [resolved, failed], [(resolved, "12")], source="test")
+        finally:
+            db.close()
+        try:
+            r = client.get("/api/available-slots/stale?slot_type=gorilla&days=730", headers=_auth(_login(*USER)))
+            assert r.status_code == 403
+            r = client.get("/api/available-slots/stale?slot_type=gorilla&days=730", headers=_auth(_login(*ADMIN)))
+            assert r.status_code == 200, r.text
+            entries = {e["date"]: e for e in r.json()["stale"]}
+            assert entries[failed]["reason"] == "retry_pending"
+            assert entries[failed]["attempts"] == 1
+            assert entries[failed]["last_error"] == "no slot value after in-run retry"
+            assert entries[resolved]["reason"] == "never_scraped"
+        finally:
+            self._cleanup([resolved, failed])
+
+    async def test_drain_resolves_due_dates_and_backs_off_the_rest(self):
+        from ..models.available_slots import AvailableSlot
+        from ..models.scrape_retry import ScrapeRetry
+        from ..services.scrape_retry_queue import drain_once, record_failures
+        good, bad = self._dates(2, 3)
+        self._cleanup([good, bad])
+        db = _db()
+        try:
+            record_failures(db, "gorilla", [good, bad], "timeout", source="test")
+            db.query(ScrapeRetry).filter(ScrapeRetry.date.in_([good, bad])).update(
+                {ScrapeRetry.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        async def fake_check(product, dates):
+            return {d: ("7", "") if d == good else (None, "still failing") for d in dates}
+
+        try:
+            summary = await drain_once(check=fake_check)
+            assert summary["gorilla"]["resolved"] >= 1
+            db = _db()
+            try:
+                assert db.query(AvailableSlot).filter(AvailableSlot.date == good).one().slots == "7"
+                assert db.query(ScrapeRetry).filter(ScrapeRetry.date == good).first() is None
+                row = db.query(ScrapeRetry).filter(ScrapeRetry.date == bad).one()
+                assert row.attempts == 2
+                assert row.last_error == "still failing"
+                assert row.next_attempt_at > datetime.utcnow()
+            finally:
+                db.close()
+        finally:
+            self._cleanup([good, bad])
+
+
+# ---------------------------------------------------------------------------
+# Scraper concurrency controller
+# ---------------------------------------------------------------------------
+
+class TestScraperControl:
+
+    def test_scraper_control_is_admin_only(self):
+        r = client.get("/api/available-slots/scraper-control", headers=_auth(_login(*USER)))
+        assert r.status_code == 403
+
+    def test_knobs_can_be_changed_live(self):
+        headers = _auth(_login(*ADMIN))
+        before = client.get("/api/available-slots/scraper-control", headers=headers).json()
+        try:
+            r = client.put("/api/available-slots/scraper-control", headers=headers,
+                           json={"max_limit": 3, "limit": 10})
+            assert r.status_code == 200, r.text
+            assert r.json()["limit"] == 3
+            assert r.json()["knobs"]["max_limit"] == 3
+
+            r = client.put("/api/available-slots/scraper-control", headers=headers,
+                           json={"decrease_factor": 2})
+            assert r.status_code == 400
+        finally:
+            client.put("/api/available-slots/scraper-control", headers=headers,
+                       json={**before["knobs"], "limit": before["limit"], "delay": before["delay_s"]})
+
+    def test_workers_share_knobs_and_split_the_limit(self):
+        from ..models.scraper_control import ScraperControl, ScraperWorkerState
+        from ..services import scraper_control
+        from ..utils.adaptive_concurrency import AdaptiveController
+
+        name = "control_test"
+        workers = {
+            worker_id: AdaptiveController(name, initial_limit=2, min_limit=1, max_limit=16,
+                                          initial_delay=1.0, min_delay=0.1, max_delay=10.0)
+            for worker_id in ("worker-a", "worker-b")
+        }
+        db = _db()
+        try:
+            scraper_control.update_control(db, name, {"max_limit": 8, "limit": 8})
+            versions = {worker_id: None for worker_id in workers}
+            for _ in range(2):  # second round: both see each other
+                for worker_id, controller in workers.items():
+                    versions[worker_id] = scraper_control.sync(db, controller, worker_id, versions[worker_id])
+            for controller in workers.values():
+                assert controller.max_limit == 8 and controller.cap == 4 and controller.limit <= 4
+            status = scraper_control.control_status(db, name)
+            assert [w["worker_id"] for w in status["workers"]] == ["worker-a", "worker-b"]
+            assert status["limit"] <= 8
+
+            scraper_control.leave(db, "worker-b")
+            scraper_control.sync(db, workers["worker-a"], "worker-a", versions["worker-a"])
+            assert workers["worker-a"].cap == 8
+        finally:
+            db.query(ScraperWorkerState).filter(ScraperWorkerState.controller == name).delete()
+            db.query(ScraperControl).filter(ScraperControl.name == name).delete()
+            db.commit()
+            db.close()
+
+
+# ---------------------------------------------------------------------------
+# Scrape work leases
+# ---------------------------------------------------------------------------
+
+class TestScrapeLeases:
+    PRODUCT = "lease_test"
+
+    def _cleanup(self):
+        from ..models.scrape_work import ScrapeWorkItem
+        db = _db()
+        try:
+            db.query(ScrapeWorkItem).filter(ScrapeWorkItem.product == self.PRODUCT).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _claim(self, worker_id):
+        from ..services.scrape_leases import claim_next
+        db = _db()
+        try:
+            item = claim_next(db, worker_id, products=[self.PRODUCT])
+            return item.id if item else None
+        finally:
+            db.close()
+
+    def test_workers_never_share_an_item_and_expired_leases_are_taken_over(self):
+        from ..models.scrape_work import ScrapeWorkItem
+        from ..services.scrape_leases import ensure_work_items, heartbeat, release, HORIZON_DAYS, BATCH_DAYS
+        self._cleanup()
+        db = _db()
+        try:
+            ensure_work_items(db, products=[self.PRODUCT])
+            ensure_work_items(db, products=[self.PRODUCT])  # idempotent
+            count = db.query(ScrapeWorkItem).filter(ScrapeWorkItem.product == self.PRODUCT).count()
+            assert count == (HORIZON_DAYS + BATCH_DAYS - 1) // BATCH_DAYS
+        finally:
+            db.close()
+        try:
+            first, second = self._claim("worker-a"), self._claim("worker-b")
+            assert first and second and first != second
+
+            # worker-a dies: its lease expires and worker-b takes the range over
+            db = _db()
+            try:
+                db.query(ScrapeWorkItem).filter(ScrapeWorkItem.id == first).update(
+                    {ScrapeWorkItem.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)})
+                db.commit()
+                assert self._claim("worker-b") == first
+                assert not heartbeat(db, first, "worker-a")
+                assert not release(db, first, "worker-a")
+                assert heartbeat(db, first, "worker-b")
+                assert release(db, first, "worker-b", error="boom")
+                item = db.query(ScrapeWorkItem).get(first)
+                assert item.lease_owner is None and item.failures == 1 and item.last_completed_at
+            finally:
+                db.close()
+
+            # a released range goes to the back of the line
+            assert self._claim("worker-c") not in (first, second)
+        finally:
+            self._cleanup()
+
+    def test_retry_drain_item_is_never_duplicated(self):
+        from ..models.scrape_work import ScrapeWorkItem
+        from ..services.scrape_leases import ALL_PRODUCTS, RETRY_DRAIN, ensure_work_items
+        db = _db()
+        try:
+            # Rows from before the sentinel: NULLs slip past the unique constraint
+            db.add_all([ScrapeWorkItem(kind=RETRY_DRAIN, product=None, start_offset=0) for _ in range(2)])
+            db.commit()
+            ensure_work_items(db, products=[self.PRODUCT])
+            ensure_work_items(db, products=[self.PRODUCT])
+            drains = db.query(ScrapeWorkItem).filter(ScrapeWorkItem.kind == RETRY_DRAIN).all()
+            assert [item.product for item in drains] == [ALL_PRODUCTS]
+        finally:
+            db.close()
+            self._cleanup()
+
+    def test_workers_endpoint_is_admin_only(self):
+        r = client.get("/api/available-slots/workers", headers=_auth(_login(*USER)))
+        assert r.status_code == 403
+        r = client.get("/api/available-slots/workers", headers=_auth(_login(*ADMIN)))
+        assert r.status_code == 200, r.text
+        assert "items" in r.json()
+
+
+# ---------------------------------------------------------------------------
+# Product catalogue scraping
+# ---------------------------------------------------------------------------
+
+class TestProductCatalogue:
+
+    def _product(self, key):
+        r = client.get("/api/available-slots/products", headers=_auth(_login(*ADMIN)))
+        assert r.status_code == 200, r.text
+        return next(p for p in r.json()["products"] if p["key"] == key)
+
+    def test_legacy_products_are_enabled_under_their_old_keys(self):
+        assert self._product("gorilla")["scrape_enabled"] is True
+        assert self._product("golden_monkey")["scrape_enabled"] is True
+        chimps = self._product("chimps_trek")
+        assert chimps["site_label"] == "Nyungwe Forest National Park"
+        assert chimps["product_label"] == "Chimps Trek"
+
+    def test_enabling_a_product_adds_it_to_the_sweep(self):
+        from ..models.scrape_work import ScrapeWorkItem
+        from ..services.scrape_leases import ensure_work_items
+        chimps = self._product("chimps_trek")
+        url = f"/api/available-slots/products/{chimps['product_id']}"
+        assert client.put(url, headers=_auth(_login(*USER)), json={"scrape_enabled": True}).status_code == 403
+
+        headers = _auth(_login(*ADMIN))
+        try:
+            r = client.put(url, headers=headers, json={"scrape_enabled": True, "permit_product_label": "Chimpanzee Trek"})
+            assert r.status_code == 200, r.text
+            assert r.json()["product_label"] == "Chimpanzee Trek"
+            db = _db()
+            try:
+                ensure_work_items(db)
+                assert db.query(ScrapeWorkItem).filter(ScrapeWorkItem.product == "chimps_trek").count() > 0
+            finally:
+                db.close()
+        finally:
+            client.put(url, headers=headers, json={"scrape_enabled": False, "permit_product_label": ""})
+        assert self._product("chimps_trek")["product_label"] == "Chimps Trek"
+        db = _db()
+        try:
+            ensure_work_items(db)
+            assert db.query(ScrapeWorkItem).filter(ScrapeWorkItem.product == "chimps_trek").count() == 0
+        finally:
+            db.close()
+
+    def test_purge_past_compares_dates_not_strings(self):
+        from ..models.available_slots import AvailableSlot
+        from ..services.product_catalogue import purge_past
+        today = datetime.now().date()
+        # As strings "01/..." sorts before "31/...": only a real date comparison gets these right
+        past = [(today - timedelta(days=1)).strftime("%d/%m/%Y"), f"31/12/{today.year - 1}"]
+        kept = [today.strftime("%d/%m/%Y"), f"01/01/{today.year + 1}", "not a date"]
+        db = _db()
+        try:
+            db.add_all(AvailableSlot(date=value, slots="5") for value in past + kept)
+            db.commit()
+            purge_past(db)
+            remaining = {row.date for row in db.query(AvailableSlot).filter(AvailableSlot.date.in_(past + kept))}
+            assert remaining == set(kept)
+        finally:
+            db.query(AvailableSlot).filter(AvailableSlot.date.in_(past + kept)).delete(synchronize_session=False)
+            db.commit()
+            db.close()
+
+    async def test_drained_dates_land_in_the_product_keyed_table(self):
+        from ..models.product_availability import ProductAvailability
+        from ..models.scrape_retry import ScrapeRetry
+        from ..services.scrape_retry_queue import drain_once, record_failures
+        date = (datetime.now() + timedelta(days=705)).strftime("%d/%m/%Y")
+        chimps = self._product("chimps_trek")
+
+        def cleanup():
+            db = _db()
+            try:
+                db.query(ScrapeRetry).filter(ScrapeRetry.date == date).delete(synchronize_session=False)
+                db.query(ProductAvailability).filter(ProductAvailability.date == date).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+        cleanup()
+        db = _db()
+        try:
+            record_failures(db, "chimps_trek", [date], "timeout", source="test")
+            db.query(ScrapeRetry).filter(ScrapeRetry.date == date).update(
+                {ScrapeRetry.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        async def fake_check(product, dates):
+            return {d: ("9", "") for d in dates}
+
+        try:
+            summary = await drain_once(check=fake_check)
+            assert summary["chimps_trek"]["resolved"] == 1
+            r = client.get(f"/api/available-slots?slot_type=chimps_trek&start_date={date}&end_date={date}",
+                           headers=_auth(_login(*USER)))
+            assert r.status_code == 200, r.text
+            assert [s["slots"] for s in r.json()["slots"]] == ["9"]
+            db = _db()
+            try:
+                row = db.query(ProductAvailability).filter(ProductAvailability.date == date).one()
+                assert row.product_id == chimps["product_id"]
+            finally:
+                db.close()
+        finally:
+            cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Availability calendar
+# ---------------------------------------------------------------------------
+
+class TestAvailabilityCalendar:
+
+    def test_columnar_calendar_is_versioned_by_scraper_writes(self):
+        from ..services.product_catalogue import LEGACY_SLOT_MODELS, get_target, save_availability
+        start = datetime.now().date() + timedelta(days=1000)
+        dates = [(start + timedelta(days=offset)).strftime("%d/%m/%Y") for offset in range(3)]
+        url = f"/api/available-slots/calendar?products=gorilla,golden_monkey&start_date={dates[0]}&end_date={dates[-1]}"
+        headers = _auth(_login(*USER))
+
+        def write(key, date, slots):
+            db = _db()
+            try:
+                save_availability(db, get_target(db, key), date, slots)
+                db.commit()
+            finally:
+                db.close()
+
+        def cleanup():
+            db = _db()
+            try:
+                for model in LEGACY_SLOT_MODELS.values():
+                    db.query(model).filter(model.date.in_(dates)).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+        cleanup()
+        try:
+            write("gorilla", dates[0], "7")
+            write("golden_monkey", dates[1], "Sold Out")
+            r = client.get(url, headers=headers)
+            assert r.status_code == 200, r.text
+            calendar = r.json()
+            assert calendar["dates"] == dates
+            assert calendar["products"]["gorilla"]["slots"] == [7, None, None]
+            assert calendar["products"]["golden_monkey"]["slots"] == [None, 0, None]
+            assert calendar["products"]["golden_monkey"]["sold_out"] == [0, 1, 0]
+            assert calendar["products"]["gorilla"]["updated_at"] is not None
+            etag = r.headers["etag"]
+            assert etag == f'"{calendar["version"]}"'
+
+            assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+            write("gorilla", dates[2], "12")
+            r = client.get(url, headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 200
+            assert r.headers["etag"] != etag
+            assert r.json()["products"]["gorilla"]["slots"] == [7, None, 12]
+
+            assert client.get("/api/available-slots/calendar?products=nope", headers=headers).status_code == 400
+        finally:
+            cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Slot alerts
+# ---------------------------------------------------------------------------
+
+class TestSlotAlerts:
+    PRODUCT = "chimps_trek"
+    TITLE = "Low Chimps Trek Slots Alert"
+
+    def _dates(self):
+        start = datetime.now().date() + timedelta(days=1100)
+        return [(start + timedelta(days=offset)).strftime("%d/%m/%Y") for offset in range(2)]
+
+    def _cleanup(self):
+        from ..models.booking import Booking
+        from ..models.notification import Notification
+        from ..models.product_availability import ProductAvailability
+        from ..models.slot_alert import SlotAlertRule, SlotAlertState
+        from ..services.capacity_index import forget_booking
+        dates = self._dates()
+        db = _db()
+        try:
+            db.query(Notification).filter(Notification.title.in_([self.TITLE, "Chimps Trek permits running low"])) \
+                .delete(synchronize_session=False)
+            for booking in db.query(Booking).filter(Booking.booking_name == "SlotAlertHold"):
+                forget_booking(db, booking)
+                db.delete(booking)
+            db.query(ProductAvailability).filter(ProductAvailability.date.in_(dates)).delete(synchronize_session=False)
+            db.query(SlotAlertState).filter(SlotAlertState.product == self.PRODUCT).delete(synchronize_session=False)
+            db.query(SlotAlertRule).filter(SlotAlertRule.product == self.PRODUCT).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _write(self, date, slots):
+        """Store a value the way the scrape engines do; returns the admin alerts raised."""
+        from ..models.notification import Notification
+        from ..models.user import User
+        from ..services.product_catalogue import get_target, save_availability
+        from ..services.slot_alerts import SlotAlerts
+        db = _db()
+        try:
+            target = get_target(db, self.PRODUCT)
+            alerts = SlotAlerts(db)
+            save_availability(db, target, date, slots)
+            alerts.observe(target, date, slots)
+            alerts.send()
+            db.commit()
+            admin = db.query(User).filter(User.email == ADMIN[0]).one()
+            return [n.message for n in db.query(Notification).filter(
+                Notification.user_id == admin.id, Notification.title == self.TITLE
+            ).order_by(Notification.id)]
+        finally:
+            db.close()
+
+    def test_thresholds_have_hysteresis_and_a_cooldown(self):
+        date = self._dates()[0]
+        url = f"/api/available-slots/alert-rules/{self.PRODUCT}"
+        assert client.put(url, headers=_auth(_login(*USER)), json={"threshold": 10}).status_code == 403
+        self._cleanup()
+        try:
+            r = client.put(url, headers=_auth(_login(*ADMIN)), json={"threshold": 10, "clear_at": 15})
+            assert r.status_code == 200, r.text
+            assert r.json()["cooldown_hours"] == 24.0
+            assert client.put(url, headers=_auth(_login(*ADMIN)), json={"clear_at": 5}).status_code == 400
+
+            assert self._write(date, "25") == []
+            alerts = self._write(date, "8")
+            assert len(alerts) == 1 and f"{date} (8 slots left)" in alerts[0]
+            assert len(self._write(date, "12")) == 1  # above the threshold, below clear_at: still low
+            assert len(self._write(date, "Sold Out")) == 1
+            assert len(self._write(date, "16")) == 1  # recovered: re-armed
+            assert len(self._write(date, "5")) == 1  # crossed again, but within the cooldown
+        finally:
+            self._cleanup()
+
+    def test_pending_bookings_count_against_the_slots_left(self):
+        from ..models.booking import Booking, BookingStatus
+        from ..models.notification import Notification
+        from ..models.user import User
+        from ..services.capacity_index import sync_booking
+        from ..services.product_catalogue import get_target
+        from ..services.slot_alerts import sweep
+        date = self._dates()[1]
+        self._cleanup()
+        client.put(f"/api/available-slots/alert-rules/{self.PRODUCT}", headers=_auth(_login(*ADMIN)),
+                   json={"threshold": 10})
+        assert self._write(date, "12") == []
+        db = _db()
+        try:
+            user = db.query(User).filter(User.email == USER[0]).one()
+            booking = Booking(
+                booking_name="SlotAlertHold", product="Chimps Trek", product_id=get_target(db, self.PRODUCT).product_id,
+                date=datetime.strptime(date, "%d/%m/%Y").date(), people=3, user_id=user.id,
+                booking_status=BookingStatus.PROVISIONAL,
+            )
+            db.add(booking)
+            db.flush()
+            sync_booking(db, booking)
+            db.commit()
+            user_id = user.id
+        finally:
+            db.close()
+        try:
+            # Still 12 on the site, but 3 of them are ours now: the sweep sees the crossing
+            db = _db()
+            try:
+                assert sweep(db) >= 1
+            finally:
+                db.close()
+            alerts = self._write(date, "12")
+            assert len(alerts) == 1 and "3 held by pending bookings" in alerts[0]
+            db = _db()
+            try:
+                owner = db.query(Notification).filter(
+                    Notification.user_id == user_id, Notification.title == "Chimps Trek permits running low"
+                ).one()
+                assert f"SlotAlertHold on {date}" in owner.message
+            finally:
+                db.close()
+        finally:
+            self._cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Capacity index
+# ---------------------------------------------------------------------------
+
+class TestCapacityIndex:
+    PRODUCT = "chimps_trek"
+    NAME = "CapacityHold"
+
+    def _day(self):
+        return datetime.now().date() + timedelta(days=1150)
+
+    def _cleanup(self):
+        from ..models.booking import Booking
+        from ..models.capacity import CapacityIndex
+        from ..models.product_availability import ProductAvailability
+        from ..services.capacity_index import forget_booking
+        db = _db()
+        try:
+            for booking in db.query(Booking).filter(Booking.booking_name.like(f"{self.NAME}%")):
+                forget_booking(db, booking)
+                db.delete(booking)
+            db.query(CapacityIndex).filter(CapacityIndex.date == self._day()).delete(synchronize_session=False)
+            db.query(ProductAvailability).filter(ProductAvailability.date == self._day().strftime("%d/%m/%Y")) \
+                .delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _scrape(self, slots):
+        from ..services.product_catalogue import get_target, save_availability
+        db = _db()
+        try:
+            save_availability(db, get_target(db, self.PRODUCT), self._day().strftime("%d/%m/%Y"), slots)
+            db.commit()
+        finally:
+            db.close()
+
+    def _body(self, suffix, people, status):
+        return {
+            "booking_name": f"{self.NAME}{suffix}",
+            "site": "",
+            "product": "Chimps Trek",
+            "number_of_people": people,
+            "date": self._day().isoformat(),
+            "status": status,
+            "available_slots": 0,
+        }
+
+    def _book(self, suffix, people, status="provisional"):
+        return client.post("/api/bookings", json=self._body(suffix, people, status), headers=_auth(_login(*USER)))
+
+    def _cell(self):
+        from ..models.capacity import CapacityIndex
+        from ..services.product_catalogue import get_target
+        db = _db()
+        try:
+            cell = db.get(CapacityIndex, (get_target(db, self.PRODUCT).product_id, self._day()))
+            return (cell.committed, cell.pending, cell.bookings) if cell else (0, 0, 0)
+        finally:
+            db.close()
+
+    def test_bookings_are_checked_against_net_availability(self, monkeypatch):
+        from ..config import settings
+        from ..models.booking import Booking, BookingStatus
+        from ..services.booking_events import transition_booking
+        self._cleanup()
+        try:
+            self._scrape("5")
+            first = self._book("A", 3)
+            assert first.status_code == 200, first.text
+            assert first.json()["capacity"]["net_available"] == 5
+            assert first.json()["capacity_warning"] is None
+            assert self._cell() == (0, 3, 1)
+
+            # 5 on the site, 3 of them already promised: a second party of 3 over-commits
+            second = self._book("B", 3)
+            assert second.status_code == 200, second.text
+            assert second.json()["capacity"]["net_available"] == 2
+            assert "Only 2 Chimps Trek permits left" in second.json()["capacity_warning"]
+            assert self._cell() == (0, 6, 2)
+
+            monkeypatch.setattr(settings, "OVERBOOKING_POLICY", "block")
+            assert self._book("C", 1).status_code == 409
+            assert self._cell() == (0, 6, 2)
+
+            db = _db()
+            try:
+                booking = db.get(Booking, first.json()["id"])
+                transition_booking(db, booking, BookingStatus.SECURED_FULL)
+                db.commit()
+                assert self._cell() == (3, 3, 2)
+                transition_booking(db, db.get(Booking, second.json()["id"]), BookingStatus.CANCELLED)
+                db.commit()
+            finally:
+                db.close()
+            assert self._cell() == (3, 0, 1)
+            assert self._book("C", 1).status_code == 200
+        finally:
+            self._cleanup()
+
+    def test_status_change_through_put_counts_the_booking_once(self):
+        self._cleanup()
+        try:
+            created = self._book("A", 2, status="rejected")
+            assert created.status_code == 200, created.text
+            assert self._cell() == (0, 0, 0)
+            r = client.put(f"/api/bookings/{created.json()['id']}", json=self._body("A", 2, "provisional"),
+                           headers=_auth(_login(*USER)))
+            assert r.status_code == 200, r.text
+            assert self._cell() == (0, 2, 1)
+        finally:
+            self._cleanup()
+
+    def test_reconcile_repairs_drift(self):
+        from ..models.capacity import CapacityIndex
+        from ..services.capacity_index import reconcile_capacity_index
+        from ..services.product_catalogue import get_target
+        self._cleanup()
+        try:
+            assert self._book("A", 2).status_code == 200
+            db = _db()
+            try:
+                cell = db.get(CapacityIndex, (get_target(db, self.PRODUCT).product_id, self._day()))
+                cell.pending = 40
+                db.commit()
+                report = reconcile_capacity_index(db, repair=True)
+                db.commit()
+                assert any(d["kind"] == "cell" and d["id"][1] == self._day().isoformat() for d in report["discrepancies"])
+            finally:
+                db.close()
+            assert self._cell() == (0, 2, 1)
+        finally:
+            self._cleanup()
+
+    def test_net_endpoint_subtracts_pending_people(self):
+        self._cleanup()
+        try:
+            self._scrape("12")
+            assert self._book("A", 4).status_code == 200
+            day = self._day().strftime("%d/%m/%Y")
+            r = client.get(f"/api/available-slots/net?product={self.PRODUCT}&start_date={day}&end_date={day}",
+                           headers=_auth(_login(*USER)))
+            assert r.status_code == 200, r.text
+            assert r.json()["dates"] == [{"date": day, "slots": 12, "committed": 0, "pending": 4, "bookings": 1,
+                                          "net_available": 8}]
+            assert client.get("/api/available-slots/net?product=nope", headers=_auth(_login(*USER))).status_code == 404
+        finally:
+            self._cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Scrape telemetry
+# ---------------------------------------------------------------------------
+
+class TestScrapeTelemetry:
+    ENGINE = "telemetry_test"
+
+    def _cleanup(self):
+        from ..models.scrape_telemetry import (
+            ScrapeBatch, ScrapeDateTiming, ScrapePageLoad, ScrapeRun, ScrapeTelemetryDaily,
+        )
+        db = _db()
+        try:
+            for model in (ScrapeDateTiming, ScrapePageLoad, ScrapeBatch, ScrapeRun, ScrapeTelemetryDaily):
+                db.query(model).filter(model.engine == self.ENGINE).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _record_run(self):
+        from ..services.scrape_telemetry import DateTiming, finish_run, record_batch, start_run
+        from ..utils.lean_pages import PageLoad
+        db = _db()
+        try:
+            run_id = start_run(db, self.ENGINE, "test-worker")
+            record_batch(db, run_id, self.ENGINE, ["gorilla"], 0, 2, datetime.utcnow(), [
+                DateTiming("gorilla", "01/01/2030", 900.0, 1, "ok"),
+                DateTiming("gorilla", "02/01/2030", 41000.0, 2, "timeout"),
+            ], page_loads=[
+                PageLoad("tab", load_ms=800.0, requests=9, blocked=4, network_bytes=120_000),
+                PageLoad("retry", load_ms=300.0, requests=9, blocked=4, cache_hits=1, network_bytes=9_000,
+                         cache_bytes=110_000),
+            ])
+            finish_run(db, run_id)
+            return run_id
+        finally:
+            db.close()
+
+    def test_runs_and_slowest_dates(self):
+        self._cleanup()
+        try:
+            run_id = self._record_run()
+            headers = _auth(_login(*ADMIN))
+            r = client.get(f"/api/available-slots/telemetry/runs?engine={self.ENGINE}", headers=headers)
+            assert r.status_code == 200, r.text
+            run = next(entry for entry in r.json()["runs"] if entry["id"] == run_id)
+            assert run["status"] == "completed"
+            assert run["batches"] == 1
+            assert (run["dates_checked"], run["dates_resolved"]) == (2, 1)
+            assert run["duration_s"] is not None
+
+            r = client.get("/api/available-slots/telemetry/slowest-dates?product=gorilla&limit=500", headers=headers)
+            assert r.status_code == 200, r.text
+            dates = [entry["date"] for entry in r.json()["dates"]]
+            assert dates.index("02/01/2030") < dates.index("01/01/2030")
+            slow = r.json()["dates"][dates.index("02/01/2030")]
+            assert slow["attempts"] >= 2 and slow["failures"] >= 1
+
+            r = client.get("/api/available-slots/telemetry/runs", headers=_auth(_login(*USER)))
+            assert r.status_code == 403
+        finally:
+            self._cleanup()
+
+    def test_page_loads_are_summarised_per_engine_and_kind(self):
+        self._cleanup()
+        try:
+            self._record_run()
+            r = client.get(f"/api/available-slots/telemetry/page-loads?engine={self.ENGINE}",
+                           headers=_auth(_login(*ADMIN)))
+            assert r.status_code == 200, r.text
+            loads = {entry["kind"]: entry for entry in r.json()["page_loads"]}
+            assert loads["tab"]["avg_load_ms"] == 800.0
+            assert (loads["tab"]["blocked"], loads["tab"]["network_bytes"]) == (4, 120_000)
+            assert (loads["retry"]["cache_hits"], loads["retry"]["cache_bytes"]) == (1, 110_000)
+            r = client.get("/api/available-slots/telemetry/page-loads", headers=_auth(_login(*USER)))
+            assert r.status_code == 403
+        finally:
+            self._cleanup()
+
+    def test_rollup_moves_old_timings_into_daily_rows(self):
+        from ..config import settings
+        from ..models.scrape_telemetry import ScrapeDateTiming, ScrapePageLoad, ScrapeTelemetryDaily
+        from ..services.scrape_telemetry import rollup_and_prune
+        self._cleanup()
+        try:
+            self._record_run()
+            db = _db()
+            try:
+                later = datetime.utcnow() + timedelta(days=settings.SCRAPE_TELEMETRY_DETAIL_DAYS + 2)
+                rollup_and_prune(db, now=later)
+                assert db.query(ScrapeDateTiming).filter(ScrapeDateTiming.engine == self.ENGINE).count() == 0
+                assert db.query(ScrapePageLoad).filter(ScrapePageLoad.engine == self.ENGINE).count() == 0
+                daily = db.query(ScrapeTelemetryDaily).filter(ScrapeTelemetryDaily.engine == self.ENGINE).one()
+                assert (daily.checks, daily.resolved, daily.timeouts, daily.attempts) == (2, 1, 1, 3)
+                assert daily.max_latency_ms == 41000.0
+            finally:
+                db.close()
+
+            r = client.get("/api/available-slots/telemetry/daily?product=gorilla", headers=_auth(_login(*ADMIN)))
+            assert r.status_code == 200, r.text
+            assert any(entry["engine"] == self.ENGINE for entry in r.json()["days"])
+        finally:
+            self._cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Metrics endpoint
+# ---------------------------------------------------------------------------
+
+class TestMetricsEndpoint:
+    def test_metrics_hidden_when_disabled(self, monkeypatch):
+        from ..utils import metrics
+        monkeypatch.setattr(metrics, "enabled", False)
+        assert client.get("/metrics").status_code == 404
+
+    def test_metrics_exposition_and_token(self, monkeypatch):
+        from ..config import settings
+        from ..utils import metrics
+        monkeypatch.setattr(metrics, "enabled", True)
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-me")
+
+        assert client.get("/metrics").status_code == 401
+        r = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE trekdesk_http_request_duration_seconds histogram" in r.text
+        import os
+        import socket
+        process = f'process="{socket.gethostname()}:{os.getpid()}"'
+        assert f'trekdesk_scrape_dates_stored{{product="gorilla",{process}}}' in r.text
+        assert f'trekdesk_scrape_retry_queue_size{{product="golden_monkey",{process}}}' in r.text
+
+
+# ---------------------------------------------------------------------------
+# Rolling deposit aggregates
+# ---------------------------------------------------------------------------
+
+class TestRollingDepositAggregates:
+    def _agent(self):
+        from ..models.agent_client import AgentClient
+        db = _db()
+        try:
+            ac = AgentClient(name=f"RD Aggregates {datetime.utcnow().timestamp()}", has_rolling_deposit=True,
+                             rolling_deposit_limit=1000.0, rolling_deposit_balance=0.0)
+            db.add(ac)
+            db.commit()
+            return ac.id
+        finally:
+            db.close()
+
+    def _cleanup(self, agent_id):
+        from ..models.agent_client import (
+            AgentClient, RollingDepositBookingState, RollingDepositTotals, RollingDepositTransaction,
+        )
+        db = _db()
+        try:
+            for model in (RollingDepositTransaction, RollingDepositBookingState, RollingDepositTotals):
+                db.query(model).filter(model.agent_client_id == agent_id).delete(synchronize_session=False)
+            db.query(AgentClient).filter(AgentClient.id == agent_id).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _post_ledger(self, agent_id, headers):
+        """Top up 1000, deduct 50, apply a 120 deposit, return 100 of it."""
+        from ..models.agent_client import AgentClient
+        from ..models.booking import Booking
+        from ..models.payment import Payment
+        from ..services.rolling_deposit import apply_rolling_deposit
+
+        base = f"/api/finance-ar/rolling-deposit/{agent_id}"
+        assert client.post(f"{base}/top-up", json={"amount": 1000}, headers=headers).status_code == 200
+        assert client.post(f"{base}/adjust", json={"amount": -50, "notes": "fx"}, headers=headers).status_code == 200
+
+        booking_id = _make_booking(_login(*ADMIN), "RD Aggregates Booking")
+        db = _db()
+        try:
+            booking = db.get(Booking, booking_id)
+            ac = db.get(AgentClient, agent_id)
+            assert apply_rolling_deposit(db, booking, ac, Payment(amount=400.0, deposit_amount=120.0))
+            db.commit()
+        finally:
+            db.close()
+
+        r = client.post(f"{base}/return", json={"booking_id": booking_id, "amount": 100}, headers=headers)
+        assert r.status_code == 200, r.text
+        assert r.json()["balance"] == 930.0
+        return booking_id
+
+    def test_postings_maintain_totals_and_booking_state(self):
+        from ..models.agent_client import RollingDepositBookingState, RollingDepositTotals
+        agent_id = self._agent()
+        try:
+            booking_id = self._post_ledger(agent_id, _auth(_login(*FINANCE)))
+            db = _db()
+            try:
+                totals = db.get(RollingDepositTotals, agent_id)
+                assert (totals.topped_up, totals.adjusted, totals.applied, totals.returned) == (1000.0, -50.0, 120.0, 100.0)
+                assert (totals.pending_return, totals.transactions) == (20.0, 4)
+                state = db.get(RollingDepositBookingState, booking_id)
+                assert (state.applied, state.returned, state.outstanding) == (120.0, 100.0, 20.0)
+            finally:
+                db.close()
+
+            r = client.get("/api/finance-ar/rolling-deposit", headers=_auth(_login(*FINANCE)))
+            row = next(a for a in r.json()["agents"] if a["agent_client_id"] == agent_id)
+            assert row["pending_return"] == 20.0
+        finally:
+            self._cleanup(agent_id)
+
+    def test_ledger_is_paginated(self):
+        agent_id = self._agent()
+        try:
+            headers = _auth(_login(*FINANCE))
+            booking_id = self._post_ledger(agent_id, headers)
+            url = f"/api/finance-ar/rolling-deposit/{agent_id}/ledger"
+
+            first = client.get(f"{url}?limit=3", headers=headers).json()
+            second = client.get(f"{url}?limit=3&offset=3", headers=headers).json()
+            assert first["total_transactions"] == 4
+            assert (len(first["transactions"]), len(second["transactions"])) == (3, 1)
+            assert second["transactions"][0]["type"] == "top_up"
+            assert first["pending_returns"] == [{
+                "booking_id": booking_id, "booking_name": "RD Aggregates Booking",
+                "applied": 120.0, "returned": 100.0, "outstanding": 20.0,
+            }]
+
+            assert client.get(f"{url}?limit=501", headers=headers).status_code == 400
+            assert client.get(url, headers=_auth(_login(*USER))).status_code == 403
+        finally:
+            self._cleanup(agent_id)
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        from ..models.agent_client import RollingDepositBookingState, RollingDepositTotals
+        agent_id = self._agent()
+        try:
+            headers = _auth(_login(*FINANCE))
+            booking_id = self._post_ledger(agent_id, headers)
+            url = f"/api/finance-ar/rolling-deposit/reconcile?agent_id={agent_id}"
+            assert client.post(url, headers=headers).json()["discrepancies"] == []
+
+            db = _db()
+            try:
+                db.get(RollingDepositTotals, agent_id).applied = 999.0
+                db.delete(db.get(RollingDepositBookingState, booking_id))
+                db.commit()
+            finally:
+                db.close()
+
+            found = client.post(url, headers=headers).json()["discrepancies"]
+            assert {(d["kind"], d["field"]) for d in found} == {("agent", "applied"), ("booking", None)}
+            assert client.post(f"{url}&repair=true", headers=headers).status_code == 200
+            result = client.post(url, headers=headers).json()
+            assert result["discrepancies"] == [] and result["balance_drift"] == []
+
+            db = _db()
+            try:
+                assert db.get(RollingDepositTotals, agent_id).applied == 120.0
+                assert db.get(RollingDepositBookingState, booking_id).outstanding == 20.0
+            finally:
+                db.close()
+
+            assert client.post(url, headers=_auth(_login(*USER))).status_code == 403
+        finally:
+            self._cleanup(agent_id)
+
+
+# ---------------------------------------------------------------------------
+# Streaming exports
+# ---------------------------------------------------------------------------
+
+class TestStreamingExports:
+    def test_booking_export_csv_honours_date_range(self):
+        import csv
+        import io
+        token = _login(*ADMIN)
+        _make_booking(token, "Export CSV Booking", days_ahead=120)
+        trek = (datetime.utcnow() + timedelta(days=120)).date()
+
+        r = client.get(f"/api/bookings/export?start_date={trek}&end_date={trek}", headers=_auth(token))
+        assert r.status_code == 200, r.text
+        assert r.headers["content-type"].startswith("text/csv")
+        assert "bookings.csv" in r.headers["content-disposition"]
+        rows = list(csv.DictReader(io.StringIO(r.content.decode("utf-8-sig"))))
+        assert any(row["Booking name"] == "Export CSV Booking" for row in rows)
+        assert all(row["Trek date"] == trek.isoformat() for row in rows)
+
+        before = trek - timedelta(days=1)
+        r = client.get(f"/api/bookings/export?end_date={before}", headers=_auth(token))
+        assert "Export CSV Booking" not in r.content.decode("utf-8-sig")
+
+    def test_ar_export_xlsx_is_a_readable_workbook(self):
+        import io
+        import zipfile
+        from xml.etree import ElementTree
+        _make_booking(_login(*ADMIN), "Export XLSX Booking", days_ahead=130)
+
+        r = client.get("/api/finance-ar/ar/export?format=xlsx", headers=_auth(_login(*FINANCE)))
+        assert r.status_code == 200, r.text
+        assert r.headers["content-type"].startswith("application/vnd.openxmlformats")
+        with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+            assert archive.testzip() is None
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        texts = [t.text for t in sheet.iterfind(".//s:t", ns)]
+        assert texts[0] == "Booking ID"
+        assert "Export XLSX Booking" in texts
+
+    def test_export_arguments_and_roles(self):
+        finance = _auth(_login(*FINANCE))
+        assert client.get("/api/finance-ar/ap/export", headers=finance).status_code == 200
+        assert client.get("/api/finance-ar/ap/export?format=pdf", headers=finance).status_code == 400
+        r = client.get("/api/finance-ar/ar/export?start_date=2030-02-01&end_date=2030-01-01", headers=finance)
+        assert r.status_code == 400
+        assert client.get("/api/finance-ar/ar/export", headers=_auth(_login(*USER))).status_code == 403
+
+
+# ---------------------------------------------------------------------------
+# Booking event log
+# ---------------------------------------------------------------------------
+
+class TestBookingEvents:
+    def _timeline(self, booking_id, token):
+        r = client.get(f"/api/bookings/{booking_id}/timeline", headers=_auth(token))
+        assert r.status_code == 200, r.text
+        return r.json()["events"]
+
+    def test_transitions_are_logged_in_order(self):
+        token = _login(*ADMIN)
+        booking_id = _make_booking(token, "Event Log Lifecycle", booking_type="provisional")
+        assert client.post(f"/api/bookings/{booking_id}/request-confirmation", headers=_auth(token)).status_code == 200
+        assert client.post(f"/api/bookings/{booking_id}/confirm", headers=_auth(token)).status_code == 200
+
+        events = self._timeline(booking_id, token)
+        assert [e["type"] for e in events] == ["created", "confirmation_requested", "confirmed", "payment_recorded"]
+        assert [(e["from_status"], e["to_status"]) for e in events[1:3]] == [
+            ("provisional", "requested"), ("requested", "confirmed"),
+        ]
+        assert all(e["actor"] == "testadmin" for e in events)
+        assert [e["timestamp"] for e in events] == sorted(e["timestamp"] for e in events)
+        assert events[-1]["is_current"] and not any(e["is_current"] for e in events[:-1])
+
+    def test_authorization_decision_has_its_own_time_and_actor(self):
+        booking_id = _make_booking(_login(*ADMIN), "Event Log Authorization")
+        r = client.post("/api/authorization/request", json={"booking_id": booking_id, "reason": "Wire pending"},
+                        headers=_auth(_login(*ADMIN)))
+        assert r.status_code == 200, r.text
+        r = client.post(f"/api/authorization/{r.json()['id']}/authorize", json={"authorizer_notes": "ok"},
+                        headers=_auth(_login(*AUTH)))
+        assert r.status_code == 200, r.text
+
+        events = {e["type"]: e for e in self._timeline(booking_id, _login(*ADMIN))}
+        assert events["auth_requested"]["detail"] == "By testadmin: Wire pending"
+        assert events["auth_approved"]["detail"] == "By testauth: ok"
+        assert events["auth_approved"]["timestamp"] >= events["auth_requested"]["timestamp"]
+
+    def test_audit_feed_pages_and_requires_elevated_role(self):
+        _make_booking(_login(*ADMIN), "Event Log Feed")
+        headers = _auth(_login(*FINANCE))
+        first = client.get("/api/bookings/events?limit=2", headers=headers).json()
+        assert len(first["events"]) == 2 and first["events"][0]["id"] > first["events"][1]["id"]
+        second = client.get(f"/api/bookings/events?limit=2&before_id={first['next_before_id']}", headers=headers).json()
+        assert second["events"][0]["id"] < first["events"][1]["id"]
+        assert client.get("/api/bookings/events", headers=_auth(_login(*USER))).status_code == 403
+
+    def test_backfill_reconstructs_history_for_unlogged_bookings(self):
+        from ..main import migrate_booking_events
+        from ..models.booking import Booking, BookingStatus
+        from ..models.booking_event import BookingEvent
+        from ..models.chase import ChaseRecord, ChaseStatus
+
+        booking_id = _make_booking(_login(*ADMIN), "Event Log Backfill")
+        db = _db()
+        try:
+            db.query(BookingEvent).filter(BookingEvent.booking_id == booking_id).delete()
+            db.get(Booking, booking_id).booking_status = BookingStatus.CHASE
+            db.add(ChaseRecord(booking_id=booking_id, chase_count=2, status=ChaseStatus.ACTIVE))
+            db.commit()
+            migrate_booking_events(db)
+        finally:
+            db.close()
+
+        events = self._timeline(booking_id, _login(*ADMIN))
+        assert [e["type"] for e in events] == ["created", "chase"]
+        assert events[0]["detail"] == "Current status: Chase"
+        assert events[1]["detail"] == "2/5 chase attempts — active"
+
+
+# ---------------------------------------------------------------------------
+# Bulk workflow actions
+# ---------------------------------------------------------------------------
+
+class TestBulkWorkflow:
+    def _bulk(self, creds, **body):
+        return client.post("/api/bookings/bulk", json=body, headers=_auth(_login(*creds)))
+
+    def _notifications(self, email, title):
+        from ..models.notification import Notification
+        from ..models.user import User
+        db = _db()
+        try:
+            user = db.query(User).filter(User.email == email).one()
+            return [n.message for n in db.query(Notification).filter(
+                Notification.user_id == user.id, Notification.title == title
+            )]
+        finally:
+            db.close()
+
+    def test_bulk_confirm_reports_each_booking_and_notifies_once(self):
+        from ..models.booking import Booking, BookingStatus
+        stamp = datetime.utcnow().strftime("%H%M%S%f")
+        names = [f"Bulk Confirm {stamp} {n}" for n in range(3)]
+        ids = [_make_booking(_login(*USER), name, booking_type="requested") for name in names]
+        provisional = _make_booking(_login(*USER), f"Bulk Confirm {stamp} P", booking_type="provisional")
+
+        assert self._bulk(USER, action="confirm", booking_ids=ids).status_code == 403
+        assert self._bulk(ADMIN, action="explode", booking_ids=ids).status_code == 400
+
+        r = self._bulk(ADMIN, action="confirm", booking_ids=ids + [provisional, 987654321, ids[0]])
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert (data["succeeded"], data["failed"]) == (3, 2)
+        assert [(x["booking_id"], x["ok"]) for x in data["results"]] == \
+            [(i, True) for i in ids] + [(provisional, False), (987654321, False)]
+        assert [x["status_code"] for x in data["results"][3:]] == [400, 404]
+
+        db = _db()
+        try:
+            for booking_id in ids:
+                booking = db.get(Booking, booking_id)
+                assert booking.booking_status == BookingStatus.CONFIRMED and booking.payment is not None
+            assert db.get(Booking, provisional).booking_status == BookingStatus.PROVISIONAL
+        finally:
+            db.close()
+        summaries = [m for m in self._notifications(USER[0], "Booking Confirmed (3 bookings)") if names[0] in m]
+        assert len(summaries) == 1 and all(name in summaries[0] for name in names)
+
+    def test_bulk_purchase_and_validation_share_one_transaction(self):
+        from ..models.booking import Booking, BookingStatus
+        stamp = datetime.utcnow().strftime("%H%M%S%f")
+        names = [f"Bulk Purchase {stamp} {n}" for n in range(2)]
+        ids = [_make_booking(_login(*USER), name, booking_type="requested") for name in names]
+        assert self._bulk(ADMIN, action="confirm", booking_ids=ids).json()["succeeded"] == 2
+
+        # Every booking needs the amount actually received; one without it fails on its own
+        r = self._bulk(FINANCE, action="validate_payment", booking_ids=ids[1:],
+                       validation_status="ok_to_purchase_deposit")
+        assert r.status_code == 200, r.text
+        [missing] = r.json()["results"]
+        assert missing["status_code"] == 400 and "amount_received is required" in missing["error"]
+
+        r = self._bulk(FINANCE, action="validate_payment", booking_ids=ids,
+                       validation_status="ok_to_purchase_deposit", amounts={str(ids[0]): 50, str(ids[1]): 75})
+        assert r.status_code == 200, r.text
+        assert [x["amount_received"] for x in r.json()["results"]] == [50.0, 75.0]
+        ready = [m for m in self._notifications(ADMIN[0], "Ready to Purchase Permits (2 bookings)") if names[0] in m]
+        assert len(ready) == 1 and names[1] in ready[0]
+
+        assert self._bulk(ADMIN, action="purchase_permits", booking_ids=ids).status_code == 400
+        r = self._bulk(ADMIN, action="purchase_permits", booking_ids=ids, purchase_type="deposit")
+        assert r.json()["succeeded"] == 2
+        r = self._bulk(ADMIN, action="purchase_permits", booking_ids=ids[:1], purchase_type="full")
+        assert r.json()["results"][0]["status_code"] == 400  # already secured
+        db = _db()
+        try:
+            assert {db.get(Booking, i).booking_status for i in ids} == {BookingStatus.SECURED_DEPOSIT}
+        finally:
+            db.close()
+
+
+# ---------------------------------------------------------------------------
+# Batch voucher imports
+# ---------------------------------------------------------------------------
+
+class TestVoucherImports:
+    def _voucher(self, reference, name="Batch Family", **overrides):
+        voucher = {
+            "booking_name": name, "booking_reference": reference, "trek_date": "2030-03-01",
+            "head_of_file": "Jo Smith", "request_date": "2030-01-10", "product_type": "Mountain Gorillas",
+            "number_of_people": 2, "agent_client": reference[:3],
+        }
+        voucher.update(overrides)
+        return json.dumps(voucher).encode()
+
+    @pytest.fixture
+    def fake_extractor(self, monkeypatch, tmp_path):
+        """Vouchers are JSON here and go to a temporary store; records how many extractions overlapped."""
+        import threading
+        import time
+        from ..config import settings
+        from ..services import voucher_imports
+        from ..services.upload_store import LocalBackend, UploadStore
+        store = UploadStore(LocalBackend(str(tmp_path)))
+        monkeypatch.setattr(voucher_imports, "get_upload_store", lambda: store)
+        monkeypatch.setattr(settings, "VOUCHER_EXTRACT_CONCURRENCY", 2)
+        lock, state = threading.Lock(), {"running": 0, "peak": 0}
+
+        def extract(path):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            try:
+                time.sleep(0.05)
+                data = json.loads(open(path, "rb").read())
+                if data.get("broken"):
+                    raise ValueError("Could not process the PDF file")
+                return data
+            finally:
+                with lock:
+                    state["running"] -= 1
+        monkeypatch.setattr(voucher_imports, "extract_file", extract)
+        return state
+
+    def test_a_zip_batch_is_extracted_deduplicated_and_upserted(self, fake_extractor):
+        import io
+        import zipfile
+        from ..models.booking import Booking, BookingStatus
+        stamp = datetime.utcnow().strftime("%H%M%S%f")
+        first, second = f"VIA{stamp}", f"VIB{stamp}"
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("batch/a.pdf", self._voucher(first, "Old Name"))
+            zf.writestr("batch/b.pdf", self._voucher(first, "New Name"))
+            zf.writestr("batch/c.pdf", self._voucher(second))
+            zf.writestr("batch/copy-of-c.pdf", self._voucher(second))
+            zf.writestr("batch/notes.txt", b"not a voucher")
+            zf.writestr("batch/d.pdf", self._voucher(f"VIC{stamp}", booking_name=""))
+            zf.writestr("__MACOSX/batch/._a.pdf", b"resource fork")
+        files = [
+            ("files", ("vouchers.zip", archive.getvalue(), "application/zip")),
+            ("files", ("broken.pdf", json.dumps({"broken": True, "stamp": stamp}).encode(), "application/pdf")),
+        ]
+        r = client.post("/api/voucher/imports", files=files, headers=_auth(_login(*USER)))
+        assert r.status_code == 202, r.text
+        import_id = r.json()["id"]
+
+        report = client.get(f"/api/voucher/imports/{import_id}", headers=_auth(_login(*USER))).json()
+        assert report["status"] == "completed" and report["total_files"] == 5 and report["extracted_files"] == 5
+        by_name = {f["filename"]: f for f in report["files"]}
+        assert set(by_name) == {"batch/a.pdf", "batch/b.pdf", "batch/c.pdf", "batch/copy-of-c.pdf",
+                                "batch/notes.txt", "batch/d.pdf", "broken.pdf"}
+        assert by_name["batch/a.pdf"]["status"] == "duplicate"
+        assert by_name["batch/a.pdf"]["duplicate_of"] == by_name["batch/b.pdf"]["id"]
+        assert by_name["batch/b.pdf"]["status"] == by_name["batch/c.pdf"]["status"] == "created"
+        assert by_name["batch/copy-of-c.pdf"]["duplicate_of"] == by_name["batch/c.pdf"]["id"]
+        assert by_name["batch/notes.txt"]["status"] == "rejected"
+        assert by_name["batch/d.pdf"]["status"] == "incomplete"
+        assert by_name["batch/d.pdf"]["missing_fields"] == ["booking_name"]
+        assert by_name["broken.pdf"]["status"] == "error"
+        assert 1 < fake_extractor["peak"] <= 2
+
+        db = _db()
+        try:
+            booking = db.query(Booking).filter(Booking.booking_ref == first).one()
+            assert booking.booking_name == "New Name" and booking.booking_status == BookingStatus.REQUESTED
+            assert by_name["batch/b.pdf"]["booking_id"] == booking.id
+        finally:
+            db.close()
+
+        # Another user cannot read the report; re-importing a reference updates its booking
+        assert client.get(f"/api/voucher/imports/{import_id}", headers=_auth(_login(*FINANCE))).status_code == 404
+        r = client.post("/api/voucher/imports", headers=_auth(_login(*USER)),
+                        files=[("files", ("again.pdf", self._voucher(first, "Final Name"), "application/pdf"))])
+        assert r.status_code == 202, r.text
+        again = client.get(f"/api/voucher/imports/{r.json()['id']}", headers=_auth(_login(*USER))).json()
+        assert [(f["status"], f["booking_id"]) for f in again["files"]] == [("updated", booking.id)]
+
+    def test_deleting_an_imported_booking_keeps_the_report(self, fake_extractor):
+        from ..models.voucher_import import VoucherImportFile
+        reference = f"VID{datetime.utcnow().strftime('%H%M%S%f')}"
+        r = client.post("/api/voucher/imports", headers=_auth(_login(*USER)),
+                        files=[("files", ("one.pdf", self._voucher(reference), "application/pdf"))])
+        assert r.status_code == 202, r.text
+        import_id = r.json()["id"]
+        [file] = client.get(f"/api/voucher/imports/{import_id}", headers=_auth(_login(*USER))).json()["files"]
+        assert file["status"] == "created" and file["booking_id"]
+
+        r = client.delete(f"/api/bookings/{file['booking_id']}", headers=_auth(_login(*USER)))
+        assert r.status_code == 200, r.text
+        db = _db()
+        try:
+            assert db.get(VoucherImportFile, file["id"]).booking_id is None
+        finally:
+            db.close()
+        [file] = client.get(f"/api/voucher/imports/{import_id}", headers=_auth(_login(*USER))).json()["files"]
+        assert (file["status"], file["booking_id"]) == ("created", None)
+
+    def test_an_unusable_batch_is_refused(self, fake_extractor, monkeypatch):
+        from ..config import settings
+        r = client.post("/api/voucher/imports", headers=_auth(_login(*USER)),
+                        files=[("files", ("vouchers.zip", b"not a zip", "application/zip"))])
+        assert r.status_code == 400 and "not a valid zip" in r.json()["detail"]
+        monkeypatch.setattr(settings, "VOUCHER_IMPORT_MAX_FILES", 1)
+        files = [("files", (f"{n}.pdf", self._voucher(f"VIX{n}"), "application/pdf")) for n in range(2)]
+        assert client.post("/api/voucher/imports", files=files, headers=_auth(_login(*USER))).status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# Background services leader election
+# ---------------------------------------------------------------------------
+
+class TestLeaderElection:
+    NAME = "leader_test"
+
+    def _cleanup(self, name):
+        from ..models.service_lease import ServiceLease
+        db = _db()
+        try:
+            db.query(ServiceLease).filter(ServiceLease.name == name).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def test_startup_work_waits_for_the_current_holder(self, monkeypatch):
+        from ..services import leader
+        self._cleanup(leader.STARTUP)
+        db = _db()
+        try:
+            assert leader.acquire(db, leader.STARTUP, "other-worker")
+            waits = []
+
+            def sleep(seconds):  # the other worker finishes while we wait
+                waits.append(seconds)
+                leader.release(db, leader.STARTUP, "other-worker")
+            monkeypatch.setattr(leader.time, "sleep", sleep)
+            with leader.held(db, leader.STARTUP, ttl=30):
+                assert leader.lease_holder(db, leader.STARTUP)["owner"] == leader.process_id()
+            assert waits == [1.0]
+            assert leader.lease_holder(db, leader.STARTUP) is None
+        finally:
+            db.close()
+            self._cleanup(leader.STARTUP)
+
+    def test_one_holder_at_a_time_and_expired_leases_fail_over(self):
+        from ..models.service_lease import ServiceLease
+        from ..services.leader import acquire, lease_holder, release
+        self._cleanup(self.NAME)
+        db = _db()
+        try:
+            assert acquire(db, self.NAME, "api-a")
+            assert not acquire(db, self.NAME, "api-b")
+            acquired_at = lease_holder(db, self.NAME)["acquired_at"]
+            assert acquire(db, self.NAME, "api-a")  # renewal keeps the takeover time
+            db.expire_all()
+            assert lease_holder(db, self.NAME)["acquired_at"] == acquired_at
+
+            # api-a stops renewing: once its lease lapses api-b takes over
+            db.query(ServiceLease).filter(ServiceLease.name == self.NAME).update(
+                {ServiceLease.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+            db.commit()
+            assert lease_holder(db, self.NAME) is None
+            assert acquire(db, self.NAME, "api-b")
+            assert not acquire(db, self.NAME, "api-a")
+            assert not release(db, self.NAME, "api-a")
+            assert release(db, self.NAME, "api-b")
+            assert lease_holder(db, self.NAME) is None
+        finally:
+            db.close()
+            self._cleanup(self.NAME)
+
+    async def test_leader_runs_services_and_releases_on_shutdown(self, monkeypatch):
+        import asyncio
+        from ..config import settings
+        from ..main import _leader_task
+        from ..services import leader
+        monkeypatch.setattr(settings, "LEADER_RENEW_SECONDS", 0.01)
+
+        class FakeServices:
+            running = False
+            starts = 0
+
+            def start(self):
+                self.running = True
+                self.starts += 1
+
+            async def stop(self):
+                self.running = False
+
+        self._cleanup(leader.BACKGROUND)
+        services = FakeServices()
+        task = asyncio.create_task(_leader_task(services))
+        try:
+            for _ in range(100):
+                if services.running:
+                    break
+                await asyncio.sleep(0.01)
+            assert services.running
+            db = _db()
+            try:
+                assert leader.lease_holder(db)["owner"] == leader.process_id()
+                # A second worker stays on standby while the lease is held
+                assert not leader.acquire(db, leader.BACKGROUND, "other-worker")
+            finally:
+                db.close()
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            assert not services.running and services.starts == 1
+            db = _db()
+            try:
+                assert leader.lease_holder(db) is None
+            finally:
+                db.close()
+        finally:
+            self._cleanup(leader.BACKGROUND)
+
+
+    async def test_leader_stops_services_when_renewal_hangs(self, monkeypatch):
+        import asyncio
+        import threading
+        from ..config import settings
+        from ..main import _leader_task
+        from ..services import leader
+        monkeypatch.setattr(settings, "LEADER_LEASE_SECONDS", 0.4)
+        monkeypatch.setattr(settings, "LEADER_RENEW_SECONDS", 0.05)
+
+        unblock = threading.Event()
+        calls = []
+        real_acquire = leader.acquire
+
+        def acquire(db, name, owner, ttl=None):
+            calls.append(owner)
+            if len(calls) > 1:
+                unblock.wait(5)  # the database stops answering
+            return real_acquire(db, name, owner, ttl)
+
+        class FakeServices:
+            running = False
+
+            def start(self):
+                self.running = True
+
+            async def stop(self):
+                self.running = False
+
+        monkeypatch.setattr(leader, "acquire", acquire)
+        self._cleanup(leader.BACKGROUND)
+        services = FakeServices()
+        task = asyncio.create_task(_leader_task(services))
+        try:
+            for _ in range(100):
+                if services.running:
+                    break
+                await asyncio.sleep(0.01)
+            assert services.running
+            # Stopped within the lease TTL although the renewal never returned
+            await asyncio.sleep(0.45)
+            assert not services.running and len(calls) >= 2
+        finally:
+            unblock.set()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup(leader.BACKGROUND)
+
+# ---------------------------------------------------------------------------
+# On-demand scrape jobs
+# ---------------------------------------------------------------------------
+
+class TestScrapeJobs:
+
+    def _cleanup(self, ids):
+        from ..models.scrape_job import ScrapeJob
+        db = _db()
+        try:
+            db.query(ScrapeJob).filter(ScrapeJob.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _dates(self, *offsets):
+        today = datetime.now().date()
+        return [(today + timedelta(days=offset)).isoformat() for offset in offsets]
+
+    def test_jobs_are_queued_deduplicated_and_cancelled(self):
+        url = "/api/available-slots/scrape-jobs"
+        body = {"products": ["gorilla"], "dates": self._dates(300, 301, 305)}
+        assert client.post(url, headers=_auth(_login(*USER)), json=body).status_code == 403
+
+        headers = _auth(_login(*ADMIN))
+        r = client.post(url, headers=headers, json=body)
+        assert r.status_code == 202, r.text
+        job = r.json()
+        try:
+            assert job["status"] == "queued" and job["total_checks"] == 3 and not job["deduplicated"]
+
+            # Covered by the active job: no second job
+            r = client.post(url, headers=headers, json={"products": ["gorilla"], "dates": self._dates(305)})
+            assert r.status_code == 200 and r.json()["id"] == job["id"] and r.json()["deduplicated"]
+
+            assert client.post(url, headers=headers, json={"products": ["nope"], "dates": self._dates(1)}).status_code == 400
+            assert client.post(url, headers=headers, json={"dates": self._dates(-1)}).status_code == 400
+            r = client.post(url, headers=headers, json={"start_date": self._dates(10)[0], "end_date": self._dates(5)[0]})
+            assert r.status_code == 400
+
+            r = client.post(f"{url}/{job['id']}/cancel", headers=headers)
+            assert r.status_code == 200 and r.json()["status"] == "cancelled"
+            assert client.post(f"{url}/{job['id']}/cancel", headers=headers).status_code == 400
+            # Finished jobs stream one event and end
+            r = client.get(f"{url}/{job['id']}/events", headers={**headers, "Accept-Encoding": "gzip"})
+            assert r.headers["content-type"].startswith("text/event-stream")
+            assert "content-encoding" not in r.headers  # compression would hold events back
+            assert r.text.count("data: ") == 1 and '"cancelled"' in r.text
+            assert any(j["id"] == job["id"] for j in client.get(url, headers=headers).json()["jobs"])
+        finally:
+            self._cleanup([job["id"]])
+
+    async def test_worker_runs_job_skipping_dates_the_sweep_refreshed(self, monkeypatch):
+        import asyncio
+        from ..config import settings
+        from ..models.scrape_job import ScrapeJob
+        from ..services import scrape_jobs
+        from ..services.product_catalogue import get_target, save_availability
+        from scrape_worker import run_job
+        monkeypatch.setattr(settings, "SCRAPE_JOB_POLL_SECONDS", 0.05)
+
+        db = _db()
+        try:
+            job, created = scrape_jobs.submit_job(db, ["gorilla"], dates=[
+                datetime.strptime(d, "%Y-%m-%d").date() for d in self._dates(400, 401, 402)
+            ])
+            assert created
+            # The background sweep refreshes one of the dates after submission
+            refreshed = (datetime.now().date() + timedelta(days=401)).strftime("%d/%m/%Y")
+            save_availability(db, get_target(db, "gorilla"), refreshed, "7")
+            db.commit()
+            slow_job, _ = scrape_jobs.submit_job(db, ["golden_monkey"], dates=[
+                datetime.strptime(self._dates(410)[0], "%Y-%m-%d").date()
+            ])
+            ids = [job.id, slow_job.id]
+        finally:
+            db.close()
+
+        scraped = []
+
+        async def scrape(products, dates, on_checked):
+            scraped.extend(dates)
+            for _ in dates:
+                on_checked()
+            return {"gorilla": [(d, "5") for d in dates]}
+
+        async def stuck(products, dates, on_checked):
+            await asyncio.sleep(30)
+
+        try:
+            db = _db()
+            try:
+                assert scrape_jobs.jobs_pending(db)
+                assert scrape_jobs.claim_next_job(db, "worker-a") == job.id
+                assert scrape_jobs.claim_next_job(db, "worker-a") == slow_job.id
+                assert scrape_jobs.claim_next_job(db, "worker-b") is None
+            finally:
+                db.close()
+
+            assert await run_job(job.id, "worker-a", scrape=scrape) == scrape_jobs.COMPLETED
+            assert refreshed not in scraped and len(scraped) == 2
+
+            running = asyncio.create_task(run_job(slow_job.id, "worker-a", scrape=stuck))
+            await asyncio.sleep(0.1)
+            db = _db()
+            try:
+                scrape_jobs.cancel_job(db, db.query(ScrapeJob).get(slow_job.id))
+            finally:
+                db.close()
+            assert await asyncio.wait_for(running, 5) == scrape_jobs.CANCELLED
+
+            db = _db()
+            try:
+                done = scrape_jobs.job_dict(db.query(ScrapeJob).get(job.id))
+                assert done["done_checks"] == 2 and done["skipped_checks"] == 1 and done["resolved_checks"] == 2
+                assert done["progress"] == 1.0 and done["finished_at"]
+                assert not scrape_jobs.jobs_pending(db)
+            finally:
+                db.close()
+        finally:
+            self._cleanup(ids)
+
+    def test_cancelled_job_of_a_dead_worker_is_closed(self):
+        from ..models.scrape_job import ScrapeJob
+        from ..services import scrape_jobs
+        db = _db()
+        try:
+            job, _ = scrape_jobs.submit_job(db, ["gorilla"], dates=[datetime.now().date() + timedelta(days=420)])
+            try:
+                assert scrape_jobs.claim_next_job(db, "worker-a") == job.id
+                scrape_jobs.cancel_job(db, job)
+                # worker-a dies before it sees the cancel
+                db.query(ScrapeJob).filter(ScrapeJob.id == job.id).update(
+                    {ScrapeJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)})
+                db.commit()
+                assert scrape_jobs.claim_next_job(db, "worker-b") is None
+                db.refresh(job)
+                assert job.status == scrape_jobs.CANCELLED and job.lease_owner is None and job.finished_at
+            finally:
+                self._cleanup([job.id])
+        finally:
+            db.close()
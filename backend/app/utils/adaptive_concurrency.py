@@ -0,0 +1,266 @@
+"""
+Adaptive concurrency and pacing for requests to the permit site.
+
+Every scraper engine used to pick its own fixed tab/worker count and sleep
+lengths. They now share one ``AdaptiveController`` per target site, which
+works like TCP congestion control (AIMD):
+
+  - each healthy response (fast enough, with a value) counts towards the
+    current window; once ``limit`` of them have arrived, the limit grows by
+    ``increase_step`` and the pacing delay shrinks a little
+  - a timeout, a 5xx, or a response with no slot value cuts the limit by
+    ``decrease_factor`` and doubles the pacing delay, at most once per
+    ``cooldown`` seconds so a burst of failures from one slowdown only
+    counts once
+  - smoothed latency well above the best recent latency also cuts the
+    limit, but more gently, before the site starts failing outright
+
+Engines wrap each date check in ``async with controller.slot():``, report
+how it went with ``controller.record(...)`` (or navigate with
+``controller.goto(...)``), and use ``controller.delay()``, ``controller.pace()``
+and ``controller.scale()`` in place of fixed sleeps. Waiting on a slot polls instead of using an asyncio primitive,
+because the scrapers run in their own event loops on worker threads and one
+controller is shared across them.
+
+Each scrape worker process has its own controller. The knobs are kept in
+the database and every worker syncs with it (app/services/scraper_control.py).
+``set_budget`` caps each worker's limit at its share of ``max_limit``, so N
+workers together stay within the site-wide limit instead of running N of
+them.
+
+Usage:
+    from app.utils.adaptive_concurrency import permit_site_controller as controller
+    async with controller.slot():
+        start = time.monotonic()
+        ...
+        controller.record("ok", time.monotonic() - start)
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from ..config import settings
+
+OUTCOMES = ("ok", "empty", "timeout", "error")
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Map a scraper exception to a controller outcome."""
+    if isinstance(exc, asyncio.TimeoutError) or "Timeout" in type(exc).__name__:
+        return "timeout"
+    return "error"
+
+
+class AdaptiveController:
+
+    TUNABLE = (
+        "min_limit", "max_limit", "increase_step", "decrease_factor", "cooldown",
+        "min_delay", "max_delay", "latency_tolerance",
+    )
+
+    def __init__(self, name: str, initial_limit: float, min_limit: int, max_limit: int,
+                 initial_delay: float, min_delay: float, max_delay: float,
+                 increase_step: float = 1.0, decrease_factor: float = 0.5,
+                 cooldown: float = 5.0, latency_tolerance: float = 2.5):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency_tolerance = latency_tolerance
+        self.initial_delay = initial_delay
+
+        self._lock = threading.Lock()
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._delay = max(min_delay, min(initial_delay, max_delay))
+        self._in_flight = 0
+        self._window_ok = 0
+        self._last_cut = 0.0
+        self._latencies = deque(maxlen=200)
+        self._ewma_latency: Optional[float] = None
+        self._outcomes = Counter()
+        self._increases = 0
+        self._decreases = 0
+        self._peak_in_flight = 0
+        self._budget: Optional[int] = None
+
+    # -- state -----------------------------------------------------------------
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def cap(self) -> int:
+        """Highest limit this controller may reach: max_limit, or its budget share if lower."""
+        if self._budget is None:
+            return self.max_limit
+        return max(self.min_limit, min(self.max_limit, self._budget))
+
+    def set_budget(self, budget: Optional[int]):
+        """Cap the limit at ``budget`` (this process's share of the site-wide max_limit)."""
+        with self._lock:
+            self._budget = budget
+            self._limit = min(self._limit, float(self.cap))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def delay(self, low: float = 0.5, high: float = 1.5) -> float:
+        """Jittered pause between steps: the current delay scaled by uniform(low, high)."""
+        return self._delay * random.uniform(low, high)
+
+    async def pace(self, low: float = 0.5, high: float = 1.5):
+        await asyncio.sleep(self.delay(low, high))
+
+    def scale(self) -> float:
+        """Current delay relative to the starting delay; multiply legacy fixed sleeps by this."""
+        return self._delay / self.initial_delay if self.initial_delay else 1.0
+
+    def batch_gap(self, base: float) -> float:
+        return base * self.scale()
+
+    # -- slots -----------------------------------------------------------------
+
+    def _try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+                return True
+            return False
+
+    def _release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self, poll: float = 0.05):
+        """Wait until fewer than ``limit`` requests are in flight, then hold one slot."""
+        while not self._try_acquire():
+            await asyncio.sleep(poll)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # -- feedback --------------------------------------------------------------
+
+    def record(self, outcome: str, latency: Optional[float] = None):
+        """Report one request: outcome is one of OUTCOMES, latency in seconds."""
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome {outcome!r}")
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes[outcome] += 1
+            if latency is not None:
+                self._latencies.append(latency)
+                self._ewma_latency = latency if self._ewma_latency is None else 0.8 * self._ewma_latency + 0.2 * latency
+
+            if outcome != "ok":
+                self._cut(now, self.decrease_factor, delay_factor=2.0)
+                return
+
+            best = min(self._latencies) if self._latencies else None
+            if best and self._ewma_latency and self._ewma_latency > best * self.latency_tolerance:
+                # Slower than usual but still answering: back off gently
+                self._cut(now, (1 + self.decrease_factor) / 2, delay_factor=1.25)
+                return
+
+            self._window_ok += 1
+            if self._window_ok >= self.limit:
+                self._window_ok = 0
+                if self._limit < self.cap:
+                    self._limit = min(self.cap, self._limit + self.increase_step)
+                    self._increases += 1
+                self._delay = max(self.min_delay, self._delay * 0.9)
+
+    def _cut(self, now: float, factor: float, delay_factor: float):
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        self._window_ok = 0
+        self._limit = max(self.min_limit, self._limit * factor)
+        self._delay = min(self.max_delay, max(self._delay, self.min_delay) * delay_factor)
+        self._decreases += 1
+
+    async def goto(self, page, url: str, **kwargs):
+        """Playwright ``page.goto`` that reports its latency, 5xx status or timeout.
+
+        Only navigation is timed, not the scrapers' own pauses, so the
+        latency signal doesn't grow with the delay it controls.
+        """
+        started = time.monotonic()
+        try:
+            response = await page.goto(url, **kwargs)
+        except Exception as e:
+            self.record(classify_exception(e))
+            raise
+        status = response.status if response is not None else 200
+        self.record("error" if status >= 500 else "ok", time.monotonic() - started)
+        return response
+
+    # -- knobs and metrics -----------------------------------------------------
+
+    def configure(self, **values) -> dict:
+        """Update tunables live; ``limit`` and ``delay`` set the current state directly."""
+        values = {key: value for key, value in values.items() if value is not None}
+        unknown = set(values) - set(self.TUNABLE) - {"limit", "delay"}
+        if unknown:
+            raise KeyError(", ".join(sorted(unknown)))
+        with self._lock:
+            knobs = {key: type(getattr(self, key))(values.get(key, getattr(self, key))) for key in self.TUNABLE}
+            if knobs["min_limit"] < 1 or knobs["max_limit"] < knobs["min_limit"]:
+                raise ValueError("Require 1 <= min_limit <= max_limit")
+            if not 0 < knobs["decrease_factor"] < 1:
+                raise ValueError("decrease_factor must be between 0 and 1")
+            if knobs["min_delay"] < 0 or knobs["max_delay"] < knobs["min_delay"]:
+                raise ValueError("Require 0 <= min_delay <= max_delay")
+            for key, value in knobs.items():
+                setattr(self, key, value)
+            limit = float(values.get("limit", self._limit))
+            delay = float(values.get("delay", self._delay))
+            self._limit = float(max(self.min_limit, min(limit, self.cap)))
+            self._delay = max(self.min_delay, min(delay, self.max_delay))
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            p95 = latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)] if latencies else None
+            total = sum(self._outcomes.values())
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "budget": self._budget,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "delay_s": round(self._delay, 3),
+                "latency_ewma_s": round(self._ewma_latency, 3) if self._ewma_latency is not None else None,
+                "latency_p95_s": round(p95, 3) if p95 is not None else None,
+                "outcomes": dict(self._outcomes),
+                "error_rate": round((total - self._outcomes["ok"]) / total, 3) if total else 0.0,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "knobs": {key: getattr(self, key) for key in self.TUNABLE},
+            }
+
+
+permit_site_controller = AdaptiveController(
+    "permit_site",
+    initial_limit=settings.SCRAPER_INITIAL_CONCURRENCY,
+    min_limit=settings.SCRAPER_MIN_CONCURRENCY,
+    max_limit=settings.SCRAPER_MAX_CONCURRENCY,
+    initial_delay=settings.SCRAPER_INITIAL_DELAY,
+    min_delay=settings.SCRAPER_MIN_DELAY,
+    max_delay=settings.SCRAPER_MAX_DELAY,
+)
@@ -0,0 +1,63 @@
+"""
+Keeps response compression (Brotli/GZip, set up in main.py) off the
+responses it would break.
+
+Range responses (utils/file_responses.py) describe raw bytes. Their
+Content-Range, Content-Length and strong ETag would all be wrong for an
+encoded body, and PDFs and JPEGs barely compress anyway. Server-sent
+event streams (scrape job progress) are exempt too: the compressor buffers
+them, so the events would only arrive once the stream ended.
+
+Both Starlette's GZipMiddleware and brotli-asgi leave a response alone once
+it has a Content-Encoding. ``MarkUncompressed`` runs inside the compressor
+and tags exempt responses with "Content-Encoding: identity".
+``StripIdentityEncoding`` runs outside it and removes that tag before the
+response reaches the client.
+"""
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def is_exempt(headers: MutableHeaders) -> bool:
+    """True for responses that must go out byte-for-byte."""
+    if headers.get("content-type", "").startswith("text/event-stream"):
+        return True
+    return "content-range" in headers or headers.get("accept-ranges", "").lower() == "bytes"
+
+
+class MarkUncompressed:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marked(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "content-encoding" not in headers and is_exempt(headers):
+                    headers["Content-Encoding"] = "identity"
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
+
+
+class StripIdentityEncoding:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_stripped(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if headers.get("content-encoding") == "identity":
+                    del headers["content-encoding"]
+            await send(message)
+
+        await self.app(scope, receive, send_stripped)
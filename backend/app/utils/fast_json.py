@@ -0,0 +1,49 @@
+"""
+Fast JSON responses for the large list endpoints (bookings, AR/AP, slots).
+
+FastAPI passes every dict a route returns through ``jsonable_encoder`` before
+serialising it, which walks the whole payload a second time. Routes that build
+thousands of rows return a ``FastJSONResponse`` instead: the rows are already
+plain dicts, so they go straight to orjson and the encoder walk is skipped.
+
+orjson handles date/datetime/Enum natively; Decimal (Numeric columns) is
+converted in ``_default``. Falls back to the stdlib json module when orjson is
+not installed, producing the same output.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+def _default(obj: Any):
+    """Serialise the types orjson (or json) doesn't know about."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode pre-shaped rows to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that bypasses jsonable_encoder and encodes with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,121 @@
+"""
+File responses with HTTP range and conditional-request support.
+
+Starlette's FileResponse (as pinned here) always sends the whole file.
+``ranged_file_response`` adds these on top:
+  - strong ETags supplied by the caller (e.g. the content hash)
+  - If-None-Match -> 304 Not Modified
+  - single-range ``Range: bytes=...`` requests -> 206 Partial Content
+    (honouring If-Range), and 416 for unsatisfiable ranges
+
+Multi-range requests are answered with the full body, which RFC 9110 allows.
+"""
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive (start, end) of a single byte range.
+
+    Returns None when the header isn't a single range we can serve (the full
+    body is sent instead). Raises ValueError when the range is unsatisfiable.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def ranged_file_response(
+    request: Request,
+    path: str,
+    etag: str,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    disposition: str = "inline",
+    max_age: int = 3600,
+) -> Response:
+    """Serve ``path`` honouring Range / If-Range / If-None-Match.
+
+    ``etag`` must be a quoted strong validator that changes whenever the bytes
+    change, e.g. '"<sha256>"'.
+    """
+    size = os.path.getsize(path)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"private, max-age={max_age}",
+    }
+    if filename:
+        headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(
+                _iter_file(path, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        _iter_file(path, 0, size),
+        media_type=media_type,
+        headers=headers,
+    )
@@ -0,0 +1,247 @@
+"""
+NumPy/OpenCV preprocessing pipeline for passport OCR.
+
+Every step works on whole arrays (no per-pixel Python loops) so a 300 dpi
+passport scan goes from file to OCR-ready images in tens of milliseconds:
+
+  grayscale -> resize -> Otsu threshold -> deskew -> MRZ crop
+
+Steps are timed individually through ``StepTimer`` so slow stages show up
+in the logs next to the OCR engine timings.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAX_SIDE = 2000
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.5
+# Width used for the cheap skew / MRZ searches; results are scaled back up.
+ANALYSIS_WIDTH = 800
+
+
+class StepTimer:
+    """Collects wall-clock durations (in ms) for named pipeline steps."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(self.timings.values()), 1)
+
+    def summary(self) -> str:
+        parts = [f"{name}={ms}" for name, ms in self.timings.items()]
+        return ", ".join(parts) + f" (total {self.total_ms} ms)"
+
+
+@dataclass
+class PreprocessedImage:
+    """OCR-ready variants of a single page."""
+    gray: np.ndarray
+    binary: np.ndarray
+    skew_angle: float = 0.0
+    mrz: Optional[np.ndarray] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def inverted(self) -> np.ndarray:
+        return cv2.bitwise_not(self.binary)
+
+
+def to_gray_array(image: Image.Image) -> np.ndarray:
+    """Convert a PIL image of any mode to a uint8 grayscale array."""
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    array = np.asarray(image)
+    if array.ndim == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+    return np.ascontiguousarray(array, dtype=np.uint8)
+
+
+def resize_max(gray: np.ndarray, max_side: int = MAX_SIDE) -> np.ndarray:
+    """Downscale so the longest side is at most ``max_side`` pixels."""
+    height, width = gray.shape[:2]
+    longest = max(height, width)
+    if longest <= max_side:
+        return gray
+    ratio = max_side / longest
+    size = (int(width * ratio), int(height * ratio))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu's threshold computed from cumulative histogram sums.
+
+    Returns the same value as the classic per-bin loop: the first grey level
+    that maximises the between-class variance.
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+
+    w_back = np.cumsum(hist)
+    sum_back = np.cumsum(hist * levels)
+    total = w_back[-1]
+    sum_all = sum_back[-1]
+    w_fore = total - w_back
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_back = sum_back / w_back
+        mean_fore = (sum_all - sum_back) / w_fore
+        var_between = w_back * w_fore * (mean_back - mean_fore) ** 2
+    var_between[(w_back == 0) | (w_fore == 0)] = 0
+
+    return int(np.argmax(var_between))
+
+
+def binarize(gray: np.ndarray, threshold: Optional[int] = None) -> np.ndarray:
+    """Black text on white: pixels above the threshold become 255."""
+    if threshold is None:
+        threshold = otsu_threshold(gray)
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+
+def _rotate(image: np.ndarray, angle: float, border_value: int = 255) -> np.ndarray:
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(
+        image, matrix, (width, height),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=border_value,
+    )
+
+
+def _scale_to_width(image: np.ndarray, width: int) -> np.ndarray:
+    if image.shape[1] <= width:
+        return image
+    ratio = width / image.shape[1]
+    return cv2.resize(image, (width, int(image.shape[0] * ratio)), interpolation=cv2.INTER_AREA)
+
+
+def estimate_skew(binary: np.ndarray,
+                  max_angle: float = MAX_SKEW_DEGREES,
+                  step: float = SKEW_STEP_DEGREES) -> float:
+    """Estimate page skew (degrees) with a projection-profile search.
+
+    Text lines produce the sharpest row-sum profile when they are horizontal,
+    so each candidate angle is scored by the energy of the profile's first
+    difference on a downscaled copy of the page.
+    """
+    small = _scale_to_width(binary, ANALYSIS_WIDTH)
+    ink = (small < 128).astype(np.uint8)
+    if not ink.any():
+        return 0.0
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = _rotate(ink, float(angle), border_value=0)
+        profile = rotated.sum(axis=1, dtype=np.int64)
+        score = float(np.sum(np.diff(profile) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return round(best_angle, 2)
+
+
+def deskew(gray: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate so detected text lines are horizontal."""
+    if abs(angle) < 0.1:
+        return gray
+    return _rotate(gray, angle)
+
+
+def crop_mrz(gray: np.ndarray, padding: float = 0.03) -> Optional[np.ndarray]:
+    """Locate the machine-readable zone and return it as a crop.
+
+    The MRZ is a wide band of dense dark characters in the lower half of the
+    data page. Black-hat + horizontal gradient + closing merges it into one
+    blob; the widest such blob below the page midline is taken. Returns None
+    when nothing MRZ-shaped is found.
+    """
+    small = _scale_to_width(gray, ANALYSIS_WIDTH)
+    scale = gray.shape[1] / small.shape[1]
+    height, width = small.shape[:2]
+
+    rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+    square_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 21))
+
+    blurred = cv2.GaussianBlur(small, (3, 3), 0)
+    blackhat = cv2.morphologyEx(blurred, cv2.MORPH_BLACKHAT, rect_kernel)
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad_max = grad.max()
+    if grad_max == 0:
+        return None
+    grad = (255 * grad / grad_max).astype(np.uint8)
+
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, rect_kernel)
+    _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, square_kernel)
+    thresh = cv2.erode(thresh, None, iterations=2)
+
+    contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    best = None
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h == 0:
+            continue
+        if w / h > 5 and w / width > 0.6 and y + h / 2 > height / 2:
+            if best is None or w * h > best[2] * best[3]:
+                best = (x, y, w, h)
+    if best is None:
+        return None
+
+    x, y, w, h = best
+    pad_x = int(width * padding)
+    pad_y = int(h * 0.25)
+    x0 = max(0, int((x - pad_x) * scale))
+    y0 = max(0, int((y - pad_y) * scale))
+    x1 = min(gray.shape[1], int((x + w + pad_x) * scale))
+    y1 = min(gray.shape[0], int((y + h + pad_y) * scale))
+    return gray[y0:y1, x0:x1]
+
+
+def preprocess(image: Image.Image, timer: Optional[StepTimer] = None) -> PreprocessedImage:
+    """Run the full pipeline on a PIL image, timing each step."""
+    timer = timer or StepTimer()
+
+    with timer.step('grayscale'):
+        gray = to_gray_array(image)
+    with timer.step('resize'):
+        gray = resize_max(gray)
+    with timer.step('threshold'):
+        binary = binarize(gray)
+    with timer.step('deskew'):
+        angle = estimate_skew(binary)
+        if angle:
+            gray = deskew(gray, angle)
+            binary = binarize(gray)
+    with timer.step('denoise'):
+        binary = cv2.medianBlur(binary, 3)
+    with timer.step('mrz_crop'):
+        mrz = crop_mrz(gray)
+        if mrz is not None:
+            mrz = binarize(mrz)
+
+    return PreprocessedImage(
+        gray=gray,
+        binary=binary,
+        skew_angle=angle,
+        mrz=mrz,
+        timings=timer.timings,
+    )
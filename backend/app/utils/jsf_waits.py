@@ -0,0 +1,133 @@
+"""
+Event-driven waits for the permit site's JSF partial-AJAX form.
+
+Every select/fill on the booking form makes the page POST a partial-ajax
+request (header "Faces-Request: partial/ajax") and swap the returned
+<update> fragments into the DOM. The scrapers used to sleep a fixed
+random_delay after each step and hope that cycle had finished. These helpers
+wait for the cycle itself instead:
+
+  - ``ajax_step`` runs one form action and returns once the partial
+    response it triggered has arrived. If none arrives within
+    SCRAPER_AJAX_TIMEOUT_MS it returns anyway (e.g. re-selecting the value
+    that is already selected may not post at all).
+  - ``date_outcome`` reads the slots field or the "No slots" message that
+    the date's partial response rendered.
+  - ``read_availability`` is the whole lookup built from them. It skips
+    the site and product steps when their value is already on the form, so
+    a tab walking through dates posts only the date change.
+
+JSF replaces the elements it updates, so before the date step
+``mark_outcome_fields`` tags the current slots field and message
+box. An element that still carries the tag is a leftover from the previous
+lookup and is never read as this one's answer. A partial response that
+updates neither element (a dropped update) ends the wait after
+SCRAPER_RENDER_TIMEOUT_MS and reads as None, so the caller retries.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional, Tuple
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from ..config import settings
+
+SITE_SELECT = '//select[@id="form:visitorAndCategoryDetails_site"]'
+PRODUCT_SELECT = '//select[@id="form:visitorAndCategoryDetails_product"]'
+DATE_INPUT = '//input[@id="form:visitorAndCategoryDetails_dateOfVisit"]'
+SLOTS_INPUT = '//input[@id="form:visitorAndCategoryDetails_slots"]'
+NO_SLOTS_MESSAGE = "No slots available on date selected"
+
+_STALE = "data-scrape-stale"
+
+_MARK_JS = """() => {
+    for (const id of ['form:visitorAndCategoryDetails_slots', 'form:messages']) {
+        const el = document.getElementById(id);
+        if (el) el.setAttribute('%s', '1');
+    }
+}""" % _STALE
+
+# Truthy once the current date's answer is on the page: a fresh error message or slots value
+_OUTCOME_JS = """() => {
+    const messages = document.getElementById('form:messages');
+    if (messages && !messages.hasAttribute('%(stale)s')) {
+        const error = messages.querySelector('li.alert-danger');
+        if (error && error.textContent.trim()) return {error: error.textContent.trim()};
+    }
+    const slots = document.getElementById('form:visitorAndCategoryDetails_slots');
+    if (slots && !slots.hasAttribute('%(stale)s') && slots.value) return {slots: slots.value};
+    return null;
+}""" % {"stale": _STALE}
+
+
+def is_partial_response(response) -> bool:
+    request = response.request
+    return request.method == "POST" and request.headers.get("faces-request") == "partial/ajax"
+
+
+async def ajax_step(page, action: Callable[[], Awaitable], timeout: Optional[float] = None):
+    """Run ``action`` and wait for the partial response it triggers.
+
+    Returns the response, or None when none came within the timeout. Errors
+    raised by ``action`` itself propagate.
+    """
+    timeout = settings.SCRAPER_AJAX_TIMEOUT_MS if timeout is None else timeout
+    waiting = asyncio.ensure_future(page.wait_for_response(is_partial_response, timeout=timeout))
+    await asyncio.sleep(0)  # let the listener attach before the action can post
+    try:
+        await action()
+    except BaseException:
+        waiting.cancel()
+        raise
+    try:
+        return await waiting
+    except PlaywrightTimeoutError:
+        return None
+
+
+async def selected_label(page, selector: str) -> Optional[str]:
+    return await page.eval_on_selector(
+        selector, "s => s.selectedIndex >= 0 ? s.options[s.selectedIndex].text.trim() : null"
+    )
+
+
+async def mark_outcome_fields(page):
+    await page.evaluate(_MARK_JS)
+
+
+async def date_outcome(page, date: str, timeout: Optional[float] = None) -> Optional[Tuple[str, str]]:
+    """(date, slots) or (date, "Sold Out") once the page shows it; None if it never does."""
+    timeout = settings.SCRAPER_RENDER_TIMEOUT_MS if timeout is None else timeout
+    try:
+        handle = await page.wait_for_function(_OUTCOME_JS, timeout=timeout)
+    except PlaywrightTimeoutError:
+        return None
+    outcome = await handle.json_value()
+    if "error" in outcome:
+        return (date, "Sold Out") if NO_SLOTS_MESSAGE in outcome["error"] else None
+    return date, outcome["slots"]
+
+
+async def read_availability(page, date: str, site_label: str, product_label: str) -> Optional[Tuple[str, str]]:
+    """Look up one product on one date on a loaded form. Returns (date, slots) or None.
+
+    Page errors other than the waits' own timeouts propagate.
+    """
+    if await selected_label(page, SITE_SELECT) != site_label:
+        await ajax_step(page, lambda: page.select_option(SITE_SELECT, label=site_label))
+    product_changed = await selected_label(page, PRODUCT_SELECT) != product_label
+    if product_changed:
+        await ajax_step(page, lambda: page.select_option(PRODUCT_SELECT, label=product_label))
+    current_date = await page.input_value(DATE_INPUT)
+    if product_changed or current_date != date:
+        await mark_outcome_fields(page)
+
+        async def enter_date():
+            if current_date == date:
+                # Same date, new product: Tab would not fire a change, so post it directly
+                await page.dispatch_event(DATE_INPUT, "change")
+            else:
+                await page.fill(DATE_INPUT, date)
+                await page.press(DATE_INPUT, "Tab")
+
+        await ajax_step(page, enter_date)
+    return await date_outcome(page, date)
@@ -0,0 +1,206 @@
+"""
+Lean page mode for the Playwright scrapers.
+
+A scrape tab only needs the permit form: the page itself, its scripts and
+the JSF partial responses. Left alone, every tab (and every retry, which
+opens a fresh one) would also pull the site's images, fonts, stylesheets
+and third-party scripts. ``install`` routes a browser context through a
+policy with three parts:
+
+  - requests whose resource type is in SCRAPER_BLOCK_RESOURCE_TYPES are
+    aborted, and so is anything from another host when
+    SCRAPER_BLOCK_THIRD_PARTY is set (except SCRAPER_THIRD_PARTY_ALLOW)
+  - static assets that are still needed (SCRAPER_CACHE_RESOURCE_TYPES) are
+    served from an on-disk cache under SCRAPER_ASSET_CACHE_DIR, shared by
+    every tab, worker process and run, for SCRAPER_ASSET_CACHE_SECONDS
+  - the page and its partial-ajax posts go to the site as usual
+
+Each tab's load time, request count, bytes downloaded, bytes served from
+the cache and blocked requests are collected as PageLoad entries. The
+engines store them as scrape telemetry (scrape_page_loads). With
+SCRAPER_LEAN_PAGES off, pages load in full but are still measured, so the
+two modes can be compared against the replay server
+(benchmarks/bench_scrapers.py --full-pages).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "trekdesk_asset_cache")
+
+# Response headers worth replaying from the cache
+_KEPT_HEADERS = ("content-type", "cache-control", "etag", "last-modified")
+
+
+def _setting_list(value: str) -> frozenset:
+    return frozenset(part.strip() for part in value.split(",") if part.strip())
+
+
+@dataclass
+class PageLoad:
+    kind: str  # tab, retry
+    load_ms: Optional[float] = None
+    requests: int = 0
+    blocked: int = 0
+    cache_hits: int = 0
+    network_bytes: int = 0
+    cache_bytes: int = 0
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+
+
+class AssetCache:
+    """URL-keyed files on disk. Writes are atomic, so concurrent tabs and processes can share it."""
+
+    def __init__(self, root: str, max_age: float):
+        self.root = root
+        self.max_age = max_age
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(url.encode()).hexdigest())
+
+    def get(self, url: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        path = self._path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta["status"], meta["headers"], body
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: bytes):
+        kept = {name: value for name, value in headers.items() if name.lower() in _KEPT_HEADERS}
+        fd, staged = tempfile.mkstemp(dir=self.root, prefix=".staging-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps({"url": url, "status": status, "headers": kept}).encode() + b"\n")
+                f.write(body)
+            os.replace(staged, self._path(url))
+        except OSError as e:
+            logger.warning(f"Could not cache {url}: {str(e)}")
+            try:
+                os.remove(staged)
+            except OSError:
+                pass
+
+
+class LeanPages:
+    """The request policy for one browser context, and the page loads it has seen."""
+
+    def __init__(self, site_url: str, cache: Optional[AssetCache] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.site_host = urlsplit(site_url).hostname
+        self.allowed_hosts = _setting_list(settings.SCRAPER_THIRD_PARTY_ALLOW) | {self.site_host}
+        self.block_types = _setting_list(settings.SCRAPER_BLOCK_RESOURCE_TYPES)
+        self.cache_types = _setting_list(settings.SCRAPER_CACHE_RESOURCE_TYPES) - self.block_types
+        self.block_third_party = settings.SCRAPER_BLOCK_THIRD_PARTY
+        self.cache = cache
+        self._pages: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._loads: List[PageLoad] = []
+        self._other = PageLoad("other")  # requests not tied to a tracked page
+
+    def track(self, page, kind: str) -> PageLoad:
+        load = PageLoad(kind)
+        self._pages[page] = load
+        self._loads.append(load)
+        return load
+
+    def loads(self) -> List[PageLoad]:
+        return list(self._loads) + ([self._other] if self._other.requests else [])
+
+    def _load_for(self, request) -> PageLoad:
+        try:
+            return self._pages.get(request.frame.page, self._other)
+        except Exception:  # service worker requests have no frame
+            return self._other
+
+    def _blocked(self, request) -> bool:
+        if request.resource_type in self.block_types:
+            return True
+        return self.block_third_party and urlsplit(request.url).hostname not in self.allowed_hosts
+
+    def on_request(self, request):
+        self._load_for(request).requests += 1
+
+    async def handle(self, route, request):
+        load = self._load_for(request)
+        if self._blocked(request):
+            load.blocked += 1
+            await route.abort("blockedbyclient")
+            return
+        if self.cache is None or request.method != "GET" or request.resource_type not in self.cache_types:
+            await route.continue_()
+            return
+
+        hit = await asyncio.to_thread(self.cache.get, request.url)
+        if hit is not None:
+            status, headers, body = hit
+            load.cache_hits += 1
+            load.cache_bytes += len(body)
+            await route.fulfill(status=status, headers=headers, body=body)
+            return
+        response = await route.fetch()
+        body = await response.body()
+        load.network_bytes += len(body)
+        if response.status == 200 and "no-store" not in response.headers.get("cache-control", ""):
+            await asyncio.to_thread(self.cache.put, request.url, response.status, response.headers, body)
+        await route.fulfill(response=response, body=body)
+
+    async def on_request_finished(self, request):
+        # Assets that went through the cache path of handle() were counted there
+        if self.enabled and self.cache is not None and request.method == "GET" \
+                and request.resource_type in self.cache_types:
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self._load_for(request).network_bytes += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+
+
+_contexts: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+async def install(context, site_url: Optional[str] = None) -> LeanPages:
+    """Measure ``context``'s page loads and, with SCRAPER_LEAN_PAGES on, route it through the policy."""
+    cache = None
+    if settings.SCRAPER_LEAN_PAGES and settings.SCRAPER_ASSET_CACHE_SECONDS > 0:
+        cache = AssetCache(settings.SCRAPER_ASSET_CACHE_DIR or DEFAULT_CACHE_DIR, settings.SCRAPER_ASSET_CACHE_SECONDS)
+    lean = LeanPages(site_url or settings.PERMIT_SITE_URL, cache, enabled=settings.SCRAPER_LEAN_PAGES)
+    if lean.enabled:
+        await context.route("**/*", lean.handle)
+    context.on("request", lean.on_request)
+    context.on("requestfinished", lean.on_request_finished)
+    _contexts[context] = lean
+    return lean
+
+
+def track(page, kind: str) -> PageLoad:
+    """Start collecting ``page``'s load stats (a detached PageLoad when its context has no install())."""
+    lean = _contexts.get(page.context)
+    return lean.track(page, kind) if lean else PageLoad(kind)
+
+
+def summary(loads: List[PageLoad]) -> str:
+    timed = [load.load_ms for load in loads if load.load_ms is not None]
+    avg = sum(timed) / len(timed) if timed else 0.0
+    return (f"{len(timed)} page loads, avg {avg:.0f} ms, "
+            f"{sum(load.network_bytes for load in loads) / 1024:.0f} KB downloaded, "
+            f"{sum(load.cache_bytes for load in loads) / 1024:.0f} KB from cache, "
+            f"{sum(load.blocked for load in loads)} requests blocked")
@@ -0,0 +1,410 @@
+"""
+Prometheus-style metrics for the API, the scheduler jobs, scraping and OCR.
+
+A small in-process registry (counters, gauges, histograms with labels) that
+renders the Prometheus text exposition format at ``GET /metrics``, so no
+client library is needed. It is switched on with METRICS_ENABLED. When it is
+off, nothing is installed: no middleware, no SQLAlchemy event listeners.
+The job and extraction hooks then cost one boolean check per call.
+
+Instrumentation points:
+  - ``MetricsMiddleware``: request latency per route template, plus DB query
+    count and time per request (via ``instrument_engine``)
+  - ``instrument_job``: scheduler job duration and last-success timestamp
+  - ``track_extraction`` / ``observe_ocr_steps``: passport and voucher
+    extraction latency, OCR pipeline step timings
+  - ``on_collect``: callbacks run at scrape time (routes/metrics.py uses one
+    to compute scrape throughput and staleness gauges from the database)
+
+The registry lives in one process and is not aggregated across processes.
+Every sample carries a ``process`` label (hostname:pid). Under several API
+processes, scrape each one as its own target, e.g. one uvicorn per port or
+container rather than ``uvicorn --workers N``, where each scrape would hit
+whichever worker accepts it. Then sum across ``process`` in queries; use
+max for the database-derived scrape gauges, which every process reports
+identically.
+
+Usage:
+    from app.utils import metrics
+    with metrics.timer(metrics.extraction_seconds, kind="passport"):
+        ...
+"""
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+enabled = settings.METRICS_ENABLED
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self) -> List[Tuple[str, tuple, float]]:
+        raise NotImplementedError
+
+    def render(self, const_pairs: Tuple[Tuple[str, str], ...] = ()) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, pairs, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(pairs + const_pairs)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("_total", tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> Optional[float]:
+        return self._values.get(self._key(labels))
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            pairs = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", pairs + (("le", _format_value(bound)),), cumulative))
+            samples.append(("_bucket", pairs + (("le", "+Inf"),), count))
+            samples.append(("_sum", pairs, total))
+            samples.append(("_count", pairs, count))
+        return samples
+
+
+class Registry:
+
+    def __init__(self, const_labels: Optional[Dict[str, str]] = None):
+        """``const_labels`` are added to every sample this registry renders."""
+        self.const_pairs = tuple((name, str(value)) for name, value in (const_labels or {}).items())
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric):
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Duplicate metric {metric.name}")
+        if set(metric.labelnames) & {name for name, _ in self.const_pairs}:
+            raise ValueError(f"{metric.name} reuses a label the registry adds to every sample")
+        self._metrics.append(metric)
+
+    def on_collect(self, fn: Callable[[], None]):
+        """Run ``fn`` before every render (for gauges computed on demand)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                collect_errors.inc(collector=getattr(collect, "__name__", "collector"))
+                logger.error(f"Metrics collector failed: {str(e)}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(self.const_pairs))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry({"process": f"{socket.gethostname()}:{os.getpid()}"})
+on_collect = REGISTRY.on_collect
+
+collect_errors = Counter(
+    "trekdesk_metrics_collect_errors", "Collector callbacks that raised while rendering /metrics", ("collector",),
+)
+
+# -- HTTP / DB -----------------------------------------------------------------
+
+http_request_seconds = Histogram(
+    "trekdesk_http_request_duration_seconds", "API request latency by route template",
+    ("method", "route", "status"),
+)
+http_in_flight = Gauge("trekdesk_http_requests_in_flight", "Requests currently being handled")
+db_queries_per_request = Histogram(
+    "trekdesk_db_queries_per_request", "SQL statements executed per API request", ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+db_seconds_per_request = Histogram(
+    "trekdesk_db_seconds_per_request", "Time spent in SQL statements per API request", ("route",),
+)
+db_queries = Counter("trekdesk_db_queries", "SQL statements executed by this process")
+db_query_seconds = Histogram(
+    "trekdesk_db_query_duration_seconds", "Latency of individual SQL statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+# -- scheduler -----------------------------------------------------------------
+
+job_seconds = Histogram(
+    "trekdesk_scheduler_job_duration_seconds", "Scheduler job run time", ("job",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0),
+)
+job_runs = Counter("trekdesk_scheduler_job_runs", "Scheduler job runs by outcome", ("job", "outcome"))
+job_last_success = Gauge(
+    "trekdesk_scheduler_job_last_success_timestamp_seconds", "Unix time the job last completed", ("job",),
+)
+background_leader = Gauge(
+    "trekdesk_background_leader", "1 while this process runs the scheduler and in-process scrape worker",
+)
+
+# -- scraping (set by the collector in routes/metrics.py) ----------------------
+
+scrape_dates_stored = Gauge("trekdesk_scrape_dates_stored", "Dates with stored availability", ("product",))
+scrape_oldest_age = Gauge(
+    "trekdesk_scrape_oldest_update_age_seconds", "Age of the least recently refreshed stored date", ("product",),
+)
+scrape_newest_age = Gauge(
+    "trekdesk_scrape_newest_update_age_seconds", "Age of the most recently refreshed stored date", ("product",),
+)
+scrape_retry_pending = Gauge("trekdesk_scrape_retry_queue_size", "Dates waiting in the scrape retry queue", ("product",))
+scrape_checks_last_hour = Gauge(
+    "trekdesk_scrape_checks_last_hour", "Date checks recorded in the last hour by outcome", ("product", "outcome"),
+)
+scrape_latency_last_hour = Gauge(
+    "trekdesk_scrape_check_latency_avg_seconds", "Average date-check latency over the last hour", ("product",),
+)
+
+# -- OCR / extraction ----------------------------------------------------------
+
+extraction_seconds = Histogram(
+    "trekdesk_extraction_duration_seconds", "Passport / voucher extraction latency", ("kind", "outcome"),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+ocr_step_seconds = Histogram(
+    "trekdesk_ocr_step_duration_seconds", "OCR pipeline step latency", ("step",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+# -- hooks ---------------------------------------------------------------------
+
+@contextmanager
+def timer(histogram: Histogram, **labels):
+    """Observe the block's duration in ``histogram`` (no-op when metrics are off)."""
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def instrument_job(job_id: str, fn: Callable) -> Callable:
+    """Wrap a scheduler job to record its duration, outcome and last success."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            job_runs.inc(job=job_id, outcome="error")
+            raise
+        finally:
+            job_seconds.observe(time.perf_counter() - start, job=job_id)
+        job_runs.inc(job=job_id, outcome="ok")
+        job_last_success.set(time.time(), job=job_id)
+        return result
+    return wrapper
+
+
+def track_extraction(kind: str):
+    """Decorator for async extractors: latency by kind and outcome (ok / error)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not enabled:
+                return await fn(*args, **kwargs)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                extraction_seconds.observe(time.perf_counter() - start, kind=kind, outcome=outcome)
+        return wrapper
+    return decorate
+
+
+def observe_ocr_steps(timings_ms: Dict[str, float]):
+    """Record a StepTimer's per-step timings (milliseconds)."""
+    if not enabled:
+        return
+    for step, ms in timings_ms.items():
+        ocr_step_seconds.observe(ms / 1000.0, step=step)
+
+
+# -- per-request DB accounting -------------------------------------------------
+
+_request_db: ContextVar[Optional[list]] = ContextVar("metrics_request_db", default=None)
+
+
+def instrument_engine(engine):
+    """Count and time SQL statements; per-request totals go to the request in progress."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        db_queries.inc()
+        db_query_seconds.observe(elapsed)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware: latency per route template and DB work per request.
+
+    The route template comes from FastAPI's matched route, so
+    /api/bookings/17 and /api/bookings/18 share one series. Requests that
+    match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _request_db.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_seconds.observe(elapsed, method=scope["method"], route=route, status=status["code"])
+            db_queries_per_request.observe(stats[0], route=route)
+            db_seconds_per_request.observe(stats[1], route=route)
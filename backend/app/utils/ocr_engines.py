@@ -0,0 +1,143 @@
+"""
+Process-wide registry of OCR engines.
+
+EasyOCR loads its detection and recognition weights (hundreds of MB) when a
+Reader is built, and pytesseract shells out to ``tesseract --version`` for
+every availability probe. Both are expensive and neither changes while the
+process is running, so the registry creates them once, lazily on first use
+or eagerly through ``warm_up()``, and every OCRProcessor shares them.
+
+Usage:
+    from app.utils.ocr_engines import ocr_engines
+    ocr_engines.readtext(array)
+    ocr_engines.tesseract_available()
+    ocr_engines.memory_report()
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB, or None if it can't be read"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 1048576, 1)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1048576, 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class OCREngineRegistry:
+    """Lazily-built, thread-safe holder for the OCR engines of one process."""
+
+    def __init__(self, languages=('en',)):
+        self.languages = list(languages)
+        self._load_lock = threading.Lock()
+        # EasyOCR inference is not guaranteed to be re-entrant, and parallel
+        # calls on a CPU box just fight over the same cores, so calls from a
+        # thread pool are serialised on the shared reader.
+        self._inference_lock = threading.Lock()
+        self._reader = None
+        self._tesseract_checked = False
+        self._tesseract_version = None
+        self.stats = {
+            'easyocr_load_ms': None,
+            'easyocr_rss_delta_mb': None,
+            'easyocr_calls': 0,
+            'tesseract_probes': 0,
+        }
+
+    @property
+    def easyocr_loaded(self) -> bool:
+        return self._reader is not None
+
+    def easyocr_reader(self):
+        """Return the shared EasyOCR reader, loading the models on first call"""
+        if self._reader is not None:
+            return self._reader
+        with self._load_lock:
+            if self._reader is None:
+                import easyocr
+
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                reader = easyocr.Reader(self.languages, gpu=False, verbose=False)
+                self.stats['easyocr_load_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                rss_after = current_rss_mb()
+                if rss_before is not None and rss_after is not None:
+                    self.stats['easyocr_rss_delta_mb'] = round(rss_after - rss_before, 1)
+                logger.info(
+                    f"EasyOCR models loaded in {self.stats['easyocr_load_ms']} ms "
+                    f"(+{self.stats['easyocr_rss_delta_mb']} MB RSS)"
+                )
+                self._reader = reader
+        return self._reader
+
+    def readtext(self, image, **kwargs):
+        """Run EasyOCR on the shared reader"""
+        reader = self.easyocr_reader()
+        with self._inference_lock:
+            self.stats['easyocr_calls'] += 1
+            return reader.readtext(image, **kwargs)
+
+    def tesseract_version(self, refresh: bool = False) -> Optional[str]:
+        """Tesseract version string, probed once per process; None if unavailable"""
+        if self._tesseract_checked and not refresh:
+            return self._tesseract_version
+        with self._load_lock:
+            if not self._tesseract_checked or refresh:
+                import pytesseract
+
+                self.stats['tesseract_probes'] += 1
+                try:
+                    self._tesseract_version = str(pytesseract.get_tesseract_version())
+                    logger.info(f"Tesseract version: {self._tesseract_version}")
+                except Exception as e:
+                    self._tesseract_version = None
+                    logger.error(f"Tesseract not properly configured: {str(e)}")
+                self._tesseract_checked = True
+        return self._tesseract_version
+
+    def tesseract_available(self, refresh: bool = False) -> bool:
+        return self.tesseract_version(refresh) is not None
+
+    def warm_up(self, easyocr: bool = True):
+        """Probe Tesseract and load EasyOCR ahead of the first request.
+
+        A tiny inference pass is run so lazy framework initialisation also
+        happens here rather than inside a user's upload.
+        """
+        start = time.perf_counter()
+        self.tesseract_version()
+        if easyocr:
+            try:
+                self.readtext(np.full((32, 128), 255, dtype=np.uint8))
+            except Exception as e:
+                logger.warning(f"EasyOCR warm-up failed: {str(e)}")
+        logger.info(
+            f"OCR warm-up finished in {round((time.perf_counter() - start) * 1000, 1)} ms; "
+            f"{self.memory_report()}"
+        )
+
+    def memory_report(self) -> dict:
+        return {
+            'rss_mb': current_rss_mb(),
+            'easyocr_loaded': self.easyocr_loaded,
+            'tesseract_version': self._tesseract_version,
+            **self.stats,
+        }
+
+
+ocr_engines = OCREngineRegistry()
@@ -1,14 +1,15 @@
 import pytesseract
 from pdf2image import convert_from_path
-from PIL import Image, ImageEnhance, ImageFilter
-import easyocr
+from PIL import Image
 import re
 from datetime import datetime, date
 from dateutil import parser
 import os
 import logging
 import sys
-import io
+from .image_preprocessing import StepTimer, preprocess
+from .metrics import observe_ocr_steps
+from .ocr_engines import ocr_engines
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,188 +21,175 @@ if sys.platform.startswith('win'):
 else:
     POPPLER_PATH = None  # Linux/Mac usually have poppler in PATH
 
+TESSERACT_WHITELIST = '-c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<>/ "'
+# A passport MRZ line is 44 characters of A-Z, 0-9 and '<' filler
+MRZ_LINE_PATTERN = re.compile(r'[A-Z0-9<]{40,44}')
+
 class OCRProcessor:
     SUPPORTED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']
+    # Mean word confidence (0-100) at which a strategy's text is accepted
+    CONFIDENCE_THRESHOLD = 75
     
     def __init__(self):
-        self.reader = easyocr.Reader(['en'])  # Initialize EasyOCR
+        # Engines are process-wide and loaded on first use, so processors are cheap to create
+        self.engines = ocr_engines
+        self.last_timings = {}
+        self.last_strategy = None
+
+    @property
+    def reader(self):
+        """Shared EasyOCR reader"""
+        return self.engines.easyocr_reader()
         
     @staticmethod
     def enhance_image(image):
-        """Apply various image enhancement techniques using PIL"""
+        """Return the grayscale, Otsu-binarised and deskewed page as a PIL image"""
         try:
-            # Convert to grayscale if not already
-            if image.mode != 'L':
-                image = image.convert('L')
-            
-            # Resize to a reasonable size if too large
-            max_size = 2000
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Apply Otsu's thresholding
-            def otsu_threshold(im):
-                # Calculate histogram
-                hist = im.histogram()
-                total = sum(hist)
-                
-                sum_all = sum(i * h for i, h in enumerate(hist))
-                sum_back = 0
-                w_back = 0
-                w_fore = 0
-                var_max = 0
-                threshold = 0
-                
-                for t in range(256):
-                    w_back += hist[t]
-                    if w_back == 0:
-                        continue
-                        
-                    w_fore = total - w_back
-                    if w_fore == 0:
-                        break
-                        
-                    sum_back += t * hist[t]
-                    mean_back = sum_back / w_back
-                    mean_fore = (sum_all - sum_back) / w_fore
-                    
-                    var_between = w_back * w_fore * (mean_back - mean_fore) ** 2
-                    if var_between > var_max:
-                        var_max = var_between
-                        threshold = t
-                
-                return threshold
-            
-            # Apply Otsu's threshold
-            threshold = otsu_threshold(image)
-            image = image.point(lambda x: 255 if x > threshold else 0)
-            
-            # Increase contrast
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.0)
-            
-            # Apply unsharp mask for better edge definition
-            image = image.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
-            
-            # Remove small noise
-            image = image.filter(ImageFilter.MedianFilter(size=3))
-            
-            return image
+            return Image.fromarray(preprocess(image).binary)
         except Exception as e:
             logger.warning(f"Image enhancement failed: {str(e)}")
             return image
 
     @staticmethod
     def check_tesseract():
-        """Check if Tesseract is properly installed and configured"""
-        try:
-            version = pytesseract.get_tesseract_version()
-            logger.info(f"Tesseract version: {version}")
+        """Check if Tesseract is properly installed and configured (probed once per process)"""
+        return ocr_engines.tesseract_available()
+
+    @staticmethod
+    def _tesseract(image, psm):
+        """Run Tesseract once, returning (text, mean word confidence 0-100)"""
+        data = pytesseract.image_to_data(
+            image,
+            config=f'--psm {psm} --oem 3 {TESSERACT_WHITELIST} --dpi 300',
+            output_type=pytesseract.Output.DICT
+        )
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            if not word:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+            conf = float(data['conf'][i])
+            if conf >= 0:
+                confidences.append(conf)
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
+
+    def _easyocr(self, image):
+        """Run EasyOCR on an array, returning (text, mean confidence 0-100)"""
+        result = self.engines.readtext(image)
+        text = '\n'.join(item[1] for item in result)
+        confidence = 100 * sum(item[2] for item in result) / len(result) if result else 0.0
+        return text, confidence
+
+    def _ocr_strategies(self, pre):
+        """Ordered (name, callable) pairs: cheapest and most likely to succeed first"""
+        strategies = []
+        if pre.mrz is not None:
+            strategies.append(('tesseract_mrz', lambda: self._tesseract(pre.mrz, 6)))
+        # 3=auto, 4=single column, 6=uniform block
+        for psm in (3, 4, 6):
+            strategies.append((f'tesseract_psm{psm}', lambda psm=psm: self._tesseract(pre.binary, psm)))
+        strategies.append(('tesseract_inverted_psm6', lambda: self._tesseract(pre.inverted, 6)))
+        strategies.append(('easyocr', lambda: self._easyocr(pre.binary)))
+        strategies.append(('easyocr_gray', lambda: self._easyocr(pre.gray)))
+        return strategies
+
+    def _is_confident(self, text, confidence):
+        """A result is accepted if it carries a full MRZ or scores above the threshold"""
+        if len(MRZ_LINE_PATTERN.findall(text.replace(' ', ''))) >= 2:
             return True
-        except Exception as e:
-            logger.error(f"Tesseract not properly configured: {str(e)}")
-            return False
+        return confidence >= self.CONFIDENCE_THRESHOLD
+
+    def run_strategies(self, pre, timer):
+        """Try each OCR strategy in order and stop at the first confident result.
+
+        If none is confident, the non-empty outputs are combined so the field
+        extractors still get everything that was read.
+        """
+        fallback = []
+        for name, strategy in self._ocr_strategies(pre):
+            try:
+                with timer.step(f'ocr:{name}'):
+                    text, confidence = strategy()
+            except Exception as e:
+                logger.warning(f"OCR strategy {name} failed: {str(e)}")
+                continue
+            if not text.strip():
+                continue
+            logger.info(f"OCR strategy {name}: confidence {confidence:.1f}")
+            if self._is_confident(text, confidence):
+                self.last_strategy = name
+                return text
+            fallback.append(text)
+
+        self.last_strategy = 'combined' if fallback else None
+        return '\n'.join(fallback)
+
+    def load_image(self, file_path):
+        """Open an image file, or render the first page of a PDF"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+
+        # Handle PDF files
+        if file_ext == '.pdf':
+            logger.info("Converting PDF to image")
+            try:
+                # Only the data page is needed; rendering the rest is wasted work
+                pages = convert_from_path(
+                    file_path,
+                    poppler_path=POPPLER_PATH,
+                    dpi=300,  # Higher DPI for better quality
+                    first_page=1,
+                    last_page=1
+                )
+                if not pages:
+                    raise ValueError("No pages found in PDF")
+                return pages[0]
+            except Exception as e:
+                logger.error(f"PDF conversion error: {str(e)}")
+                raise Exception(f"Failed to convert PDF: {str(e)}")
+        # Handle image files
+        elif file_ext in self.SUPPORTED_IMAGE_FORMATS:
+            logger.info("Opening image file")
+            try:
+                image = Image.open(file_path)
+                image.load()
+                return image
+            except Exception as e:
+                logger.error(f"Image opening error: {str(e)}")
+                raise Exception(f"Failed to open image: {str(e)}")
+        else:
+            raise ValueError(f"Unsupported file format: {file_ext}")
 
     def extract_text_from_image(self, file_path):
-        """Extract text using multiple OCR engines with fallback"""
+        """Extract text by preprocessing once and running OCR strategies until one is confident"""
         try:
             if not self.check_tesseract():
                 raise Exception("Tesseract OCR is not properly configured")
 
             logger.info(f"Processing file: {file_path}")
-            file_ext = os.path.splitext(file_path)[1].lower()
-            
-            # Handle PDF files
-            if file_ext == '.pdf':
-                logger.info("Converting PDF to image")
-                try:
-                    pages = convert_from_path(
-                        file_path, 
-                        poppler_path=POPPLER_PATH,
-                        dpi=300  # Higher DPI for better quality
-                    )
-                    if not pages:
-                        raise ValueError("No pages found in PDF")
-                    image = pages[0]
-                except Exception as e:
-                    logger.error(f"PDF conversion error: {str(e)}")
-                    raise Exception(f"Failed to convert PDF: {str(e)}")
-            # Handle image files
-            elif file_ext in self.SUPPORTED_IMAGE_FORMATS:
-                logger.info("Opening image file")
-                try:
-                    image = Image.open(file_path)
-                except Exception as e:
-                    logger.error(f"Image opening error: {str(e)}")
-                    raise Exception(f"Failed to open image: {str(e)}")
-            else:
-                raise ValueError(f"Unsupported file format: {file_ext}")
+            timer = StepTimer()
 
-            # Enhance image
-            enhanced_image = self.enhance_image(image)
-            
-            # Try multiple OCR approaches
-            text_results = []
-            
-            # 1. Try Tesseract with optimized settings for passport
-            try:
-                logger.info("Attempting Tesseract OCR with optimized passport settings")
-                # Use multiple page segmentation modes
-                psm_modes = [3, 4, 6]  # 3=auto, 4=single column, 6=uniform block
-                for psm in psm_modes:
-                    text = pytesseract.image_to_string(
-                        enhanced_image,
-                        config=f'--psm {psm} --oem 3 -c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<>/ " --dpi 300'
-                    )
-                    if text.strip():
-                        text_results.append(text)
-                        
-                # Try again with different image processing
-                inverted_image = Image.eval(enhanced_image, lambda x: 255 - x)
-                for psm in psm_modes:
-                    text = pytesseract.image_to_string(
-                        inverted_image,
-                        config=f'--psm {psm} --oem 3 -c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<>/ " --dpi 300'
-                    )
-                    if text.strip():
-                        text_results.append(text)
-            except Exception as e:
-                logger.warning(f"Tesseract passport-specific OCR failed: {str(e)}")
+            with timer.step('load'):
+                image = self.load_image(file_path)
 
-            # 2. Try EasyOCR
-            try:
-                logger.info("Attempting EasyOCR")
-                # Convert PIL image to bytes
-                img_byte_arr = io.BytesIO()
-                enhanced_image.save(img_byte_arr, format='PNG')
-                img_byte_arr = img_byte_arr.getvalue()
-                
-                result = self.reader.readtext(img_byte_arr)
-                easy_text = '\n'.join([item[1] for item in result])
-                if easy_text.strip():
-                    text_results.append(easy_text)
-                    
-                # Try with inverted image
-                inverted_byte_arr = io.BytesIO()
-                inverted_image.save(inverted_byte_arr, format='PNG')
-                inverted_byte_arr = inverted_byte_arr.getvalue()
-                
-                result = self.reader.readtext(inverted_byte_arr)
-                easy_text = '\n'.join([item[1] for item in result])
-                if easy_text.strip():
-                    text_results.append(easy_text)
-            except Exception as e:
-                logger.warning(f"EasyOCR failed: {str(e)}")
+            pre = preprocess(image, timer)
+            if pre.skew_angle:
+                logger.info(f"Deskewed page by {pre.skew_angle} degrees")
 
-            if not text_results:
+            text = self.run_strategies(pre, timer)
+            self.last_timings = timer.timings
+            observe_ocr_steps(timer.timings)
+            logger.info(f"OCR timings (ms): {timer.summary()}; strategy: {self.last_strategy}")
+
+            if not text.strip():
                 raise ValueError("No text could be extracted from the image")
 
-            # Combine and clean results
-            combined_text = '\n'.join(text_results)
-            cleaned_text = self.clean_text(combined_text)
-            
+            cleaned_text = self.clean_text(text)
+
             logger.info(f"Successfully extracted text: {cleaned_text[:200]}...")
             return cleaned_text
 
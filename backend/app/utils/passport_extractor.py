@@ -11,6 +11,7 @@ from pdf2image import convert_from_path
 import tempfile
 import shutil
 from openai import OpenAI
+from .metrics import track_extraction
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -134,6 +135,7 @@ class PassportExtractor:
         """Strip spaces/dashes/dots and uppercase."""
         return ''.join(c for c in raw.upper() if c.isalnum())
 
+    @track_extraction("passport")
     async def extract_data(self, file_path: str, source_file: Optional[str] = None) -> PassportData:
         """Extract passport data using GPT-4o Vision."""
         import json
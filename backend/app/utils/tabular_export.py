@@ -0,0 +1,190 @@
+"""
+Streaming CSV / XLSX exports.
+
+``export_response`` turns an iterator of row dicts into a StreamingResponse
+without holding the file in memory: CSV is written a buffer at a time, and
+XLSX is a zip written to a non-seekable sink (zipfile then uses data
+descriptors) with inline strings, so neither the archive nor a shared-strings
+table grows with the row count. Callers feed it rows from a ``yield_per``
+query so the database side stays bounded too.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# (row key, column header)
+Columns = Sequence[Tuple[str, str]]
+
+# Characters XML 1.0 cannot carry at all
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "value"):  # enums
+        return str(value.value)
+    return str(value)
+
+
+def iter_csv(columns: Columns, rows: Iterable[dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens UTF-8 names correctly
+    buffer.write("\ufeff")
+    writer.writerow([header for _, header in columns])
+    for row in rows:
+        writer.writerow([_text(row.get(key)) for key, _ in columns])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Sink:
+    """Write-only file object; zipfile sees it as unseekable and streams."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _cell(ref: str, value) -> str:
+    if value is None or value == "":
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub("", _text(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(sheet_name: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def iter_xlsx(columns: Columns, rows: Iterable[dict], sheet_name: str = "Export") -> Iterator[bytes]:
+    sink = _Sink()
+    letters = [_column_letter(i) for i in range(len(columns))]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _workbook(sheet_name))
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        # force_zip64: the sheet's final size isn't known up front
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            header = "".join(_cell(f"{letter}1", title) for letter, (_, title) in zip(letters, columns))
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<sheetData><row r="1">{header}</row>'
+            ).encode("utf-8"))
+            for number, row in enumerate(rows, start=2):
+                cells = "".join(
+                    _cell(f"{letter}{number}", row.get(key)) for letter, (key, _) in zip(letters, columns)
+                )
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode("utf-8"))
+                if sink.size >= CHUNK_SIZE:
+                    yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def check_export_args(fmt: str, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """400 for an unknown format or an inverted date range."""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(MEDIA_TYPES)}")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+
+
+def export_response(columns: Columns, rows: Iterable[dict], fmt: str, filename: str) -> StreamingResponse:
+    """Stream ``rows`` as ``fmt`` ("csv" or "xlsx") with a download filename (no extension)."""
+    if fmt == "xlsx":
+        body = iter_xlsx(columns, rows, sheet_name=filename)
+    else:
+        body = iter_csv(columns, rows)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(f'{filename}.{fmt}')}"},
+    )
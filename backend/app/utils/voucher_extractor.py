@@ -10,6 +10,7 @@ from typing import Optional
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
+from .metrics import track_extraction
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -104,6 +105,7 @@ class VoucherExtractor:
             logger.error(f"Error converting PDF: {e}")
             raise
 
+    @track_extraction("voucher")
     async def extract_data(self, file_path: str, source_file: Optional[str] = None) -> VoucherData:
         """Extract data from voucher image using GPT-4o Vision."""
         try:
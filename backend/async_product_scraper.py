@@ -0,0 +1,329 @@
+"""
+Generic availability scraper for any product in the catalogue.
+
+One engine for every Product row with scrape_enabled set (see
+app/services/product_catalogue.py): each tab loads the permit site once and
+then checks every requested product for each of its dates, so adding a
+product adds date checks to the existing sweep rather than a new module and
+a new 2-year cycle. async_panda_headless.py and async_golden_monkey.py are
+now thin wrappers around this. Every check is timed and stored as scrape
+telemetry (app/services/scrape_telemetry.py).
+
+    python async_product_scraper.py                  # all enabled products, next 30 days
+    python async_product_scraper.py chimps_trek 60   # one product, days 60-89
+"""
+import asyncio
+from playwright.async_api import async_playwright
+from datetime import datetime, timedelta
+import random
+import sys
+from app.config import settings
+from app.database import SessionLocal
+from app.services.product_catalogue import ScrapeTarget, purge_past, save_availability, scrape_targets
+from app.services.scrape_retry_queue import record_scrape_outcome
+from app.services.slot_alerts import SlotAlerts
+from app.services import scrape_telemetry
+from app.services.scrape_telemetry import DateTiming
+from app.utils.adaptive_concurrency import classify_exception, permit_site_controller as controller
+from app.utils import lean_pages
+from app.utils.jsf_waits import SITE_SELECT, read_availability
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Disable noisy logging
+logging.getLogger('playwright').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+]
+
+BATCH_DAYS = 30
+
+
+def random_delay(min_delay=0.5, max_delay=1):
+    # Scaled by the shared controller: shorter while the site is healthy, longer after errors
+    return random.uniform(min_delay, max_delay) * controller.scale()
+
+
+async def check_date(page, date, site_label, product_label):
+    """Read one date's availability. Returns (date, slots) or None, and lets
+    page errors (timeouts etc.) propagate."""
+    await page.wait_for_selector(SITE_SELECT, timeout=20000)
+    # Each step waits for its own JSF partial response rather than a fixed sleep
+    return await read_availability(page, date, site_label, product_label)
+
+
+async def process_date(page, date, site_label, product_label):
+    try:
+        return await check_date(page, date, site_label, product_label)
+    except Exception:
+        return None  # Just return None to trigger retry
+
+
+async def check_target(page, date, target: ScrapeTarget):
+    return await process_date(page, date, target.site_label, target.product_label)
+
+
+async def timed_check(page, date, target: ScrapeTarget):
+    """Check one target on one date. Returns (result, outcome, seconds)."""
+    started = time.monotonic()
+    try:
+        result = await check_date(page, date, target.site_label, target.product_label)
+    except Exception as e:
+        return None, classify_exception(e), time.monotonic() - started
+    if result is None:
+        outcome = "empty"
+    else:
+        outcome = "sold_out" if result[1] == "Sold Out" else "ok"
+    return result, outcome, time.monotonic() - started
+
+
+def _controller_outcome(outcome):
+    return "ok" if outcome == "sold_out" else outcome
+
+
+async def process_dates_in_tab(context, dates, targets, on_checked=None):
+    """Check every target for each date on one page.
+
+    Returns ([(key, date, slots)], [DateTiming]). ``on_checked()`` is called
+    after each (date, product) check, for progress reporting.
+    """
+    page = await context.new_page()
+    load = lean_pages.track(page, "tab")
+    results = []
+    timings = []
+
+    try:
+        started = time.monotonic()
+        await controller.goto(
+            page,
+            settings.PERMIT_SITE_URL,
+            timeout=20000,
+            wait_until='domcontentloaded'
+        )
+        load.load_ms = (time.monotonic() - started) * 1000
+
+        for date in dates:
+            for target in targets:
+                try:
+                    async with controller.slot():
+                        result, outcome, elapsed = await timed_check(page, date, target)
+                    controller.record(_controller_outcome(outcome))
+
+                    attempts = 1
+                    if result is None:
+                        result, outcome, retry_elapsed = await retry_date_in_new_tab(context, date, target)
+                        attempts += 1
+                        elapsed += retry_elapsed
+                    timings.append(DateTiming(target.key, date, elapsed * 1000, attempts, outcome))
+                    if result:
+                        results.append((target.key, result[0], result[1]))
+                except Exception:
+                    continue
+                finally:
+                    if on_checked:
+                        on_checked()
+
+            await controller.pace(1.0, 2.0)  # Pause between dates, scaled by the controller
+
+    finally:
+        await page.close()
+
+    return results, timings
+
+
+async def retry_date_in_new_tab(context, date, target):
+    """One more try on a fresh page. Returns (result, outcome, seconds)."""
+    page = None
+    started = time.monotonic()
+    try:
+        page = await context.new_page()
+        load = lean_pages.track(page, "retry")
+        async with controller.slot():
+            load_started = time.monotonic()
+            await controller.goto(
+                page,
+                settings.PERMIT_SITE_URL,
+                timeout=20000,
+                wait_until='domcontentloaded'
+            )
+            load.load_ms = (time.monotonic() - load_started) * 1000
+            result, outcome, _ = await timed_check(page, date, target)
+        controller.record(_controller_outcome(outcome))
+        await page.close()
+        return result, outcome, time.monotonic() - started
+    except Exception as e:
+        if page:
+            await page.close()
+        return None, classify_exception(e), time.monotonic() - started
+
+
+async def scrape_products(keys=None, start_offset=0, days=BATCH_DAYS, source="async_product_scraper", run_id=None):
+    """Scrape ``days`` dates from ``start_offset`` for the given product keys
+    (default: every enabled product). Returns {key: [(date, slots)]}.
+
+    Timings are recorded as a batch of telemetry run ``run_id``; without
+    one, the call is recorded as a run of its own.
+    """
+    start_date = datetime.now().date() + timedelta(days=start_offset)
+    dates = [(start_date + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(days)]
+    return await scrape_dates(keys, dates, source=source, run_id=run_id)
+
+
+async def scrape_dates(keys, dates, source="async_product_scraper", run_id=None, on_checked=None):
+    """Scrape specific dates ("dd/mm/YYYY", in order) for the given product keys.
+
+    Same as scrape_products, for callers that want a sparse set of dates
+    (scrape jobs). ``on_checked`` is passed on to process_dates_in_tab.
+    """
+    if not dates:
+        return {}
+    db = None
+    own_run = False
+    try:
+        db = SessionLocal()
+        targets = scrape_targets(db, keys)
+        if not targets:
+            logger.warning(f"No scrape targets for {keys or 'enabled products'}")
+            return {}
+        if run_id is None:
+            run_id = scrape_telemetry.start_run(db, source)
+            own_run = True
+        batch_started_at = datetime.utcnow()
+
+        # First, clean up past dates from database
+        try:
+            purge_past(db)
+            logger.info("Cleaned up past dates from database")
+        except Exception as e:
+            logger.error(f"Error cleaning past dates: {str(e)}")
+            db.rollback()
+
+        today = datetime.now().date()
+        start_offset = (datetime.strptime(dates[0], "%d/%m/%Y").date() - today).days
+        days = len(dates)
+
+        batch_start_time = time.time()
+        names = ", ".join(target.key for target in targets)
+        logger.info(f"Retrieving {names} for dates: {dates[0]} to {dates[-1]}")
+
+        # Tabs follow the controller's current limit; slot() enforces cuts made mid-batch
+        num_tabs = min(controller.limit, len(dates))
+        date_batches = [dates[i::num_tabs] for i in range(num_tabs)]
+
+        async with async_playwright() as p:
+            try:
+                browser = await p.chromium.launch(
+                    headless=True,
+                    args=[
+                        '--no-sandbox',
+                        '--disable-setuid-sandbox',
+                        '--disable-dev-shm-usage',
+                        '--disable-blink-features=AutomationControlled',
+                        '--disable-infobars',
+                        '--disable-extensions',
+                    ]
+                )
+
+                # Create single context for all tabs
+                context = await browser.new_context(
+                    user_agent=random.choice(USER_AGENTS),
+                    viewport={'width': 1280, 'height': 720},
+                    extra_http_headers={
+                        'Accept-Language': 'en-US,en;q=0.9',
+                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                    }
+                )
+                # Prevent headless detection via navigator.webdriver
+                await context.add_init_script(
+                    'Object.defineProperty(navigator, "webdriver", {get: () => undefined})'
+                )
+                # Skip images/fonts/styles and share static assets between tabs
+                lean = await lean_pages.install(context)
+
+                # Process all batches in parallel
+                tasks = [process_dates_in_tab(context, batch, targets, on_checked) for batch in date_batches]
+                batch_results = await asyncio.gather(*tasks)
+
+                await context.close()
+                await browser.close()
+            except Exception as e:
+                logger.error(f"Browser error: {str(e)}")
+                for target in targets:
+                    record_scrape_outcome(db, target.key, dates, [], source=source, error=f"Browser error: {str(e)}")
+                scrape_telemetry.record_batch(
+                    db, run_id, source, [target.key for target in targets], start_offset, days,
+                    batch_started_at, error=f"Browser error: {str(e)}",
+                )
+                raise
+
+        results = {target.key: [] for target in targets}
+        timings = []
+        for tab_results, tab_timings in batch_results:
+            for key, date, slots in tab_results:
+                results[key].append((date, slots))
+            timings.extend(tab_timings)
+        page_loads = lean.loads()
+        logger.info(f"Page loads for {names}: {lean_pages.summary(page_loads)}")
+        scrape_telemetry.record_batch(
+            db, run_id, source, [target.key for target in targets], start_offset, days,
+            batch_started_at, timings, page_loads=page_loads,
+        )
+
+        saved_count = 0
+        alerts = SlotAlerts(db)
+        for target in targets:
+            # Dates still unresolved go to the retry queue instead of waiting for the next cycle
+            record_scrape_outcome(db, target.key, dates, results[target.key], source=source)
+
+            # Save to database
+            for date, slots in results[target.key]:
+                if not date or not slots:
+                    continue
+                try:
+                    if datetime.strptime(date, "%d/%m/%Y").date() >= today:
+                        save_availability(db, target, date, slots)
+                        alerts.observe(target, date, slots)
+                        saved_count += 1
+                except Exception as e:
+                    logger.error(f"Database error for {target.key} {date}: {str(e)}")
+                    db.rollback()
+                    continue
+
+        try:
+            alerts.send()
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error committing batch to database: {str(e)}")
+            db.rollback()
+
+        if not saved_count:
+            logger.error("No results were collected in this batch")
+
+        batch_time = time.time() - batch_start_time
+        logger.info(f"Completed {names} for {dates[0]} to {dates[-1]} in {batch_time:.2f} seconds ({saved_count} slots)")
+        return results
+
+    except Exception as e:
+        logger.error(f"Error in scrape_dates: {str(e)}")
+        if own_run:
+            scrape_telemetry.finish_run(db, run_id, "failed", str(e))
+            own_run = False
+        raise
+    finally:
+        if db:
+            if own_run:
+                scrape_telemetry.finish_run(db, run_id)
+            db.close()
+
+
+if __name__ == "__main__":
+    keys = sys.argv[1].split(",") if len(sys.argv) > 1 else None
+    offset = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    asyncio.run(scrape_products(keys, offset))
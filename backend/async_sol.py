@@ -3,8 +3,10 @@ from playwright.async_api import async_playwright
 from datetime import datetime, timedelta
 import random
 from app.models.scrape_status import ScrapeStatus
+from app.config import settings
 from app.database import SessionLocal
 from app.models.available_slots import AvailableSlot
+from app.utils.adaptive_concurrency import permit_site_controller as controller
 import logging
 
 # Configure logging
@@ -28,14 +30,15 @@ def generate_dates(start_date, num_days):
     return [(start_date + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(num_days)]
 
 def random_delay(min_delay=0.5, max_delay=3):
-    return random.uniform(min_delay, max_delay)
+    # Scaled by the shared controller: shorter while the site is healthy, longer after errors
+    return random.uniform(min_delay, max_delay) * controller.scale()
 
 async def process_date(page, date, wait_time=10000):
     try:
         print(f"Processing date: {date}")
         
         # Make selections first
-        await page.goto("https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml", 
+        await controller.goto(page, settings.PERMIT_SITE_URL, 
                        wait_until='networkidle',
                        timeout=wait_time)  # Use configurable wait time
         
@@ -45,7 +48,7 @@ async def process_date(page, date, wait_time=10000):
         
         # Select site and wait
         await page.select_option(site_selector, label='Volcanoes National Park')
-        await asyncio.sleep(2)
+        await asyncio.sleep(controller.delay(1.5, 2.5))
         
         # Wait for product dropdown to be populated
         product_selector = '//select[@id="form:visitorAndCategoryDetails_product"]'
@@ -53,13 +56,13 @@ async def process_date(page, date, wait_time=10000):
         
         # Select product
         await page.select_option(product_selector, label='Mountain gorillas')
-        await asyncio.sleep(2)
+        await asyncio.sleep(controller.delay(1.5, 2.5))
         
         # Fill date and wait for response
         date_selector = '//input[@id="form:visitorAndCategoryDetails_dateOfVisit"]'
         await page.fill(date_selector, date)
         await page.press(date_selector, 'Tab')
-        await asyncio.sleep(2)
+        await asyncio.sleep(controller.delay(1.5, 2.5))
 
         # Wait for either slots input or error message
         await page.wait_for_selector(
@@ -101,13 +104,20 @@ async def process_date(page, date, wait_time=10000):
         print(f"Error processing date {date}: {str(e)}")
         return None  # Return None to trigger retry
 
+async def checked_process_date(page, date):
+    """process_date under a controller slot, reporting whether it produced a value."""
+    async with controller.slot():
+        result = await process_date(page, date)
+    controller.record("ok" if result else "empty")
+    return result
+
 async def process_dates_in_tab(context, dates):
     results = []
     
     for date in dates:
         page = await context.new_page()
         try:
-            result = await process_date(page, date)
+            result = await checked_process_date(page, date)
             if result is None:  # If initial attempt failed, retry in new tab
                 print(f"Initial attempt failed for {date}, retrying in new tab...")
                 result = await retry_date_in_new_tab(context, date)
@@ -119,7 +129,7 @@ async def process_dates_in_tab(context, dates):
                 print(f"Added result for {date}: {result['Attendance']}")
         finally:
             await page.close()
-            await asyncio.sleep(1)
+            await controller.pace(0.75, 1.25)
     
     # Log summary of results
     sold_out_count = len([r for r in results if r['Attendance'] == "Sold Out"])
@@ -132,7 +142,7 @@ async def main(start_date=None):
         # Use provided start_date or default to day after tomorrow
         start_date = start_date or (datetime.now() + timedelta(days=2))
         num_days = 30
-        num_tabs = 10
+        num_tabs = min(controller.limit, num_days)
         dates = generate_dates(start_date, num_days)
         date_batches = [dates[i::num_tabs] for i in range(num_tabs)]
 
@@ -270,7 +280,7 @@ async def retry_date_in_new_tab(context, date):
     try:
         print(f"Retrying date {date} in new tab")
         page = await context.new_page()
-        result = await process_date(page, date)
+        result = await checked_process_date(page, date)
         await page.close()
         
         if result:
@@ -279,7 +289,7 @@ async def retry_date_in_new_tab(context, date):
         # If still no result after retry, try one more time
         print(f"Still no clear result for {date}, trying one final time")
         page = await context.new_page()
-        result = await process_date(page, date)
+        result = await checked_process_date(page, date)
         await page.close()
         
         if result:
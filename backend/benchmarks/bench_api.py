@@ -0,0 +1,281 @@
+"""
+Latency benchmark for the API's list endpoints on a large synthetic data set.
+
+Generates data with benchmarks/synthetic_data.py into a throwaway SQLite
+database (or --database-url), serves the app with uvicorn on a free local
+port, logs in as the synthetic benchmark users, and then replays each
+endpoint in ENDPOINTS --requests times with --concurrency requests in flight.
+When uvicorn is not installed, the app is served in-process through
+httpx's ASGI transport instead. --url benchmarks a server that is already
+running (seed it first with synthetic_data.py).
+
+Each endpoint reports p50 / p95 / max latency in ms, requests per second,
+the response size, and non-2xx responses.
+
+Run from backend/:
+    python benchmarks/bench_api.py --scale large --requests 30 --concurrency 4
+    python benchmarks/bench_api.py --json api.json
+    python benchmarks/bench_api.py --baseline api.json --tolerance 0.25
+    python benchmarks/bench_api.py --url http://localhost:8000 --endpoints bookings,finance_ar
+
+With --baseline the exit status is 1 when any endpoint's p50 or p95 grew by
+more than the tolerance (and by at least --min-delta-ms), or an endpoint
+that used to succeed now returns errors.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+# name -> (GET path, synthetic_data.BENCH_USERS key to call it as)
+ENDPOINTS = {
+    "bookings": ("/api/bookings", "admin"),
+    "finance_ar": ("/api/finance-ar/ar", "finance"),
+    "finance_ap": ("/api/finance-ar/ap", "finance"),
+    "rolling_deposit": ("/api/finance-ar/rolling-deposit", "finance"),
+    "pending_validations": ("/api/finance/pending-validations", "finance"),
+    "overdue_payments": ("/api/finance/overdue-payments", "finance"),
+    "authorization": ("/api/authorization/", "admin"),
+    "chase": ("/api/chase", "admin"),
+    "agents": ("/api/agents", "admin"),
+    "notifications": ("/api/notifications", "admin"),
+    "gorilla_slots": ("/api/available-slots?slot_type=gorilla", "admin"),
+    "golden_monkey_slots": ("/api/golden-monkey-slots", "admin"),
+}
+
+# (metric, True when higher is better)
+REGRESSION_METRICS = (("p50_ms", False), ("p95_ms", False))
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+async def bench_endpoint(client: httpx.AsyncClient, name: str, path: str, headers: dict,
+                         requests: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await client.get(path, headers=headers)
+
+    latencies, sizes, statuses = [], [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+            except httpx.HTTPError as e:
+                statuses.append(type(e).__name__)
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(response.content))
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+    errors = [s for s in statuses if not (isinstance(s, int) and 200 <= s < 300)]
+    return {
+        "endpoint": name,
+        "path": path,
+        "requests": requests,
+        "errors": len(errors),
+        "error_sample": str(errors[0]) if errors else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "max_ms": max(latencies) if latencies else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "rps": requests / wall if wall else 0.0,
+        "bytes": int(sum(sizes) / len(sizes)) if sizes else 0,
+    }
+
+
+async def bench(client: httpx.AsyncClient, names: list, args) -> list:
+    from benchmarks.synthetic_data import BENCH_PASSWORD, BENCH_USERS
+
+    headers = {}
+    for role in sorted({ENDPOINTS[name][1] for name in names}):
+        email = BENCH_USERS[role]
+        response = await client.post("/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+        if response.status_code != 200:
+            raise SystemExit(f"Login as {email} failed ({response.status_code}): {response.text[:200]}")
+        headers[role] = {"Authorization": f"Bearer {response.json()['access_token']}", "Accept-Encoding": "gzip"}
+
+    results = []
+    for name in names:
+        path, role = ENDPOINTS[name]
+        result = await bench_endpoint(client, name, path, headers[role],
+                                      args.requests, args.concurrency, args.warmup)
+        results.append(result)
+        print(f"  {name:<22}p95 {result['p95_ms']:8.1f} ms", flush=True)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(url: str, proc, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit(f"uvicorn exited with status {proc.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise SystemExit(f"Server did not come up within {timeout:.0f}s")
+
+
+async def run(args, names: list) -> list:
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await bench(client, names, args)
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        uvicorn = None
+
+    if uvicorn is None:
+        print("uvicorn is not installed; serving the app in-process over ASGI")
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            return await bench(client, names, args)
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=dict(os.environ),
+    )
+    try:
+        await _wait_until_up(url, proc, 60)
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            return await bench(client, names, args)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def seed(args):
+    import app.models  # noqa: F401  (registers every table)
+    from app.database import Base, SessionLocal, engine
+    from benchmarks.synthetic_data import generate, scale_from_args
+
+    Base.metadata.create_all(bind=engine)
+    scale = scale_from_args(args)
+    print(f"Seeding {args.scale} data set: {scale.bookings:,} bookings, {scale.notifications:,} notifications")
+    with SessionLocal() as db:
+        generate(db, scale, seed=args.seed, anchor=args.anchor)
+
+
+def compare(results: list, baseline: list, tolerance: float, min_delta_ms: float) -> list:
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    before = {r["endpoint"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        old = before.get(result["endpoint"])
+        if not old:
+            continue
+        if result["errors"] and not old.get("errors"):
+            regressions.append(f"{result['endpoint']}: {result['errors']} errors ({result['error_sample']})")
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS:
+            was, now = old.get(metric), result.get(metric)
+            if not was or now is None or abs(now - was) < min_delta_ms:
+                continue
+            change = (now - was) / was
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{result['endpoint']}: {metric} {was:.1f} -> {now:.1f} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: list):
+    print(f"{'endpoint':<22}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'req/s':>8}{'KB':>9}{'errors':>8}")
+    for r in results:
+        print(f"{r['endpoint']:<22}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['max_ms']:>9.1f}"
+              f"{r['rps']:>8.1f}{r['bytes'] / 1024:>9.0f}{r['errors']:>8}")
+        if r["errors"]:
+            print(f"{'':<22}first error: {r['error_sample']}")
+
+
+def main():
+    from benchmarks.synthetic_data import add_scale_arguments
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests per endpoint first")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--url", help="benchmark this running server instead of starting one")
+    parser.add_argument("--database-url", help="seed and serve this database instead of a throwaway SQLite file")
+    parser.add_argument("--skip-seed", action="store_true", help="use the data already in --database-url")
+    parser.add_argument("--json", dest="json_out", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier --json run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="ignore latency changes smaller than this (noise on fast endpoints)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoint {unknown[0]!r}; choose from {', '.join(ENDPOINTS)}")
+
+    with tempfile.TemporaryDirectory(prefix="bench_api_") as workdir:
+        if not args.url:
+            # Set before anything imports app.database, and inherited by the uvicorn child
+            os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+            os.environ.setdefault("SCRAPE_IN_API_PROCESS", "false")
+            if not args.skip_seed:
+                seed(args)
+        results = asyncio.run(run(args, names))
+
+    print_results(results)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
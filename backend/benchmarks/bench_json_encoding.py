@@ -0,0 +1,111 @@
+"""
+Encode-time and payload-size benchmark for the large list endpoints.
+
+Compares the default FastAPI path (jsonable_encoder + json.dumps, what
+JSONResponse does) with app.utils.fast_json on synthetic rows shaped like
+GET /api/bookings and GET /api/finance-ar/ar, then reports the on-the-wire
+size raw, gzipped and brotli-compressed.
+
+Run from backend/:
+    python benchmarks/bench_json_encoding.py --rows 50000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.models.booking import BookingStatus  # noqa: E402
+from app.models.payment import PaymentStatus, ValidationStatus  # noqa: E402
+from app.utils.fast_json import dumps as fast_dumps  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _booking_row(i: int, rng: random.Random) -> dict:
+    trek = date.today() + timedelta(days=rng.randint(1, 730))
+    unit_cost = Decimal(rng.choice(["1500.00", "100.00", "75.00", "60.00"]))
+    people = rng.randint(1, 8)
+    paid = unit_cost * people * Decimal("0.3") if rng.random() < 0.5 else Decimal("0")
+    return {
+        "id": i,
+        "date": trek,
+        "booking_name": f"Booking {i}",
+        "number_of_people": people,
+        "status": rng.choice(list(BookingStatus)),
+        "site": "Volcanoes National Park",
+        "product": "Mountain gorillas",
+        "unit_cost": unit_cost,
+        "total_amount": unit_cost * people,
+        "amount_received": paid,
+        "balance": unit_cost * people - paid,
+        "payment_status": rng.choice(list(PaymentStatus)),
+        "validation_status": rng.choice(list(ValidationStatus)),
+        "deposit_due_date": datetime.utcnow() + timedelta(days=rng.randint(-30, 30)),
+        "balance_due_date": datetime.combine(trek, datetime.min.time()) - timedelta(days=45),
+        "agent_client": "DEM",
+        "head_of_file": "Smith",
+        "date_of_request": date.today() - timedelta(days=rng.randint(0, 90)),
+        "available_slots": str(rng.randint(0, 96)),
+        "authorization_status": None,
+        "passport_count": rng.randint(0, people),
+        "days_to_trek": (trek - date.today()).days,
+    }
+
+
+def _default_encode(rows) -> bytes:
+    """What JSONResponse does for a route that returns plain dicts."""
+    return json.dumps(
+        jsonable_encoder(rows),
+        ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _time(fn, rows, repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [_booking_row(i, rng) for i in range(args.rows)]
+
+    before_s, before_body = _time(_default_encode, rows, args.repeat)
+    after_s, after_body = _time(fast_dumps, rows, args.repeat)
+
+    print(f"{args.rows} rows (best of {args.repeat})")
+    print(f"{'path':<28}{'encode ms':>12}{'raw KB':>12}{'gzip KB':>12}{'brotli KB':>12}")
+    for label, secs, body in (
+        ("jsonable_encoder + json", before_s, before_body),
+        ("fast_json (orjson)", after_s, after_body),
+    ):
+        gz = len(gzip.compress(body, compresslevel=6))
+        br = f"{len(brotli.compress(body, quality=4)) / 1024:>12.1f}" if brotli else f"{'n/a':>12}"
+        print(f"{label:<28}{secs * 1000:>12.1f}{len(body) / 1024:>12.1f}{gz / 1024:>12.1f}{br}")
+    print(f"encode speed-up: {before_s / after_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
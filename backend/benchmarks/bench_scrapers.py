@@ -0,0 +1,315 @@
+"""
+Throughput, accuracy and resource benchmark for the slot scrapers.
+
+Starts the offline permit replay site (benchmarks/permit_replay_server.py),
+then runs each scraper engine in its own subprocess against it with
+PERMIT_SITE_URL and a throwaway SQLite DATABASE_URL. Each run reports:
+
+  dates/s    resolved dates per second of wall time
+  resolved   dates written to the slot table / unique dates the engine asked for
+  accuracy   share of resolved dates whose value matches the replay ground truth
+  retries    repeat date checks seen by the server
+  cpu s      user+sys CPU of the engine's process tree
+  peak MB    peak RSS of the engine's process tree (browsers included)
+  KB/page    bytes the server sent (page, partials and assets) per page load
+
+The Playwright engines run in lean page mode (app/utils/lean_pages.py)
+unless --full-pages is given. Run both ways to see what it saves. Each run
+starts with an empty asset cache.
+
+Engines: panda (async_panda_headless), golden_monkey (async_golden_monkey),
+fast (fast_scrapers, Playwright pool), http (fast_scrapers_http),
+sol (async_sol). The Playwright engines need a local chromium
+(``playwright install chromium``); engines that fail to start are reported
+as unavailable rather than aborting the run.
+
+Run from backend/:
+    python benchmarks/bench_scrapers.py --engines http,panda --latency-ms 150 --error-rate 0.05
+    python benchmarks/bench_scrapers.py --json results.json
+    python benchmarks/bench_scrapers.py --engines panda --full-pages
+    python benchmarks/bench_scrapers.py --baseline results.json --tolerance 0.15
+
+With --baseline the exit status is 1 when any engine's dates/s or accuracy
+dropped, or its peak memory grew, by more than the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.permit_replay_server import (  # noqa: E402
+    add_config_arguments, config_from_args, expected_slots, start_replay_server,
+)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RESULT_MARKER = "BENCH_RESULT "
+
+# engine -> (replay product value, slot table)
+ENGINES = {
+    "panda": ("1", "available_slots"),
+    "golden_monkey": ("2", "golden_monkey_slots"),
+    "fast": ("1", "available_slots"),
+    "http": ("1", "available_slots"),
+    "sol": ("1", "available_slots"),
+}
+
+# (metric, True when higher is better)
+REGRESSION_METRICS = (("dates_per_sec", True), ("accuracy", True), ("peak_rss_mb", False))
+
+
+# -- child side ----------------------------------------------------------------
+
+async def _run_engine(name: str, offset: int):
+    if name == "panda":
+        from async_panda_headless import scrape_slots
+        await scrape_slots(offset)
+    elif name == "golden_monkey":
+        from async_golden_monkey import scrape_golden_monkey_slots
+        await scrape_golden_monkey_slots(offset)
+    elif name == "fast":
+        from fast_scrapers import scrape_gorilla_slots
+        await scrape_gorilla_slots(offset)
+    elif name == "http":
+        # Built directly: the module's own wrappers rely on names it never imports
+        from app.models.available_slots import AvailableSlot
+        from fast_scrapers_http import FastHttpScraper
+        await FastHttpScraper(AvailableSlot, 1, "Mountain gorillas").scrape(offset)
+    elif name == "sol":
+        from async_sol import scrape_slots
+        await scrape_slots(offset)
+    else:
+        raise ValueError(f"Unknown engine {name}")
+
+
+def child_main(name: str, offset: int):
+    from sqlalchemy import text
+
+    import app.models  # noqa: F401  (registers every table)
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    from app.services.catalogue_seed import seed_initial_data  # the product engine scrapes catalogue rows
+    with SessionLocal() as db:
+        seed_initial_data(db)
+    start = time.perf_counter()
+    error = None
+    try:
+        asyncio.run(_run_engine(name, offset))
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+    wall = time.perf_counter() - start
+
+    table = ENGINES[name][1]
+    db = SessionLocal()
+    try:
+        rows = dict(db.execute(text(f"SELECT date, slots FROM {table}")).all())
+    finally:
+        db.close()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(RESULT_MARKER + json.dumps({
+        "wall_s": wall,
+        "rows": rows,
+        "error": error,
+        "cpu_s": usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        "max_rss_mb": max(usage.ru_maxrss, children.ru_maxrss) / 1024,
+    }), flush=True)
+
+
+# -- parent side ---------------------------------------------------------------
+
+async def _sample_tree(pid: int, peak: dict, interval: float = 0.1):
+    """Track peak RSS and CPU of a process and its descendants until cancelled."""
+    try:
+        root = psutil.Process(pid)
+    except psutil.Error:
+        return
+    cpu = {}
+    while True:
+        try:
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        for proc in procs:
+            try:
+                rss += proc.memory_info().rss
+                times = proc.cpu_times()
+                cpu[proc.pid] = times.user + times.system
+            except psutil.Error:
+                continue
+        peak["rss_mb"] = max(peak.get("rss_mb", 0.0), rss / 1048576)
+        peak["cpu_s"] = sum(cpu.values())
+        await asyncio.sleep(interval)
+
+
+async def run_engine(name: str, server, offset: int, timeout: float, full_pages: bool = False) -> dict:
+    server.site.stats.reset()
+    server.site.sessions.clear()
+    product = ENGINES[name][0]
+
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        env = dict(os.environ)
+        env.update({
+            "PERMIT_SITE_URL": server.url,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")])),
+            "SCRAPER_LEAN_PAGES": "false" if full_pages else "true",
+            "SCRAPER_ASSET_CACHE_DIR": os.path.join(workdir, "asset_cache"),
+        })
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--child", name, "--offset", str(offset),
+            cwd=workdir, env=env,  # scrapers drop log files in their cwd
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+        peak = {}
+        sampler = asyncio.create_task(_sample_tree(proc.pid, peak)) if psutil else None
+        try:
+            output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return {"engine": name, "available": False, "error": f"timed out after {timeout:.0f}s"}
+        finally:
+            if sampler:
+                sampler.cancel()
+
+    lines = output.decode(errors="replace").splitlines()
+    result_line = next((l for l in reversed(lines) if l.startswith(RESULT_MARKER)), None)
+    if result_line is None:
+        tail = " | ".join(lines[-3:]) or f"exit status {proc.returncode}"
+        return {"engine": name, "available": False, "error": tail}
+
+    child = json.loads(result_line[len(RESULT_MARKER):])
+    stats = server.site.stats.as_dict()
+    config = server.site.config
+    rows = child["rows"]
+    correct = sum(
+        1 for date, value in rows.items()
+        if value == expected_slots(config.seed, product, date, config.sold_out_rate)
+    )
+    requested = len({date for (p, date) in server.site.stats.date_checks if p == product})
+    resolved = len(rows)
+    page_loads = stats["requests"].get("page", 0)
+    bytes_sent = sum(stats["bytes_sent"].values())
+    return {
+        "engine": name,
+        "available": not (child["error"] and not rows),
+        "error": child["error"],
+        "wall_s": child["wall_s"],
+        "dates_requested": requested,
+        "dates_resolved": resolved,
+        "dates_correct": correct,
+        "dates_per_sec": resolved / child["wall_s"] if child["wall_s"] else 0.0,
+        "accuracy": correct / resolved if resolved else 0.0,
+        "coverage": resolved / requested if requested else 0.0,
+        "retries": stats["retries"],
+        "requests": sum(stats["requests"].values()),
+        "faults": stats["faults"],
+        "page_loads": page_loads,
+        "bytes_sent": bytes_sent,
+        "kb_per_page": bytes_sent / 1024 / page_loads if page_loads else None,
+        "cpu_s": peak.get("cpu_s", child["cpu_s"]),
+        "peak_rss_mb": peak.get("rss_mb", child["max_rss_mb"]),
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    before = {r["engine"]: r for r in baseline if r.get("available")}
+    regressions = []
+    for result in results:
+        old = before.get(result["engine"])
+        if not old:
+            continue
+        if not result.get("available"):
+            regressions.append(f"{result['engine']}: unavailable ({result.get('error')})")
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS:
+            was, now = old.get(metric), result.get(metric)
+            if not was or now is None:
+                continue
+            change = (now - was) / was
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{result['engine']}: {metric} {was:.2f} -> {now:.2f} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: list):
+    print(f"{'engine':<15}{'dates/s':>9}{'resolved':>11}{'accuracy':>10}{'retries':>9}{'cpu s':>8}{'peak MB':>9}"
+          f"{'KB/page':>9}")
+    for r in results:
+        if not r["available"]:
+            print(f"{r['engine']:<15}unavailable: {r['error']}")
+            continue
+        resolved = f"{r['dates_resolved']}/{r['dates_requested']}"
+        kb_per_page = f"{r['kb_per_page']:.0f}" if r.get("kb_per_page") is not None else "-"
+        print(f"{r['engine']:<15}{r['dates_per_sec']:>9.2f}{resolved:>11}{r['accuracy']:>10.1%}"
+              f"{r['retries']:>9}{r['cpu_s']:>8.1f}{r['peak_rss_mb']:>9.0f}{kb_per_page:>9}")
+        if r["error"]:
+            print(f"{'':<15}engine raised {r['error']}")
+
+
+async def run(args) -> list:
+    server = await start_replay_server(config_from_args(args))
+    try:
+        results = []
+        for name in args.engines.split(","):
+            name = name.strip()
+            if name not in ENGINES:
+                raise SystemExit(f"Unknown engine {name!r}; choose from {', '.join(ENGINES)}")
+            results.append(await run_engine(name, server, args.offset, args.timeout, args.full_pages))
+        return results
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--offset", type=int, default=0, help="start_offset passed to each engine")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before an engine run is killed")
+    parser.add_argument("--full-pages", action="store_true", help="turn lean page mode off in the engines")
+    parser.add_argument("--json", dest="json_out", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier --json run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.offset)
+        return
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
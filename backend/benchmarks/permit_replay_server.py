@@ -0,0 +1,391 @@
+"""
+Offline stand-in for the RDB tourism permit site.
+
+Serves TourismPermit_v1.xhtml and answers JSF partial-AJAX posts from the
+recorded fixtures in benchmarks/fixtures/permit_site. Slot availability is
+derived deterministically from (seed, product, date), so runs can be compared
+and checked against ground truth. Latency, server errors, hangs, empty
+partial responses, ViewExpired errors and "No slots available" dates are all
+configurable. The page also pulls the static assets a real JSF page does
+(stylesheet, web font, images, PrimeFaces script), so the bytes a scraper
+downloads per page can be measured (the "bytes" stats).
+
+Run standalone and point the scrapers at it:
+
+    python -m benchmarks.permit_replay_server --port 8765 --latency-ms 150 --error-rate 0.05
+    PERMIT_SITE_URL=http://localhost:8765/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml \\
+        python async_panda_headless.py
+
+Control endpoints (JSON):
+    GET  /__replay/stats    request counters, injected faults, retries per date
+    POST /__replay/reset    clear the counters
+    GET  /__replay/config   current fault/latency settings
+    POST /__replay/config   update settings live, e.g. {"error_rate": 0.2}
+    GET  /__replay/truth?product=1&date=01/02/2027   expected slots value
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Optional
+
+from aiohttp import web
+
+PAGE_PATH = "/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml"
+RESOURCE_PATH = "/rdbBooking/javax.faces.resource/"
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "permit_site")
+
+SITE_FIELD = "form:visitorAndCategoryDetails_site"
+PRODUCT_FIELD = "form:visitorAndCategoryDetails_product"
+DATE_FIELD = "form:visitorAndCategoryDetails_dateOfVisit"
+
+# site value -> (label, {product value: (label, daily capacity)})
+CATALOGUE = {
+    "1": ("Volcanoes National Park", {
+        "1": ("Mountain gorillas", 96),
+        "2": ("Golden Monkeys", 80),
+        "3": ("Bisoke", 40),
+        "4": ("Dian Fossey Tomb", 30),
+        "5": ("Gahinga", 20),
+        "6": ("Muhabura", 20),
+        "8": ("Nature walk", 30),
+    }),
+    "2": ("Nyungwe Forest National Park", {
+        "13": ("Canopy Walk", 60),
+        "15": ("Chimps Trek", 16),
+        "17": ("Bird Walk - Nyungwe Forest", 20),
+    }),
+}
+# Static assets referenced by the page: name -> (content type, size in bytes)
+ASSETS = {
+    "theme.css": ("text/css", 48_000),
+    "fontawesome-webfont.woff2": ("font/woff2", 77_000),
+    "banner.jpg": ("image/jpeg", 180_000),
+    "logo.png": ("image/png", 24_000),
+    "primefaces.js": ("application/javascript", 110_000),
+}
+
+PRODUCTS = {value: label for _, products in CATALOGUE.values() for value, (label, _) in products.items()}
+CAPACITY = {value: cap for _, products in CATALOGUE.values() for value, (_, cap) in products.items()}
+
+
+@dataclass
+class ReplayConfig:
+    latency_ms: float = 120.0         # mean response delay
+    jitter_ms: float = 80.0           # +/- uniform jitter on the delay
+    error_rate: float = 0.0           # HTTP 500 on any request
+    timeout_rate: float = 0.0         # hang for timeout_s, then 504
+    timeout_s: float = 30.0
+    empty_rate: float = 0.0           # date check answered with no updates
+    view_expired_rate: float = 0.0    # ViewExpiredException on an AJAX post
+    sold_out_rate: float = 0.25       # share of dates with "No slots available"
+    views_per_session: int = 15       # JSF numberOfViewsInSession
+    seed: int = 0
+
+    def update(self, values: dict):
+        names = {f.name: f.type for f in fields(self)}
+        for key, value in values.items():
+            if key not in names:
+                raise KeyError(key)
+            setattr(self, key, int(value) if names[key] in (int, "int") else float(value))
+
+
+def expected_slots(seed: int, product: str, date: str, sold_out_rate: float) -> str:
+    """Ground-truth value the site shows for a product/date."""
+    rng = random.Random(f"{seed}:{product}:{date}")
+    if rng.random() < sold_out_rate:
+        return "Sold Out"
+    return str(rng.randint(1, CAPACITY.get(product, 20)))
+
+
+def _load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class ReplayStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.faults = Counter()
+        self.outcomes = Counter()
+        self.date_checks = Counter()
+        self.bytes_sent = Counter()  # page, ajax, asset
+
+    def as_dict(self) -> dict:
+        retries = sum(count - 1 for count in self.date_checks.values() if count > 1)
+        return {
+            "requests": dict(self.requests),
+            "faults": dict(self.faults),
+            "outcomes": dict(self.outcomes),
+            "date_checks": sum(self.date_checks.values()),
+            "unique_dates": len(self.date_checks),
+            "retries": retries,
+            "bytes_sent": dict(self.bytes_sent),
+        }
+
+
+class _Session:
+    def __init__(self, views_per_session: int):
+        self.views = deque(maxlen=views_per_session)
+        self.site: Optional[str] = None
+        self.product: Optional[str] = None
+
+    def new_view(self) -> str:
+        view_state = f"{secrets.randbelow(10**18)}:{secrets.randbelow(10**18)}"
+        self.views.append(view_state)
+        return view_state
+
+
+class PermitReplaySite:
+
+    def __init__(self, config: Optional[ReplayConfig] = None):
+        self.config = config or ReplayConfig()
+        self.stats = ReplayStats()
+        self.sessions: Dict[str, _Session] = {}
+        self._rng = random.Random(self.config.seed)
+        self._page = _load_fixture("TourismPermit_v1.xhtml")
+        self._partials = {
+            name: _load_fixture(f"partial_{name}.xml")
+            for name in ("products", "slots", "no_slots", "empty", "view_expired")
+        }
+
+    # -- helpers -------------------------------------------------------------
+
+    def _session(self, request: web.Request):
+        session_id = request.cookies.get("JSESSIONID")
+        if session_id not in self.sessions:
+            session_id = secrets.token_hex(16)
+            self.sessions[session_id] = _Session(self.config.views_per_session)
+        return session_id, self.sessions[session_id]
+
+    async def _delay(self):
+        cfg = self.config
+        delay = cfg.latency_ms + self._rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    async def _injected_fault(self) -> Optional[web.Response]:
+        cfg = self.config
+        if cfg.timeout_rate and self._rng.random() < cfg.timeout_rate:
+            self.stats.faults["timeout"] += 1
+            await asyncio.sleep(cfg.timeout_s)
+            return web.Response(status=504, text="Gateway Timeout")
+        if cfg.error_rate and self._rng.random() < cfg.error_rate:
+            self.stats.faults["error"] += 1
+            return web.Response(status=500, text="<html><body><h1>HTTP Status 500 - Internal Server Error</h1></body></html>",
+                                content_type="text/html")
+        return None
+
+    def _partial(self, body: str) -> web.Response:
+        self.stats.bytes_sent["ajax"] += len(body)
+        return web.Response(text=body, content_type="text/xml", charset="utf-8")
+
+    @staticmethod
+    def _asset_body(name: str, content_type: str, size: int) -> bytes:
+        if content_type.startswith(("text/", "application/javascript")):
+            filler = f"/* {name} */\n".encode()
+        else:
+            filler = bytes(range(256))
+        return (filler * (size // len(filler) + 1))[:size]
+
+    # -- handlers ------------------------------------------------------------
+
+    async def page(self, request: web.Request) -> web.Response:
+        self.stats.requests["page"] += 1
+        await self._delay()
+        fault = await self._injected_fault()
+        if fault:
+            return fault
+
+        session_id, session = self._session(request)
+        site_options = "\n".join(
+            f'<option value="{value}">{label}</option>' for value, (label, _) in CATALOGUE.items()
+        )
+        body = (self._page
+                .replace("{action}", PAGE_PATH)
+                .replace("{site_options}", site_options)
+                .replace("{view_state}", session.new_view()))
+        self.stats.bytes_sent["page"] += len(body)
+        response = web.Response(text=body, content_type="text/html", charset="utf-8")
+        response.set_cookie("JSESSIONID", session_id, path="/rdbBooking")
+        return response
+
+    async def asset(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        if name not in ASSETS:
+            raise web.HTTPNotFound()
+        self.stats.requests[f"asset:{name}"] += 1
+        content_type, size = ASSETS[name]
+        self.stats.bytes_sent["asset"] += size
+        return web.Response(body=self._asset_body(name, content_type, size), content_type=content_type,
+                            headers={"Cache-Control": "max-age=604800"})
+
+    async def ajax(self, request: web.Request) -> web.Response:
+        if request.headers.get("Faces-Request") != "partial/ajax":
+            return await self.page(request)
+
+        form = await request.post()
+        source = form.get("javax.faces.source", "")
+        self.stats.requests[f"ajax:{source}"] += 1
+        await self._delay()
+        fault = await self._injected_fault()
+        if fault:
+            return fault
+
+        cfg = self.config
+        _, session = self._session(request)
+        if source == DATE_FIELD:
+            self.stats.date_checks[(form.get(PRODUCT_FIELD) or session.product, form.get(DATE_FIELD, ""))] += 1
+        view_state = form.get("javax.faces.ViewState", "")
+        if view_state not in session.views or (cfg.view_expired_rate and self._rng.random() < cfg.view_expired_rate):
+            self.stats.faults["view_expired"] += 1
+            return self._partial(self._partials["view_expired"])
+
+        if source == SITE_FIELD:
+            session.site = form.get(SITE_FIELD) or None
+            products = CATALOGUE.get(session.site, ("", {}))[1]
+            options = "\n".join(f'<option value="{value}">{label}</option>'
+                                for value, (label, _) in products.items())
+            return self._partial(self._partials["products"]
+                                 .replace("{product_options}", options)
+                                 .replace("{view_state}", view_state))
+
+        if source == PRODUCT_FIELD:
+            session.product = form.get(PRODUCT_FIELD) or None
+            return self._partial(self._partials["empty"].replace("{view_state}", view_state))
+
+        if source == DATE_FIELD:
+            product = form.get(PRODUCT_FIELD) or session.product
+            date = form.get(DATE_FIELD, "")
+            if cfg.empty_rate and self._rng.random() < cfg.empty_rate:
+                self.stats.faults["empty"] += 1
+                return self._partial(self._partials["empty"].replace("{view_state}", view_state))
+            if product not in PRODUCTS or not date:
+                self.stats.outcomes["invalid"] += 1
+                return self._partial(self._partials["empty"].replace("{view_state}", view_state))
+
+            value = expected_slots(cfg.seed, product, date, cfg.sold_out_rate)
+            if value == "Sold Out":
+                self.stats.outcomes["sold_out"] += 1
+                return self._partial(self._partials["no_slots"].replace("{view_state}", view_state))
+            self.stats.outcomes["slots"] += 1
+            return self._partial(self._partials["slots"]
+                                 .replace("{slots}", value)
+                                 .replace("{view_state}", view_state))
+
+        return self._partial(self._partials["empty"].replace("{view_state}", view_state))
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.as_dict())
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.stats.reset()
+        self.sessions.clear()
+        return web.json_response({"reset": True})
+
+    async def get_config(self, request: web.Request) -> web.Response:
+        return web.json_response(asdict(self.config))
+
+    async def set_config(self, request: web.Request) -> web.Response:
+        try:
+            self.config.update(await request.json())
+        except (KeyError, ValueError, TypeError) as e:
+            return web.json_response({"error": f"Invalid setting: {e}"}, status=400)
+        return web.json_response(asdict(self.config))
+
+    async def truth(self, request: web.Request) -> web.Response:
+        product = request.query.get("product", "")
+        date = request.query.get("date", "")
+        return web.json_response({
+            "product": product,
+            "date": date,
+            "slots": expected_slots(self.config.seed, product, date, self.config.sold_out_rate),
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(PAGE_PATH, self.page)
+        app.router.add_post(PAGE_PATH, self.ajax)
+        app.router.add_get(RESOURCE_PATH + "{name}", self.asset)
+        app.router.add_get("/__replay/stats", self.get_stats)
+        app.router.add_post("/__replay/reset", self.reset_stats)
+        app.router.add_get("/__replay/config", self.get_config)
+        app.router.add_post("/__replay/config", self.set_config)
+        app.router.add_get("/__replay/truth", self.truth)
+        return app
+
+
+class ReplayServer:
+    """A running replay site; use ``await start_replay_server()`` to create one."""
+
+    def __init__(self, site: PermitReplaySite, runner: web.AppRunner, host: str, port: int):
+        self.site = site
+        self.runner = runner
+        self.base_url = f"http://{host}:{port}"
+        self.url = self.base_url + PAGE_PATH
+
+    @property
+    def stats(self) -> ReplayStats:
+        return self.site.stats
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def _public_host(host: str) -> str:
+    # aiohttp's default cookie jar ignores cookies from bare IP addresses, which
+    # would give the HTTP scraper a fresh JSESSIONID (and an expired view) on
+    # every request. Advertise the loopback address by name instead.
+    return "localhost" if host in ("127.0.0.1", "0.0.0.0") else host
+
+
+async def start_replay_server(config: Optional[ReplayConfig] = None,
+                              host: str = "127.0.0.1", port: int = 0) -> ReplayServer:
+    site = PermitReplaySite(config)
+    runner = web.AppRunner(site.make_app(), access_log=None)
+    await runner.setup()
+    tcp = web.TCPSite(runner, host, port)
+    await tcp.start()
+    bound_port = tcp._server.sockets[0].getsockname()[1]
+    return ReplayServer(site, runner, _public_host(host), bound_port)
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = ReplayConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--timeout-rate", type=float, default=defaults.timeout_rate)
+    parser.add_argument("--timeout-s", type=float, default=defaults.timeout_s)
+    parser.add_argument("--empty-rate", type=float, default=defaults.empty_rate)
+    parser.add_argument("--view-expired-rate", type=float, default=defaults.view_expired_rate)
+    parser.add_argument("--sold-out-rate", type=float, default=defaults.sold_out_rate)
+    parser.add_argument("--views-per-session", type=int, default=defaults.views_per_session)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> ReplayConfig:
+    return ReplayConfig(**{f.name: getattr(args, f.name) for f in fields(ReplayConfig)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay of the RDB tourism permit site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    site = PermitReplaySite(config_from_args(args))
+    print(f"Permit replay site on http://{_public_host(args.host)}:{args.port}{PAGE_PATH}")
+    web.run_app(site.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
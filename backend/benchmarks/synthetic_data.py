@@ -0,0 +1,463 @@
+"""
+Deterministic large-scale synthetic data for load testing.
+
+Fills the database named by DATABASE_URL with bookings, payments,
+authorization requests, chase records, passports, notifications,
+rolling-deposit transactions and two years of slot availability. Rows are
+written with bulk INSERTs in chunks, so the "large" preset (50k bookings,
+500k notifications) loads in well under a minute on SQLite.
+
+The same --seed and --anchor always produce the same rows. Everything the
+generator creates is tagged (booking refs "SYN…", users "@synthetic.test",
+agents "SYN Agent …") and is purged before each run, so it is safe to
+re-run against a database that also holds real data. Slot rows for the
+generated horizon are replaced.
+
+Run from backend/:
+    python benchmarks/synthetic_data.py --scale large
+    python benchmarks/synthetic_data.py --bookings 20000 --notifications 100000 --seed 7
+    python benchmarks/synthetic_data.py --purge
+
+benchmarks/bench_api.py logs in as the BENCH_USERS accounts: an admin for
+the booking and operations lists and a finance admin for the finance ones.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = "bench-password"
+BENCH_USERS = {  # role key -> email; all share BENCH_PASSWORD
+    "admin": "bench-admin@synthetic.test",
+    "finance": "bench-finance@synthetic.test",
+}
+REF_PREFIX = "SYN"
+USER_DOMAIN = "@synthetic.test"
+AGENT_PREFIX = "SYN Agent "
+CHUNK = 5000
+
+
+@dataclass(frozen=True)
+class Scale:
+    bookings: int
+    notifications: int
+    agents: int
+    users: int
+    slot_days: int = 730
+    passport_share: float = 0.6  # share of bookings with passports on file (one per person)
+    rolling_share: float = 0.3  # share of agents with a rolling deposit account
+
+
+SCALES = {
+    "small": Scale(bookings=2_000, notifications=20_000, agents=40, users=10),
+    "medium": Scale(bookings=10_000, notifications=100_000, agents=100, users=25),
+    "large": Scale(bookings=50_000, notifications=500_000, agents=250, users=50),
+}
+
+
+def _status_mix():
+    """(booking status, weight, (payment status, validation, share paid) or None for no payment)."""
+    from app.models.booking import BookingStatus as S
+    from app.models.payment import PaymentStatus as P, ValidationStatus as V
+    return [
+        (S.PROVISIONAL, 6, None),
+        (S.CONFIRMED, 12, (P.PENDING, V.PENDING, 0.0)),
+        (S.AWAITING_AUTHORIZATION, 6, (P.PENDING, V.DO_NOT_PURCHASE, 0.0)),
+        (S.AUTHORIZED, 4, (P.PENDING, V.DO_NOT_PURCHASE, 0.0)),
+        (S.CHASE, 6, (P.PENDING, V.DO_NOT_PURCHASE, 0.0)),
+        (S.RELEASED, 3, (P.CANCELLED, V.DO_NOT_PURCHASE, 0.0)),
+        (S.SECURED_FULL, 25, (P.FULLY_PAID, V.OK_TO_PURCHASE_FULL, 1.0)),
+        (S.SECURED_DEPOSIT, 20, (P.DEPOSIT_PAID, V.OK_TO_PURCHASE_DEPOSIT, 0.3)),
+        (S.SECURED_AUTHORIZATION, 5, (P.PENDING, V.DO_NOT_PURCHASE, 0.0)),
+        (S.AMENDMENT_REQUESTED, 3, (P.DEPOSIT_PAID, V.OK_TO_PURCHASE_DEPOSIT, 0.3)),
+        (S.CANCELLATION_REQUESTED, 2, (P.DEPOSIT_PAID, V.OK_TO_PURCHASE_DEPOSIT, 0.3)),
+        (S.CANCELLED, 6, (P.CANCELLED, V.DO_NOT_PURCHASE, 0.0)),
+        (S.REJECTED, 2, (P.CANCELLED, V.DO_NOT_PURCHASE, 0.0)),
+    ]
+
+
+def _bulk(db, model, rows: Iterable[dict], chunk: int = CHUNK) -> int:
+    """INSERT ``rows`` in executemany chunks; returns the row count."""
+    from sqlalchemy import insert
+
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            db.execute(insert(model), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(model), batch)
+        count += len(batch)
+    return count
+
+
+def _next_id(db, model) -> int:
+    from sqlalchemy import func
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _sync_sequences(db, tables):
+    """Explicit ids bypass PostgreSQL sequences; move them past the new rows."""
+    from sqlalchemy import text
+    if db.bind.dialect.name != "postgresql":
+        return
+    for table in tables:
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def purge(db) -> Dict[str, int]:
+    """Delete everything a previous run generated (children first)."""
+    from sqlalchemy import select
+
+    from app.models.agent_client import (
+        AgentClient, RollingDepositBookingState, RollingDepositTotals, RollingDepositTransaction,
+    )
+    from app.models.authorization import AuthorizationRequest
+    from app.models.booking import Booking
+    from app.models.booking_event import BookingEvent
+    from app.models.chase import ChaseRecord
+    from app.models.notification import Notification
+    from app.models.passport_data import PassportData
+    from app.models.payment import Payment
+    from app.models.user import User
+
+    booking_ids = select(Booking.id).where(Booking.booking_ref.like(f"{REF_PREFIX}%"))
+    user_ids = select(User.id).where(User.email.like(f"%{USER_DOMAIN}"))
+    agent_ids = select(AgentClient.id).where(AgentClient.name.like(f"{AGENT_PREFIX}%"))
+    deleted = {}
+    for name, query in (
+        ("rolling_deposit_transactions", db.query(RollingDepositTransaction).filter(
+            RollingDepositTransaction.agent_client_id.in_(agent_ids))),
+        ("rolling_deposit_booking_states", db.query(RollingDepositBookingState).filter(
+            RollingDepositBookingState.agent_client_id.in_(agent_ids))),
+        ("rolling_deposit_totals", db.query(RollingDepositTotals).filter(
+            RollingDepositTotals.agent_client_id.in_(agent_ids))),
+        ("passport_data", db.query(PassportData).filter(PassportData.user_id.in_(user_ids))),
+        ("notifications", db.query(Notification).filter(Notification.user_id.in_(user_ids))),
+        ("chase_records", db.query(ChaseRecord).filter(ChaseRecord.booking_id.in_(booking_ids))),
+        ("booking_events", db.query(BookingEvent).filter(BookingEvent.booking_id.in_(booking_ids))),
+        ("authorization_requests", db.query(AuthorizationRequest).filter(
+            AuthorizationRequest.booking_id.in_(booking_ids))),
+        ("payments", db.query(Payment).filter(Payment.booking_id.in_(booking_ids))),
+        ("bookings", db.query(Booking).filter(Booking.booking_ref.like(f"{REF_PREFIX}%"))),
+        ("agent_clients", db.query(AgentClient).filter(AgentClient.name.like(f"{AGENT_PREFIX}%"))),
+        ("users", db.query(User).filter(User.email.like(f"%{USER_DOMAIN}"))),
+    ):
+        deleted[name] = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def generate(db, scale: Scale, seed: int = 42, anchor: Optional[date] = None, log=print) -> Dict[str, int]:
+    """Purge earlier synthetic rows, then bulk-insert a fresh data set."""
+    from passlib.context import CryptContext
+
+    from app.services.catalogue_seed import seed_initial_data
+    from app.models.agent_client import (
+        AgentClient, AgentClientType, PaymentTermsAnchor,
+        RollingDepositTransaction, RollingDepositTransactionType,
+    )
+    from app.models.authorization import AuthorizationRequest
+    from app.models.available_slots import AvailableSlot
+    from app.models.booking import Booking, BookingStatus, PaymentStatus, ValidationStatus
+    from app.models.chase import ChaseRecord, ChaseStatus
+    from app.models.golden_monkey_slots import GoldenMonkeySlot
+    from app.models.notification import Notification, NotificationPriority, NotificationStatus, NotificationType
+    from app.models.passport_data import PassportData
+    from app.models.payment import Payment
+    from app.models.product_availability import ProductAvailability
+    from app.models.site import Product
+    from app.models.user import User, UserRole
+    from app.services.product_catalogue import product_key
+
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+    now = datetime.combine(anchor, datetime.min.time()) + timedelta(hours=12)
+    counts = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        counts[name] = fn()
+        db.commit()
+        log(f"  {name:<30}{counts[name]:>9,} rows  {time.perf_counter() - started:6.1f}s")
+
+    seed_initial_data(db)
+    purge(db)
+    products = db.query(Product).order_by(Product.id).all()
+    if not products:
+        raise SystemExit("No products to book against")
+
+    # -- users -----------------------------------------------------------------
+    hashed = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(BENCH_PASSWORD)
+    first_user = _next_id(db, User)
+    user_ids = list(range(first_user, first_user + scale.users + 2))
+
+    def users():
+        yield dict(id=user_ids[0], email=BENCH_USERS["admin"], username="bench-admin", hashed_password=hashed,
+                   role=UserRole.ADMIN, is_active=True)
+        yield dict(id=user_ids[1], email=BENCH_USERS["finance"], username="bench-finance", hashed_password=hashed,
+                   role=UserRole.FINANCE_ADMIN, is_active=True)
+        roles = [UserRole.USER] * 6 + [UserRole.ADMIN, UserRole.FINANCE_ADMIN, UserRole.AUTHORIZER]
+        for i, user_id in enumerate(user_ids[2:], 1):
+            yield dict(id=user_id, email=f"syn-user-{i}{USER_DOMAIN}", username=f"syn-user-{i}",
+                       hashed_password=hashed, role=roles[i % len(roles)], is_active=True)
+    step("users", lambda: _bulk(db, User, users()))
+
+    # -- agents ----------------------------------------------------------------
+    first_agent = _next_id(db, AgentClient)
+    agents = []
+    for i in range(scale.agents):
+        rolling = rng.random() < scale.rolling_share
+        agents.append(dict(
+            id=first_agent + i,
+            name=f"{AGENT_PREFIX}{i:04d}",
+            type=AgentClientType.AGENT if rng.random() < 0.8 else AgentClientType.CLIENT,
+            is_trusted=rng.random() < 0.5,
+            has_rolling_deposit=rolling,
+            email=f"agent{i}@agents.synthetic.test",
+            payment_terms_deposit_days=rng.choice([7, 14, 30]),
+            payment_terms_balance_days=rng.choice([30, 45, 60]),
+            payment_terms_anchor=rng.choice(list(PaymentTermsAnchor)),
+            rolling_deposit_limit=float(rng.choice([5000, 10000, 20000, 50000])) if rolling else 0.0,
+            rolling_deposit_balance=0.0,
+            created_at=now - timedelta(days=rng.randint(400, 900)),
+        ))
+    step("agent_clients", lambda: _bulk(db, AgentClient, agents))
+
+    # -- bookings and their children -------------------------------------------
+    mix = _status_mix()
+    statuses = [entry[0] for entry in mix]
+    weights = [entry[1] for entry in mix]
+    payment_terms = {entry[0]: entry[2] for entry in mix}
+    first_booking = _next_id(db, Booking)
+    payments, auth_requests, chases, passports, ledger = [], [], [], [], []
+
+    def bookings():
+        passport_seq = 0
+        for i in range(scale.bookings):
+            booking_id = first_booking + i
+            status = rng.choices(statuses, weights)[0]
+            product = rng.choices(products, [20 if p.name == "Mountain gorillas" else 8 if p.name == "Golden Monkeys"
+                                             else 1 for p in products])[0]
+            agent = agents[rng.randrange(len(agents))]
+            user_id = user_ids[rng.randrange(len(user_ids))]
+            people = rng.randint(1, 8)
+            requested = anchor - timedelta(days=rng.randint(0, 365))
+            trek = requested + timedelta(days=rng.randint(14, 540))
+            created = datetime.combine(requested, datetime.min.time()) + timedelta(minutes=rng.randint(0, 1439))
+            unit = float(product.unit_cost)
+            total = unit * people
+            terms = payment_terms[status]
+            paid = round(total * terms[2], 2) if terms else 0.0
+
+            yield dict(
+                id=booking_id, booking_name=f"Synthetic Group {i}", booking_ref=f"{REF_PREFIX}{i:07d}",
+                invoice_no=f"INV-S{i:07d}", number_of_permits=people, people=people,
+                voucher_number=f"V-S{i:07d}" if rng.random() < 0.7 else None,
+                date_of_request=requested, trekking_date=trek, date=trek,
+                head_of_file=f"Lead{i}", agent_client=agent["name"][-3:], product=product.name,
+                total_amount=total, paid_amount=paid, booking_status=status,
+                payment_status=PaymentStatus(terms[0].value) if terms else PaymentStatus.PENDING,
+                validation_status=ValidationStatus(terms[1].value) if terms else ValidationStatus.PENDING,
+                created_at=created, user_id=user_id, site_id=product.site_id, product_id=product.id,
+                agent_client_id=agent["id"],
+            )
+
+            if terms:
+                deposit = round(total * 0.3, 2)
+                due_anchor = datetime.combine(requested, datetime.min.time())
+                payments.append(dict(
+                    booking_id=booking_id, amount=total, deposit_amount=deposit, deposit_paid=paid,
+                    balance_due=max(total - paid, 0.0), unit_cost=unit, units=people,
+                    payment_status=terms[0], validation_status=terms[1],
+                    deposit_due_date=due_anchor + timedelta(days=agent["payment_terms_deposit_days"]),
+                    balance_due_date=datetime.combine(trek, datetime.min.time()) - timedelta(days=45),
+                    created_at=created, updated_at=created,
+                ))
+            if status in (BookingStatus.AWAITING_AUTHORIZATION, BookingStatus.AUTHORIZED,
+                          BookingStatus.SECURED_AUTHORIZATION):
+                auth_requests.append(dict(
+                    booking_id=booking_id, reason="Proof of incoming payment provided",
+                    status="pending" if status == BookingStatus.AWAITING_AUTHORIZATION else "authorized",
+                    requested_by=user_id, auto_flagged=rng.random() < 0.2,
+                    deadline=created + timedelta(days=7), created_at=created,
+                ))
+            if status in (BookingStatus.CHASE, BookingStatus.RELEASED):
+                count = 5 if status == BookingStatus.RELEASED else rng.randint(0, 4)
+                chases.append(dict(
+                    booking_id=booking_id, chase_count=count,
+                    last_chase_at=now - timedelta(days=rng.randint(0, 6)) if count else None,
+                    next_chase_at=None if status == BookingStatus.RELEASED else now + timedelta(days=rng.randint(0, 7)),
+                    status=ChaseStatus.RELEASED if status == BookingStatus.RELEASED else ChaseStatus.ACTIVE,
+                    created_at=created,
+                ))
+            if rng.random() < scale.passport_share:
+                for person in range(people):
+                    passport_seq += 1
+                    passports.append(dict(
+                        full_name=f"Traveller {i}-{person}",
+                        date_of_birth=date(rng.randint(1950, 2008), rng.randint(1, 12), rng.randint(1, 28)),
+                        passport_number=f"{REF_PREFIX}{passport_seq:09d}",
+                        passport_expiry=anchor + timedelta(days=rng.randint(-60, 3650)),
+                        nationality=rng.choice(["US", "GB", "DE", "FR", "RW", "KE", "CN", "AU"]),
+                        gender=rng.choice(["M", "F"]), confidence_score=round(rng.uniform(0.6, 1.0), 2),
+                        extraction_status="complete" if rng.random() < 0.9 else "incomplete",
+                        user_id=user_id, booking_id=booking_id, created_at=created,
+                    ))
+            if agent["has_rolling_deposit"] and status in (BookingStatus.SECURED_DEPOSIT, BookingStatus.SECURED_FULL):
+                applied = round(total * 0.3, 2)
+                ledger.append((created, agent["id"], booking_id, RollingDepositTransactionType.APPLIED, applied))
+                if status == BookingStatus.SECURED_FULL and rng.random() < 0.7:
+                    returned_at = created + timedelta(days=rng.randint(3, 40))
+                    if returned_at < now:
+                        ledger.append((returned_at, agent["id"], booking_id,
+                                       RollingDepositTransactionType.RETURNED, applied))
+
+    step("bookings", lambda: _bulk(db, Booking, bookings()))
+    step("payments", lambda: _bulk(db, Payment, payments))
+    step("authorization_requests", lambda: _bulk(db, AuthorizationRequest, auth_requests))
+    step("chase_records", lambda: _bulk(db, ChaseRecord, chases))
+    step("passport_data", lambda: _bulk(db, PassportData, passports))
+
+    # -- rolling deposit ledger: replayed in time order for balance_after -------
+    limits = {agent["id"]: agent["rolling_deposit_limit"] for agent in agents if agent["has_rolling_deposit"]}
+    balances = {}
+
+    def transactions():
+        for agent_id, limit in limits.items():
+            balances[agent_id] = limit
+            yield dict(agent_client_id=agent_id, type=RollingDepositTransactionType.TOP_UP, amount=limit,
+                       balance_after=limit, notes="Opening deposit", created_at=now - timedelta(days=400))
+        for created, agent_id, booking_id, kind, amount in sorted(ledger, key=lambda entry: (entry[0], entry[2])):
+            balance = balances[agent_id]
+            if kind == RollingDepositTransactionType.APPLIED and amount > balance:
+                top_up = round(limits[agent_id] - balance + amount, 2)
+                balance = round(balance + top_up, 2)
+                yield dict(agent_client_id=agent_id, type=RollingDepositTransactionType.TOP_UP, amount=top_up,
+                           balance_after=balance, notes="Top-up", created_at=created)
+            balance = round(balance - amount if kind == RollingDepositTransactionType.APPLIED else balance + amount, 2)
+            balances[agent_id] = balance
+            yield dict(agent_client_id=agent_id, booking_id=booking_id, type=kind, amount=amount,
+                       balance_after=balance, created_at=created)
+
+    step("rolling_deposit_transactions", lambda: _bulk(db, RollingDepositTransaction, transactions()))
+    from sqlalchemy import update
+    if balances:
+        db.execute(update(AgentClient), [{"id": agent_id, "rolling_deposit_balance": balance}
+                                         for agent_id, balance in balances.items()])
+
+    def rolling_deposit_aggregates():
+        from app.services.rolling_deposit import reconcile_rolling_deposit
+        result = reconcile_rolling_deposit(db, repair=True)
+        return result["agents_checked"] + result["bookings_checked"]
+    step("rolling_deposit_aggregates", rolling_deposit_aggregates)
+
+    def booking_events():
+        from app.services.booking_events import backfill_booking_events
+        return backfill_booking_events(db)
+    step("booking_events", booking_events)
+
+    # -- notifications ---------------------------------------------------------
+    def notifications():
+        types = list(NotificationType)
+        priorities = list(NotificationPriority)
+        # The benchmark admin gets a tenth of them so GET /api/notifications has work to do
+        for i in range(scale.notifications):
+            user_id = user_ids[0] if rng.random() < 0.1 else user_ids[rng.randrange(len(user_ids))]
+            created = now - timedelta(minutes=rng.randint(0, 525_600))
+            roll = rng.random()
+            status = NotificationStatus.UNREAD if roll < 0.4 else NotificationStatus.READ if roll < 0.9 \
+                else NotificationStatus.ARCHIVED
+            yield dict(
+                user_id=user_id, type=rng.choice(types), priority=rng.choice(priorities), status=status,
+                title=f"Synthetic alert {i}", message=f"Booking {REF_PREFIX}{rng.randrange(max(scale.bookings, 1)):07d} "
+                                                     f"needs attention",
+                created_at=created, read_at=created + timedelta(hours=2) if status != NotificationStatus.UNREAD else None,
+                requires_action=rng.random() < 0.2,
+            )
+    step("notifications", lambda: _bulk(db, Notification, notifications()))
+
+    # -- two years of slots ----------------------------------------------------
+    dates = [(anchor + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(scale.slot_days)]
+    stamp = now - timedelta(hours=1)
+    slot_products = {product_key(p.name): p for p in products if p.scrape_enabled}
+
+    def slot_value(capacity):
+        return "Sold Out" if rng.random() < 0.15 else str(rng.randint(1, capacity))
+
+    def slots():
+        total = 0
+        for model, key, capacity in ((AvailableSlot, "gorilla", 96), (GoldenMonkeySlot, "golden_monkey", 60)):
+            for start in range(0, len(dates), 500):
+                db.query(model).filter(model.date.in_(dates[start:start + 500])).delete(synchronize_session=False)
+            rows = [dict(date=d, slots=slot_value(capacity), created_at=stamp, updated_at=stamp) for d in dates]
+            total += _bulk(db, model, rows)
+            product = slot_products.get(key)
+            if product is not None:
+                db.query(ProductAvailability).filter(ProductAvailability.product_id == product.id).delete(
+                    synchronize_session=False)
+                total += _bulk(db, ProductAvailability, [
+                    dict(product_id=product.id, date=row["date"], slots=row["slots"], created_at=stamp, updated_at=stamp)
+                    for row in rows
+                ])
+        return total
+    step("slots", slots)
+
+    _sync_sequences(db, ["users", "agent_clients", "bookings"])
+    db.commit()
+    return counts
+
+
+def scale_from_args(args) -> Scale:
+    scale = SCALES[args.scale]
+    overrides = {field: getattr(args, field) for field in ("bookings", "notifications", "agents", "users", "slot_days")
+                 if getattr(args, field) is not None}
+    return replace(scale, **overrides)
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--bookings", type=int)
+    parser.add_argument("--notifications", type=int)
+    parser.add_argument("--agents", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--slot-days", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor", type=date.fromisoformat, help="date the data is generated around (default today)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--purge", action="store_true", help="only delete previously generated rows")
+    args = parser.parse_args()
+
+    import app.models  # noqa: F401  (registers every table)
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if args.purge:
+            for table, count in purge(db).items():
+                print(f"  {table:<30}{count:>9,} deleted")
+            return
+        scale = scale_from_args(args)
+        print(f"Generating {args.scale} data set (seed {args.seed}): {scale}")
+        started = time.perf_counter()
+        counts = generate(db, scale, seed=args.seed, anchor=args.anchor)
+        print(f"Inserted {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
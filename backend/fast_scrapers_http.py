@@ -14,6 +14,8 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.utils.adaptive_concurrency import classify_exception, permit_site_controller as controller
 
 # Load environment variables
 load_dotenv()
@@ -31,13 +33,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class FastHttpScraper:
-    def __init__(self, slot_model: Type, product_id: int, product_name: str, max_concurrent: int = 10):
+    def __init__(self, slot_model: Type, product_id: int, product_name: str, max_concurrent: int = settings.SCRAPER_MAX_CONCURRENCY):
         self.slot_model = slot_model
         self.product_id = product_id  # 1 for gorillas, 2 for monkeys
         self.product_name = product_name
-        self.max_concurrent = max_concurrent
+        self.max_concurrent = max_concurrent  # connection pool size; live concurrency comes from the controller
         self.results = []
-        self.semaphore = asyncio.Semaphore(max_concurrent)
         self.session = None
         self.batch_size = 30  # Reduced batch size for stability
         self.timeout = aiohttp.ClientTimeout(total=30, connect=10)
@@ -66,12 +67,12 @@ class FastHttpScraper:
         # Get initial cookies
         try:
             async with self.session.get(
-                "https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml",
+                settings.PERMIT_SITE_URL,
                 allow_redirects=True,
                 timeout=self.timeout
             ) as response:
                 await response.text()
-                await asyncio.sleep(2)  # Increased wait for stability
+                await controller.pace(1.5, 2.5)  # Wait for stability
         except Exception as e:
             logger.error(f"Error initializing session: {str(e)}")
             raise
@@ -84,7 +85,7 @@ class FastHttpScraper:
         """Get the JSF view state needed for requests"""
         try:
             async with self.session.get(
-                "https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml"
+                settings.PERMIT_SITE_URL
             ) as response:
                 text = await response.text()
                 # Find viewstate in the HTML
@@ -98,7 +99,7 @@ class FastHttpScraper:
     async def check_date(self, date: str, view_state: str) -> Optional[Tuple[str, str]]:
         """Check availability for a single date using direct HTTP request"""
         try:
-            async with self.semaphore:
+            async with controller.slot():
                 # First set the site and product with AJAX
                 data = {
                     "javax.faces.partial.ajax": "true",
@@ -120,14 +121,14 @@ class FastHttpScraper:
                 # Set site and product
                 try:
                     async with self.session.post(
-                        "https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml",
+                        settings.PERMIT_SITE_URL,
                         data=data,
                         headers=headers,
                         timeout=self.timeout
                     ) as response:
                         text = await response.text()
                         logger.debug(f"Product selection response: {text[:200]}...")
-                        await asyncio.sleep(0.5)
+                        await asyncio.sleep(controller.delay(0.4, 0.6))
                 except Exception as e:
                     logger.error(f"Error setting product for date {date}: {str(e)}")
                     return None
@@ -146,18 +147,24 @@ class FastHttpScraper:
                 }
                 
                 try:
+                    started = time.monotonic()
                     async with self.session.post(
-                        "https://visitrwandabookings.rdb.rw/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml",
+                        settings.PERMIT_SITE_URL,
                         data=data,
                         headers=headers,
                         timeout=self.timeout
                     ) as response:
                         text = await response.text()
+                        latency = time.monotonic() - started
                         logger.debug(f"Date check response for {date}: {text[:200]}...")
+                        if response.status >= 500:
+                            controller.record("error", latency)
+                            return None
                         
                         # Check for red error message in AJAX response
                         if "No slots available on date selected" in text and '<li class="alert alert-danger">' in text:
                             logger.info(f"Found Sold Out for date {date}")
+                            controller.record("ok", latency)
                             return date, "Sold Out"
                         
                         # Look for slots in AJAX response
@@ -183,13 +190,16 @@ class FastHttpScraper:
                                 
                                 if slots:
                                     logger.info(f"Found slots for date {date}: {slots}")
+                                    controller.record("ok", latency)
                                     return date, ", ".join(slots)
                         
                         logger.debug(f"No slots or error found for date {date}, will retry")
+                        controller.record("empty", latency)
                         return None
                         
                 except Exception as e:
                     logger.error(f"Error checking slots for date {date}: {str(e)}")
+                    controller.record(classify_exception(e))
                     return None
             
             return None
@@ -257,14 +267,15 @@ class FastHttpScraper:
                 logger.error("Failed to get view state")
                 return
             
-            # Process dates in smaller chunks
-            chunk_size = 5
-            for i in range(0, len(dates), chunk_size):
-                chunk = dates[i:i + chunk_size]
+            # Process dates in chunks sized to the controller's current limit
+            i = 0
+            while i < len(dates):
+                chunk = dates[i:i + controller.limit]
+                i += len(chunk)
                 tasks = [self.check_date(date, view_state) for date in chunk]
                 chunk_results = await asyncio.gather(*tasks)
                 self.results.extend([r for r in chunk_results if r])
-                await asyncio.sleep(2)  # Wait between chunks
+                await controller.pace(1.5, 2.5)  # Wait between chunks
             
             # Save results
             if self.results:
@@ -310,7 +321,7 @@ async def run_scrapers():
         await gorilla_scraper.close_session()
         
         # Wait a bit before starting monkey scraper
-        await asyncio.sleep(5)
+        await asyncio.sleep(controller.batch_gap(5))
         
         # Run golden monkey scraper
         monkey_scraper = FastHttpScraper(GoldenMonkeySlot, 2, "Golden Monkeys")
@@ -0,0 +1,325 @@
+"""
+Standalone scrape worker.
+
+Claims work items from scrape_work_items (see app/services/scrape_leases.py),
+scrapes them with the generic product engine (async_product_scraper.py) and
+releases them, heartbeating its leases while it works. Start
+as many workers as you like, on one machine or several, against the same
+database; they split the 2-year horizon between them instead of each
+scraping all of it.
+
+    python scrape_worker.py                        # run until stopped
+    python scrape_worker.py --worker-id box2-a     # default id is host:pid
+    python scrape_worker.py --once                 # one pass over the horizon, then exit
+    python scrape_worker.py --products gorilla     # only some products (catalogue keys)
+
+The API process no longer scrapes unless SCRAPE_IN_API_PROCESS is set,
+in which case it runs one of these workers in a background thread.
+
+Each worker also runs on-demand scrape jobs queued through the API (see
+app/services/scrape_jobs.py) on a second lane, and claims no new background
+items while a job is waiting or running.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.scrape_job import ScrapeJob
+from app.services import scrape_jobs, scrape_leases, scrape_telemetry, scraper_control
+from app.services.scrape_leases import BATCH, RETRY_DRAIN
+from app.utils.adaptive_concurrency import permit_site_controller
+
+logger = logging.getLogger("scrape_worker")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _heartbeat_loop(item_ids: List[int], worker_id: str):
+    held = list(item_ids)
+    while held:
+        await asyncio.sleep(settings.SCRAPE_HEARTBEAT_SECONDS)
+        db = SessionLocal()
+        try:
+            for item_id in list(held):
+                if not scrape_leases.heartbeat(db, item_id, worker_id):
+                    logger.warning(f"[{worker_id}] lost the lease on work item {item_id}")
+                    held.remove(item_id)
+        except Exception as e:
+            logger.error(f"[{worker_id}] heartbeat for work items {held} failed: {str(e)}")
+        finally:
+            db.close()
+
+
+def _telemetry(fn, *args, **kwargs):
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def work_item(item_ids: List[int], kind: str, products: List[str], start_offset: int,
+                    worker_id: str, run_id: Optional[int] = None) -> Optional[str]:
+    """Run claimed items while heartbeating their leases. Returns an error message, or None.
+
+    Batch items for the same range are worked together: one sweep over the
+    dates checks every claimed product.
+    """
+    beat = asyncio.create_task(_heartbeat_loop(item_ids, worker_id))
+    try:
+        if kind == RETRY_DRAIN:
+            from app.services.scrape_retry_queue import drain_once
+            drain_started = datetime.utcnow()
+            summary = await drain_once()
+            if summary:
+                logger.info(f"[{worker_id}] retry drain: {summary}")
+                _telemetry(
+                    scrape_telemetry.record_batch, run_id, "retry_drain", list(summary), 0, 0, drain_started,
+                    checked=sum(entry["checked"] for entry in summary.values()),
+                    resolved=sum(entry["resolved"] for entry in summary.values()),
+                )
+        else:
+            from async_product_scraper import scrape_products
+            await scrape_products(products, start_offset, days=scrape_leases.BATCH_DAYS,
+                                  source="scrape_worker", run_id=run_id)
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {str(e)}"
+    finally:
+        beat.cancel()
+
+
+async def run_job(job_id: int, worker_id: str, scrape=None) -> str:
+    """Run a claimed scrape job, BATCH_DAYS dates at a time. Returns its final status.
+
+    ``scrape(products, dates, on_checked)`` must scrape and store the dates
+    ("dd/mm/YYYY") and return {product: [(date, slots)]}; it defaults to the
+    Playwright engine.
+    """
+    if scrape is None:
+        from async_product_scraper import scrape_dates
+
+        async def scrape(products, dates, on_checked):
+            return await scrape_dates(products, dates, source="scrape_job", on_checked=on_checked)
+
+    db = SessionLocal()
+    try:
+        job = db.query(ScrapeJob).get(job_id)
+        products, dates = scrape_jobs.job_products(job), scrape_jobs.job_dates(job)
+    finally:
+        db.close()
+    progress = {"done": 0, "skipped": 0, "resolved": 0}
+
+    def checked():
+        progress["done"] += 1
+
+    async def work():
+        for start in range(0, len(dates), scrape_leases.BATCH_DAYS):
+            chunk = dates[start:start + scrape_leases.BATCH_DAYS]
+            db = SessionLocal()
+            try:
+                due = scrape_jobs.dates_to_check(db, db.query(ScrapeJob).get(job_id), chunk)
+            finally:
+                db.close()
+            progress["skipped"] += (len(chunk) - len(due)) * len(products)
+            if due:
+                results = await scrape(products, [d.strftime("%d/%m/%Y") for d in due], checked)
+                progress["resolved"] += sum(len(found) for found in (results or {}).values())
+
+    logger.info(f"[{worker_id}] running scrape job {job_id}: {', '.join(products)}, {len(dates)} dates")
+    task = asyncio.create_task(work())
+    status, error = scrape_jobs.COMPLETED, None
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=settings.SCRAPE_JOB_POLL_SECONDS)
+            if task.done():
+                break
+            cancel = _telemetry(scrape_jobs.report_progress, job_id, worker_id, progress)
+            if cancel is None or cancel:
+                status = scrape_jobs.CANCELLED if cancel else None
+                task.cancel()
+    except asyncio.CancelledError:
+        # Worker shutting down; the lease expires and another worker takes the job over
+        task.cancel()
+        raise
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        status, error = scrape_jobs.FAILED, f"{type(e).__name__}: {str(e)}"
+        logger.error(f"[{worker_id}] scrape job {job_id} failed: {error}")
+    if status is None:
+        logger.warning(f"[{worker_id}] lost the lease on scrape job {job_id}")
+        return scrape_jobs.RUNNING
+    _telemetry(scrape_jobs.report_progress, job_id, worker_id, progress)
+    _telemetry(scrape_jobs.finish_job, job_id, worker_id, status, error)
+    logger.info(f"[{worker_id}] scrape job {job_id} {status}: {progress}")
+    return status
+
+
+async def _job_lane(worker_id: str, stop: Optional[Callable[[], bool]] = None):
+    while not (stop and stop()):
+        try:
+            job_id = _telemetry(scrape_jobs.claim_next_job, worker_id)
+            if job_id is None:
+                await asyncio.sleep(settings.SCRAPE_JOB_POLL_SECONDS)
+                continue
+            await run_job(job_id, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[{worker_id}] scrape job lane error: {str(e)}")
+            await asyncio.sleep(settings.SCRAPE_JOB_POLL_SECONDS)
+
+
+async def _control_loop(worker_id: str):
+    """Keep this process's controller in step with the shared knobs and budget."""
+    version = None
+    try:
+        while True:
+            try:
+                version = _telemetry(scraper_control.sync, permit_site_controller, worker_id, version)
+            except Exception as e:
+                logger.error(f"[{worker_id}] scraper control sync failed: {str(e)}")
+            await asyncio.sleep(settings.SCRAPER_CONTROL_SYNC_SECONDS)
+    finally:
+        try:
+            _telemetry(scraper_control.leave, worker_id)
+        except Exception as e:
+            logger.error(f"[{worker_id}] could not leave the scraper pool: {str(e)}")
+
+
+async def run_worker(worker_id: Optional[str] = None, products: Optional[Iterable[str]] = None,
+                     once: bool = False, stop: Optional[Callable[[], bool]] = None,
+                     on_status: Optional[Callable[[str], None]] = None) -> int:
+    """Claim and work items until ``stop()`` returns True. Returns how many items were worked.
+
+    With ``once`` the worker only takes ranges that haven't completed since it
+    started and exits when none are left, i.e. one pass over the horizon
+    shared with any other workers running at the same time.
+
+    Each pass is a telemetry run; a continuous worker starts a new run when
+    it comes back round to a range it has already worked in the current one.
+    """
+    worker_id = worker_id or default_worker_id()
+    products = list(products) if products else None
+    started = datetime.utcnow()
+
+    logger.info(f"[{worker_id}] scrape worker started")
+    run_id = _telemetry(scrape_telemetry.start_run, "scrape_worker", worker_id)
+    run_ranges = set()
+    worked = 0
+    control = asyncio.create_task(_control_loop(worker_id))
+    jobs = asyncio.create_task(_job_lane(worker_id, stop))
+    while not (stop and stop()):
+        if _telemetry(scrape_jobs.jobs_pending):
+            # On-demand jobs go first; the job lane is working them
+            if on_status:
+                on_status("Scrape jobs")
+            await asyncio.sleep(settings.SCRAPE_JOB_POLL_SECONDS)
+            continue
+
+        db = SessionLocal()
+        try:
+            # Picks up products enabled or disabled since the last item
+            scrape_leases.ensure_work_items(db)
+            cutoff = started if once else None
+            item = scrape_leases.claim_next(
+                db, worker_id, kinds=(RETRY_DRAIN, BATCH), products=products, completed_before=cutoff,
+            )
+            claimed = None
+            if item:
+                claimed = (item.kind, item.start_offset, [item.id], [item.product])
+                while item.kind == BATCH:
+                    item = scrape_leases.claim_next(
+                        db, worker_id, kinds=(BATCH,), products=products, completed_before=cutoff,
+                        start_offset=claimed[1],
+                    )
+                    if item is None:
+                        break
+                    claimed[2].append(item.id)
+                    claimed[3].append(item.product)
+        finally:
+            db.close()
+
+        if claimed is None:
+            if once:
+                break
+            if on_status:
+                on_status("Idle")
+            await asyncio.sleep(settings.SCRAPE_WORKER_POLL_SECONDS)
+            continue
+
+        kind, start_offset, item_ids, item_products = claimed
+        if kind == RETRY_DRAIN:
+            label = "Retry queue"
+        else:
+            ranges = {(product, start_offset) for product in item_products}
+            if ranges & run_ranges:
+                _telemetry(scrape_telemetry.finish_run, run_id)
+                run_id = _telemetry(scrape_telemetry.start_run, "scrape_worker", worker_id)
+                run_ranges.clear()
+            run_ranges |= ranges
+            label = f"{', '.join(item_products)} days {start_offset}-{start_offset + scrape_leases.BATCH_DAYS - 1}"
+        logger.info(f"[{worker_id}] working {label}")
+        if on_status:
+            on_status(label)
+
+        error = await work_item(item_ids, kind, item_products, start_offset, worker_id, run_id)
+        if error:
+            logger.error(f"[{worker_id}] {label} failed: {error}")
+
+        db = SessionLocal()
+        try:
+            for item_id in item_ids:
+                scrape_leases.release(db, item_id, worker_id, error)
+        finally:
+            db.close()
+        worked += len(item_ids)
+
+        if kind == BATCH:
+            # 30 s between batches at the starting pace; shorter or longer as the controller adapts
+            await asyncio.sleep(permit_site_controller.batch_gap(30))
+
+    for task in (jobs, control):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _telemetry(scrape_telemetry.finish_run, run_id, "stopped" if stop and stop() else "completed")
+    logger.info(f"[{worker_id}] scrape worker stopped after {worked} items")
+    return worked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--products", default=None, help="comma-separated, e.g. gorilla,golden_monkey")
+    parser.add_argument("--once", action="store_true", help="make one pass over the horizon, then exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if sys.platform == "win32":
+        # Playwright needs subprocess support, which only the Proactor loop has on Windows
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+    products = [p.strip() for p in args.products.split(",")] if args.products else None
+    try:
+        asyncio.run(run_worker(args.worker_id, products, once=args.once))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
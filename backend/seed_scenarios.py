@@ -44,7 +44,7 @@ def run():
             from app.models.cancellation import CancellationRequest
             from app.models.authorization import AuthorizationRequest
             from app.models.payment import Payment
-            from app.models.agent_client import RollingDepositTransaction
+            from app.models.agent_client import RollingDepositBookingState, RollingDepositTransaction
 
             db.query(AmendmentRequest).filter(AmendmentRequest.booking_id.in_(old_ids)).delete(synchronize_session=False)
             db.query(CancellationRequest).filter(CancellationRequest.booking_id.in_(old_ids)).delete(synchronize_session=False)
@@ -56,6 +56,9 @@ def run():
             from app.models.chase import ChaseRecord
             db.query(ChaseRecord).filter(ChaseRecord.booking_id.in_(old_ids)).delete(synchronize_session=False)
             db.query(RollingDepositTransaction).filter(RollingDepositTransaction.booking_id.in_(old_ids)).delete(synchronize_session=False)
+            db.query(RollingDepositBookingState).filter(RollingDepositBookingState.booking_id.in_(old_ids)).delete(synchronize_session=False)
+            from app.models.booking_event import BookingEvent
+            db.query(BookingEvent).filter(BookingEvent.booking_id.in_(old_ids)).delete(synchronize_session=False)
             db.query(Payment).filter(Payment.booking_id.in_(old_ids)).delete(synchronize_session=False)
             for b in old:
                 db.delete(b)
@@ -441,6 +444,12 @@ def run():
         make_booking("Solo Canopy Walker", BookingStatus.REQUESTED, canopy, site_nyu, 1, ua, 45)
         created.append("[-]          Requested — voucher submitted, awaiting confirmation")
 
+        # Ledger rows and statuses above were written directly; bring the maintained totals
+        # and the booking event log in line
+        from app.services.booking_events import backfill_booking_events
+        from app.services.rolling_deposit import reconcile_rolling_deposit
+        reconcile_rolling_deposit(db, repair=True)
+        backfill_booking_events(db)
         db.commit()
 
         print(f"\nCreated {len(created)} scenario bookings:\n")
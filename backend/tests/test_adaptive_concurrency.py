@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.utils.adaptive_concurrency import AdaptiveController, classify_exception
+
+
+def _controller(**overrides):
+    options = dict(initial_limit=4, min_limit=1, max_limit=8,
+                   initial_delay=1.0, min_delay=0.1, max_delay=10.0, cooldown=0.0)
+    options.update(overrides)
+    return AdaptiveController("test", **options)
+
+
+def test_limit_grows_by_one_per_healthy_window():
+    controller = _controller()
+    for _ in range(4):
+        controller.record("ok", 0.1)
+    assert controller.limit == 5
+    for _ in range(5):
+        controller.record("ok", 0.1)
+    assert controller.limit == 6
+    assert controller.scale() < 1.0
+
+
+def test_failures_cut_multiplicatively_and_slow_down():
+    controller = _controller(initial_limit=8)
+    controller.record("timeout")
+    assert controller.limit == 4
+    assert controller.scale() == 2.0
+    controller.record("error")
+    assert controller.limit == 2
+    controller.record("empty")
+    controller.record("empty")
+    assert controller.limit == 1  # never below min_limit
+
+
+def test_cooldown_counts_a_burst_of_failures_once():
+    controller = _controller(initial_limit=8, cooldown=60.0)
+    for _ in range(5):
+        controller.record("error")
+    assert controller.limit == 4
+    assert controller.snapshot()["decreases"] == 1
+
+
+def test_rising_latency_backs_off_before_errors():
+    controller = _controller(initial_limit=8)
+    controller.record("ok", 0.1)
+    for _ in range(10):
+        controller.record("ok", 1.0)
+    assert controller.limit < 8
+
+
+async def test_slot_enforces_limit():
+    controller = _controller(initial_limit=2)
+
+    async def hold():
+        async with controller.slot(poll=0.005):
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*(hold() for _ in range(6)))
+    snapshot = controller.snapshot()
+    assert snapshot["peak_in_flight"] == 2
+    assert snapshot["in_flight"] == 0
+
+
+def test_configure_validates_and_clamps():
+    controller = _controller()
+    snapshot = controller.configure(max_limit=3, delay=50)
+    assert snapshot["limit"] == 3
+    assert snapshot["delay_s"] == 10.0
+    with pytest.raises(ValueError):
+        controller.configure(decrease_factor=1.5)
+    assert controller.decrease_factor == 0.5
+    with pytest.raises(KeyError):
+        controller.configure(bogus=1)
+
+
+def test_classify_exception():
+    assert classify_exception(asyncio.TimeoutError()) == "timeout"
+    assert classify_exception(type("TimeoutError", (Exception,), {})()) == "timeout"
+    assert classify_exception(RuntimeError("boom")) == "error"
+
+
+def test_budget_caps_the_limit_below_max_limit():
+    controller = _controller(initial_limit=8)
+    controller.set_budget(3)
+    assert controller.limit == 3
+    for _ in range(20):
+        controller.record("ok", 0.1)
+    assert controller.limit == 3
+    controller.set_budget(None)
+    for _ in range(3):
+        controller.record("ok", 0.1)
+    assert controller.limit == 4
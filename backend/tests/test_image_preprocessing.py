@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.utils.image_preprocessing import (
+    StepTimer, binarize, crop_mrz, deskew, estimate_skew, otsu_threshold, preprocess
+)
+
+
+def _reference_otsu(gray):
+    """The original per-bin loop, kept here as the oracle"""
+    hist = np.bincount(gray.ravel(), minlength=256).tolist()
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_back = w_back = 0
+    var_max = 0
+    threshold = 0
+    for t in range(256):
+        w_back += hist[t]
+        if w_back == 0:
+            continue
+        w_fore = total - w_back
+        if w_fore == 0:
+            break
+        sum_back += t * hist[t]
+        mean_back = sum_back / w_back
+        mean_fore = (sum_all - sum_back) / w_fore
+        var_between = w_back * w_fore * (mean_back - mean_fore) ** 2
+        if var_between > var_max:
+            var_max = var_between
+            threshold = t
+    return threshold
+
+
+def _synthetic_page(width=1200, height=850):
+    """White page with body text and a two-line MRZ near the bottom"""
+    page = np.full((height, width), 235, dtype=np.uint8)
+    for row in range(6):
+        cv2.putText(page, "SURNAME GIVEN NAMES 12 JAN 1980", (60, 90 + row * 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, 30, 2)
+    for row, line in enumerate(["P<GBRSMITH<<JOHN<<<<<<<<<<<<<<<<<<<<<<<<<<<",
+                                "1234567897GBR8001014M3001014<<<<<<<<<<<<<<02"]):
+        cv2.putText(page, line, (40, 700 + row * 55), cv2.FONT_HERSHEY_PLAIN, 1.9, 20, 2)
+    return page
+
+
+def test_otsu_matches_reference_loop():
+    rng = np.random.default_rng(7)
+    for _ in range(5):
+        gray = np.concatenate([
+            rng.normal(60, 20, 5000), rng.normal(190, 25, 15000)
+        ]).clip(0, 255).astype(np.uint8)
+        assert otsu_threshold(gray) == _reference_otsu(gray)
+
+
+def test_otsu_handles_flat_image():
+    gray = np.full((20, 20), 128, dtype=np.uint8)
+    assert otsu_threshold(gray) == _reference_otsu(gray)
+
+
+def test_binarize_is_two_level():
+    page = _synthetic_page()
+    binary = binarize(page)
+    assert set(np.unique(binary)) <= {0, 255}
+
+
+def test_deskew_recovers_rotation():
+    page = _synthetic_page()
+    rotated = deskew(page, 3.0)
+    angle = estimate_skew(binarize(rotated))
+    assert abs(angle + 3.0) <= 0.5
+
+
+def test_mrz_crop_finds_bottom_band():
+    page = _synthetic_page()
+    mrz = crop_mrz(page)
+    assert mrz is not None
+    assert mrz.shape[1] > page.shape[1] * 0.6
+    assert mrz.shape[0] < page.shape[0] * 0.35
+
+
+def test_preprocess_reports_step_timings():
+    timer = StepTimer()
+    pre = preprocess(Image.fromarray(_synthetic_page()).convert('RGB'), timer)
+    assert pre.binary.shape == pre.gray.shape
+    for step in ('grayscale', 'resize', 'threshold', 'deskew', 'denoise', 'mrz_crop'):
+        assert step in pre.timings
+    assert timer.total_ms >= 0
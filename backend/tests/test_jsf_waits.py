@@ -0,0 +1,151 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from app.utils import jsf_waits
+from app.utils.jsf_waits import ajax_step, read_availability
+
+
+class FakePermitPage:
+    """Just enough of a Playwright page over the permit form's JSF cycle.
+
+    Each change posts a partial request. The response event fires first and
+    the DOM update lands a moment later, as with the real jsf.js.
+    """
+
+    def __init__(self, slots, dropped=()):
+        self.slots = slots  # date -> slots value, or None for "No slots"
+        self.dropped = set(dropped)  # dates whose partial response updates nothing
+        self.site = self.product = None
+        self.date = self._typed = ""
+        self.slots_field = {"value": "", "stale": False}
+        self.messages = {"error": None, "stale": False}
+        self.posts = []
+        self._waiters = []
+
+    # -- form actions ----------------------------------------------------------
+
+    async def select_option(self, selector, label):
+        if selector == jsf_waits.SITE_SELECT:
+            self.site, self.product = label, None
+        else:
+            self.product = label
+        self._post(selector)
+
+    async def fill(self, selector, value):
+        self._typed = value
+
+    async def dispatch_event(self, selector, event):
+        self._post(selector)
+
+    async def press(self, selector, key):
+        if self._typed != self.date:
+            self.date = self._typed
+            self._post(selector)
+
+    def _post(self, source):
+        self.posts.append(source)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, self._respond)
+        loop.call_later(0.02, self._apply, source, self.date)
+
+    def _respond(self):
+        response = SimpleNamespace(request=SimpleNamespace(method="POST", headers={"faces-request": "partial/ajax"}))
+        for predicate, future in self._waiters:
+            if not future.done() and predicate(response):
+                future.set_result(response)
+
+    def _apply(self, source, date):
+        # Like the replay site, only the date field's partial response carries the answer
+        if source != jsf_waits.DATE_INPUT or not (self.product and date) or date in self.dropped:
+            return
+        if self.slots[date] is None:
+            self.slots_field = {"value": "", "stale": False}
+            self.messages = {"error": jsf_waits.NO_SLOTS_MESSAGE, "stale": False}
+        else:
+            self.slots_field = {"value": self.slots[date], "stale": False}
+            self.messages = {"error": None, "stale": False}
+
+    # -- reads and waits ---------------------------------------------------------
+
+    async def eval_on_selector(self, selector, script):
+        return self.site if selector == jsf_waits.SITE_SELECT else self.product
+
+    async def input_value(self, selector):
+        return self.date
+
+    async def evaluate(self, script):
+        assert script == jsf_waits._MARK_JS
+        self.slots_field["stale"] = self.messages["stale"] = True
+
+    async def wait_for_response(self, predicate, timeout):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((predicate, future))
+        try:
+            return await asyncio.wait_for(future, timeout / 1000)
+        except asyncio.TimeoutError:
+            raise PlaywrightTimeoutError("no partial response")
+
+    async def wait_for_function(self, script, timeout):
+        assert script == jsf_waits._OUTCOME_JS
+        deadline = asyncio.get_running_loop().time() + timeout / 1000
+        while asyncio.get_running_loop().time() < deadline:
+            if not self.messages["stale"] and self.messages["error"]:
+                return SimpleNamespace(json_value=self._value({"error": self.messages["error"]}))
+            if not self.slots_field["stale"] and self.slots_field["value"]:
+                return SimpleNamespace(json_value=self._value({"slots": self.slots_field["value"]}))
+            await asyncio.sleep(0.005)
+        raise PlaywrightTimeoutError("nothing rendered")
+
+    @staticmethod
+    def _value(value):
+        async def json_value():
+            return value
+        return json_value
+
+
+@pytest.fixture(autouse=True)
+def short_timeouts(monkeypatch):
+    monkeypatch.setattr(jsf_waits.settings, "SCRAPER_AJAX_TIMEOUT_MS", 200)
+    monkeypatch.setattr(jsf_waits.settings, "SCRAPER_RENDER_TIMEOUT_MS", 100)
+
+
+async def test_a_tab_walking_dates_posts_only_the_date_change():
+    page = FakePermitPage({"01/03/2027": "12", "02/03/2027": None, "03/03/2027": "4"})
+    site, product = "Volcanoes National Park", "Mountain gorillas"
+
+    assert await read_availability(page, "01/03/2027", site, product) == ("01/03/2027", "12")
+    assert len(page.posts) == 3
+    assert await read_availability(page, "02/03/2027", site, product) == ("02/03/2027", "Sold Out")
+    assert await read_availability(page, "03/03/2027", site, product) == ("03/03/2027", "4")
+    assert page.posts[3:] == [jsf_waits.DATE_INPUT, jsf_waits.DATE_INPUT]
+
+
+async def test_a_product_change_on_the_same_date_posts_the_date_again():
+    page = FakePermitPage({"01/03/2027": "12"})
+    await read_availability(page, "01/03/2027", "Volcanoes National Park", "Mountain gorillas")
+    page.slots["01/03/2027"] = "30"  # the other product's availability
+    assert await read_availability(page, "01/03/2027", "Volcanoes National Park", "Golden Monkeys") == ("01/03/2027", "30")
+    assert page.posts[-2:] == [jsf_waits.PRODUCT_SELECT, jsf_waits.DATE_INPUT]
+
+
+async def test_a_dropped_update_reads_as_none_not_the_previous_date():
+    page = FakePermitPage({"01/03/2027": "12", "02/03/2027": "7"}, dropped={"02/03/2027"})
+    site, product = "Volcanoes National Park", "Mountain gorillas"
+    assert await read_availability(page, "01/03/2027", site, product) == ("01/03/2027", "12")
+    assert await read_availability(page, "02/03/2027", site, product) is None
+
+
+async def test_ajax_step_falls_back_to_the_timeout_and_passes_action_errors_on():
+    page = FakePermitPage({})
+
+    async def nothing_posted():
+        pass
+    assert await ajax_step(page, nothing_posted, timeout=50) is None
+
+    async def broken():
+        raise RuntimeError("detached")
+    with pytest.raises(RuntimeError):
+        await ajax_step(page, broken)
@@ -0,0 +1,107 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import lean_pages
+from app.utils.lean_pages import AssetCache, LeanPages
+
+SITE = "https://permits.example/rdbBooking/tourismpermit_v1/TourismPermit_v1.xhtml"
+
+
+class FakeResponse:
+    def __init__(self, body, status=200, headers=None):
+        self._body = body
+        self.status = status
+        self.headers = headers or {"content-type": "application/javascript"}
+
+    async def body(self):
+        return self._body
+
+
+class FakeRoute:
+    def __init__(self, response=None):
+        self.response = response
+        self.outcome = None
+
+    async def abort(self, error_code=None):
+        self.outcome = ("abort", error_code)
+
+    async def continue_(self):
+        self.outcome = ("continue",)
+
+    async def fetch(self):
+        return self.response
+
+    async def fulfill(self, **kwargs):
+        self.outcome = ("fulfill", kwargs.get("body"))
+
+
+class FakePage:
+    """Pages are tracked weakly, like Playwright's own Page objects."""
+
+
+def _request(url, resource_type, page, method="GET"):
+    return SimpleNamespace(url=url, resource_type=resource_type, method=method, frame=SimpleNamespace(page=page))
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(lean_pages.settings, "SCRAPER_BLOCK_RESOURCE_TYPES", "image,media,font,stylesheet")
+    monkeypatch.setattr(lean_pages.settings, "SCRAPER_CACHE_RESOURCE_TYPES", "script,stylesheet")
+    monkeypatch.setattr(lean_pages.settings, "SCRAPER_BLOCK_THIRD_PARTY", True)
+    monkeypatch.setattr(lean_pages.settings, "SCRAPER_THIRD_PARTY_ALLOW", "cdn.example")
+
+
+async def _handle(lean, request, response=None):
+    lean.on_request(request)
+    route = FakeRoute(response)
+    await lean.handle(route, request)
+    return route.outcome
+
+
+async def test_unneeded_resources_and_third_parties_are_aborted(tmp_path):
+    lean = LeanPages(SITE, AssetCache(str(tmp_path), 3600))
+    page = FakePage()
+    load = lean.track(page, "tab")
+
+    assert (await _handle(lean, _request("https://permits.example/logo.png", "image", page)))[0] == "abort"
+    assert (await _handle(lean, _request("https://permits.example/theme.css", "stylesheet", page)))[0] == "abort"
+    assert (await _handle(lean, _request("https://tracker.example/a.js", "script", page)))[0] == "abort"
+    assert await _handle(lean, _request(SITE, "document", page)) == ("continue",)
+    assert await _handle(lean, _request(SITE, "fetch", page, method="POST")) == ("continue",)
+    assert (load.requests, load.blocked) == (5, 3)
+
+
+async def test_needed_assets_are_shared_through_the_disk_cache(tmp_path):
+    script = "https://cdn.example/primefaces.js"
+    first = LeanPages(SITE, AssetCache(str(tmp_path), 3600))
+    page = FakePage()
+    tab = first.track(page, "tab")
+    body = b"x" * 5000
+    outcome = await _handle(first, _request(script, "script", page), FakeResponse(body))
+    assert outcome == ("fulfill", body)
+    assert (tab.network_bytes, tab.cache_hits) == (5000, 0)
+
+    # Another context (tab, worker process or run) sharing the directory never downloads it again
+    second = LeanPages(SITE, AssetCache(str(tmp_path), 3600))
+    page = FakePage()
+    retry = second.track(page, "retry")
+    assert await _handle(second, _request(script, "script", page), FakeResponse(b"not fetched")) == ("fulfill", body)
+    assert (retry.network_bytes, retry.cache_hits, retry.cache_bytes) == (0, 1, 5000)
+    assert "5 KB from cache" in lean_pages.summary(first.loads() + second.loads())
+
+
+async def test_expired_and_uncacheable_responses_are_fetched(tmp_path):
+    cache = AssetCache(str(tmp_path), 60)
+    script = "https://permits.example/app.js"
+    cache.put(script, 200, {"content-type": "application/javascript"}, b"old")
+    old = os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0])
+    os.utime(old, (0, 0))
+
+    lean = LeanPages(SITE, cache)
+    page = FakePage()
+    lean.track(page, "tab")
+    fresh = FakeResponse(b"new", headers={"cache-control": "no-store"})
+    assert await _handle(lean, _request(script, "script", page), fresh) == ("fulfill", b"new")
+    assert cache.get(script) is None  # still expired: the no-store response was not cached
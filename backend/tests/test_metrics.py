@@ -0,0 +1,138 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import metrics
+from app.utils.metrics import Counter, Gauge, Histogram, MetricsMiddleware, Registry
+
+
+@pytest.fixture
+def metrics_on(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = Registry()
+    hits = Counter("t_hits", "Hits", ("route",), registry=registry)
+    depth = Gauge("t_depth", "Queue depth", registry=registry)
+    hits.inc(route="/a")
+    hits.inc(2, route='/b"x')
+    depth.set(3)
+
+    text = registry.render()
+    assert "# TYPE t_hits counter" in text
+    assert 't_hits_total{route="/a"} 1' in text
+    assert 't_hits_total{route="/b\\"x"} 2' in text
+    assert "# TYPE t_depth gauge\nt_depth 3\n" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = Histogram("t_latency", "Latency", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert 't_latency_bucket{le="0.1"} 1' in text
+    assert 't_latency_bucket{le="1"} 3' in text
+    assert 't_latency_bucket{le="+Inf"} 4' in text
+    assert "t_latency_sum 6.05" in text
+    assert "t_latency_count 4" in text
+
+
+def test_wrong_labels_and_duplicate_names_are_rejected():
+    registry = Registry()
+    hits = Counter("t_hits", "Hits", ("route",), registry=registry)
+    with pytest.raises(ValueError):
+        hits.inc(path="/a")
+    with pytest.raises(ValueError):
+        Counter("t_hits", "Again", registry=registry)
+
+
+def test_collectors_run_before_render_and_failures_are_counted():
+    registry = Registry()
+    depth = Gauge("t_depth", "Queue depth", registry=registry)
+    registry.on_collect(lambda: depth.set(7))
+
+    def broken():
+        raise RuntimeError("db down")
+    registry.on_collect(broken)
+
+    before = metrics.collect_errors.value(collector="broken")
+    assert "t_depth 7" in registry.render()
+    assert metrics.collect_errors.value(collector="broken") == before + 1
+
+
+def test_hooks_are_no_ops_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    job = metrics.instrument_job("t_disabled_job", lambda: "done")
+    assert job() == "done"
+    with metrics.timer(metrics.ocr_step_seconds, step="t_disabled"):
+        pass
+    metrics.observe_ocr_steps({"t_disabled_step": 12.0})
+    assert metrics.job_seconds.count(job="t_disabled_job") == 0
+    assert metrics.ocr_step_seconds.count(step="t_disabled") == 0
+    assert metrics.ocr_step_seconds.count(step="t_disabled_step") == 0
+
+
+def test_instrument_job_records_success_and_errors(metrics_on):
+    metrics.instrument_job("t_ok_job", lambda: None)()
+    assert metrics.job_runs.value(job="t_ok_job", outcome="ok") == 1
+    assert metrics.job_last_success.value(job="t_ok_job") is not None
+
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        metrics.instrument_job("t_bad_job", fail)()
+    assert metrics.job_runs.value(job="t_bad_job", outcome="error") == 1
+    assert metrics.job_last_success.value(job="t_bad_job") is None
+    assert metrics.job_seconds.count(job="t_bad_job") == 1
+
+
+async def test_track_extraction_labels_outcome(metrics_on):
+    @metrics.track_extraction("t_doc")
+    async def extract(fail=False):
+        if fail:
+            raise ValueError("unreadable")
+        return "data"
+
+    assert await extract() == "data"
+    with pytest.raises(ValueError):
+        await extract(fail=True)
+    assert metrics.extraction_seconds.count(kind="t_doc", outcome="ok") == 1
+    assert metrics.extraction_seconds.count(kind="t_doc", outcome="error") == 1
+
+
+def test_middleware_labels_by_route_template(metrics_on):
+    app = FastAPI()
+
+    @app.get("/t/items/{item_id}")
+    def get_item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    assert client.get("/t/items/1").status_code == 200
+    assert client.get("/t/items/2").status_code == 200
+    assert client.get("/t/nowhere").status_code == 404
+
+    assert metrics.http_request_seconds.count(method="GET", route="/t/items/{item_id}", status=200) == 2
+    assert metrics.http_request_seconds.count(method="GET", route="unmatched", status=404) >= 1
+    assert metrics.db_queries_per_request.count(route="/t/items/{item_id}") == 2
+
+
+def test_registry_labels_every_sample_with_its_constant_labels():
+    registry = Registry({"process": "host:1"})
+    hits = Counter("t_hits", "Hits", ("route",), registry=registry)
+    depth = Gauge("t_depth", "Queue depth", registry=registry)
+    latency = Histogram("t_latency", "Latency", buckets=(1.0,), registry=registry)
+    hits.inc(route="/a")
+    depth.set(2)
+    latency.observe(0.5)
+
+    text = registry.render()
+    assert 't_hits_total{route="/a",process="host:1"} 1' in text
+    assert 't_depth{process="host:1"} 2' in text
+    assert 't_latency_bucket{le="1",process="host:1"} 1' in text
+    with pytest.raises(ValueError):
+        Gauge("t_other", "Clashes", ("process",), registry=registry)
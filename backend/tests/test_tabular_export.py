@@ -0,0 +1,44 @@
+import csv
+import io
+import zipfile
+from datetime import date
+from xml.etree import ElementTree
+
+from app.utils import tabular_export
+from app.utils.tabular_export import iter_csv, iter_xlsx
+
+COLUMNS = (("id", "ID"), ("name", "Name"), ("when", "When"), ("paid", "Paid"))
+NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def _rows(n):
+    for i in range(n):
+        yield {"id": i, "name": f"Trek <{i}> & co\x01", "when": date(2030, 1, 1), "paid": i % 2 == 0}
+
+
+def test_csv_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(tabular_export, "CHUNK_SIZE", 1024)
+    chunks = list(iter_csv(COLUMNS, _rows(500)))
+    assert len(chunks) > 1
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+    assert rows[0] == ["ID", "Name", "When", "Paid"]
+    assert rows[1] == ["0", "Trek <0> & co\x01", "2030-01-01", "true"]
+    assert len(rows) == 501
+
+
+def test_xlsx_streams_a_valid_workbook(monkeypatch):
+    monkeypatch.setattr(tabular_export, "CHUNK_SIZE", 1024)
+    chunks = list(iter_xlsx(COLUMNS, _rows(2000), sheet_name="Bookings"))
+    assert len(chunks) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    assert workbook.find(".//s:sheet", NS).get("name") == "Bookings"
+    rows = sheet.findall(".//s:row", NS)
+    assert len(rows) == 2001
+    cells = rows[1].findall("s:c", NS)
+    assert cells[0].find("s:v", NS).text == "0"
+    assert cells[1].find(".//s:t", NS).text == "Trek <0> & co"
+    assert (cells[3].get("t"), cells[3].find("s:v", NS).text) == ("b", "1")
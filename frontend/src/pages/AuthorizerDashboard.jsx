@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import RowActionsDropdown from '../components/RowActionsDropdown';
 
@@ -33,7 +33,9 @@ const AuthorizerDashboard = () => {
   const [submitting, setSubmitting] = useState(false);
 
   // Document viewer state
-  const [docModal, setDocModal] = useState(null); // { req, docs: string[] }
+  const [docModal, setDocModal] = useState(null); // { req, docs: { filename, original_filename }[] }
+  const [docPreviews, setDocPreviews] = useState({}); // filename -> thumbnail blob URL
+  const previewRun = useRef(0); // bumped when the modal closes, so late previews are dropped
   const [activeDoc, setActiveDoc] = useState(null); // { filename, blobUrl, type } | { filename, error }
   const [docLoading, setDocLoading] = useState(false);
 
@@ -138,16 +140,49 @@ const AuthorizerDashboard = () => {
     }
   };
 
+  // Small server-rendered thumbnails, so the sidebar doesn't pull every original.
+  // A 202 means the server is still rendering one: retry with backoff until it is ready.
+  const fetchPreviews = (docs) => {
+    const run = ++previewRun.current;
+    const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+    docs.forEach(async (doc) => {
+      for (let attempt = 0; attempt < 8 && run === previewRun.current; attempt++) {
+        try {
+          const res = await fetch(`${API}/authorization/documents/${doc.filename}/preview`, {
+            headers: { 'Authorization': `Bearer ${token}` },
+          });
+          if (res.status === 202) {
+            const retryAfter = Number(res.headers.get('Retry-After')) || 1;
+            await sleep(Math.min(retryAfter * 1000 * 2 ** attempt, 15000));
+            continue;
+          }
+          if (res.status !== 200) return;
+          const url = URL.createObjectURL(await res.blob());
+          if (run !== previewRun.current) { URL.revokeObjectURL(url); return; }
+          setDocPreviews(prev => ({ ...prev, [doc.filename]: url }));
+          return;
+        } catch {
+          return;
+        }
+      }
+    });
+  };
+
   const openDocModal = (req) => {
-    const docs = req.proof_documents
-      ? req.proof_documents.split(',').map(d => d.trim()).filter(Boolean)
-      : [];
+    const docs = req.documents?.length
+      ? req.documents
+      : (req.proof_documents || '').split(',').map(d => d.trim()).filter(Boolean)
+          .map(filename => ({ filename, original_filename: filename }));
     setDocModal({ req, docs });
-    if (docs.length > 0) fetchDoc(docs[0]);
+    if (docs.length > 1) fetchPreviews(docs);
+    if (docs.length > 0) fetchDoc(docs[0].filename);
   };
 
   const closeDocModal = () => {
+    previewRun.current++;
     if (activeDoc?.blobUrl) URL.revokeObjectURL(activeDoc.blobUrl);
+    Object.values(docPreviews).forEach(url => URL.revokeObjectURL(url));
+    setDocPreviews({});
     setDocModal(null);
     setActiveDoc(null);
   };
@@ -300,19 +335,26 @@ const AuthorizerDashboard = () => {
                 <div className="w-52 border-r border-gray-200 dark:border-gray-700 p-3 flex-shrink-0">
                   <p className="text-xs text-gray-400 uppercase tracking-wider mb-2 px-1">Files</p>
                   {docModal.docs.map((doc, i) => {
-                    const label = doc.replace(/^\d+_/, '').replace(/_/g, ' ');
-                    const isActive = activeDoc?.filename === doc;
+                    const label = (doc.original_filename || doc.filename).replace(/^\d+_/, '').replace(/_/g, ' ');
+                    const isActive = activeDoc?.filename === doc.filename;
                     return (
                       <button
                         key={i}
-                        onClick={() => fetchDoc(doc)}
+                        onClick={() => fetchDoc(doc.filename)}
                         className={`w-full text-left text-xs px-2 py-2 rounded mb-1 truncate ${
                           isActive
                             ? 'bg-blue-50 text-blue-700 font-medium dark:bg-blue-900/30 dark:text-blue-400'
                             : 'text-gray-600 dark:text-gray-400 hover:bg-gray-50 dark:hover:bg-gray-700'
                         }`}
-                        title={doc}
+                        title={doc.original_filename || doc.filename}
                       >
+                        {docPreviews[doc.filename] && (
+                          <img
+                            src={docPreviews[doc.filename]}
+                            alt=""
+                            className="w-full h-20 object-cover object-top rounded mb-1 border border-gray-200 dark:border-gray-700"
+                          />
+                        )}
                         {label}
                       </button>
                     );
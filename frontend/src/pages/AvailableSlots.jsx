@@ -10,6 +10,35 @@ const formatDate = (date) => {
     return `${d}/${m}/${y}`;
 };
 
+// Same wording as the API's format_relative_time
+const relativeTime = (timestamp) => {
+    if (!timestamp) return null;
+    const seconds = Math.abs(Math.floor((Date.now() - new Date(`${timestamp}Z`).getTime()) / 1000));
+    const plural = (n, unit) => `${n} ${unit}${n !== 1 ? 's' : ''} ago`;
+    if (seconds === 0) return 'just now';
+    if (seconds < 60) return plural(seconds, 'second');
+    if (seconds < 3600) return plural(Math.floor(seconds / 60), 'minute');
+    if (seconds < 86400) return plural(Math.floor(seconds / 3600), 'hour');
+    return plural(Math.floor(seconds / 86400), 'day');
+};
+
+// One row per date the product has a value for, from the columnar /calendar payload
+const calendarRows = (calendar, product) => {
+    const columns = calendar && calendar.products[product];
+    if (!columns) return [];
+    const monthUpdated = Object.fromEntries(
+        calendar.months.map((month, i) => [month, columns.month_updated_at[i]])
+    );
+    return calendar.dates.flatMap((date, i) => {
+        if (columns.slots[i] === null) return [];
+        return [{
+            date,
+            slots: columns.sold_out[i] ? 'Sold Out' : String(columns.slots[i]),
+            relative_time: relativeTime(monthUpdated[date.slice(3)]),
+        }];
+    });
+};
+
 const AvailableSlots = () => {
     // Set default start date to tomorrow
     const tomorrow = new Date();
@@ -24,7 +53,7 @@ const AvailableSlots = () => {
         return defaultEnd;
     });
     const [selectedProduct, setSelectedProduct] = useState('gorilla');
-    const [slots, setSlots] = useState([]);
+    const [calendar, setCalendar] = useState(null);
     const [loading, setLoading] = useState(false);
 
     // Update end date whenever start date changes
@@ -50,10 +79,11 @@ const AvailableSlots = () => {
             const formattedStartDate = formatDate(startDate);
             const formattedEndDate = formatDate(endDate);
 
+            // Both products in one compact response; switching product needs no refetch
             const { data } = await axios.get(
-                `/available-slots?start_date=${formattedStartDate}&end_date=${formattedEndDate}&slot_type=${selectedProduct}`
+                `/available-slots/calendar?products=gorilla,golden_monkey&start_date=${formattedStartDate}&end_date=${formattedEndDate}`
             );
-            setSlots(data.slots);
+            setCalendar(data);
         } catch (error) {
             console.error('Error fetching slots:', error);
         } finally {
@@ -63,7 +93,12 @@ const AvailableSlots = () => {
 
     useEffect(() => {
         fetchSlots();
-    }, [startDate, endDate, selectedProduct]);
+    }, [startDate, endDate]);
+
+    const slots = calendarRows(calendar, selectedProduct);
+    const lastUpdate = calendar && calendar.products[selectedProduct]
+        ? relativeTime(calendar.products[selectedProduct].updated_at)
+        : null;
 
     return (
         <div className="container mx-auto px-4 sm:px-6 lg:px-8">
@@ -104,7 +139,7 @@ const AvailableSlots = () => {
                                         className="w-full p-2 border border-gray-300 rounded-md shadow-sm focus:ring-1 focus:ring-blue-500 focus:border-blue-500"
                                     >
                                         <option value="gorilla">Mountain Gorillas</option>
-                                        <option value="golden-monkey">Golden Monkeys</option>
+                                        <option value="golden_monkey">Golden Monkeys</option>
                                     </select>
                                 </div>
                             </div>
@@ -127,7 +162,7 @@ const AvailableSlots = () => {
                     <div className="bg-white rounded-lg shadow-sm">
                         <div className="p-3 border-b border-gray-200 flex justify-between items-center">
                             <span className="text-sm text-gray-500">
-                                Last updated: {slots[0].relative_time || 'Never'}
+                                Last updated: {lastUpdate || 'Never'}
                             </span>
                         </div>
                         <div className="overflow-x-auto">
@@ -141,7 +176,7 @@ const AvailableSlots = () => {
                                 </thead>
                                 <tbody className="bg-white divide-y divide-gray-200">
                                     {slots.map(slot => (
-                                        <tr key={slot.id} className="hover:bg-gray-50">
+                                        <tr key={slot.date} className="hover:bg-gray-50">
                                             <td className="px-3 py-2.5 whitespace-nowrap text-xs text-gray-700">{slot.date}</td>
                                             <td className="px-3 py-2.5 whitespace-nowrap text-xs">
                                                 {slot.slots === "Sold Out" ? (
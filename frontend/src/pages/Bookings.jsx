@@ -378,35 +378,55 @@ const Bookings = () => {
     return baseColumns;
   }, [role, getActionButton]);
 
+  const PURCHASE_TYPES = { ok_to_purchase_full: 'full', ok_to_purchase_deposit: 'deposit' };
+
   const handleBatchAction = async (action) => {
     const token = localStorage.getItem('token');
-    const endpointMap = {
-      confirm: 'confirm',
-      reject: 'reject',
-      send_to_finance: 'send-to-finance',
-      payment_request: 'payment-request',
-    };
-    const endpoint = endpointMap[action];
-    if (!endpoint) return;
+    const headers = { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' };
 
     const eligible = selectedBookings.filter(b => {
-      if (action === 'confirm' || action === 'reject') return b.status === 'requested';
-      if (action === 'send_to_finance') return b.status === 'confirmed';
+      if (action === 'confirm' || action === 'send_to_finance') return b.status === 'requested';
+      if (action === 'reject') return b.status === 'requested' || b.status === 'provisional';
+      if (action === 'purchase_permits') return b.status === 'confirmed' && PURCHASE_TYPES[b.validation_status];
       return true;
     });
 
     if (eligible.length === 0) { alert('No eligible bookings for this action.'); return; }
     if (!window.confirm(`Apply "${action.replace(/_/g,' ')}" to ${eligible.length} booking(s)?`)) return;
 
-    const results = await Promise.allSettled(
-      eligible.map(b => fetch(`http://localhost:8000/api/bookings/${b.id}/${endpoint}`, {
-        method: 'POST',
-        headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
-      }))
-    );
+    let succeeded = 0;
+    let failed = 0;
+    if (action === 'payment_request') {
+      const results = await Promise.allSettled(
+        eligible.map(b => fetch(`http://localhost:8000/api/bookings/${b.id}/payment-request`, { method: 'POST', headers }))
+      );
+      failed = results.filter(r => r.status === 'rejected' || !r.value?.ok).length;
+      succeeded = eligible.length - failed;
+    } else {
+      // One request (and one transaction) per purchase type, with a result per booking
+      const groups = {};
+      eligible.forEach(b => {
+        const purchaseType = action === 'purchase_permits' ? PURCHASE_TYPES[b.validation_status] : null;
+        (groups[purchaseType] = groups[purchaseType] || []).push(b.id);
+      });
+      for (const [purchaseType, ids] of Object.entries(groups)) {
+        try {
+          const res = await fetch('http://localhost:8000/api/bookings/bulk', {
+            method: 'POST', headers,
+            body: JSON.stringify({
+              action, booking_ids: ids,
+              ...(action === 'purchase_permits' ? { purchase_type: purchaseType } : {}),
+            }),
+          });
+          if (!res.ok) { failed += ids.length; continue; }
+          const data = await res.json();
+          succeeded += data.succeeded;
+          failed += data.failed;
+        } catch { failed += ids.length; }
+      }
+    }
 
-    const failed = results.filter(r => r.status === 'rejected' || !r.value?.ok).length;
-    if (failed > 0) alert(`${eligible.length - failed} succeeded, ${failed} failed.`);
+    if (failed > 0) alert(`${succeeded} succeeded, ${failed} failed.`);
     setSelectedBookings([]);
     fetchBookings();
   };
@@ -640,7 +660,7 @@ const Bookings = () => {
                 </button>
               </>
             )}
-            {role === 'admin' && selectedBookings.some(b => b.status === 'confirmed') && (
+            {role === 'admin' && selectedBookings.some(b => b.status === 'requested') && (
               <button
                 onClick={() => handleBatchAction('send_to_finance')}
                 className="px-3 py-1.5 text-xs font-medium text-white bg-blue-600 rounded-md hover:bg-blue-700"
@@ -648,6 +668,14 @@ const Bookings = () => {
                 Send to Finance
               </button>
             )}
+            {role === 'admin' && selectedBookings.some(b => b.status === 'confirmed' && PURCHASE_TYPES[b.validation_status]) && (
+              <button
+                onClick={() => handleBatchAction('purchase_permits')}
+                className="px-3 py-1.5 text-xs font-medium text-white bg-cyan-600 rounded-md hover:bg-cyan-700"
+              >
+                Mark Permits Purchased
+              </button>
+            )}
             {role === 'admin' && (
               <button
                 onClick={() => handleBatchAction('payment_request')}
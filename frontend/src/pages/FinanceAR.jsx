@@ -627,8 +627,10 @@ const FinanceAR = () => {
                     <td className="px-3 py-2.5 text-xs text-gray-600 dark:text-gray-400 whitespace-nowrap">{fmtDate(b.trek_date)}</td>
                     <td className="px-3 py-2.5">
                       {b.slots_available !== null ? (
-                        <span className={`px-1.5 py-0.5 rounded text-xs font-medium ${URGENCY_STYLE[b.urgency]}`}>
-                          {b.slots_available} {b.urgency === 'critical' ? '🔴' : b.urgency === 'high' ? '⚠️' : ''}
+                        <span className={`px-1.5 py-0.5 rounded text-xs font-medium ${URGENCY_STYLE[b.urgency]}`}
+                              title={b.net_available !== null && b.net_available !== b.slots_available
+                                ? `${b.slots_available} on the permit site, less our pending bookings` : undefined}>
+                          {b.net_available ?? b.slots_available} {b.urgency === 'critical' ? '🔴' : b.urgency === 'high' ? '⚠️' : ''}
                         </span>
                       ) : <span className="text-gray-400 text-xs">—</span>}
                     </td>
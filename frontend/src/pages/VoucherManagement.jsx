@@ -1,4 +1,4 @@
-import React, { useState, useRef } from 'react';
+import React, { useState, useRef, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { DocumentArrowUpIcon, CheckCircleIcon, XCircleIcon } from '@heroicons/react/24/outline';
 
@@ -9,8 +9,50 @@ const VoucherManagement = () => {
   const [extractedData, setExtractedData] = useState(null);
   const [missingFields, setMissingFields] = useState([]);
   const fileInputRef = useRef(null);
+  const batchInputRef = useRef(null);
+  const [batchReport, setBatchReport] = useState(null);
+  const [batchError, setBatchError] = useState(null);
   const navigate = useNavigate();
 
+  // Poll a running batch import until every file has an outcome
+  useEffect(() => {
+    if (!batchReport || !['queued', 'running'].includes(batchReport.status)) return undefined;
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(`http://localhost:8000/api/voucher/imports/${batchReport.id}`, {
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+        });
+        if (res.ok) setBatchReport(await res.json());
+      } catch (err) {
+        console.error('Error polling voucher import:', err);
+      }
+    }, 2000);
+    return () => clearTimeout(timer);
+  }, [batchReport]);
+
+  const handleBatchChange = async (event) => {
+    const files = Array.from(event.target.files || []);
+    if (files.length === 0) return;
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+    try {
+      setBatchError(null);
+      setBatchReport(null);
+      const res = await fetch('http://localhost:8000/api/voucher/imports', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+        body: formData
+      });
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.detail || 'Import failed');
+      setBatchReport(data);
+    } catch (err) {
+      setBatchError(err.message || 'Import failed');
+    } finally {
+      if (batchInputRef.current) batchInputRef.current.value = '';
+    }
+  };
+
   const handleFileChange = async (event) => {
     const file = event.target.files[0];
     if (!file) return;
@@ -159,6 +201,52 @@ const VoucherManagement = () => {
             </div>
           </div>
 
+          {/* Batch import: a zip or several vouchers at once */}
+          <div className="mb-8 border-t border-gray-200 pt-6">
+            <div className="flex items-center justify-between">
+              <div>
+                <h3 className="text-sm font-medium text-gray-900">Import a batch</h3>
+                <p className="text-xs text-gray-500">A zip or several PDF/PNG/JPG vouchers; each becomes or updates a booking.</p>
+              </div>
+              <label className="px-3 py-1.5 text-xs font-medium text-white bg-indigo-600 rounded-md hover:bg-indigo-700 cursor-pointer">
+                Choose files
+                <input
+                  type="file"
+                  className="hidden"
+                  multiple
+                  accept=".zip,.pdf,.png,.jpg,.jpeg"
+                  onChange={handleBatchChange}
+                  ref={batchInputRef}
+                  disabled={batchReport && ['queued', 'running'].includes(batchReport.status)}
+                />
+              </label>
+            </div>
+            {batchError && <p className="mt-2 text-xs text-red-600">{batchError}</p>}
+            {batchReport && (
+              <div className="mt-3">
+                <p className="text-xs text-gray-600 mb-2">
+                  Import #{batchReport.id}: {batchReport.status}
+                  {batchReport.total_files > 0 && ` — ${batchReport.extracted_files}/${batchReport.total_files} extracted`}
+                </p>
+                <table className="w-full text-xs">
+                  <tbody>
+                    {batchReport.files.map(file => (
+                      <tr key={file.id} className="border-t border-gray-100">
+                        <td className="py-1 pr-2 text-gray-700">{file.filename}</td>
+                        <td className="py-1 pr-2 font-medium">{file.status}</td>
+                        <td className="py-1 text-gray-500">
+                          {file.booking_reference || ''}
+                          {file.missing_fields.length > 0 && ` missing: ${file.missing_fields.join(', ')}`}
+                          {file.error && ` ${file.error}`}
+                        </td>
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            )}
+          </div>
+
           {isProcessing && (
             <div className="text-center mb-6">
               <div className="inline-flex items-center px-4 py-2 font-semibold leading-6 text-sm shadow rounded-md text-white bg-indigo-500">
@@ -11,7 +11,6 @@ import asyncio
 import sys
 import threading
 import os
-import time
 import logging
 
 # ── paths ──────────────────────────────────────────────────────────────────────
@@ -72,42 +71,24 @@ def _set_status(text: str, active: bool = True):
 
 
 # ── scraper ────────────────────────────────────────────────────────────────────
-TOTAL_BATCHES = 25   # 2 years in 30-day batches
-BATCH_SIZE    = 30
-
-
 async def _run_all_batches():
-    from async_panda_headless import scrape_slots
-    from async_golden_monkey import scrape_golden_monkey_slots
-
-    logger.info(f"=== Starting full 2-year scrape ({TOTAL_BATCHES} batches) ===")
-
-    for batch in range(TOTAL_BATCHES):
-        if _state["stop"]:
-            break
-        start_offset = batch * BATCH_SIZE
-        logger.info(f"Batch {batch + 1}/{TOTAL_BATCHES} — gorilla")
-        _set_status(f"Batch {batch + 1}/{TOTAL_BATCHES} — Gorilla scrape")
-        try:
-            await scrape_slots(start_offset=start_offset)
-        except Exception as e:
-            logger.error(f"Gorilla batch {batch + 1} error: {e}")
-
-        await asyncio.sleep(30)
-
-        if _state["stop"]:
-            break
-        logger.info(f"Batch {batch + 1}/{TOTAL_BATCHES} — golden monkey")
-        _set_status(f"Batch {batch + 1}/{TOTAL_BATCHES} — Golden Monkey scrape")
-        try:
-            await scrape_golden_monkey_slots(start_offset=start_offset)
-        except Exception as e:
-            logger.error(f"Golden Monkey batch {batch + 1} error: {e}")
-
-        if batch < TOTAL_BATCHES - 1:
-            await asyncio.sleep(30)
-
-    logger.info("=== Full 2-year scrape complete ===")
+    """One pass over the 2-year horizon as a scrape worker (see backend/scrape_worker.py).
+
+    Ranges are claimed through the shared work-lease table, so running this
+    alongside other workers splits the pass between them instead of
+    scraping every range twice.
+    """
+    import socket
+    from scrape_worker import run_worker
+
+    logger.info("=== Starting full 2-year scrape ===")
+    worked = await run_worker(
+        worker_id=f"tray:{socket.gethostname()}:{os.getpid()}",
+        once=True,
+        stop=lambda: _state["stop"],
+        on_status=_set_status,
+    )
+    logger.info(f"=== Full 2-year scrape complete ({worked} work items) ===")
 
 
 def _scraper_thread_fn():